@@ -15,7 +15,10 @@ data "aws_iam_policy_document" "read_write" {
       aws_dynamodb_table.jobs.arn,
       "${aws_dynamodb_table.jobs.arn}/index/*",
       aws_dynamodb_table.audit.arn,
-      "${aws_dynamodb_table.audit.arn}/index/*"
+      "${aws_dynamodb_table.audit.arn}/index/*",
+      aws_dynamodb_table.workers.arn,
+      aws_dynamodb_table.concurrency.arn,
+      aws_dynamodb_table.rate_limits.arn
     ]
   }
 }
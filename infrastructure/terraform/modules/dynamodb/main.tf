@@ -92,6 +92,19 @@ resource "aws_dynamodb_table" "audit" {
     type = "S"
   }
 
+  # Sparse: only indexed (security-critical) actions carry action_bucket
+  attribute {
+    name = "action_bucket"
+    type = "S"
+  }
+
+  global_secondary_index {
+    name            = "action-index"
+    hash_key        = "action_bucket"
+    range_key       = "timestamp"
+    projection_type = "ALL"
+  }
+
   ttl {
     attribute_name = "expires_at"
     enabled        = true
@@ -106,6 +119,78 @@ resource "aws_dynamodb_table" "audit" {
   })
 }
 
+# -----------------------------------------------------------------------------
+# Workers Table
+# Worker heartbeats listing in-flight jobs, read by the orphaned-job reaper
+# -----------------------------------------------------------------------------
+resource "aws_dynamodb_table" "workers" {
+  name         = "${var.project_name}-workers-${var.environment}"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "worker_id"
+
+  attribute {
+    name = "worker_id"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  tags = merge(var.tags, {
+    Name = "${var.project_name}-workers-${var.environment}"
+  })
+}
+
+# -----------------------------------------------------------------------------
+# Concurrency Table
+# Per-tenant running-job semaphores (leased slots renewed by worker heartbeats)
+# -----------------------------------------------------------------------------
+resource "aws_dynamodb_table" "concurrency" {
+  name         = "${var.project_name}-concurrency-${var.environment}"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "tenant_id"
+
+  attribute {
+    name = "tenant_id"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  tags = merge(var.tags, {
+    Name = "${var.project_name}-concurrency-${var.environment}"
+  })
+}
+
+# -----------------------------------------------------------------------------
+# Rate Limits Table
+# Per-tenant request buckets (GCRA theoretical arrival times) for the API
+# -----------------------------------------------------------------------------
+resource "aws_dynamodb_table" "rate_limits" {
+  name         = "${var.project_name}-rate-limits-${var.environment}"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "bucket_id"
+
+  attribute {
+    name = "bucket_id"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  tags = merge(var.tags, {
+    Name = "${var.project_name}-rate-limits-${var.environment}"
+  })
+}
+
 # -----------------------------------------------------------------------------
 # Dispatches Table
 # Stores dispatch (job execution) records
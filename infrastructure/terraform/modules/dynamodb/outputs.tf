@@ -22,6 +22,30 @@ output "audit_table_name" {
   value = aws_dynamodb_table.audit.name
 }
 
+output "workers_table_arn" {
+  value = aws_dynamodb_table.workers.arn
+}
+
+output "workers_table_name" {
+  value = aws_dynamodb_table.workers.name
+}
+
+output "concurrency_table_arn" {
+  value = aws_dynamodb_table.concurrency.arn
+}
+
+output "concurrency_table_name" {
+  value = aws_dynamodb_table.concurrency.name
+}
+
+output "rate_limits_table_arn" {
+  value = aws_dynamodb_table.rate_limits.arn
+}
+
+output "rate_limits_table_name" {
+  value = aws_dynamodb_table.rate_limits.name
+}
+
 output "api_keys_table_arn" {
   value = aws_dynamodb_table.api_keys.arn
 }
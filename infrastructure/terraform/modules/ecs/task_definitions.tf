@@ -79,7 +79,9 @@ resource "aws_ecs_task_definition" "agent" {
 
       environment = [
         { name = "AGENT_TYPE", value = each.key },
-        { name = "ENVIRONMENT", value = var.environment }
+        { name = "ENVIRONMENT", value = var.environment },
+        # Scopes the dependency cache to the image that built each tree
+        { name = "WORKER_IMAGE", value = "${var.ecr_repository_urls[each.key]}:${each.value.image_tag}" }
       ]
 
       secrets = [
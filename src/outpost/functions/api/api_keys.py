@@ -5,7 +5,7 @@ import hashlib
 from datetime import datetime
 import boto3
 from src.outpost.models import APIKey
-from src.outpost.services import AuditService
+from src.outpost.services import AuditService, flush_audit_aggregates
 
 class APIKeyAPI:
     def __init__(self):
@@ -56,6 +56,7 @@ class APIKeyAPI:
             print(f"Error revoking key: {e}")
             raise e
 
+@flush_audit_aggregates
 def handler(event, context):
 
     api = APIKeyAPI()
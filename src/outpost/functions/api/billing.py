@@ -4,13 +4,18 @@ Billing Portal API endpoints for Outpost multi-tenant SaaS.
 Provides self-service billing management for tenants:
 - GET /billing/portal - Redirect to Stripe Customer Portal
 - GET /billing/usage - Get current usage statistics
+- GET /billing/usage/history - Get monthly usage history
+- GET /billing/preview - Projected invoice for the current period
 - POST /billing/checkout - Create checkout session for subscription
 """
 import json
 import os
 from typing import Dict, Any, Optional
 
-from src.outpost.services import BillingService, SubscriptionTier, MeteringService, AuditService
+from src.outpost.services import (
+    BillingService, SubscriptionTier, MeteringService, InvoicePreview, TenantCache,
+    flush_audit_aggregates
+)
 
 
 class BillingAPI:
@@ -23,7 +28,7 @@ class BillingAPI:
     def __init__(self):
         self.billing = BillingService()
         self.metering = MeteringService()
-        self.audit = AuditService()
+        self.invoice_preview = InvoicePreview(self.metering, stripe_client=self.billing.stripe)
         self.app_url = os.environ.get("APP_URL", "https://outpost.zeroechelon.com")
 
     def get_portal_url(self, tenant_id: str) -> Dict[str, str]:
@@ -36,15 +41,8 @@ class BillingAPI:
         Returns:
             Dict with 'url' for redirect to Stripe portal
         """
-        result = self.billing.create_portal_session(tenant_id)
-
-        self.audit.log_action(
-            tenant_id=tenant_id,
-            action="ACCESS_BILLING_PORTAL",
-            resource="stripe_portal"
-        )
-
-        return result
+        # BillingService audits the visit (ACCESS_BILLING_PORTAL)
+        return self.billing.create_portal_session(tenant_id)
 
     def get_usage(self, tenant_id: str, period: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -59,6 +57,33 @@ class BillingAPI:
         """
         return self.metering.get_usage(tenant_id, period)
 
+    def get_usage_history(self, tenant_id: str, months: int = 12) -> Dict[str, Any]:
+        """
+        Get monthly usage history for the tenant, newest first.
+
+        Args:
+            tenant_id: Authenticated tenant ID
+            months: Number of months (1-36)
+
+        Returns:
+            Dict with 'history' list, zero-filled for months without usage
+        """
+        if not 1 <= months <= 36:
+            raise ValueError("months must be between 1 and 36")
+        return {"tenant_id": tenant_id, "history": self.metering.get_usage_history(tenant_id, months)}
+
+    def get_preview(self, tenant_id: str) -> Dict[str, Any]:
+        """
+        Get the projected invoice for the current billing period.
+
+        Args:
+            tenant_id: Authenticated tenant ID
+
+        Returns:
+            Invoice preview dict (amounts in cents)
+        """
+        return self.invoice_preview.preview(tenant_id)
+
     def create_checkout(
         self,
         tenant_id: str,
@@ -103,6 +128,7 @@ class BillingAPI:
         return self.billing.get_subscription_status(tenant_id)
 
 
+@flush_audit_aggregates
 def handler(event, context):
     """
     Lambda handler for billing API endpoints.
@@ -110,9 +136,12 @@ def handler(event, context):
     Routes:
     - GET /billing/portal -> Stripe Customer Portal URL
     - GET /billing/usage -> Current usage statistics
+    - GET /billing/usage/history -> Monthly usage history
+    - GET /billing/preview -> Projected invoice
     - GET /billing/status -> Subscription status
     - POST /billing/checkout -> Create checkout session
     """
+    TenantCache.log_stats()
     api = BillingAPI()
 
     http_method = event.get("httpMethod") or event.get("requestContext", {}).get("http", {}).get("method")
@@ -140,6 +169,15 @@ def handler(event, context):
                     "body": json.dumps(result)
                 }
 
+        elif path.endswith("/usage/history"):
+            if http_method == "GET":
+                query_params = event.get("queryStringParameters") or {}
+                result = api.get_usage_history(tenant_id, int(query_params.get("months", 12)))
+                return {
+                    "statusCode": 200,
+                    "body": json.dumps(result)
+                }
+
         elif path.endswith("/usage"):
             if http_method == "GET":
                 query_params = event.get("queryStringParameters") or {}
@@ -150,6 +188,14 @@ def handler(event, context):
                     "body": json.dumps(result)
                 }
 
+        elif path.endswith("/preview"):
+            if http_method == "GET":
+                result = api.get_preview(tenant_id)
+                return {
+                    "statusCode": 200,
+                    "body": json.dumps(result)
+                }
+
         elif path.endswith("/status"):
             if http_method == "GET":
                 result = api.get_subscription_status(tenant_id)
@@ -1,10 +1,22 @@
 import json
+import math
 import os
 import ulid
 from datetime import datetime
+from decimal import Decimal
 import boto3
-from src.outpost.models import Job, JobStatus, AgentType
-from src.outpost.services import AuditService
+from botocore.exceptions import ClientError
+from src.outpost.models import Job, JobStatus, AgentType, JobStep
+from src.outpost.services import (
+    AuditService, RateLimiter, MeteringService, QuotaExceededError, AnomalyDetector, UsageAnomalyError,
+    TenantCache, flush_audit_aggregates
+)
+
+def _json_default(value):
+    # DynamoDB returns numbers as Decimal
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
 
 class JobAPI:
     def __init__(self):
@@ -14,21 +26,36 @@ class JobAPI:
         self.queue_url = os.environ.get("JOBS_QUEUE_URL")
         self.table = self.dynamodb.Table(self.jobs_table_name)
         self.audit = AuditService()
+        self.metering = MeteringService()
+        self.anomaly = AnomalyDetector(audit=self.audit, metering=self.metering)
 
     def submit_job(self, tenant_id: str, data: dict):
+        # Watches for runaway submission loops; raises UsageAnomalyError in throttle mode
+        self.anomaly.record_submission(tenant_id)
+
         job_id = str(ulid.new())
+        steps = [JobStep.from_request(step) for step in data["steps"]] if data.get("steps") else None
         job = Job(
             job_id=job_id,
             tenant_id=tenant_id,
             agent=AgentType(data["agent"]),
-            command=data["command"],
+            command=data.get("command") or " && ".join(step.command for step in steps or []),
+            repo=data.get("repo"),
+            batchable=data.get("batchable", False),
+            steps=steps,
             status=JobStatus.PENDING,
             created_at=datetime.utcnow()
         )
         
-        # 1. Save to DynamoDB
+        # 1. Save to DynamoDB, counted against the tenant's quota in the same transaction
         item = job.model_dump(mode="json")
-        self.table.put_item(Item=item)
+        self.metering.transact_job_usage(tenant_id, job_id, [{
+            "Put": {
+                "TableName": self.jobs_table_name,
+                "Item": item,
+                "ConditionExpression": "attribute_not_exists(job_id)"
+            }
+        }])
         
         # 2. Submit to SQS
         if self.queue_url:
@@ -52,6 +79,18 @@ class JobAPI:
             return None
         return item
 
+    def get_job_steps(self, tenant_id: str, job_id: str):
+        job = self.get_job(tenant_id, job_id)
+        if not job:
+            return None
+        steps = job.get("steps") or []
+        return {
+            "job_id": job_id,
+            "status": job.get("status"),
+            "steps": steps,
+            "total_duration_ms": sum(int(step.get("duration_ms") or 0) for step in steps)
+        }
+
     def list_jobs(self, tenant_id: str, limit: int = 50):
         response = self.table.query(
             KeyConditionExpression=boto3.dynamodb.conditions.Key("tenant_id").eq(tenant_id),
@@ -72,18 +111,37 @@ class JobAPI:
         self.audit.log_action(tenant_id, "CANCEL_JOB", job_id)
         return {"status": "cancelled"}
 
+@flush_audit_aggregates
 def handler(event, context):
-    api = JobAPI()
+    # Rate limiting and metering read tenants through the process-wide cache
+    TenantCache.log_stats()
     http_method = event.get("httpMethod") or event.get("requestContext", {}).get("http", {}).get("method")
     # In Lambda Authorizer context, tenant_id should be in authorizer context
-    tenant_id = event.get("requestContext", {}).get("authorizer", {}).get("tenant_id")
-    path_params = event.get("pathParameters") or {}
-    job_id = path_params.get("id")
-    
+    authorizer = event.get("requestContext", {}).get("authorizer", {})
+    tenant_id = authorizer.get("tenant_id")
+
     if not tenant_id:
         # Fallback for testing or non-authorized routes (admin)
         tenant_id = event.get("headers", {}).get("X-Tenant-ID")
 
+    # Checked before any other work so a runaway client costs as little as possible
+    decision = RateLimiter().check(tenant_id, tier=authorizer.get("tier"))
+    if not decision.allowed:
+        return {
+            "statusCode": 429,
+            "headers": decision.headers(),
+            "body": json.dumps({"error": "Rate limit exceeded", "retry_after": math.ceil(decision.retry_after)})
+        }
+
+    response = _route(JobAPI(), event, http_method, tenant_id)
+    response.setdefault("headers", {}).update(decision.headers())
+    return response
+
+def _route(api: JobAPI, event: dict, http_method: str, tenant_id: str):
+    path_params = event.get("pathParameters") or {}
+    job_id = path_params.get("id")
+    path = event.get("path") or event.get("rawPath", "")
+
     try:
         if http_method == "POST":
             body = json.loads(event.get("body", "{}"))
@@ -91,14 +149,19 @@ def handler(event, context):
             return {"statusCode": 201, "body": json.dumps(result)}
             
         elif http_method == "GET":
-            if job_id:
+            if job_id and path.endswith("/steps"):
+                result = api.get_job_steps(tenant_id, job_id)
+                if not result:
+                    return {"statusCode": 404, "body": json.dumps({"error": "Not found"})}
+                return {"statusCode": 200, "body": json.dumps(result, default=_json_default)}
+            elif job_id:
                 result = api.get_job(tenant_id, job_id)
                 if not result:
                     return {"statusCode": 404, "body": json.dumps({"error": "Not found"})}
-                return {"statusCode": 200, "body": json.dumps(result)}
+                return {"statusCode": 200, "body": json.dumps(result, default=_json_default)}
             else:
                 result = api.list_jobs(tenant_id)
-                return {"statusCode": 200, "body": json.dumps(result)}
+                return {"statusCode": 200, "body": json.dumps(result, default=_json_default)}
                 
         elif http_method == "DELETE":
             if not job_id:
@@ -107,7 +170,26 @@ def handler(event, context):
             return {"statusCode": 200, "body": json.dumps(result)}
             
         return {"statusCode": 405, "body": json.dumps({"error": "Method not allowed"})}
-        
+
+    except QuotaExceededError as e:
+        return {"statusCode": 402, "body": json.dumps({"error": "Quota exceeded", "message": str(e)})}
+    except UsageAnomalyError as e:
+        retry_after = max(1, math.ceil(e.retry_after))
+        return {
+            "statusCode": 429,
+            "headers": {"Retry-After": str(retry_after)},
+            "body": json.dumps({"error": "Unusual submission rate", "message": str(e), "retry_after": retry_after})
+        }
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "TransactionCanceledException":
+            print(f"Error: {e}")
+            return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
+        # Lost a race for the tenant's usage item to concurrent submissions
+        return {
+            "statusCode": 429,
+            "headers": {"Retry-After": "1"},
+            "body": json.dumps({"error": "Too many concurrent submissions", "retry_after": 1})
+        }
     except Exception as e:
         print(f"Error: {e}")
         return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
@@ -4,7 +4,7 @@ import uuid
 from datetime import datetime
 import boto3
 from src.outpost.models import Tenant, TenantStatus
-from src.outpost.services import AuditService
+from src.outpost.services import AuditService, TenantCache, flush_audit_aggregates
 
 class TenantAPI:
     def __init__(self):
@@ -51,6 +51,7 @@ class TenantAPI:
             ExpressionAttributeNames=expr_attr_names,
             ExpressionAttributeValues=expr_attr_values
         )
+        TenantCache.for_table(self.table_name).invalidate(tenant_id)
         self.audit.log_action(tenant_id, "UPDATE_TENANT", tenant_id, metadata=data)
         return self.get_tenant(tenant_id)
 
@@ -61,9 +62,11 @@ class TenantAPI:
             ExpressionAttributeNames={"#s": "status"},
             ExpressionAttributeValues={":s": TenantStatus.DELETED.value}
         )
+        TenantCache.for_table(self.table_name).invalidate(tenant_id)
         self.audit.log_action(tenant_id, "DELETE_TENANT", tenant_id)
         return {"status": "deleted"}
 
+@flush_audit_aggregates
 def handler(event, context):
     api = TenantAPI()
     http_method = event.get("httpMethod") or event.get("requestContext", {}).get("http", {}).get("method")
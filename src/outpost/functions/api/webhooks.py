@@ -8,7 +8,7 @@ import os
 import hashlib
 from typing import Dict, Any, Optional
 
-from src.outpost.services import BillingService, AuditService
+from src.outpost.services import BillingService, AuditService, flush_audit_aggregates
 from src.outpost.services.stripe_client import StripeClient
 
 
@@ -140,7 +140,8 @@ class WebhookHandler:
             stripe_customer_id=customer_id,
             subscription_id=subscription_id,
             status=status,
-            current_period_end=current_period_end
+            current_period_end=current_period_end,
+            tier=(subscription.get("metadata") or {}).get("tier")
         )
 
         return {"action": "subscription_created", "subscription_id": subscription_id}
@@ -156,7 +157,8 @@ class WebhookHandler:
             stripe_customer_id=customer_id,
             subscription_id=subscription_id,
             status=status,
-            current_period_end=current_period_end
+            current_period_end=current_period_end,
+            tier=(subscription.get("metadata") or {}).get("tier")
         )
 
         return {"action": "subscription_updated", "status": status}
@@ -226,6 +228,7 @@ class WebhookHandler:
         return {"action": "checkout_completed", "subscription_id": subscription_id}
 
 
+@flush_audit_aggregates
 def handler(event, context):
     """
     Lambda handler for Stripe webhooks.
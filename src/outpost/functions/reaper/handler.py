@@ -0,0 +1,16 @@
+from src.outpost.services import flush_audit_aggregates
+from src.outpost.worker.heartbeat import OrphanReaper
+
+@flush_audit_aggregates
+def handler(event, context):
+    """
+    Scheduled entry point (e.g. EventBridge rate(1 minute)).
+
+    Fails or requeues jobs left running by workers whose heartbeat went stale.
+    Safe to run alongside in-worker reapers: job transitions are conditional.
+    """
+    reaper = OrphanReaper(
+        dead_after_seconds=event.get("dead_after_seconds"),
+        action=event.get("action")
+    )
+    return reaper.reap()
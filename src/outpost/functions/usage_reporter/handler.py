@@ -0,0 +1,16 @@
+from src.outpost.services import flush_audit_aggregates
+from src.outpost.services.usage_reporter import UsageReporter
+
+@flush_audit_aggregates
+def handler(event, context):
+    """
+    Scheduled entry point (e.g. EventBridge rate(15 minutes)).
+
+    Reports usage recorded since the last run to Stripe, one aggregated
+    usage record per subscription item. Safe to retry or overlap: usage
+    items are claimed before reporting and reports carry idempotency keys.
+    """
+    reporter = UsageReporter()
+    if event.get("reconcile"):
+        return {"reconciliation": reporter.reconcile(event.get("periods"), check_stripe=True)}
+    return reporter.report(event.get("periods"))
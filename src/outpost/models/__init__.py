@@ -1,6 +1,6 @@
 from .tenant import Tenant, TenantStatus
-from .job import Job, JobStatus, AgentType
+from .job import Job, JobStatus, AgentType, JobStep, StepStatus
 from .audit import AuditEntry
 from .api_key import APIKey
 
-__all__ = ["Tenant", "TenantStatus", "Job", "JobStatus", "AgentType", "AuditEntry", "APIKey"]
+__all__ = ["Tenant", "TenantStatus", "Job", "JobStatus", "AgentType", "JobStep", "StepStatus", "AuditEntry", "APIKey"]
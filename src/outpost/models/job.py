@@ -1,6 +1,6 @@
 from datetime import datetime
 from enum import Enum
-from typing import Optional, Any
+from typing import Optional, Any, List
 from pydantic import BaseModel, Field
 
 class JobStatus(str, Enum):
@@ -17,16 +17,53 @@ class AgentType(str, Enum):
     GROK = "grok"
     AIDER = "aider"
 
+class StepStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCESS = "success"
+    FAILED = "failed"
+    CACHED = "cached"
+    SKIPPED = "skipped"
+
+class JobStep(BaseModel):
+    name: str = Field(..., min_length=1, description="e.g., clone, install, agent, test, package")
+    command: str = Field(..., min_length=1)
+    cacheable: bool = Field(False, description="Deterministic step whose workspace result can be reused by input hash")
+    inputs: List[str] = Field(default_factory=list, description="Workspace files whose contents feed the cache key")
+    status: StepStatus = StepStatus.PENDING
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    duration_ms: Optional[int] = None
+    cache_hit: bool = False
+    cache_key: Optional[str] = Field(None, description="Input hash of a completed cacheable step")
+
+    class Config:
+        from_attributes = True
+
+    @classmethod
+    def from_request(cls, data: dict) -> "JobStep":
+        """
+        Build a pending step from client input.
+
+        Status, timing and cache key are the worker's to set; accepting them
+        would let a client mark steps completed or point the step cache at a
+        snapshot of its choosing.
+        """
+        return cls(**{name: data[name] for name in ("name", "command", "cacheable", "inputs") if name in data})
+
 class Job(BaseModel):
     job_id: str = Field(..., description="Unique job identifier (ULID)")
     tenant_id: str = Field(..., description="Owner tenant ID")
     agent: AgentType
     command: str = Field(..., min_length=1)
+    repo: Optional[str] = Field(None, description="Repository the job operates on (owner/name)")
+    batchable: bool = Field(False, description="Short job that may share a workspace with others for the same tenant and repo")
     status: JobStatus = JobStatus.PENDING
     created_at: datetime = Field(default_factory=datetime.utcnow)
     completed_at: Optional[datetime] = None
     output_location: Optional[str] = Field(None, description="S3 URI or local path to results")
     error_message: Optional[str] = None
+    steps: Optional[List[JobStep]] = Field(None, description="Ordered pipeline steps; replaces command when set")
 
     class Config:
         from_attributes = True
@@ -1,3 +1,3 @@
-from .manager import SecretsManager
+from .manager import SecretsManager, AGENT_CREDENTIAL_ENV
 
-__all__ = ["SecretsManager"]
+__all__ = ["SecretsManager", "AGENT_CREDENTIAL_ENV"]
@@ -1,9 +1,25 @@
 import boto3
 import json
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, List
 from botocore.exceptions import ClientError
 
+# Environment variable each agent reads its provider credential from
+# (matches the control plane's secret injector)
+AGENT_CREDENTIAL_ENV: Dict[str, str] = {
+    "claude": "ANTHROPIC_API_KEY",
+    "codex": "OPENAI_API_KEY",
+    "gemini": "GOOGLE_API_KEY",
+    "aider": "DEEPSEEK_API_KEY",
+    "grok": "XAI_API_KEY",
+    # Not an agent: injected into every job, for cloning private repos
+    "github": "GITHUB_TOKEN"
+}
+
+# BatchGetSecretValue limits: results per page, and name prefixes per filter
+BATCH_PAGE_SIZE = 20
+BATCH_FILTER_VALUES = 10
+
 class SecretsManager:
     def __init__(self, region_name: str = "us-east-1"):
         self.client = boto3.client("secretsmanager", region_name=region_name)
@@ -13,13 +29,26 @@ class SecretsManager:
     def _get_secret_name(self, tenant_id: str, key_name: str) -> str:
         return f"/outpost/tenants/{tenant_id}/api_keys/{key_name}"
 
+    def _get_agent_prefix(self, tenant_id: str) -> str:
+        return f"/outpost/tenants/{tenant_id}/agents/"
+
     def create_api_key_secret(self, tenant_id: str, key_name: str, api_key: str) -> str:
         secret_name = self._get_secret_name(tenant_id, key_name)
+        return self._put_secret(secret_name, api_key, tenant_id, f"API key for tenant {tenant_id}")
+
+    def create_agent_credential(self, tenant_id: str, agent: str, value: str) -> str:
+        """Store a tenant's credential for an agent (or "github"), replacing any existing one."""
+        secret_name = self._get_agent_prefix(tenant_id) + agent
+        arn = self._put_secret(secret_name, value, tenant_id, f"{agent} credential for tenant {tenant_id}")
+        self._cache.pop(self._get_agent_prefix(tenant_id), None)
+        return arn
+
+    def _put_secret(self, secret_name: str, value: str, tenant_id: str, description: str) -> str:
         try:
             response = self.client.create_secret(
                 Name=secret_name,
-                SecretString=api_key,
-                Description=f"API key for tenant {tenant_id}",
+                SecretString=value,
+                Description=description,
                 Tags=[
                     {"Key": "TenantID", "Value": tenant_id},
                     {"Key": "Project", "Value": "outpost"}
@@ -29,7 +58,7 @@ class SecretsManager:
         except ClientError as e:
             if e.response["Error"]["Code"] == "ResourceExistsException":
                 # Fallback to update if it exists (though usually we generate new names)
-                self.client.put_secret_value(SecretId=secret_name, SecretString=api_key)
+                self.client.put_secret_value(SecretId=secret_name, SecretString=value)
                 return secret_name
             raise e
 
@@ -55,6 +84,69 @@ class SecretsManager:
         except ClientError as e:
             raise e
 
+    def get_agent_credentials(self, tenant_id: str) -> Dict[str, str]:
+        """
+        All of a tenant's agent credentials, by agent, in one BatchGetSecretValue call.
+
+        Cached per tenant, including tenants without any credentials.
+        """
+        prefix = self._get_agent_prefix(tenant_id)
+        entry = self._cache.get(prefix)
+        if entry and time.time() - entry["timestamp"] < self._cache_ttl:
+            return entry["value"]
+        return self.prefetch_agent_credentials([tenant_id])[tenant_id]
+
+    def prefetch_agent_credentials(self, tenant_ids: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        """
+        Fetch and cache the agent credentials of several tenants.
+
+        Tenants are looked up by secret name prefix, BATCH_FILTER_VALUES per
+        call (more calls only when a page of BATCH_PAGE_SIZE fills up).
+
+        Returns:
+            Dict of tenant_id -> {agent: credential}
+        """
+        prefixes = {self._get_agent_prefix(tenant_id): tenant_id for tenant_id in dict.fromkeys(tenant_ids)}
+        credentials: Dict[str, Dict[str, str]] = {tenant_id: {} for tenant_id in prefixes.values()}
+        names = list(prefixes)
+        for start in range(0, len(names), BATCH_FILTER_VALUES):
+            for secret in self._batch_get(names[start:start + BATCH_FILTER_VALUES]):
+                # Name filters match prefixes without regard to case: keep exact matches only
+                prefix = secret["Name"][:secret["Name"].rfind("/") + 1]
+                if prefix in prefixes and "SecretString" in secret:
+                    credentials[prefixes[prefix]][secret["Name"][len(prefix):]] = secret["SecretString"]
+
+        now = time.time()
+        for prefix, tenant_id in prefixes.items():
+            self._cache[prefix] = {"value": credentials[tenant_id], "timestamp": now}
+        return credentials
+
+    def agent_env(self, tenant_id: str, agent: str) -> Dict[str, str]:
+        """
+        Environment variables carrying the tenant's credentials for a job.
+
+        Only the job's own agent credential (and the GitHub token) is
+        injected, not every credential the tenant has stored.
+        """
+        credentials = self.get_agent_credentials(tenant_id)
+        return {
+            AGENT_CREDENTIAL_ENV[name]: credentials[name]
+            for name in (agent, "github")
+            if name in credentials and name in AGENT_CREDENTIAL_ENV
+        }
+
+    def _batch_get(self, prefixes: List[str]) -> List[Dict[str, Any]]:
+        secrets = []
+        kwargs = {"Filters": [{"Key": "name", "Values": prefixes}], "MaxResults": BATCH_PAGE_SIZE}
+        while True:
+            response = self.client.batch_get_secret_value(**kwargs)
+            secrets.extend(response.get("SecretValues", []))
+            for error in response.get("Errors", []):
+                print(f"Failed to read secret {error.get('SecretId')}: {error.get('ErrorCode')}")
+            if not response.get("NextToken"):
+                return secrets
+            kwargs["NextToken"] = response["NextToken"]
+
     def delete_api_key_secret(self, tenant_id: str, key_name: str, recovery_window: int = 7):
         secret_name = self._get_secret_name(tenant_id, key_name)
         try:
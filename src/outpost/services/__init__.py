@@ -1,15 +1,37 @@
-from .audit import AuditService
+from .audit import AuditService, flush_audit_aggregates
+from .audit_export import AuditExporter
 from .billing import BillingService, SubscriptionTier, SubscriptionStatus
 from .stripe_client import StripeClient
-from .metering import MeteringService, TierQuota, QuotaExceededError
+from .metering import MeteringService, TierQuota, MeteringDimension, QuotaExceededError
+from .tenant_cache import TenantCache
+from .usage_cache import UsageCache
+from .usage_reporter import UsageReporter
+from .usage_report import UsageReport
+from .rate_limiter import RateLimiter
+from .cost_engine import CostEngine, CostEvents
+from .invoice_preview import InvoicePreview
+from .anomaly import AnomalyDetector, UsageAnomalyError
 
 __all__ = [
     "AuditService",
+    "flush_audit_aggregates",
+    "AuditExporter",
     "BillingService",
     "StripeClient",
     "SubscriptionTier",
     "SubscriptionStatus",
     "MeteringService",
     "TierQuota",
-    "QuotaExceededError"
+    "MeteringDimension",
+    "QuotaExceededError",
+    "TenantCache",
+    "UsageCache",
+    "UsageReporter",
+    "UsageReport",
+    "RateLimiter",
+    "CostEngine",
+    "CostEvents",
+    "InvoicePreview",
+    "AnomalyDetector",
+    "UsageAnomalyError"
 ]
@@ -0,0 +1,458 @@
+"""
+Streaming detection of runaway job submission rates.
+
+A misconfigured automation can submit jobs in an endless loop and hold
+fleet capacity for hours before anyone notices. The detector counts each
+tenant's submissions per fixed interval and keeps an exponentially weighted
+mean and variance of those counts, so a tenant costs a few numbers however
+long it runs. An interval is flagged as soon as its count exceeds the mean
+by more than ANOMALY_THRESHOLD standard deviations (and ANOMALY_MIN_JOBS),
+without waiting for the interval to end. Flagged intervals do not feed the
+baseline, so a loop never becomes the new normal.
+
+A tenant's statistics are shared by every API container, like the rate
+limiter's buckets: they live on one item in the rate limits table, and each
+submission is one conditional update that counts it and returns the
+tenant's statistics, so a loop spread over many containers is judged on its
+whole rate. Closing an interval, and flagging one, are conditional writes of
+their own that a single container wins; it writes the audit entry. So that
+a new tenant is not flagged for a busy month, its baseline starts from its
+month-to-date average per interval (one MeteringService.get_usage read when
+the item is created). Without metering, a tenant is not judged until
+ANOMALY_WARMUP_INTERVALS intervals have been seen. ANOMALY_STATE=local keeps
+the statistics in-process instead, per container (evaluation, tests).
+
+Each episode is written to the audit log when it starts (USAGE_ANOMALY) and
+when it clears (USAGE_ANOMALY_CLEARED). In throttle mode, submissions are
+refused while the episode lasts. An episode clears at the first full
+interval back under the limit.
+"""
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, Any, Optional, Callable, List, Tuple
+
+import boto3
+from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeDeserializer
+
+from src.outpost.services.audit import AuditService
+from src.outpost.services.metering import MeteringService
+
+ANOMALY_MODES = ("flag", "throttle", "off")
+ANOMALY_STATES = ("shared", "local")
+
+# Idle intervals folded into the baseline at most; after that it has decayed to nothing anyway
+MAX_IDLE_INTERVALS = 200
+
+# A tenant's statistics outlive its last submission by this long (the table's TTL attribute)
+STATE_TTL_SECONDS = 7 * 86400
+
+# Statistics attributes, as stored; "count" is a DynamoDB reserved word
+_FIELDS = ("interval_start", "submissions", "mean", "var", "seeded", "intervals", "flagged", "flagged_at", "peak", "version")
+
+
+class UsageAnomalyError(Exception):
+    """Raised when a tenant's submissions are throttled for an anomalous rate."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AnomalyDecision:
+    """Outcome of recording a submission."""
+
+    def __init__(self, anomalous: bool, throttled: bool, count: int, limit: float, mean: float, retry_after: float = 0.0):
+        self.anomalous = anomalous
+        self.throttled = throttled
+        self.count = count
+        self.limit = limit
+        self.mean = mean
+        self.retry_after = retry_after
+
+
+class _LocalRates:
+    """Per-process statistics (ANOMALY_STATE=local): each container judges what it sees."""
+
+    # Shared by every instance in the process; handlers create a detector per request
+    _states: Dict[str, Dict[str, Any]] = {}
+    _lock = threading.Lock()
+
+    def get(self, tenant_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            state = self._states.get(tenant_id)
+            return dict(state) if state else None
+
+    def add(self, tenant_id: str, interval_start: float, units: int) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        with self._lock:
+            state = self._states.get(tenant_id)
+            if state is None or state["interval_start"] != interval_start:
+                return False, dict(state) if state else None
+            state["submissions"] += units
+            return True, dict(state)
+
+    def replace(self, tenant_id: str, state: Dict[str, Any], expected: Optional[Dict[str, Any]]) -> bool:
+        with self._lock:
+            current = self._states.get(tenant_id)
+            if expected is None and current is not None:
+                return False
+            if expected is not None and (current is None or any(
+                current[name] != expected[name] for name in ("version", "submissions")
+            )):
+                return False
+            self._states[tenant_id] = dict(state)
+            return True
+
+    def flag(self, tenant_id: str, interval_start: float, now: float, count: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            state = self._states.get(tenant_id)
+            if state is None or state["flagged"] or state["interval_start"] != interval_start:
+                return None
+            state.update(flagged=True, flagged_at=now, peak=count, version=state["version"] + 1)
+            return dict(state)
+
+
+class _SharedRates:
+    """
+    Statistics on the rate limits table, item "anomaly#<tenant_id>".
+
+    Counting is an ADD conditional on the interval; replacing the
+    statistics (new tenant, closed intervals) is conditional on the version
+    and count read, so no submission is lost to a concurrent close.
+    """
+
+    _tables: Dict[str, Any] = {}
+
+    def __init__(self, table_name: str):
+        self.table_name = table_name
+
+    @property
+    def table(self):
+        table = self._tables.get(self.table_name)
+        if table is None:
+            table = boto3.resource("dynamodb", region_name="us-east-1").Table(self.table_name)
+            self._tables[self.table_name] = table
+        return table
+
+    @staticmethod
+    def _key(tenant_id: str) -> Dict[str, str]:
+        return {"bucket_id": f"anomaly#{tenant_id}"}
+
+    @staticmethod
+    def _number(value: float) -> Decimal:
+        return Decimal(str(round(value, 6)))
+
+    @staticmethod
+    def _parse(item: Optional[Dict[str, Any]], serialized: bool = False) -> Optional[Dict[str, Any]]:
+        if not item or "version" not in item:
+            return None
+        if serialized:
+            item = {name: TypeDeserializer().deserialize(value) for name, value in item.items()}
+        state = {name: item[name] for name in _FIELDS}
+        for name in ("interval_start", "mean", "var", "flagged_at"):
+            state[name] = float(state[name])
+        for name in ("submissions", "intervals", "peak", "version"):
+            state[name] = int(state[name])
+        return state
+
+    def get(self, tenant_id: str) -> Optional[Dict[str, Any]]:
+        return self._parse(self.table.get_item(Key=self._key(tenant_id), ConsistentRead=True).get("Item"))
+
+    def add(self, tenant_id: str, interval_start: float, units: int) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        try:
+            response = self.table.update_item(
+                Key=self._key(tenant_id),
+                UpdateExpression="ADD submissions :units",
+                ConditionExpression="interval_start = :start",
+                ExpressionAttributeValues={":units": units, ":start": self._number(interval_start)},
+                ReturnValues="ALL_NEW",
+                ReturnValuesOnConditionCheckFailure="ALL_OLD"
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            return False, self._parse(e.response.get("Item"), serialized=True)
+        return True, self._parse(response["Attributes"])
+
+    def replace(self, tenant_id: str, state: Dict[str, Any], expected: Optional[Dict[str, Any]]) -> bool:
+        item = {**self._key(tenant_id), **{
+            name: self._number(value) if isinstance(value, float) else value for name, value in state.items()
+        }, "expires_at": int(state["interval_start"]) + STATE_TTL_SECONDS}
+        if expected is None:
+            condition = {"ConditionExpression": "attribute_not_exists(bucket_id) OR attribute_not_exists(version)"}
+        else:
+            condition = {
+                "ConditionExpression": "version = :version AND submissions = :submissions",
+                "ExpressionAttributeValues": {":version": expected["version"], ":submissions": expected["submissions"]}
+            }
+        try:
+            self.table.put_item(Item=item, **condition)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            return False
+        return True
+
+    def flag(self, tenant_id: str, interval_start: float, now: float, count: int) -> Optional[Dict[str, Any]]:
+        try:
+            response = self.table.update_item(
+                Key=self._key(tenant_id),
+                UpdateExpression="SET flagged = :true, flagged_at = :now, peak = :count ADD version :one",
+                ConditionExpression="flagged = :false AND interval_start = :start",
+                ExpressionAttributeValues={
+                    ":true": True,
+                    ":false": False,
+                    ":now": self._number(now),
+                    ":count": count,
+                    ":one": 1,
+                    ":start": self._number(interval_start)
+                },
+                ReturnValues="ALL_NEW"
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            return None
+        return self._parse(response["Attributes"])
+
+
+class AnomalyDetector:
+    """
+    EWMA rate and variance per tenant, over submissions per interval.
+
+    Modes (ANOMALY_MODE):
+    - flag: anomalies are written to the audit log
+    - throttle: as flag, and submissions raise UsageAnomalyError until the
+      episode clears
+    - off: nothing is recorded
+
+    State (ANOMALY_STATE): shared (DynamoDB, default) or local (in-process).
+    DynamoDB errors fail open, as for the rate limiter: a submission is not
+    judged rather than refused.
+    """
+
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        audit: Optional[AuditService] = None,
+        metering: Optional[MeteringService] = None,
+        clock: Callable[[], float] = time.time,
+        state: Optional[str] = None
+    ):
+        """
+        Args:
+            mode: flag, throttle or off (default: ANOMALY_MODE)
+            audit: Where alerts are written
+            metering: Seeds new tenants' baselines from month-to-date usage
+            clock: Time source (tests)
+            state: shared or local (default: ANOMALY_STATE)
+        """
+        self.mode = mode or os.environ.get("ANOMALY_MODE", "flag")
+        if self.mode not in ANOMALY_MODES:
+            raise ValueError(f"Unknown ANOMALY_MODE: {self.mode}")
+        self.state = state or os.environ.get("ANOMALY_STATE", "shared")
+        if self.state not in ANOMALY_STATES:
+            raise ValueError(f"Unknown ANOMALY_STATE: {self.state}")
+        self.interval_seconds = float(os.environ.get("ANOMALY_INTERVAL_SECONDS", "60"))
+        # Weight of the newest interval; 0.05 remembers roughly the last 20
+        self.alpha = float(os.environ.get("ANOMALY_ALPHA", "0.05"))
+        self.threshold = float(os.environ.get("ANOMALY_THRESHOLD", "6"))
+        self.min_jobs = int(os.environ.get("ANOMALY_MIN_JOBS", "30"))
+        self.warmup_intervals = int(os.environ.get("ANOMALY_WARMUP_INTERVALS", "3"))
+        self.metering = metering
+        self.audit = audit if audit is not None else (AuditService() if self.mode != "off" else None)
+        self.rates = _LocalRates() if self.state == "local" else _SharedRates(
+            os.environ.get("RATE_LIMITS_TABLE", "outpost-rate-limits-prod")
+        )
+        self._clock = clock
+
+    @classmethod
+    def reset(cls) -> None:
+        """Forget all in-process statistics (ANOMALY_STATE=local; tests, or a fresh container)."""
+        with _LocalRates._lock:
+            _LocalRates._states.clear()
+
+    def record_submission(self, tenant_id: str, units: int = 1) -> AnomalyDecision:
+        """
+        Count a submission (or `units` of them) and check the tenant's rate.
+
+        Refused submissions are counted too, so a throttled loop stays
+        flagged until it stops.
+
+        Returns:
+            AnomalyDecision
+
+        Raises:
+            UsageAnomalyError: In throttle mode, while the tenant is flagged
+        """
+        if self.mode == "off":
+            return AnomalyDecision(False, False, 0, 0.0, 0.0)
+
+        now = self._clock()
+        alerts: List[Tuple[str, Dict[str, Any]]] = []
+        try:
+            state = self._count(tenant_id, now, units, alerts)
+            limit = self._limit(state) if state else 0.0
+            judged = state is not None and (state["seeded"] or state["intervals"] >= self.warmup_intervals)
+            if judged and not state["flagged"] and state["submissions"] > limit:
+                flagged = self.rates.flag(tenant_id, state["interval_start"], now, state["submissions"])
+                if flagged:
+                    alerts.append(("USAGE_ANOMALY", self._alert(flagged, limit, now)))
+                    state = flagged
+                else:
+                    # Another container flagged it first (and audited it)
+                    state["flagged"] = True
+        except Exception as e:
+            print(f"Anomaly state unavailable for {tenant_id}, not judging submission: {e}")
+            state = None
+
+        for action, metadata in alerts:
+            self._log(tenant_id, action, metadata)
+        if state is None:
+            return AnomalyDecision(False, False, 0, 0.0, 0.0)
+        decision = AnomalyDecision(
+            state["flagged"],
+            state["flagged"] and self.mode == "throttle",
+            state["submissions"],
+            limit,
+            state["mean"],
+            state["interval_start"] + self.interval_seconds - now if state["flagged"] else 0.0
+        )
+        if decision.throttled:
+            raise UsageAnomalyError(
+                f"Job submissions for tenant {tenant_id} are paused: {decision.count} in the current "
+                f"{int(self.interval_seconds)}s interval against a usual {decision.mean:.1f}",
+                decision.retry_after
+            )
+        return decision
+
+    def baseline(self, tenant_id: str) -> Optional[Dict[str, Any]]:
+        """The tenant's current statistics, or None if it has not been seen."""
+        state = self.rates.get(tenant_id)
+        if state is None:
+            return None
+        return {
+            "mean": state["mean"],
+            "std": math.sqrt(state["var"]),
+            "limit": self._limit(state),
+            "count": state["submissions"],
+            "flagged": state["flagged"]
+        }
+
+    def _count(
+        self,
+        tenant_id: str,
+        now: float,
+        units: int,
+        alerts: List[Tuple[str, Dict[str, Any]]]
+    ) -> Optional[Dict[str, Any]]:
+        """Add units to the tenant's current interval, first closing the intervals that ended."""
+        interval_start = now - now % self.interval_seconds
+        for _ in range(5):
+            added, state = self.rates.add(tenant_id, interval_start, units)
+            if added:
+                return state
+            if state is not None and state["interval_start"] > interval_start:
+                # Another container's clock is ahead; count into its interval
+                interval_start = state["interval_start"]
+                continue
+            closed: List[Tuple[str, Dict[str, Any]]] = []
+            if state is None:
+                fresh = self._new_state(tenant_id, interval_start, now, units)
+            else:
+                fresh = self._advance(state, interval_start, now, units, closed)
+            if self.rates.replace(tenant_id, fresh, state):
+                alerts.extend(closed)
+                return fresh
+        print(f"Lost the race for {tenant_id}'s anomaly state; not judging this submission")
+        return None
+
+    def _new_state(self, tenant_id: str, interval_start: float, now: float, units: int) -> Dict[str, Any]:
+        prior = self._prior(tenant_id, now)
+        # Counts are at least Poisson-noisy, so a starting variance equal to the mean
+        return {
+            "interval_start": interval_start,
+            "submissions": units,
+            "mean": prior or 0.0,
+            "var": prior or 0.0,
+            "seeded": prior is not None,
+            "intervals": 0,
+            "flagged": False,
+            "flagged_at": 0.0,
+            "peak": 0,
+            "version": 0
+        }
+
+    def _prior(self, tenant_id: str, now: float) -> Optional[float]:
+        """Month-to-date submissions per interval, or None without metering."""
+        if self.metering is None:
+            return None
+        try:
+            count = self.metering.get_usage(tenant_id)["count"]
+        except Exception as e:
+            print(f"Failed to seed submission baseline for {tenant_id}: {e}")
+            return None
+        month_start = datetime.fromtimestamp(now, tz=timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        intervals = max(1.0, (now - month_start.timestamp()) / self.interval_seconds)
+        return count / intervals
+
+    def _limit(self, state: Dict[str, Any]) -> float:
+        # Submission counts are at least Poisson-noisy: never assume a deviation below sqrt(mean)
+        std = math.sqrt(max(state["var"], state["mean"], 1.0))
+        return max(float(self.min_jobs), state["mean"] + self.threshold * std)
+
+    def _advance(
+        self,
+        state: Dict[str, Any],
+        interval_start: float,
+        now: float,
+        units: int,
+        alerts: List[Tuple[str, Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """Statistics with the intervals that ended before interval_start folded into the baseline."""
+        state = dict(state)
+        elapsed = int(round((interval_start - state["interval_start"]) / self.interval_seconds))
+        counts = [state["submissions"]] + [0] * min(elapsed - 1, MAX_IDLE_INTERVALS)
+        for count in counts:
+            if state["flagged"]:
+                state["peak"] = max(state["peak"], count)
+                if count <= self._limit(state):
+                    state["flagged"] = False
+                    alerts.append(("USAGE_ANOMALY_CLEARED", {
+                        "peak_per_interval": state["peak"],
+                        "duration_seconds": Decimal(str(round(now - state["flagged_at"], 1)))
+                    }))
+                continue
+            if state["intervals"] == 0 and not state["seeded"]:
+                state["mean"] = state["var"] = float(count)
+            else:
+                # Incremental EWMA mean and variance
+                diff = count - state["mean"]
+                increment = self.alpha * diff
+                state["mean"] += increment
+                state["var"] = (1 - self.alpha) * (state["var"] + diff * increment)
+            state["intervals"] += 1
+        state.update(interval_start=interval_start, submissions=units, version=state["version"] + 1)
+        return state
+
+    def _alert(self, state: Dict[str, Any], limit: float, now: float) -> Dict[str, Any]:
+        return {
+            "count": state["submissions"],
+            "interval_seconds": int(self.interval_seconds),
+            "elapsed_seconds": Decimal(str(round(now - state["interval_start"], 1))),
+            "mean": Decimal(str(round(state["mean"], 3))),
+            "std": Decimal(str(round(math.sqrt(state["var"]), 3))),
+            "limit": Decimal(str(round(limit, 3))),
+            "mode": self.mode
+        }
+
+    def _log(self, tenant_id: str, action: str, metadata: Dict[str, Any]) -> None:
+        print(f"{action} for {tenant_id}: {metadata}")
+        try:
+            self.audit.log_action(tenant_id, action, "job_submissions", metadata=metadata)
+        except Exception as e:
+            print(f"Failed to audit {action} for {tenant_id}: {e}")
@@ -1,17 +1,166 @@
+import base64
 import boto3
+import functools
+import heapq
+import json
 import os
+import random
+import signal
+import threading
 import time
-from datetime import datetime
-from typing import Dict, Any, Optional, List
-from boto3.dynamodb.conditions import Key
+import ulid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from enum import Enum
+from typing import Dict, Any, Optional, List, Tuple, Iterator
+from boto3.dynamodb.conditions import Key, Attr
 from src.outpost.models import AuditEntry
 
+# Sort keys are "<timestamp>#<ulid>"; the fixed-width timestamp keeps them in time order
+SORT_KEY_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+SORT_KEY_SEPARATOR = "#"
+# Sorts after every "<timestamp>#<ulid>" key sharing the timestamp prefix
+SORT_KEY_UPPER_SUFFIX = "$"
+EPOCH = datetime(1970, 1, 1)
+
+# Sparse GSI over indexed actions: hash "<action>#<hour>#<shard>", range timestamp
+ACTION_INDEX_NAME = "action-index"
+ACTION_BUCKET_FORMAT = "%Y-%m-%dT%H"
+
+class AuditMode(str, Enum):
+    """How log_action records an action."""
+    ALWAYS = "always"
+    SAMPLE = "sample"
+    AGGREGATE = "aggregate"
+
+# Never sampled or aggregated, whatever AUDIT_POLICIES says
+SECURITY_CRITICAL_ACTIONS = frozenset({
+    "GENERATE_KEY",
+    "REVOKE_KEY",
+    "CREATE_TENANT",
+    "UPDATE_TENANT",
+    "DELETE_TENANT",
+})
+
+# Billing portal access is written per call as well, like the security-critical set
+ALWAYS_AUDITED_ACTIONS = SECURITY_CRITICAL_ACTIONS | frozenset({
+    "ACCESS_BILLING_PORTAL",
+})
+
+# High-volume, low-value actions; overridable through AUDIT_POLICIES
+DEFAULT_AUDIT_POLICIES: Dict[str, Tuple[AuditMode, float]] = {}
+
+def _parse_policy_config(value: str) -> Dict[str, Tuple[AuditMode, float]]:
+    """Parse AUDIT_POLICIES, e.g. "GET_JOB=sample:0.01,LIST_JOBS=aggregate"."""
+    policies = {}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        action, _, spec = part.partition("=")
+        mode, _, rate = spec.partition(":")
+        policies[action] = (AuditMode(mode), float(rate or 1.0))
+    return policies
+
+def _parse_shard_config(value: str) -> Dict[str, int]:
+    """Parse AUDIT_SHARDED_TENANTS, e.g. "ten_hot:4,ten_busy:8"."""
+    shards = {}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        tenant_id, _, count = part.partition(":")
+        shards[tenant_id] = max(1, int(count or 1))
+    return shards
+
 class AuditService:
-    def __init__(self, region_name: str = "us-east-1"):
+    """
+    Audit log backed by DynamoDB (partition: tenant_id, sort: timestamp).
+
+    Sort keys are "<UTC timestamp>#<ULID>": unique even for writes in the
+    same microsecond and monotonic within a process, so entries never
+    overwrite each other and sort in write order.
+
+    Each action has a policy (AUDIT_POLICIES="ACTION=mode[:rate],..."):
+    - always: every call writes an entry (the default)
+    - sample: a fraction of calls write an entry tagged with sample_rate
+    - aggregate: calls are counted in memory and flushed as one counter
+      item per tenant, action and window (AUDIT_AGGREGATE_WINDOW_SECONDS).
+      Lambda handlers wrapped in flush_audit_aggregates write their counts
+      once they are AUDIT_AGGREGATE_FLUSH_SECONDS old or number
+      AUDIT_AGGREGATE_FLUSH_COUNT, and on SIGTERM at shutdown; long-running
+      processes call flush() when they stop.
+    Security-critical actions (key and tenant lifecycle) and billing portal
+    access are always written.
+
+    Actions in AUDIT_INDEXED_ACTIONS (default: the security-critical set) are
+    also written to a sparse cross-tenant index keyed by action, hour bucket
+    and one of AUDIT_INDEX_SHARDS shards, so "all REVOKE_KEY events in the
+    last hour" is a handful of index queries rather than a table scan.
+
+    Hot tenants can be write-sharded (AUDIT_SHARDED_TENANTS="ten_x:4"):
+    entries are spread over partition keys "ten_x", "ten_x#1" ... "ten_x#3"
+    and reads query every shard and merge by sort key. Shard 0 is the plain
+    tenant id, so enabling sharding keeps existing entries readable.
+    """
+
+    _key_lock = threading.Lock()
+    _last_key_time = datetime.min
+
+    # Shared by every instance in the process; handlers create a service per request
+    _aggregate_lock = threading.Lock()
+    _aggregates: Dict[Tuple[str, str, str, datetime], int] = {}
+    # time.monotonic() when the oldest count still held was taken
+    _aggregates_since: Optional[float] = None
+
+    def __init__(
+        self,
+        region_name: str = "us-east-1",
+        shards: Optional[Dict[str, int]] = None,
+        policies: Optional[Dict[str, Tuple[AuditMode, float]]] = None
+    ):
         self.dynamodb = boto3.resource("dynamodb", region_name=region_name)
         self.table_name = os.environ.get("AUDIT_TABLE", "outpost-audit-prod")
         self.table = self.dynamodb.Table(self.table_name)
         self.retention_days = int(os.environ.get("AUDIT_RETENTION_DAYS", "90"))
+        self.shards = shards if shards is not None else _parse_shard_config(
+            os.environ.get("AUDIT_SHARDED_TENANTS", "")
+        )
+        self.policies = {
+            **DEFAULT_AUDIT_POLICIES,
+            **(policies if policies is not None else _parse_policy_config(os.environ.get("AUDIT_POLICIES", "")))
+        }
+        self.aggregate_window_seconds = int(os.environ.get("AUDIT_AGGREGATE_WINDOW_SECONDS", "300"))
+        indexed = os.environ.get("AUDIT_INDEXED_ACTIONS")
+        self.indexed_actions = frozenset(
+            filter(None, (a.strip() for a in indexed.split(",")))
+        ) if indexed is not None else SECURITY_CRITICAL_ACTIONS
+        self.index_shards = max(1, int(os.environ.get("AUDIT_INDEX_SHARDS", "4")))
+
+    @classmethod
+    def _next_sort_key(cls, now: datetime) -> str:
+        # Never go backwards within a process, even if the clock does or two calls share a microsecond
+        with cls._key_lock:
+            if now <= cls._last_key_time:
+                now = cls._last_key_time + timedelta(microseconds=1)
+            cls._last_key_time = now
+        return f"{now.strftime(SORT_KEY_FORMAT)}{SORT_KEY_SEPARATOR}{ulid.new().str}"
+
+    def policy(self, action: str) -> Tuple[AuditMode, float]:
+        """Effective (mode, sample rate) for an action."""
+        if action in ALWAYS_AUDITED_ACTIONS:
+            return AuditMode.ALWAYS, 1.0
+        return self.policies.get(action, (AuditMode.ALWAYS, 1.0))
+
+    def _action_bucket(self, action: str, when: datetime, shard: int) -> str:
+        return f"{action}{SORT_KEY_SEPARATOR}{when.strftime(ACTION_BUCKET_FORMAT)}{SORT_KEY_SEPARATOR}{shard}"
+
+    def shard_count(self, tenant_id: str) -> int:
+        return self.shards.get(tenant_id, 1)
+
+    def partition_keys(self, tenant_id: str) -> List[str]:
+        """All partition keys holding a tenant's entries."""
+        return [tenant_id] + [
+            f"{tenant_id}{SORT_KEY_SEPARATOR}{shard}" for shard in range(1, self.shard_count(tenant_id))
+        ]
+
+    def _write_partition_key(self, tenant_id: str) -> str:
+        shard = random.randrange(self.shard_count(tenant_id))
+        return tenant_id if shard == 0 else f"{tenant_id}{SORT_KEY_SEPARATOR}{shard}"
 
     def log_action(
         self,
@@ -24,11 +173,22 @@ class AuditService:
         user_agent: Optional[str] = None
     ):
         """
-        Logs an action to the audit table.
+        Logs an action to the audit table, subject to the action's policy.
         """
         now = datetime.utcnow()
+        mode, rate = self.policy(action)
+
+        if mode == AuditMode.AGGREGATE:
+            self._aggregate(tenant_id, action, now)
+            return
+        if mode == AuditMode.SAMPLE:
+            if random.random() >= rate:
+                self._flush_aggregates(now)
+                return
+            metadata = {**(metadata or {}), "sample_rate": Decimal(str(rate))}
+
         expires_at = int(time.time()) + (self.retention_days * 24 * 60 * 60)
-        
+
         entry = AuditEntry(
             tenant_id=tenant_id,
             timestamp=now,
@@ -39,29 +199,378 @@ class AuditService:
             ip_address=ip_address,
             user_agent=user_agent
         )
-        
+
         item = entry.model_dump()
-        # Convert datetime to ISO string for DynamoDB
-        item["timestamp"] = entry.timestamp.isoformat()
+        item["tenant_id"] = self._write_partition_key(tenant_id)
+        item["timestamp"] = self._next_sort_key(now)
         item["expires_at"] = expires_at
-        
+        if action in self.indexed_actions:
+            item["action_bucket"] = self._action_bucket(action, now, random.randrange(self.index_shards))
+
         try:
             self.table.put_item(Item=item)
         except Exception as e:
             # In production, we might want to log this to CloudWatch or a DLQ
             print(f"Failed to log audit entry: {e}")
+        self._flush_aggregates(now)
+
+    def flush(self) -> int:
+        """
+        Write every pending aggregate counter, including open windows.
+
+        Returns:
+            Number of counter items written
+        """
+        return self._flush_aggregates(None)
+
+    @classmethod
+    def has_pending_aggregates(cls) -> bool:
+        """Whether this process holds counts not yet written (for any table)."""
+        with cls._aggregate_lock:
+            return bool(cls._aggregates)
+
+    @classmethod
+    def aggregates_due(cls, max_age_seconds: Optional[float] = None, max_count: Optional[int] = None) -> bool:
+        """
+        Whether held counts should be written now: the oldest is max_age_seconds
+        old (AUDIT_AGGREGATE_FLUSH_SECONDS) or they add up to max_count
+        (AUDIT_AGGREGATE_FLUSH_COUNT).
+        """
+        if max_age_seconds is None:
+            max_age_seconds = float(os.environ.get("AUDIT_AGGREGATE_FLUSH_SECONDS", "60"))
+        if max_count is None:
+            max_count = int(os.environ.get("AUDIT_AGGREGATE_FLUSH_COUNT", "1000"))
+        with cls._aggregate_lock:
+            if not cls._aggregates:
+                return False
+            return (time.monotonic() - cls._aggregates_since >= max_age_seconds
+                    or sum(cls._aggregates.values()) >= max_count)
+
+    def _aggregate(self, tenant_id: str, action: str, now: datetime) -> None:
+        seconds = int((now - EPOCH).total_seconds())
+        window_start = EPOCH + timedelta(seconds=seconds - seconds % self.aggregate_window_seconds)
+        key = (self.table_name, tenant_id, action, window_start)
+        with self._aggregate_lock:
+            if not self._aggregates:
+                AuditService._aggregates_since = time.monotonic()
+            self._aggregates[key] = self._aggregates.get(key, 0) + 1
+        self._flush_aggregates(now)
+
+    def _flush_aggregates(self, now: Optional[datetime]) -> int:
+        """Write counters whose window has closed (all of them when now is None)."""
+        window = timedelta(seconds=self.aggregate_window_seconds)
+        with self._aggregate_lock:
+            due = {
+                key: count for key, count in self._aggregates.items()
+                if key[0] == self.table_name and (now is None or key[3] + window <= now)
+            }
+            for key in due:
+                del self._aggregates[key]
+            if not self._aggregates:
+                AuditService._aggregates_since = None
+
+        expires_at = int(time.time()) + (self.retention_days * 24 * 60 * 60)
+        for (_, tenant_id, action, window_start), count in due.items():
+            # Atomic ADD so counters from every process sharing a window add up
+            try:
+                self.table.update_item(
+                    Key={
+                        "tenant_id": tenant_id,
+                        "timestamp": f"{window_start.strftime(SORT_KEY_FORMAT)}{SORT_KEY_SEPARATOR}AGG{SORT_KEY_SEPARATOR}{action}"
+                    },
+                    UpdateExpression=(
+                        "SET #a = :a, #r = :r, #m = :m, expires_at = :x ADD #c :n"
+                    ),
+                    ExpressionAttributeNames={"#a": "action", "#r": "resource", "#m": "metadata", "#c": "count"},
+                    ExpressionAttributeValues={
+                        ":a": action,
+                        ":r": "aggregate",
+                        ":m": {"aggregated": True, "window_seconds": self.aggregate_window_seconds},
+                        ":x": expires_at,
+                        ":n": count
+                    }
+                )
+            except Exception as e:
+                print(f"Failed to flush audit aggregate: {e}")
+        return len(due)
 
     def get_tenant_audit(self, tenant_id: str, limit: int = 50) -> List[AuditEntry]:
         """
         Retrieves audit entries for a tenant.
         """
         try:
-            response = self.table.query(
-                KeyConditionExpression=boto3.dynamodb.conditions.Key("tenant_id").eq(tenant_id),
-                ScanIndexForward=False,  # Newest first
-                Limit=limit
-            )
-            return [AuditEntry(**item) for item in response.get("Items", [])]
+            entries, _ = self.query_range(tenant_id, limit=limit)
+            return entries
         except Exception as e:
             print(f"Failed to retrieve audit entries: {e}")
             return []
+
+    def query_range(
+        self,
+        tenant_id: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        actions: Optional[List[str]] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        newest_first: bool = True
+    ) -> Tuple[List[AuditEntry], Optional[str]]:
+        """
+        Query one page of a tenant's audit entries in a time window.
+
+        Args:
+            tenant_id: Tenant identifier
+            start: Inclusive lower bound (default: beginning of retention)
+            end: Inclusive upper bound (default: now)
+            actions: Only return entries with one of these actions
+            limit: Maximum entries per page
+            cursor: Opaque cursor from a previous page
+            newest_first: Sort order (False for chronological exports)
+
+        Returns:
+            (entries, next_cursor); next_cursor is None on the last page
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        lower = start.strftime(SORT_KEY_FORMAT) if start else "0"
+        upper = (end or datetime.utcnow()).strftime(SORT_KEY_FORMAT) + SORT_KEY_UPPER_SUFFIX
+        position = self._decode_cursor(cursor) if cursor else None
+
+        if position:
+            # Sort keys are unique across shards, so one key marks the position in every shard
+            if newest_first:
+                upper = min(upper, position)
+            else:
+                lower = max(lower, position)
+
+        per_shard = []
+        truncated = False
+        for partition_key in self.partition_keys(tenant_id):
+            items, more = self._query_shard(partition_key, lower, upper, actions, limit, newest_first, position)
+            per_shard.append(items)
+            truncated = truncated or more
+
+        merged = list(heapq.merge(*per_shard, key=lambda item: item["timestamp"], reverse=newest_first))
+        page = merged[:limit]
+        has_more = truncated or len(merged) > limit
+        next_cursor = self._encode_cursor(page[-1]["timestamp"]) if page and has_more else None
+        return [self._item_to_entry(item) for item in page], next_cursor
+
+    def iter_pages(
+        self,
+        tenant_id: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        actions: Optional[List[str]] = None,
+        page_size: int = 100,
+        newest_first: bool = True
+    ) -> Iterator[List[AuditEntry]]:
+        """
+        Lazily yield pages of audit entries in a time window.
+
+        Only one page per shard is held in memory at a time, so arbitrarily
+        long histories can be streamed (e.g. for compliance exports).
+        """
+        # Pin the window so entries written while iterating do not shift it
+        end = end or datetime.utcnow()
+        cursor = None
+        while True:
+            entries, cursor = self.query_range(
+                tenant_id,
+                start=start,
+                end=end,
+                actions=actions,
+                limit=page_size,
+                cursor=cursor,
+                newest_first=newest_first
+            )
+            if entries:
+                yield entries
+            if not cursor:
+                return
+
+    def query_action(
+        self,
+        action: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        newest_first: bool = True
+    ) -> Tuple[List[AuditEntry], Optional[str]]:
+        """
+        Query one page of an indexed action across all tenants.
+
+        Walks the window one hour bucket at a time and stops as soon as the
+        page is full, so recent-activity queries touch only a few buckets.
+
+        Args:
+            action: An action in AUDIT_INDEXED_ACTIONS
+            start: Inclusive lower bound (default: 24 hours before end)
+            end: Inclusive upper bound (default: now)
+            limit: Maximum entries per page
+            cursor: Opaque cursor from a previous page
+            newest_first: Sort order
+
+        Returns:
+            (entries, next_cursor); next_cursor is None on the last page
+
+        Raises:
+            ValueError: If the action is not indexed or the cursor is malformed
+        """
+        if action not in self.indexed_actions:
+            raise ValueError(f"Action is not indexed: {action}")
+
+        end = end or datetime.utcnow()
+        start = start or end - timedelta(days=1)
+        lower = start.strftime(SORT_KEY_FORMAT)
+        upper = end.strftime(SORT_KEY_FORMAT) + SORT_KEY_UPPER_SUFFIX
+        position = self._decode_cursor(cursor) if cursor else None
+        if position:
+            if newest_first:
+                upper = min(upper, position)
+            else:
+                lower = max(lower, position)
+
+        hours = []
+        hour = start.replace(minute=0, second=0, microsecond=0)
+        while hour <= end:
+            bucket_end = hour + timedelta(hours=1)
+            # Skip buckets the cursor has already moved past
+            if hour.strftime(SORT_KEY_FORMAT) <= upper and bucket_end.strftime(SORT_KEY_FORMAT) > lower:
+                hours.append(hour)
+            hour = bucket_end
+        if newest_first:
+            hours.reverse()
+
+        page: List[Dict[str, Any]] = []
+        has_more = False
+        for index, hour in enumerate(hours):
+            want = limit - len(page)
+            per_shard = []
+            truncated = False
+            for shard in range(self.index_shards):
+                items, more = self._query_shard(
+                    self._action_bucket(action, hour, shard), lower, upper, None, want, newest_first, position,
+                    hash_key="action_bucket", index_name=ACTION_INDEX_NAME
+                )
+                per_shard.append(items)
+                truncated = truncated or more
+            merged = list(heapq.merge(*per_shard, key=lambda item: item["timestamp"], reverse=newest_first))
+            page.extend(merged[:want])
+            if truncated or len(merged) > want:
+                has_more = True
+                break
+            if len(page) == limit:
+                has_more = index < len(hours) - 1
+                break
+
+        next_cursor = self._encode_cursor(page[-1]["timestamp"]) if page and has_more else None
+        return [self._item_to_entry(item) for item in page], next_cursor
+
+    def _query_shard(
+        self,
+        partition_key: str,
+        lower: str,
+        upper: str,
+        actions: Optional[List[str]],
+        limit: int,
+        newest_first: bool,
+        exclude: Optional[str],
+        hash_key: str = "tenant_id",
+        index_name: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Read up to limit matching items from one partition key (of the table or an index).
+
+        Returns:
+            (items, more) where more means the shard may hold further matches
+        """
+        kwargs = {
+            "KeyConditionExpression": Key(hash_key).eq(partition_key) & Key("timestamp").between(lower, upper),
+            "ScanIndexForward": not newest_first,
+            "Limit": limit + 1
+        }
+        if index_name:
+            kwargs["IndexName"] = index_name
+        if actions:
+            kwargs["FilterExpression"] = Attr("action").is_in(actions)
+
+        items = []
+        while True:
+            response = self.table.query(**kwargs)
+            items.extend(item for item in response.get("Items", []) if item["timestamp"] != exclude)
+            if len(items) > limit:
+                return items[:limit], True
+            if "LastEvaluatedKey" not in response:
+                return items, False
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def _encode_cursor(self, sort_key: str) -> str:
+        return base64.urlsafe_b64encode(json.dumps({"k": sort_key}).encode()).decode()
+
+    def _decode_cursor(self, cursor: str) -> str:
+        try:
+            return json.loads(base64.urlsafe_b64decode(cursor.encode()))["k"]
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("Invalid audit cursor")
+
+    def _item_to_entry(self, item: Dict[str, Any]) -> AuditEntry:
+        """Build an AuditEntry from a stored item (shard suffix and ULID stripped)."""
+        metadata = item.get("metadata") or {}
+        if "count" in item:
+            # Aggregate counter item
+            metadata = {**metadata, "count": item["count"]}
+        return AuditEntry(**{
+            **item,
+            "tenant_id": item["tenant_id"].split(SORT_KEY_SEPARATOR, 1)[0],
+            "timestamp": item["timestamp"].split(SORT_KEY_SEPARATOR, 1)[0],
+            "metadata": metadata
+        })
+
+
+def _flush_on_shutdown() -> None:
+    """
+    Write held counts when the process gets SIGTERM.
+
+    Lambda sends SIGTERM before recycling a container only while an
+    extension is registered; without one, up to the flush thresholds' worth
+    of counts can be lost.
+    """
+    previous = signal.getsignal(signal.SIGTERM)
+    if getattr(previous, "_flushes_audit", False):
+        return
+
+    def on_sigterm(signum, frame):
+        if AuditService.has_pending_aggregates():
+            AuditService().flush()
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    on_sigterm._flushes_audit = True
+    try:
+        signal.signal(signal.SIGTERM, on_sigterm)
+    except ValueError:
+        # Not the main thread; rely on the thresholds
+        pass
+
+
+def flush_audit_aggregates(handler):
+    """
+    Wrap a Lambda handler so aggregated audit counts are written once they
+    are due (see AuditService.aggregates_due) and at shutdown, rather than
+    on every invocation: warm containers batch counts across requests.
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        _flush_on_shutdown()
+        try:
+            return handler(event, context)
+        finally:
+            if AuditService.aggregates_due():
+                AuditService().flush()
+    return wrapper
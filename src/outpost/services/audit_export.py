@@ -0,0 +1,313 @@
+"""
+Streaming audit export for compliance requests.
+
+Streams a tenant's audit entries for a date range from AuditService
+pagination into gzip-compressed NDJSON (or Parquet when pyarrow is
+installed) and uploads it to S3 with multipart upload. Memory stays bounded
+by one query page plus one upload part regardless of history size.
+
+Run locally against moto:
+    python -m src.outpost.services.audit_export --tenant ten_123 \\
+        --start 2026-01-01 --end 2026-12-31 --moto --seed 50000
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Any, Optional, List
+
+import boto3
+
+from src.outpost.services.audit import AuditService
+
+# S3 rejects parts smaller than 5 MiB except the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+EXPORT_FORMATS = ("ndjson", "parquet")
+
+
+def _json_default(value):
+    # DynamoDB returns numbers as Decimal
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class MultipartUpload:
+    """Write-only file object that streams to an S3 multipart upload."""
+
+    def __init__(self, s3, bucket: str, key: str, part_size: int, content_type: str):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.upload_id = s3.create_multipart_upload(
+            Bucket=bucket, Key=key, ContentType=content_type
+        )["UploadId"]
+        self.parts: List[Dict[str, Any]] = []
+        self.bytes_written = 0
+        self.closed = False
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        self._buffer.extend(data)
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def tell(self) -> int:
+        return self.bytes_written
+
+    def flush(self) -> None:
+        pass
+
+    def writable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        if self._buffer or not self.parts:
+            self._upload_part(bytes(self._buffer))
+            self._buffer.clear()
+        self.s3.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": self.parts}
+        )
+        self.closed = True
+
+    def abort(self) -> None:
+        self.closed = True
+        try:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except Exception as e:
+            print(f"Failed to abort multipart upload {self.upload_id}: {e}")
+
+    def _upload_part(self, body: bytes) -> None:
+        number = len(self.parts) + 1
+        response = self.s3.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=number,
+            Body=body
+        )
+        self.parts.append({"PartNumber": number, "ETag": response["ETag"]})
+
+
+class AuditExporter:
+    """
+    Exports audit history for a tenant and period to S3.
+
+    Formats:
+    - ndjson: one JSON entry per line, gzip-compressed (.ndjson.gz)
+    - parquet: columnar, snappy-compressed (.parquet); requires pyarrow
+    """
+
+    def __init__(
+        self,
+        audit: Optional[AuditService] = None,
+        bucket: Optional[str] = None,
+        page_size: int = 1000,
+        part_size: int = 8 * 1024 * 1024,
+        row_group_size: int = 50000
+    ):
+        self.audit = audit or AuditService()
+        self.bucket = bucket or os.environ.get("AUDIT_EXPORT_BUCKET")
+        self.s3 = boto3.client("s3", region_name="us-east-1")
+        self.page_size = page_size
+        self.part_size = part_size
+        self.row_group_size = row_group_size
+
+    def export_key(self, tenant_id: str, start: datetime, end: datetime, fmt: str) -> str:
+        suffix = "ndjson.gz" if fmt == "ndjson" else "parquet"
+        return f"audit-exports/{tenant_id}/{start:%Y%m%d}-{end:%Y%m%d}.{suffix}"
+
+    def export(
+        self,
+        tenant_id: str,
+        start: datetime,
+        end: datetime,
+        fmt: str = "ndjson",
+        actions: Optional[List[str]] = None,
+        key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Stream a tenant's audit entries in [start, end] to S3, oldest first.
+
+        Returns:
+            Export stats: location, entries, bytes, parts and throughput
+
+        Raises:
+            ValueError: Unknown format or no export bucket configured
+            ImportError: Parquet requested without pyarrow installed
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        if not self.bucket:
+            raise ValueError("AUDIT_EXPORT_BUCKET is not configured")
+
+        key = key or self.export_key(tenant_id, start, end, fmt)
+        pages = self.audit.iter_pages(
+            tenant_id,
+            start=start,
+            end=end,
+            actions=actions,
+            page_size=self.page_size,
+            newest_first=False
+        )
+
+        started = time.monotonic()
+        upload = MultipartUpload(
+            self.s3,
+            self.bucket,
+            key,
+            self.part_size,
+            "application/gzip" if fmt == "ndjson" else "application/vnd.apache.parquet"
+        )
+        try:
+            if fmt == "ndjson":
+                entries, raw_bytes = self._write_ndjson(pages, upload)
+            else:
+                entries, raw_bytes = self._write_parquet(pages, upload)
+            upload.close()
+        except BaseException:
+            upload.abort()
+            raise
+        seconds = max(time.monotonic() - started, 1e-9)
+
+        return {
+            "location": f"s3://{self.bucket}/{key}",
+            "format": fmt,
+            "entries": entries,
+            "bytes_uncompressed": raw_bytes,
+            "bytes_written": upload.bytes_written,
+            "parts": len(upload.parts),
+            "seconds": round(seconds, 3),
+            "entries_per_second": int(entries / seconds),
+            "mb_per_second": round(raw_bytes / seconds / 1024 / 1024, 2)
+        }
+
+    def _write_ndjson(self, pages, upload: MultipartUpload):
+        entries = 0
+        raw_bytes = 0
+        with gzip.GzipFile(fileobj=upload, mode="wb") as gz:
+            for page in pages:
+                chunk = "".join(
+                    json.dumps(entry.model_dump(), default=_json_default, separators=(",", ":")) + "\n"
+                    for entry in page
+                ).encode()
+                gz.write(chunk)
+                entries += len(page)
+                raw_bytes += len(chunk)
+        return entries, raw_bytes
+
+    def _write_parquet(self, pages, upload: MultipartUpload):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet audit exports require pyarrow (pip install pyarrow)")
+
+        schema = pa.schema([
+            ("tenant_id", pa.string()),
+            ("timestamp", pa.timestamp("us")),
+            ("action", pa.string()),
+            ("resource", pa.string()),
+            ("metadata", pa.string()),
+            ("request_id", pa.string()),
+            ("ip_address", pa.string()),
+            ("user_agent", pa.string()),
+        ])
+        entries = 0
+        raw_bytes = 0
+        rows: List[Dict[str, Any]] = []
+
+        with pq.ParquetWriter(upload, schema, compression="snappy") as writer:
+            for page in pages:
+                for entry in page:
+                    row = entry.model_dump()
+                    row["metadata"] = json.dumps(entry.metadata, default=_json_default)
+                    rows.append(row)
+                entries += len(page)
+                if len(rows) >= self.row_group_size:
+                    table = pa.Table.from_pylist(rows, schema=schema)
+                    raw_bytes += table.nbytes
+                    writer.write_table(table)
+                    rows = []
+            if rows:
+                table = pa.Table.from_pylist(rows, schema=schema)
+                raw_bytes += table.nbytes
+                writer.write_table(table)
+        return entries, raw_bytes
+
+
+def _seed(audit: AuditService, tenant_id: str, count: int) -> None:
+    actions = ["SUBMIT_JOB", "START_JOB", "JOB_SUCCESS", "GET_JOB", "GENERATE_API_KEY"]
+    for i in range(count):
+        audit.log_action(tenant_id, actions[i % len(actions)], f"job_{i:08d}", metadata={"seq": i})
+
+
+def _create_local_resources(bucket: str) -> None:
+    boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=bucket)
+    boto3.resource("dynamodb", region_name="us-east-1").create_table(
+        TableName=os.environ.get("AUDIT_TABLE", "outpost-audit-prod"),
+        KeySchema=[
+            {"AttributeName": "tenant_id", "KeyType": "HASH"},
+            {"AttributeName": "timestamp", "KeyType": "RANGE"}
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "tenant_id", "AttributeType": "S"},
+            {"AttributeName": "timestamp", "AttributeType": "S"}
+        ],
+        BillingMode="PAY_PER_REQUEST"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Export a tenant's audit history to S3")
+    parser.add_argument("--tenant", required=True)
+    parser.add_argument("--start", required=True, type=datetime.fromisoformat)
+    parser.add_argument("--end", required=True, type=datetime.fromisoformat)
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--actions", help="Comma-separated actions to include")
+    parser.add_argument("--bucket", default=os.environ.get("AUDIT_EXPORT_BUCKET", "outpost-audit-exports"))
+    parser.add_argument("--moto", action="store_true", help="Run against in-memory AWS (moto)")
+    parser.add_argument("--seed", type=int, default=0, help="With --moto, entries to generate first")
+    args = parser.parse_args(argv)
+
+    def run():
+        if args.moto:
+            _create_local_resources(args.bucket)
+            if args.seed:
+                _seed(AuditService(), args.tenant, args.seed)
+        exporter = AuditExporter(bucket=args.bucket)
+        return exporter.export(
+            args.tenant,
+            args.start,
+            args.end,
+            fmt=args.format,
+            actions=args.actions.split(",") if args.actions else None
+        )
+
+    if args.moto:
+        from moto import mock_aws
+        with mock_aws():
+            stats = run()
+    else:
+        stats = run()
+    print(json.dumps(stats, indent=2))
+    return stats
+
+
+if __name__ == "__main__":
+    main()
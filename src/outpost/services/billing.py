@@ -11,6 +11,8 @@ from enum import Enum
 
 from src.outpost.services.stripe_client import StripeClient
 from src.outpost.services.audit import AuditService
+from src.outpost.services.metering import MeteringService
+from src.outpost.services.tenant_cache import TenantCache
 from src.outpost.models import Tenant, TenantStatus
 
 
@@ -42,18 +44,28 @@ class BillingService:
     def __init__(
         self,
         stripe_client: Optional[StripeClient] = None,
-        audit_service: Optional[AuditService] = None
+        audit_service: Optional[AuditService] = None,
+        metering_service: Optional[MeteringService] = None
     ):
         self.stripe = stripe_client or StripeClient()
         self.audit = audit_service or AuditService()
+        self._metering = metering_service
 
         self.dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
         self.tenants_table_name = os.environ.get("TENANTS_TABLE", "outpost-tenants-prod")
         self.tenants_table = self.dynamodb.Table(self.tenants_table_name)
+        self.tenant_cache = TenantCache.for_table(self.tenants_table_name)
 
         # URLs for checkout redirects
         self.app_url = os.environ.get("APP_URL", "https://outpost.zeroechelon.com")
 
+    @property
+    def metering(self) -> MeteringService:
+        # Only needed on tier changes; created lazily
+        if self._metering is None:
+            self._metering = MeteringService()
+        return self._metering
+
     def create_customer_for_tenant(self, tenant: Tenant) -> str:
         """
         Create a Stripe customer for a tenant and update the tenant record.
@@ -83,6 +95,7 @@ class BillingService:
                 ":ts": datetime.utcnow().isoformat()
             }
         )
+        self.tenant_cache.invalidate(tenant.tenant_id)
 
         # Audit log
         self.audit.log_action(
@@ -175,10 +188,10 @@ class BillingService:
             return_url=f"{self.app_url}/dashboard"
         )
 
-        # Audit log
+        # The one audit entry per portal visit
         self.audit.log_action(
             tenant_id=tenant_id,
-            action="CREATE_PORTAL_SESSION",
+            action="ACCESS_BILLING_PORTAL",
             resource=session.id
         )
 
@@ -189,7 +202,8 @@ class BillingService:
         stripe_customer_id: str,
         subscription_id: str,
         status: str,
-        current_period_end: Optional[int] = None
+        current_period_end: Optional[int] = None,
+        tier: Optional[str] = None
     ) -> None:
         """
         Handle subscription status update from Stripe webhook.
@@ -199,7 +213,17 @@ class BillingService:
             subscription_id: Stripe subscription ID
             status: New subscription status
             current_period_end: Unix timestamp of period end
+            tier: Subscription tier from the subscription metadata, if known
+
+        Raises:
+            ValueError: If tier is not a known subscription tier (nothing is written)
         """
+        if tier is not None:
+            try:
+                tier = SubscriptionTier(tier.lower()).value
+            except ValueError:
+                raise ValueError(f"Unknown subscription tier: {tier}")
+
         # Find tenant by Stripe customer ID
         tenant_data = self._get_tenant_by_stripe_id(stripe_customer_id)
         if not tenant_data:
@@ -226,16 +250,31 @@ class BillingService:
             update_expr += ", subscription_period_end = :pe"
             expr_values[":pe"] = current_period_end
 
+        expr_names = {}
         if tenant_data.get("status") != tenant_status.value:
             update_expr += ", #st = :status"
             expr_values[":status"] = tenant_status.value
+            expr_names["#st"] = "status"
+
+        tier_changed = tier is not None and tier != tenant_data.get("subscription_tier")
+        if tier_changed:
+            update_expr += ", subscription_tier = :tier"
+            expr_values[":tier"] = tier
 
+        update_kwargs = {}
+        if expr_names:
+            update_kwargs["ExpressionAttributeNames"] = expr_names
         self.tenants_table.update_item(
             Key={"tenant_id": tenant_id},
             UpdateExpression=update_expr,
             ExpressionAttributeValues=expr_values,
-            ExpressionAttributeNames={"#st": "status"} if "status" in update_expr else {}
+            **update_kwargs
         )
+        self.tenant_cache.invalidate(tenant_id)
+
+        if tier_changed:
+            # Keep the quota denormalized on the usage item in step with the tier
+            self.metering.sync_quota(tenant_id, tier)
 
         # Audit log
         self.audit.log_action(
@@ -277,6 +316,7 @@ class BillingService:
             },
             ExpressionAttributeNames={"#st": "status"}
         )
+        self.tenant_cache.invalidate(tenant_id)
 
         # Audit log
         self.audit.log_action(
@@ -0,0 +1,317 @@
+"""
+Bulk job cost pricing for invoices, billing previews and what-if tier changes.
+
+Prices dispatch_complete cost events (src/integrations/ledger/cost-event.schema.json)
+with the same formulas and rates as the control plane's ledger cost
+calculator. Events are loaded once into columns; pricing is then a few
+vectorized NumPy operations over whole columns, and per-agent/model token
+rates are looked up once per distinct (agent, model) pair rather than per
+event. Re-pricing the same events under other rates only redoes the lookup.
+
+NumPy is optional: without it, pricing falls back to the row-by-row
+reference implementation (CostEngine.calculate), which is also what the
+vectorized path is tested against.
+
+Benchmark:
+    python tests/performance/cost_benchmark.py --events 2000000
+"""
+import math
+from typing import Dict, Any, Optional, List, Iterable, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Fargate compute rates (approximate)
+COMPUTE_RATES: Dict[str, float] = {
+    "vcpu_per_second": 0.000012,
+    "memory_gb_per_second": 0.000001,
+    "efs_gb_per_month": 0.30
+}
+
+# Flagship LLM token rates per agent, per token
+LLM_TOKEN_RATES: Dict[str, Dict[str, float]] = {
+    "claude": {"input": 0.000015, "output": 0.000075},
+    "codex": {"input": 0.00001, "output": 0.00003},
+    "gemini": {"input": 0.00001, "output": 0.00002},
+    "aider": {"input": 0.0000014, "output": 0.0000028},
+    "grok": {"input": 0.000005, "output": 0.000015}
+}
+
+# Applied to the agent's flagship rates by model tier
+MODEL_TIER_MULTIPLIERS: Dict[str, float] = {
+    "flagship": 1.0,
+    "balanced": 0.4,
+    "fast": 0.1
+}
+
+# Unknown models are priced as flagship (conservative)
+MODEL_TIER_MAP: Dict[str, str] = {
+    "claude-opus-4-5-20251101": "flagship",
+    "claude-opus-4-20250514": "flagship",
+    "claude-sonnet-4-20250514": "balanced",
+    "claude-3-5-sonnet-20241022": "balanced",
+    "claude-3-5-haiku-20241022": "fast",
+    "gpt-5.1-codex-max": "flagship",
+    "gpt-4.1-codex": "balanced",
+    "gpt-4o-mini": "fast",
+    "gemini-3-flash-preview": "flagship",
+    "gemini-3-pro-preview": "flagship",
+    "gemini-2.5-pro": "flagship",
+    "gemini-2.0-flash": "balanced",
+    "gemini-2.0-flash-lite": "fast",
+    "deepseek/deepseek-coder": "balanced",
+    "deepseek-coder-v2": "balanced",
+    "deepseek-coder": "fast",
+    "grok-4-1-fast-reasoning": "flagship",
+    "grok-4-fast-reasoning": "fast",
+    "grok-3": "balanced",
+    "grok-2": "fast"
+}
+
+# EFS is billed per GB-month; storage is prorated per second of the job
+SECONDS_PER_MONTH = 30 * 24 * 60 * 60
+BYTES_PER_GB = 1024 * 1024 * 1024
+
+COST_COMPONENTS = ("compute", "memory", "llm", "storage", "total")
+
+GROUP_BY = ("user_id", "agent", "model")
+
+
+def _round_microdollars(value: float) -> float:
+    # Half-up like the ledger's Math.round, not Python's half-even round()
+    return math.floor(value * 1_000_000 + 0.5) / 1_000_000
+
+
+def _validate(columns: Dict[str, Any]) -> None:
+    """
+    Raises:
+        ValueError: The first event with a negative (or, for vcpu and memory, non-positive) field
+    """
+    checks = (
+        ("duration_seconds", False), ("vcpu", True), ("memory_mb", True),
+        ("tokens_input", False), ("tokens_output", False), ("efs_size_bytes", False)
+    )
+    for name, positive in checks:
+        column = columns[name]
+        if np is not None and isinstance(column, np.ndarray):
+            invalid = np.flatnonzero(column <= 0 if positive else column < 0)
+            first = int(invalid[0]) if len(invalid) else None
+        else:
+            first = next((i for i, v in enumerate(column) if (v <= 0 if positive else v < 0)), None)
+        if first is not None:
+            raise ValueError(f"{name} must be {'positive' if positive else 'non-negative'} (event {first})")
+
+
+class CostEvents:
+    """
+    Cost events as columns.
+
+    Numeric fields are float64 arrays (lists without NumPy). Agent/model
+    pairs and users are stored once, with an integer code per event.
+    efs_size_bytes is zero for ephemeral workspaces, which have no storage cost.
+    """
+
+    NUMERIC_COLUMNS = ("duration_seconds", "vcpu", "memory_mb", "tokens_input", "tokens_output", "efs_size_bytes")
+
+    def __init__(
+        self,
+        columns: Dict[str, Any],
+        pairs: List[Tuple[str, str]],
+        pair_codes: Any,
+        users: List[str],
+        user_codes: Any
+    ):
+        self.columns = columns
+        self.pairs = pairs
+        self.pair_codes = pair_codes
+        self.users = users
+        self.user_codes = user_codes
+        _validate(columns)
+
+    @classmethod
+    def from_events(cls, events: Iterable[Dict[str, Any]]) -> "CostEvents":
+        """
+        Load cost events (dicts matching the cost event schema).
+
+        Raises:
+            ValueError: An event has a negative or non-positive field
+        """
+        values: Dict[str, List[float]] = {name: [] for name in cls.NUMERIC_COLUMNS}
+        pair_index: Dict[Tuple[str, str], int] = {}
+        user_index: Dict[str, int] = {}
+        pair_codes: List[int] = []
+        user_codes: List[int] = []
+
+        for event in events:
+            for name in ("duration_seconds", "vcpu", "memory_mb", "tokens_input", "tokens_output"):
+                values[name].append(event[name])
+            persistent = event.get("workspace_mode") == "persistent"
+            values["efs_size_bytes"].append((event.get("efs_size_bytes") or 0) if persistent else 0)
+            pair_codes.append(pair_index.setdefault((event["agent"], event["model"]), len(pair_index)))
+            user_codes.append(user_index.setdefault(event["user_id"], len(user_index)))
+
+        if np is not None:
+            columns = {name: np.asarray(column, dtype=np.float64) for name, column in values.items()}
+            return cls(columns, list(pair_index), np.asarray(pair_codes, dtype=np.int32),
+                       list(user_index), np.asarray(user_codes, dtype=np.int32))
+        return cls(values, list(pair_index), pair_codes, list(user_index), user_codes)
+
+    def __len__(self) -> int:
+        return len(self.pair_codes)
+
+
+class CostEngine:
+    """
+    Prices cost events, singly or in bulk.
+
+    Rates default to the ledger's; pass overrides to price what-if
+    scenarios (e.g. another agent's token rates or a model's tier).
+    """
+
+    def __init__(
+        self,
+        compute_rates: Optional[Dict[str, float]] = None,
+        llm_rates: Optional[Dict[str, Dict[str, float]]] = None,
+        model_tiers: Optional[Dict[str, str]] = None,
+        tier_multipliers: Optional[Dict[str, float]] = None
+    ):
+        self.compute_rates = {**COMPUTE_RATES, **(compute_rates or {})}
+        self.llm_rates = {**LLM_TOKEN_RATES, **(llm_rates or {})}
+        self.model_tiers = {**MODEL_TIER_MAP, **(model_tiers or {})}
+        self.tier_multipliers = {**MODEL_TIER_MULTIPLIERS, **(tier_multipliers or {})}
+
+    def token_rates(self, agent: str, model: str) -> Tuple[float, float]:
+        """
+        (input, output) rate per token for an agent's model.
+
+        Raises:
+            ValueError: Unknown agent
+        """
+        rates = self.llm_rates.get(agent)
+        if rates is None:
+            raise ValueError(f"Unknown agent: {agent}")
+        multiplier = self.tier_multipliers[self.model_tiers.get(model, "flagship")]
+        return rates["input"] * multiplier, rates["output"] * multiplier
+
+    def calculate(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Price one cost event; the reference implementation.
+
+        Returns:
+            Dict with compute, memory, llm, storage and total in USD,
+            each rounded to microdollars
+
+        Raises:
+            ValueError: Invalid event
+        """
+        efs = (event.get("efs_size_bytes") or 0) if event.get("workspace_mode") == "persistent" else 0
+        row = {name: [event[name]] for name in CostEvents.NUMERIC_COLUMNS if name != "efs_size_bytes"}
+        _validate({**row, "efs_size_bytes": [efs]})
+        input_rate, output_rate = self.token_rates(event["agent"], event["model"])
+        costs = self._price_row(
+            event["duration_seconds"], event["vcpu"], event["memory_mb"],
+            event["tokens_input"], event["tokens_output"], efs, input_rate, output_rate
+        )
+        return {**{name: _round_microdollars(cost) for name, cost in zip(COST_COMPONENTS, costs)}, "currency": "USD"}
+
+    def price(self, events: CostEvents) -> Dict[str, Any]:
+        """
+        Price every event.
+
+        Returns:
+            Column per cost component (COST_COMPONENTS), one value per
+            event, each rounded to microdollars
+
+        Raises:
+            ValueError: An event's agent is unknown
+        """
+        rates = [self.token_rates(agent, model) for agent, model in events.pairs]
+        columns = events.columns
+        if np is None or not isinstance(events.pair_codes, np.ndarray):
+            priced: Dict[str, List[float]] = {name: [] for name in COST_COMPONENTS}
+            for row, code in enumerate(events.pair_codes):
+                costs = self._price_row(*(columns[name][row] for name in CostEvents.NUMERIC_COLUMNS), *rates[code])
+                for name, cost in zip(COST_COMPONENTS, costs):
+                    priced[name].append(_round_microdollars(cost))
+            return priced
+
+        input_rates = np.asarray([r[0] for r in rates], dtype=np.float64)[events.pair_codes]
+        output_rates = np.asarray([r[1] for r in rates], dtype=np.float64)[events.pair_codes]
+        duration = columns["duration_seconds"]
+        # Same operation order as _price_row, so results match it exactly
+        compute = duration * columns["vcpu"] * self.compute_rates["vcpu_per_second"]
+        memory = duration * (columns["memory_mb"] / 1024) * self.compute_rates["memory_gb_per_second"]
+        llm = columns["tokens_input"] * input_rates + columns["tokens_output"] * output_rates
+        storage = (columns["efs_size_bytes"] / BYTES_PER_GB) \
+            * (self.compute_rates["efs_gb_per_month"] / SECONDS_PER_MONTH) * duration
+        total = compute + memory + llm + storage
+        return {
+            name: np.floor(cost * 1_000_000 + 0.5) / 1_000_000
+            for name, cost in zip(COST_COMPONENTS, (compute, memory, llm, storage, total))
+        }
+
+    def totals(self, events: CostEvents, by: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Sum priced events, overall or per user_id, agent or model.
+
+        Sums are of the per-event rounded costs, as recorded by the ledger.
+
+        Returns:
+            Component totals, or {group: component totals} when grouped
+
+        Raises:
+            ValueError: Unknown grouping
+        """
+        if by is not None and by not in GROUP_BY:
+            raise ValueError(f"Cannot group costs by {by}")
+        priced = self.price(events)
+        if by is None:
+            return {name: _round_microdollars(float(sum(priced[name]))) for name in COST_COMPONENTS}
+
+        labels, codes = self._groups(events, by)
+        if np is not None and isinstance(codes, np.ndarray):
+            sums = {
+                name: np.bincount(codes, weights=priced[name], minlength=len(labels)).tolist()
+                for name in COST_COMPONENTS
+            }
+        else:
+            sums = {name: [0.0] * len(labels) for name in COST_COMPONENTS}
+            for row, code in enumerate(codes):
+                for name in COST_COMPONENTS:
+                    sums[name][code] += priced[name][row]
+
+        grouped: Dict[str, Dict[str, float]] = {}
+        for i, label in enumerate(labels):
+            group = grouped.setdefault(label, {name: 0.0 for name in COST_COMPONENTS})
+            for name in COST_COMPONENTS:
+                group[name] += sums[name][i]
+        return {
+            label: {name: _round_microdollars(value) for name, value in group.items()}
+            for label, group in grouped.items()
+        }
+
+    def _groups(self, events: CostEvents, by: str) -> Tuple[List[str], Any]:
+        if by == "user_id":
+            return events.users, events.user_codes
+        # One code per (agent, model) pair; several pairs can share an agent or model label
+        labels = [pair[0 if by == "agent" else 1] for pair in events.pairs]
+        return labels, events.pair_codes
+
+    def _price_row(
+        self,
+        duration: float,
+        vcpu: float,
+        memory_mb: float,
+        tokens_input: float,
+        tokens_output: float,
+        efs_size_bytes: float,
+        input_rate: float,
+        output_rate: float
+    ) -> Tuple[float, float, float, float, float]:
+        compute = duration * vcpu * self.compute_rates["vcpu_per_second"]
+        memory = duration * (memory_mb / 1024) * self.compute_rates["memory_gb_per_second"]
+        llm = tokens_input * input_rate + tokens_output * output_rate
+        storage = (efs_size_bytes / BYTES_PER_GB) * (self.compute_rates["efs_gb_per_month"] / SECONDS_PER_MONTH) * duration
+        return compute, memory, llm, storage, compute + memory + llm + storage
@@ -0,0 +1,157 @@
+"""
+Projected invoice for a tenant's current billing period.
+
+Combines the period's usage (MeteringService.get_usage, served from the
+process-wide UsageCache) with tier pricing: the monthly amount of the
+tier's Stripe price plus metered charges per job and per resource
+dimension. Only jobs that ran are billed; units leased to API containers
+and not yet used are left out. The projection extrapolates usage linearly
+to the end of the period, capped at the tier's limits. Amounts are in
+cents, as Stripe bills them.
+"""
+import os
+import time
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Any, Optional, Callable, Tuple
+
+from src.outpost.services.cost_engine import COMPUTE_RATES
+from src.outpost.services.metering import MeteringService, MeteringDimension
+from src.outpost.services.stripe_client import StripeClient
+
+# Metered price per unit, in cents. Compute passes through at the cost
+# engine's Fargate rates; tokens are not billed, agents run on the tenant's
+# own subscriptions.
+USAGE_PRICES: Dict[str, Decimal] = {
+    "jobs": Decimal("0"),
+    MeteringDimension.TOKENS.value: Decimal("0"),
+    MeteringDimension.VCPU_SECONDS.value: Decimal(str(COMPUTE_RATES["vcpu_per_second"])) * 100,
+    MeteringDimension.MEMORY_GB_SECONDS.value: Decimal(str(COMPUTE_RATES["memory_gb_per_second"])) * 100
+}
+
+
+def _parse_usage_prices(value: str) -> Dict[str, Decimal]:
+    """Parse BILLING_USAGE_PRICES overrides (cents per unit), e.g. "jobs=5,vcpu_seconds=0.002"."""
+    prices = {}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        name, _, price = part.partition("=")
+        prices[name.lower()] = Decimal(price)
+    return prices
+
+
+def _cents(value: Decimal) -> int:
+    return int(value.quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def _period_bounds(period: str) -> Tuple[datetime, datetime]:
+    start = datetime.strptime(period, "%Y-%m").replace(tzinfo=timezone.utc)
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start, end
+
+
+class InvoicePreview:
+    """
+    Builds a tenant's projected bill for the current period.
+
+    Usage comes from the UsageCache. Jobs and resources are recorded by
+    other functions, so each cached summary is checked against the usage
+    items' updated_at (MeteringService.usage_version, a projected read)
+    before it is served, and reloaded once anything was recorded. Tier
+    amounts come from the tier's Stripe price (StripeClient.get_tier_amount)
+    unless given in tier_prices.
+    """
+
+    def __init__(
+        self,
+        metering: Optional[MeteringService] = None,
+        stripe_client: Optional[StripeClient] = None,
+        tier_prices: Optional[Dict[str, int]] = None,
+        usage_prices: Optional[Dict[str, Decimal]] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        self.metering = metering or MeteringService()
+        self._stripe = stripe_client
+        self.tier_prices = {tier.upper(): price for tier, price in (tier_prices or {}).items()}
+        self.usage_prices = {
+            **USAGE_PRICES,
+            **(usage_prices if usage_prices is not None else _parse_usage_prices(
+                os.environ.get("BILLING_USAGE_PRICES", "")
+            ))
+        }
+        self._clock = clock
+
+    @property
+    def stripe(self) -> StripeClient:
+        # Created on first use; previews priced entirely from tier_prices never need Stripe
+        if self._stripe is None:
+            self._stripe = StripeClient()
+        return self._stripe
+
+    def tier_price(self, tier: str) -> int:
+        """Monthly amount for a tier, in cents."""
+        if tier.upper() in self.tier_prices:
+            return self.tier_prices[tier.upper()]
+        return self.stripe.get_tier_amount(tier)
+
+    def preview(self, tenant_id: str) -> Dict[str, Any]:
+        """
+        Project the tenant's invoice for the current period.
+
+        Returns:
+            Dict with the period, usage, invoice lines (amount to date and
+            projected amount, in cents) and totals
+        """
+        now = datetime.fromtimestamp(self._clock(), tz=timezone.utc)
+        period = now.strftime("%Y-%m")
+        usage, hit = self.metering.usage_cache.get(
+            tenant_id,
+            period,
+            lambda: self.metering.get_usage(tenant_id, period),
+            version=lambda: self.metering.usage_version(tenant_id, period)
+        )
+        start, end = _period_bounds(period)
+        # At least a minute in, so the first moments of a period do not project wildly
+        elapsed = min(1.0, max(60.0, (now - start).total_seconds()) / (end - start).total_seconds())
+
+        tier = usage["tier"]
+        base = self.tier_price(tier)
+        lines = [{
+            "description": f"{tier.capitalize()} plan",
+            "quantity": 1,
+            "unit_amount": base,
+            "amount": base,
+            "projected_amount": base
+        }]
+        # Leased units not yet used may be returned, and are not billed
+        jobs = usage["count"] - usage.get("leased", 0)
+        metered = [("jobs", jobs, usage["quota"])] + [
+            (name, dimension["used"], dimension["quota"]) for name, dimension in usage["dimensions"].items()
+        ]
+        for name, used, limit in metered:
+            price = self.usage_prices.get(name, Decimal("0"))
+            if not price:
+                continue
+            projected = used / elapsed if limit is None else min(float(limit), used / elapsed)
+            lines.append({
+                "description": name,
+                "quantity": used,
+                "unit_amount": float(price),
+                "amount": _cents(Decimal(str(used)) * price),
+                "projected_quantity": round(projected, 3),
+                "projected_amount": _cents(Decimal(str(projected)) * price)
+            })
+
+        return {
+            "tenant_id": tenant_id,
+            "period": period,
+            "period_start": start.isoformat(),
+            "period_end": end.isoformat(),
+            "elapsed": round(elapsed, 4),
+            "tier": tier,
+            "currency": "usd",
+            "usage": {"jobs": jobs, **{name: d["used"] for name, d in usage["dimensions"].items()}},
+            "lines": lines,
+            "amount_to_date": sum(line["amount"] for line in lines),
+            "projected_total": sum(line["projected_amount"] for line in lines),
+            "cached": hit
+        }
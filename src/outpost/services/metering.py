@@ -3,12 +3,35 @@ Usage metering service for Outpost multi-tenant SaaS.
 
 Tracks job usage per tenant, enforces tier quotas, and reports to Stripe for billing.
 """
+import math
 import os
+import random
+import threading
+import time
+import uuid
 import boto3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Dict, Any, Optional
+from decimal import Decimal
+from typing import Dict, Any, Optional, List, Tuple
 from enum import Enum
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+from src.outpost.services.tenant_cache import TenantCache
+from src.outpost.services.usage_cache import UsageCache
+
+
+# BatchGetItem accepts at most 100 keys per request
+BATCH_GET_SIZE = 100
+BATCH_GET_WORKERS = 8
+
+# Usage item attributes recording outstanding quota leases: lease_<id> = {units, expires_at, used}
+LEASE_ATTRIBUTE_PREFIX = "lease_"
+# Leases are no longer served once a limited dimension reaches this share of its limit
+LEASE_DIMENSION_HEADROOM = 0.8
+# Weight of the newest inter-arrival gap in a tenant's submission rate estimate
+SUBMISSION_RATE_SMOOTHING = 0.3
 
 
 class TierQuota(int, Enum):
@@ -18,11 +41,81 @@ class TierQuota(int, Enum):
     ENTERPRISE = 999999  # Effectively unlimited
 
 
+class MeteringDimension(str, Enum):
+    """Resource dimensions metered from job completion data, alongside the job count."""
+    TOKENS = "tokens"
+    VCPU_SECONDS = "vcpu_seconds"
+    MEMORY_GB_SECONDS = "memory_gb_seconds"
+
+
+# Per-period limits for each dimension by subscription tier; None is unlimited
+DIMENSION_QUOTAS: Dict[str, Dict[MeteringDimension, Optional[int]]] = {
+    "FREE": {
+        MeteringDimension.TOKENS: 2_000_000,
+        MeteringDimension.VCPU_SECONDS: 4 * 3600,
+        MeteringDimension.MEMORY_GB_SECONDS: 8 * 3600
+    },
+    "PRO": {
+        MeteringDimension.TOKENS: 50_000_000,
+        MeteringDimension.VCPU_SECONDS: 200 * 3600,
+        MeteringDimension.MEMORY_GB_SECONDS: 400 * 3600
+    },
+    "ENTERPRISE": {dimension: None for dimension in MeteringDimension}
+}
+
+# A usage item admits jobs only while every limited dimension is under its limit
+_DIMENSIONS_CONDITION = " AND ".join(
+    f"(attribute_not_exists({d.value}_limit) OR attribute_not_exists({d.value}) OR {d.value} < {d.value}_limit)"
+    for d in MeteringDimension
+)
+
+
 class QuotaExceededError(Exception):
     """Raised when tenant exceeds their tier quota."""
     pass
 
 
+def _parse_dimension_quotas(value: str) -> Dict[str, Dict[MeteringDimension, Optional[int]]]:
+    """Parse USAGE_DIMENSION_QUOTAS overrides, e.g. "pro.tokens=80000000,free.vcpu_seconds=none"."""
+    quotas: Dict[str, Dict[MeteringDimension, Optional[int]]] = {}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        name, _, limit = part.partition("=")
+        tier, _, dimension = name.partition(".")
+        quotas.setdefault(tier.upper(), {})[MeteringDimension(dimension)] = (
+            None if limit.lower() == "none" else int(limit)
+        )
+    return quotas
+
+
+def _parse_shard_config(value: str) -> Dict[str, int]:
+    """Parse USAGE_SHARDED_TENANTS, e.g. "ten_hot:4,ten_busy:8"."""
+    shards = {}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        tenant_id, _, count = part.partition(":")
+        shards[tenant_id] = min(100, max(1, int(count or 1)))
+    return shards
+
+
+class _QuotaLease:
+    """Quota units this process has taken from a usage item and not yet used."""
+
+    def __init__(self, key: str, lease_id: str, units: int, expires_at: int, count: int, quota: int):
+        self.key = key
+        self.attribute = f"{LEASE_ATTRIBUTE_PREFIX}{lease_id}"
+        self.units = units
+        self.available = units
+        self.expires_at = expires_at
+        # Period usage right after the lease was taken (all leased units counted)
+        self.count = count
+        self.quota = quota
+        # "used" as last written to the usage item; the job that took the lease
+        self.recorded_used = 1
+
+    @property
+    def used(self) -> int:
+        return self.units - self.available
+
+
 class MeteringService:
     """
     Tracks and enforces usage quotas for tenant job submissions.
@@ -32,15 +125,71 @@ class MeteringService:
     - Tier-based quota enforcement
     - Billing cycle reset support
     - Threshold alerting (80%, 100%)
-    - Optional Stripe metered billing integration
+    - Resource dimensions (tokens, vCPU-seconds, memory GB-seconds) with
+      per-tier limits; new jobs are refused once any dimension is spent
+    - Optional Stripe metered billing (reported in batches by UsageReporter)
+
+    Hot tenants can have their monthly counter sharded
+    (USAGE_SHARDED_TENANTS="ten_x:4"): usage lives on "ten_x#2026-05" and
+    "ten_x#2026-05#1" ... "#3", each shard holding its slice of the quota as
+    its own quota_limit. Writes pick a random shard and fall through to the
+    others when it is exhausted, so the tenant is only rejected once the
+    whole quota is used; reads sum the shards with BatchGetItem. Change a
+    tenant's shard count at a period boundary (or call sync_quota after) so
+    the shard budgets still add up to the quota.
+
+    consume_quota is the leased alternative to record_job_usage for warm
+    API containers: one conditional update moves a block of units (up to
+    QUOTA_LEASE_MAX) onto job_count and records the lease on the usage item;
+    the process then counts jobs against it without touching DynamoDB.
+    Leases are sized from the tenant's observed submission rate and shrink to
+    a single unit near the job limit, or when a resource dimension is close
+    to its limit (jobs served from a lease are not checked against
+    dimensions). A spent or expired lease is settled, returning its unused
+    units, by the next consume_quota call that needs a new one; callers
+    that want used units on the item sooner call settle_leases on their own
+    schedule, in the background rather than per request. A lease its
+    container never settles (the container was recycled) is settled by the
+    next process to lease from the item, from the used count last written.
+    Only used units are billable (billable_job_count). Job submission does
+    not lease: transact_job_usage stores the job and counts it in one
+    transaction.
     """
 
-    def __init__(self):
+    # Shared by every instance in the process; handlers create a service per request
+    _leases: Dict[str, _QuotaLease] = {}
+    _lease_hints: Dict[str, Dict[str, Any]] = {}
+    _submission_rates: Dict[str, Tuple[float, float]] = {}
+    _leases_lock = threading.Lock()
+
+    def __init__(
+        self,
+        shards: Optional[Dict[str, int]] = None,
+        dimension_quotas: Optional[Dict[str, Dict[MeteringDimension, Optional[int]]]] = None
+    ):
+        """
+        Args:
+            shards: Counter shards per tenant (default: USAGE_SHARDED_TENANTS)
+            dimension_quotas: Per-tier overrides of DIMENSION_QUOTAS
+                (default: USAGE_DIMENSION_QUOTAS)
+        """
         self.dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
         self.tenants_table_name = os.environ.get("TENANTS_TABLE", "outpost-tenants-prod")
         self.usage_table_name = os.environ.get("USAGE_TABLE", "outpost-usage-prod")
         self.tenants_table = self.dynamodb.Table(self.tenants_table_name)
         self.usage_table = self.dynamodb.Table(self.usage_table_name)
+        self.tenant_cache = TenantCache.for_table(self.tenants_table_name)
+        self.usage_cache = UsageCache.for_table(self.usage_table_name)
+        self.shards = shards if shards is not None else _parse_shard_config(
+            os.environ.get("USAGE_SHARDED_TENANTS", "")
+        )
+        self.dimension_quotas = dimension_quotas if dimension_quotas is not None else _parse_dimension_quotas(
+            os.environ.get("USAGE_DIMENSION_QUOTAS", "")
+        )
+        self.lease_max = int(os.environ.get("QUOTA_LEASE_MAX", "20"))
+        self.lease_seconds = int(os.environ.get("QUOTA_LEASE_SECONDS", "30"))
+        # A lease takes at most this share of the item's remaining quota
+        self.lease_fraction = float(os.environ.get("QUOTA_LEASE_FRACTION", "0.1"))
 
         # Stripe metered billing (optional)
         self.stripe_metering_enabled = os.environ.get("STRIPE_METERING_ENABLED", "false").lower() == "true"
@@ -64,6 +213,13 @@ class MeteringService:
         """
         Record a job execution and check quota.
 
+        The quota limit is denormalized onto the period's usage item, so the
+        increment and the quota check are a single conditional update: the
+        counter only moves while job_count < quota_limit and every resource
+        dimension is under its limit. The tenant record
+        is read only to seed a period's first usage item. Sharded tenants
+        count against a random shard's budget, trying the rest in turn.
+
         Args:
             tenant_id: Tenant identifier
             job_id: Job identifier (for audit)
@@ -74,69 +230,303 @@ class MeteringService:
         Raises:
             QuotaExceededError: If tenant has exceeded their quota
         """
-        # Get tenant tier
-        tenant = self._get_tenant(tenant_id)
-        if not tenant:
-            raise ValueError(f"Tenant not found: {tenant_id}")
+        return self._record_job(tenant_id, job_id)
 
-        tier = tenant.get("subscription_tier", "free").upper()
-        quota = TierQuota[tier].value
+    def _record_job(
+        self,
+        tenant_id: str,
+        job_id: str,
+        writes: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        period_key = self.get_current_period_key(tenant_id)
+        shards = self.shard_count(tenant_id)
+        keys = self.shard_keys(period_key, shards)
 
-        # Atomic increment in usage table
+        exhausted = []
+        for shard in random.sample(range(shards), shards):
+            recorded, item = self._increment_shard(tenant_id, keys[shard], shard, shards, writes)
+            if recorded:
+                break
+            exhausted.append(item)
+        else:
+            # Every shard's budget is spent, so the shards hold the whole picture
+            self._raise_quota_exceeded(tenant_id, self.combine_shards(exhausted, shards))
+
+        usage = item if shards == 1 else self._read_usage(tenant_id, period_key)
+        return self._usage_result(tenant_id, job_id, period_key, int(usage["job_count"]), int(usage["quota_limit"]))
+
+    def consume_quota(self, tenant_id: str, job_id: str) -> Dict[str, Any]:
+        """
+        Count a job against a quota lease held by this process.
+
+        Same contract as record_job_usage, but most calls are served from a
+        lease without a DynamoDB request. The first job on a usage item (per
+        process) is recorded directly, which seeds the item and tells the
+        process its quota; after that, a spent or expired lease is settled and
+        a new one taken in the same call. "count" includes units leased to
+        other processes and not yet used, so it can run slightly ahead of
+        record_job_usage's.
+
+        Raises:
+            QuotaExceededError: If tenant has exceeded their quota
+        """
+        return self._count_job(tenant_id, job_id)
+
+    def transact_job_usage(self, tenant_id: str, job_id: str, writes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Apply writes and count the job against the tenant's quota, all or nothing.
+
+        The writes (TransactWriteItems entries, e.g. the job's Put) go in one
+        TransactWriteItems call with the usage item's conditional update, so
+        a job is never stored without being counted, or counted without
+        being stored. Quota leases are not used here: a job served from a
+        lease would be stored apart from the usage it counts against, and
+        the lease's used units would need a write of their own.
+
+        Args:
+            tenant_id: Tenant identifier
+            job_id: Job identifier (for audit)
+            writes: TransactWriteItems entries to commit with the usage update
+
+        Returns:
+            Dict with usage info as from record_job_usage
+
+        Raises:
+            QuotaExceededError: If tenant has exceeded their quota; nothing is written
+            ClientError: If a write's own condition fails or the transaction
+                conflicts with another (TransactionCanceledException)
+        """
+        return self._record_job(tenant_id, job_id, writes)
+
+    def _count_job(self, tenant_id: str, job_id: str) -> Dict[str, Any]:
+        now = time.time()
         period_key = self.get_current_period_key(tenant_id)
+        with self._leases_lock:
+            rate = self._observe_submission(tenant_id, now)
+            lease = self._leases.get(tenant_id)
+            leased = lease and lease.available > 0 and lease.expires_at > now and lease.key.startswith(period_key)
+            if leased:
+                lease.available -= 1
+            else:
+                stale = self._leases.pop(tenant_id, None)
+        if leased:
+            return self._usage_result(tenant_id, job_id, period_key, lease.count - lease.available, lease.quota)
+        if stale:
+            self._settle_lease(stale)
 
-        try:
-            response = self.usage_table.update_item(
-                Key={"period_key": period_key},
-                UpdateExpression="SET job_count = if_not_exists(job_count, :zero) + :inc, "
-                                 "tenant_id = :tid, "
-                                 "updated_at = :ts",
-                ExpressionAttributeValues={
-                    ":zero": 0,
-                    ":inc": 1,
-                    ":tid": tenant_id,
-                    ":ts": datetime.now(timezone.utc).isoformat()
-                },
-                ReturnValues="UPDATED_NEW"
-            )
-            new_count = int(response["Attributes"]["job_count"])
-        except Exception as e:
-            raise RuntimeError(f"Failed to record usage: {e}")
+        shards = self.shard_count(tenant_id)
+        keys = self.shard_keys(period_key, shards)
+        exhausted = []
+        for shard in random.sample(range(shards), shards):
+            recorded, item, lease = self._lease_shard(tenant_id, keys[shard], shard, shards, rate, now)
+            if recorded:
+                break
+            exhausted.append(item)
+        else:
+            self._raise_quota_exceeded(tenant_id, self.combine_shards(exhausted, shards))
 
-        # Check quota
-        remaining = max(0, quota - new_count)
-        warning = None
+        usage = item if shards == 1 else self._read_usage(tenant_id, period_key)
+        count, quota = int(usage["job_count"]), int(usage["quota_limit"])
+        if lease:
+            lease.count, lease.quota = count, quota
+            with self._leases_lock:
+                self._leases[tenant_id] = lease
+            count -= lease.available
+        return self._usage_result(tenant_id, job_id, period_key, count, quota)
 
-        if new_count > quota:
-            # Rollback the increment (best effort)
-            self._decrement_usage(period_key)
-            raise QuotaExceededError(
-                f"Quota exceeded for tenant {tenant_id}. "
-                f"Tier: {tier}, Limit: {quota}, Used: {new_count - 1}"
-            )
+    def release_leases(self, tenant_id: Optional[str] = None) -> int:
+        """
+        Return this process's unused leased units to the usage items.
 
-        # Threshold warnings
-        usage_percent = (new_count / quota) * 100 if quota > 0 else 100
-        if usage_percent >= 100:
-            warning = "QUOTA_REACHED"
-        elif usage_percent >= 80:
-            warning = "QUOTA_WARNING_80"
+        Args:
+            tenant_id: Only this tenant's lease (default: every lease)
 
-        # Report to Stripe metered billing (if enabled)
-        if self.stripe_metering_enabled:
-            self._report_to_stripe(tenant_id, tenant.get("stripe_subscription_item_id"))
+        Returns:
+            Number of units returned
+        """
+        with self._leases_lock:
+            tenant_ids = [tenant_id] if tenant_id else list(self._leases)
+            leases = [lease for lease in (self._leases.pop(t, None) for t in tenant_ids) if lease]
+        return sum(self._settle_lease(lease) for lease in leases)
+
+    @classmethod
+    def reset_leases(cls) -> None:
+        """Forget in-process leases without settling them (tests, or a fresh container)."""
+        with cls._leases_lock:
+            cls._leases.clear()
+            cls._lease_hints.clear()
+            cls._submission_rates.clear()
+
+    @staticmethod
+    def billable_job_count(item: Dict[str, Any], now: Optional[float] = None) -> int:
+        """
+        Jobs on a usage item that are known to have run.
+
+        job_count includes every leased unit; those not (yet) used by an
+        outstanding lease are returned when it is settled and are not billable.
+        Leases written before "used" was recorded count as unused while
+        unexpired and as fully used after.
+        """
+        now = time.time() if now is None else now
+        return int(item.get("job_count", 0)) - sum(
+            int(value["units"]) - MeteringService._lease_used(value, now)
+            for name, value in item.items() if name.startswith(LEASE_ATTRIBUTE_PREFIX)
+        )
+
+    @staticmethod
+    def _lease_used(value: Dict[str, Any], now: float) -> int:
+        if "used" in value:
+            return int(value["used"])
+        return 0 if int(value["expires_at"]) > now else int(value["units"])
+
+    def settle_leases(self) -> int:
+        """
+        Write this process's lease usage back to the usage items.
+
+        One write per lease, so call it periodically (or before a container
+        shuts down), not per request: a lease whose container goes away
+        leaves only the used count last written behind. Expired and spent
+        leases are settled (unused units returned) and dropped; active ones
+        get "used" updated if it changed.
+
+        Returns:
+            Number of leases written
+        """
+        now = time.time()
+        with self._leases_lock:
+            done = [tenant_id for tenant_id, lease in self._leases.items()
+                    if lease.available <= 0 or lease.expires_at <= now]
+            finished = [self._leases.pop(tenant_id) for tenant_id in done]
+            active = [lease for lease in self._leases.values() if lease.used != lease.recorded_used]
+        for lease in finished:
+            self._settle_lease(lease)
+        for lease in active:
+            self._record_lease_usage(lease)
+        return len(finished) + len(active)
+
+    def record_resource_usage(
+        self,
+        tenant_id: str,
+        job_id: str,
+        tokens: float = 0,
+        vcpu_seconds: float = 0,
+        memory_gb_seconds: float = 0
+    ) -> Dict[str, Any]:
+        """
+        Add a finished job's resource consumption to the current period.
+
+        One unconditional ADD per job: the work has already happened, so it
+        is always counted, and record_job_usage refuses further jobs once a
+        dimension reaches its limit.
+
+        Args:
+            tenant_id: Tenant identifier
+            job_id: Job identifier (for audit)
+            tokens: LLM input plus output tokens
+            vcpu_seconds: vCPUs allocated x wall-clock seconds
+            memory_gb_seconds: Memory allocated (GB) x wall-clock seconds
 
+        Returns:
+            Dict with the amounts recorded per dimension
+        """
+        period_key = self.get_current_period_key(tenant_id)
+        shards = self.shard_count(tenant_id)
+        shard = random.randrange(shards)
+        recorded = {
+            MeteringDimension.TOKENS.value: Decimal(int(tokens)),
+            MeteringDimension.VCPU_SECONDS.value: Decimal(str(round(vcpu_seconds, 3))),
+            MeteringDimension.MEMORY_GB_SECONDS.value: Decimal(str(round(memory_gb_seconds, 3)))
+        }
+        self.usage_table.update_item(
+            Key={"period_key": self.shard_keys(period_key, shards)[shard]},
+            UpdateExpression="SET tenant_id = :tid, updated_at = :ts ADD " + ", ".join(
+                f"{name} :{name}" for name in recorded
+            ),
+            ExpressionAttributeValues={
+                ":tid": tenant_id,
+                ":ts": datetime.now(timezone.utc).isoformat(),
+                **{f":{name}": value for name, value in recorded.items()}
+            }
+        )
         return {
             "tenant_id": tenant_id,
             "job_id": job_id,
             "period": period_key.split("#")[1],
-            "count": new_count,
-            "quota": quota,
-            "remaining": remaining,
-            "usage_percent": round(usage_percent, 1),
-            "warning": warning
+            "recorded": {name: float(value) for name, value in recorded.items()}
+        }
+
+    @staticmethod
+    def usage_from_completion(completion: Dict[str, Any]) -> Dict[str, float]:
+        """
+        Convert worker completion data (cost-event field names) to dimension amounts.
+
+        Uses duration_seconds, vcpu, memory_mb, tokens_input and tokens_output;
+        missing fields count as zero.
+        """
+        duration = float(completion.get("duration_seconds") or 0)
+        return {
+            "tokens": float(completion.get("tokens_input") or 0) + float(completion.get("tokens_output") or 0),
+            "vcpu_seconds": float(completion.get("vcpu") or 0) * duration,
+            "memory_gb_seconds": float(completion.get("memory_mb") or 0) / 1024 * duration
         }
 
+    def dimension_limits(self, tier: str) -> Dict[MeteringDimension, Optional[int]]:
+        """Per-period limit for each resource dimension for a tier (None is unlimited)."""
+        tier = tier.upper()
+        return {**DIMENSION_QUOTAS.get(tier, DIMENSION_QUOTAS["FREE"]), **self.dimension_quotas.get(tier, {})}
+
+    def sync_quota(self, tenant_id: str, tier: str) -> None:
+        """
+        Propagate a tier change to the current period's usage item(s).
+
+        Called whenever subscription_tier changes so the denormalized
+        quota_limit used by record_job_usage stays correct. Sharded tenants
+        get the new quota split across their shards.
+
+        Raises:
+            ValueError: If tier is unknown (nothing is written)
+        """
+        if tier.upper() not in TierQuota.__members__:
+            raise ValueError(f"Unknown tier: {tier}")
+        quota = TierQuota[tier.upper()].value
+        limits = self.dimension_limits(tier)
+        shards = self.shard_count(tenant_id)
+        for shard, key in enumerate(self.shard_keys(self.get_current_period_key(tenant_id), shards)):
+            update_expr = "SET quota_limit = :q, tier = :tier, tenant_id = :tid, updated_at = :ts"
+            expr_values = {
+                ":q": self.shard_budget(quota, shard, shards),
+                ":tier": tier.lower(),
+                ":tid": tenant_id,
+                ":ts": datetime.now(timezone.utc).isoformat()
+            }
+            unlimited = []
+            for dimension, limit in limits.items():
+                if limit is None:
+                    unlimited.append(f"{dimension.value}_limit")
+                else:
+                    update_expr += f", {dimension.value}_limit = :{dimension.value}"
+                    expr_values[f":{dimension.value}"] = self.shard_budget(limit, shard, shards)
+            if unlimited:
+                update_expr += " REMOVE " + ", ".join(unlimited)
+            self.usage_table.update_item(
+                Key={"period_key": key},
+                UpdateExpression=update_expr,
+                ExpressionAttributeValues=expr_values
+            )
+        self.usage_cache.invalidate(tenant_id)
+
+    def shard_count(self, tenant_id: str) -> int:
+        return self.shards.get(tenant_id, 1)
+
+    def shard_keys(self, period_key: str, shards: int) -> List[str]:
+        """Usage item keys for a period. Shard 0 is the plain period key."""
+        return [period_key] + [f"{period_key}#{shard}" for shard in range(1, shards)]
+
+    @staticmethod
+    def shard_budget(quota: int, shard: int, shards: int) -> int:
+        """A shard's slice of the quota; the slices sum to the quota exactly."""
+        return quota // shards + (1 if shard < quota % shards else 0)
+
     def get_usage(self, tenant_id: str, period: Optional[str] = None) -> Dict[str, Any]:
         """
         Get usage statistics for a tenant.
@@ -153,16 +543,30 @@ class MeteringService:
         else:
             period_key = self.get_current_period_key(tenant_id)
 
-        tenant = self._get_tenant(tenant_id)
-        tier = tenant.get("subscription_tier", "free").upper() if tenant else "FREE"
-        quota = TierQuota[tier].value
-
         try:
-            response = self.usage_table.get_item(Key={"period_key": period_key})
-            item = response.get("Item", {})
-            count = int(item.get("job_count", 0))
+            item = self._read_usage(tenant_id, period_key)
         except Exception:
-            count = 0
+            item = {}
+        count = int(item.get("job_count", 0))
+
+        if "quota_limit" in item:
+            tier = item.get("tier", "free").upper()
+            quota = int(item["quota_limit"])
+        else:
+            tenant = self.get_tenant(tenant_id)
+            tier = tenant.get("subscription_tier", "free").upper() if tenant else "FREE"
+            quota = TierQuota[tier].value
+
+        dimensions = {}
+        for dimension, tier_limit in self.dimension_limits(tier).items():
+            used = float(item.get(dimension.value, 0))
+            limit = item.get(f"{dimension.value}_limit", tier_limit) if "quota_limit" in item else tier_limit
+            dimensions[dimension.value] = {
+                "used": used,
+                "quota": int(limit) if limit is not None else None,
+                "remaining": max(0.0, float(limit) - used) if limit is not None else None,
+                "usage_percent": round(used / float(limit) * 100, 1) if limit else 0
+            }
 
         return {
             "tenant_id": tenant_id,
@@ -171,9 +575,40 @@ class MeteringService:
             "count": count,
             "quota": quota,
             "remaining": max(0, quota - count),
-            "usage_percent": round((count / quota) * 100, 1) if quota > 0 else 0
+            "usage_percent": round((count / quota) * 100, 1) if quota > 0 else 0,
+            # Part of count leased but not yet used; returned when the leases are settled
+            "leased": count - self.billable_job_count(item) if item else 0,
+            "dimensions": dimensions
         }
 
+    def usage_version(self, tenant_id: str, period: Optional[str] = None) -> Tuple[Tuple[str, Optional[str]], ...]:
+        """
+        The updated_at of each of a period's usage items, as a cheap check for changes.
+
+        Every usage write sets updated_at, so a summary read from get_usage
+        is current while this is unchanged. Only the key and updated_at are
+        read (one GetItem, or one BatchGetItem for sharded tenants).
+
+        Args:
+            tenant_id: Tenant identifier
+            period: Optional period (YYYY-MM). Defaults to current.
+
+        Returns:
+            (period_key, updated_at) per existing usage item, in key order
+        """
+        period_key = f"{tenant_id}#{period}" if period else self.get_current_period_key(tenant_id)
+        shards = self.shard_count(tenant_id)
+        if shards == 1:
+            item = self.usage_table.get_item(
+                Key={"period_key": period_key}, ProjectionExpression="period_key, updated_at"
+            ).get("Item")
+            items = [item] if item else []
+        else:
+            items = self.batch_get_usage(
+                self.shard_keys(period_key, shards), consistent=False, projection="period_key, updated_at"
+            )
+        return tuple(sorted((item["period_key"], item.get("updated_at")) for item in items))
+
     def check_quota(self, tenant_id: str) -> bool:
         """
         Check if tenant has remaining quota.
@@ -185,13 +620,18 @@ class MeteringService:
             True if tenant can submit jobs, False otherwise
         """
         usage = self.get_usage(tenant_id)
-        return usage["remaining"] > 0
+        return usage["remaining"] > 0 and all(
+            dimension["remaining"] is None or dimension["remaining"] > 0
+            for dimension in usage["dimensions"].values()
+        )
 
     def reset_usage(self, tenant_id: str, period: Optional[str] = None) -> None:
         """
         Reset usage counter (admin operation).
 
         Typically called at billing cycle anchor or for manual resets.
+        Usage already reported to Stripe stays billed; reporting restarts
+        from zero.
 
         Args:
             tenant_id: Tenant identifier
@@ -202,14 +642,25 @@ class MeteringService:
         else:
             period_key = self.get_current_period_key(tenant_id)
 
-        self.usage_table.update_item(
-            Key={"period_key": period_key},
-            UpdateExpression="SET job_count = :zero, reset_at = :ts",
-            ExpressionAttributeValues={
-                ":zero": 0,
-                ":ts": datetime.now(timezone.utc).isoformat()
-            }
-        )
+        dimensions = ", ".join(f"{d.value} = :zero" for d in MeteringDimension)
+        for key in self.shard_keys(period_key, self.shard_count(tenant_id)):
+            # Outstanding leases go too, so their holders cannot return units into the new count
+            item = self.usage_table.get_item(Key={"period_key": key}).get("Item", {})
+            leases = {f"#lease{i}": name for i, name in enumerate(
+                name for name in item if name.startswith(LEASE_ATTRIBUTE_PREFIX)
+            )}
+            kwargs = {"ExpressionAttributeNames": leases} if leases else {}
+            self.usage_table.update_item(
+                Key={"period_key": key},
+                UpdateExpression=f"SET job_count = :zero, {dimensions}, stripe_reported = :zero, reset_at = :ts, updated_at = :ts "
+                                 "REMOVE " + ", ".join(["stripe_pending", *leases]),
+                ExpressionAttributeValues={
+                    ":zero": 0,
+                    ":ts": datetime.now(timezone.utc).isoformat()
+                },
+                **kwargs
+            )
+        self.usage_cache.invalidate(tenant_id)
 
     def get_usage_history(self, tenant_id: str, limit: int = 12) -> list:
         """
@@ -220,51 +671,492 @@ class MeteringService:
             limit: Number of periods to return
 
         Returns:
-            List of usage records, newest first
+            List of usage records, newest first, one per month (zero-filled)
         """
-        try:
-            # Query by tenant_id prefix using begins_with
-            response = self.usage_table.query(
-                KeyConditionExpression=Key("period_key").begins_with(f"{tenant_id}#"),
-                ScanIndexForward=False,
-                Limit=limit
-            )
-            return response.get("Items", [])
-        except Exception:
-            return []
+        return self.get_usage_histories([tenant_id], limit)[tenant_id]
+
+    def get_usage_histories(self, tenant_ids: List[str], months: int = 12) -> Dict[str, list]:
+        """
+        Get the last `months` periods of usage for many tenants at once.
+
+        Period keys are deterministic, so every usage item (and shard) is
+        fetched by key with parallel BatchGetItem calls rather than queried.
+        Months without usage are returned with a zero count.
+
+        Args:
+            tenant_ids: Tenant identifiers
+            months: Number of periods per tenant, including the current one
+
+        Returns:
+            Dict of tenant_id to usage records, newest first
+        """
+        periods = self.recent_periods(months)
+        keys = [
+            key
+            for tenant_id in tenant_ids
+            for period in periods
+            for key in self.shard_keys(f"{tenant_id}#{period}", self.shard_count(tenant_id))
+        ]
+        items = {item["period_key"]: item for item in self.batch_get_usage(keys, consistent=False)}
+
+        histories = {}
+        for tenant_id in tenant_ids:
+            shards = self.shard_count(tenant_id)
+            history = []
+            for period in periods:
+                usage = self.combine_shards([
+                    items[key] for key in self.shard_keys(f"{tenant_id}#{period}", shards) if key in items
+                ], shards)
+                history.append({
+                    "tenant_id": tenant_id,
+                    "period": period,
+                    "count": int(usage.get("job_count", 0)),
+                    "quota": int(usage["quota_limit"]) if "quota_limit" in usage else None,
+                    "tier": usage.get("tier"),
+                    **{d.value: float(usage.get(d.value, 0)) for d in MeteringDimension}
+                })
+            histories[tenant_id] = history
+        return histories
+
+    @staticmethod
+    def recent_periods(months: int) -> List[str]:
+        """The last `months` billing periods (YYYY-MM), current first."""
+        now = datetime.now(timezone.utc)
+        year, month = now.year, now.month
+        periods = []
+        for _ in range(months):
+            periods.append(f"{year:04d}-{month:02d}")
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        return periods
 
-    def _get_tenant(self, tenant_id: str) -> Optional[Dict[str, Any]]:
-        """Get tenant record."""
+    def batch_get_usage(
+        self,
+        keys: List[str],
+        consistent: bool = True,
+        projection: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Fetch usage items by period key, BATCH_GET_SIZE keys per request, requests in parallel."""
+        chunks = [keys[i:i + BATCH_GET_SIZE] for i in range(0, len(keys), BATCH_GET_SIZE)]
+        if len(chunks) <= 1:
+            return self._batch_get_chunk(chunks[0], consistent, projection) if chunks else []
+        # Low-level clients are thread-safe; resources are not
+        with ThreadPoolExecutor(max_workers=min(BATCH_GET_WORKERS, len(chunks))) as pool:
+            results = pool.map(lambda chunk: self._batch_get_chunk(chunk, consistent, projection), chunks)
+            return [item for chunk_items in results for item in chunk_items]
+
+    def get_tenant(self, tenant_id: str) -> Optional[Dict[str, Any]]:
+        """Get tenant record (cached process-wide, see TenantCache)."""
         try:
-            response = self.tenants_table.get_item(Key={"tenant_id": tenant_id})
-            return response.get("Item")
+            return self.tenant_cache.get(tenant_id, self._load_tenant)
         except Exception:
             return None
 
-    def _decrement_usage(self, period_key: str) -> None:
-        """Rollback a usage increment (best effort)."""
+    def _load_tenant(self, tenant_id: str) -> Optional[Dict[str, Any]]:
+        response = self.tenants_table.get_item(Key={"tenant_id": tenant_id})
+        return response.get("Item")
+
+    def _increment_shard(
+        self,
+        tenant_id: str,
+        key: str,
+        shard: int,
+        shards: int,
+        writes: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Count one job against a usage item's own quota_limit, in a transaction with writes if given.
+
+        Returns:
+            (True, updated item) or (False, current item) if its budget is spent
+        """
         try:
+            item = self._update_usage(
+                writes,
+                Key={"period_key": key},
+                UpdateExpression="SET job_count = if_not_exists(job_count, :zero) + :inc, updated_at = :ts",
+                ConditionExpression="attribute_exists(quota_limit) AND "
+                                    "(attribute_not_exists(job_count) OR job_count < quota_limit) AND "
+                                    + _DIMENSIONS_CONDITION,
+                ExpressionAttributeValues={
+                    ":zero": 0,
+                    ":inc": 1,
+                    ":ts": datetime.now(timezone.utc).isoformat()
+                },
+                ReturnValuesOnConditionCheckFailure="ALL_OLD"
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                if writes:
+                    raise
+                raise RuntimeError(f"Failed to record usage: {e}")
+            current = self._deserialize(e.response.get("Item"))
+            if "quota_limit" in current:
+                return False, current
+            # First job on this item this period (or an item from before quota denormalization)
+            return self._seed_usage(tenant_id, key, shard, shards, writes)
+        if not item:
+            # The transaction did not return the item: go on from what this process last knew of it,
+            # which at least includes this job, so only its first transaction on an item reads it
+            hint = self._lease_hints.get(key)
+            item = {**hint, "job_count": int(hint.get("job_count", 0)) + 1} if hint else self._get_usage_item(key)
+            self._lease_hints[key] = item
+        return True, item
+
+    def _lease_shard(
+        self,
+        tenant_id: str,
+        key: str,
+        shard: int,
+        shards: int,
+        rate: float,
+        now: float
+    ) -> Tuple[bool, Dict[str, Any], Optional[_QuotaLease]]:
+        """
+        Count one job against a usage item, leasing units for the jobs after it.
+
+        The lease is one conditional update: job_count grows by the lease size
+        only while that stays within quota_limit. DynamoDB conditions cannot
+        add, so the bound is computed from the quota_limit this process last
+        saw on the item, and the update also requires that quota_limit.
+
+        Returns:
+            (True, updated item, lease or None) or (False, current item, None)
+            if the item's budget is spent
+        """
+        for _ in range(3):
+            hint = self._lease_hints.get(key)
+            units = self._lease_size(rate, hint) if hint else 1
+            if units <= 1:
+                break
+            lease_id = uuid.uuid4().hex[:16]
+            expires_at = int(now) + self.lease_seconds
+            names = {"#lease": f"{LEASE_ATTRIBUTE_PREFIX}{lease_id}"}
+            values = {}
+            # Settle leases of processes that stopped without settling (given a grace period to
+            # do so themselves): their unused units are returned, conditional on the used count
+            # not having changed since this process read it
+            expired = [(name, value) for name, value in hint.items()
+                       if name.startswith(LEASE_ATTRIBUTE_PREFIX)
+                       and int(value["expires_at"]) + self.lease_seconds <= now][:10]
+            refund = 0
+            conditions = []
+            for i, (name, value) in enumerate(expired):
+                names[f"#expired{i}"] = name
+                if "used" in value:
+                    values[f":used{i}"] = int(value["used"])
+                    conditions.append(f"#expired{i}.used = :used{i}")
+                else:
+                    conditions.append(f"attribute_not_exists(#expired{i}.used)")
+                refund += int(value["units"]) - self._lease_used(value, now)
+            update_expr = "SET job_count = if_not_exists(job_count, :zero) + :n, #lease = :lease, updated_at = :ts"
+            if expired:
+                update_expr += " REMOVE " + ", ".join(f"#expired{i}" for i in range(len(expired)))
+            try:
+                item = self.usage_table.update_item(
+                    Key={"period_key": key},
+                    UpdateExpression=update_expr,
+                    ConditionExpression="quota_limit = :q AND "
+                                        "(attribute_not_exists(job_count) OR job_count <= :max) AND "
+                                        + " AND ".join([*conditions, _DIMENSIONS_CONDITION]),
+                    ExpressionAttributeNames=names,
+                    ExpressionAttributeValues={
+                        **values,
+                        ":zero": 0,
+                        ":n": units - refund,
+                        ":lease": {"units": units, "expires_at": expires_at, "used": 1},
+                        ":q": int(hint["quota_limit"]),
+                        ":max": int(hint["quota_limit"]) - units + refund,
+                        ":ts": datetime.now(timezone.utc).isoformat()
+                    },
+                    ReturnValues="ALL_NEW",
+                    ReturnValuesOnConditionCheckFailure="ALL_OLD"
+                )["Attributes"]
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise RuntimeError(f"Failed to lease quota: {e}")
+                current = self._deserialize(e.response.get("Item"))
+                if "quota_limit" not in current:
+                    # Reset or removed; record directly, which seeds it again
+                    self._lease_hints.pop(key, None)
+                    break
+                self._lease_hints[key] = current
+                if self._budget_spent(current):
+                    return False, current, None
+                continue
+
+            self._lease_hints[key] = item
+            lease = _QuotaLease(key, lease_id, units, expires_at, int(item["job_count"]), int(item["quota_limit"]))
+            lease.available -= 1
+            return True, item, lease
+
+        recorded, item = self._increment_shard(tenant_id, key, shard, shards)
+        if "quota_limit" in item:
+            self._lease_hints[key] = item
+        return recorded, item, None
+
+    def _lease_size(self, rate: float, item: Dict[str, Any]) -> int:
+        """Units to lease: what the tenant is expected to submit before the lease expires, within bounds."""
+        remaining = int(item["quota_limit"]) - int(item.get("job_count", 0))
+        if remaining <= 0:
+            return 0
+        if any(
+            f"{d.value}_limit" in item
+            and float(item.get(d.value, 0)) >= float(item[f"{d.value}_limit"]) * LEASE_DIMENSION_HEADROOM
+            for d in MeteringDimension
+        ):
+            # Leased jobs skip the dimension check; count each one directly near a limit
+            return 1
+        expected = math.ceil(rate * self.lease_seconds)
+        return max(1, min(self.lease_max, expected, int(remaining * self.lease_fraction)))
+
+    def _observe_submission(self, tenant_id: str, now: float) -> float:
+        """Update and return the tenant's smoothed submission rate (jobs per second) in this process."""
+        rate, last = self._submission_rates.get(tenant_id, (0.0, 0.0))
+        if last:
+            rate += SUBMISSION_RATE_SMOOTHING * (1.0 / max(now - last, 0.001) - rate)
+        self._submission_rates[tenant_id] = (rate, now)
+        return rate
+
+    def _settle_lease(self, lease: _QuotaLease) -> int:
+        """Remove a lease from its usage item, returning its unused units."""
+        try:
+            # Gone after a reset, or settled by another process; the units are then not ours to return
             self.usage_table.update_item(
-                Key={"period_key": period_key},
-                UpdateExpression="SET job_count = job_count - :dec",
-                ConditionExpression="job_count > :zero",
-                ExpressionAttributeValues={":dec": 1, ":zero": 0}
+                Key={"period_key": lease.key},
+                UpdateExpression="SET job_count = job_count - :unused, updated_at = :ts REMOVE #lease",
+                ConditionExpression="attribute_exists(#lease)",
+                ExpressionAttributeNames={"#lease": lease.attribute},
+                ExpressionAttributeValues={":unused": lease.available, ":ts": datetime.now(timezone.utc).isoformat()}
             )
-        except Exception:
-            pass  # Best effort rollback
+            return lease.available
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                print(f"Failed to settle quota lease {lease.attribute} on {lease.key}: {e}")
+        return 0
+
+    def _record_lease_usage(self, lease: _QuotaLease) -> None:
+        used = lease.used
+        try:
+            self.usage_table.update_item(
+                Key={"period_key": lease.key},
+                UpdateExpression="SET #lease.used = :used, updated_at = :ts",
+                ConditionExpression="attribute_exists(#lease)",
+                ExpressionAttributeNames={"#lease": lease.attribute},
+                ExpressionAttributeValues={":used": used, ":ts": datetime.now(timezone.utc).isoformat()}
+            )
+            lease.recorded_used = used
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                print(f"Failed to record quota lease {lease.attribute} on {lease.key}: {e}")
+
+    def _budget_spent(self, item: Dict[str, Any]) -> bool:
+        """Whether a usage item admits no more jobs: job quota or a dimension limit reached."""
+        if int(item.get("job_count", 0)) >= int(item["quota_limit"]):
+            return True
+        return any(
+            f"{d.value}_limit" in item and item.get(d.value, 0) >= item[f"{d.value}_limit"]
+            for d in MeteringDimension
+        )
+
+    def _usage_result(self, tenant_id: str, job_id: str, period_key: str, count: int, quota: int) -> Dict[str, Any]:
+        remaining = max(0, quota - count)
+        warning = None
+
+        # Threshold warnings
+        usage_percent = (count / quota) * 100 if quota > 0 else 100
+        if usage_percent >= 100:
+            warning = "QUOTA_REACHED"
+        elif usage_percent >= 80:
+            warning = "QUOTA_WARNING_80"
+
+        return {
+            "tenant_id": tenant_id,
+            "job_id": job_id,
+            "period": period_key.split("#")[1],
+            "count": count,
+            "quota": quota,
+            "remaining": remaining,
+            "usage_percent": round(usage_percent, 1),
+            "warning": warning
+        }
 
-    def _report_to_stripe(self, tenant_id: str, subscription_item_id: Optional[str]) -> None:
-        """Report metered usage to Stripe (if subscription item ID is set)."""
-        if not self.stripe or not subscription_item_id:
-            return
+    def _seed_usage(
+        self,
+        tenant_id: str,
+        key: str,
+        shard: int = 0,
+        shards: int = 1,
+        writes: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[bool, Dict[str, Any]]:
+        """Create or backfill a usage item with its share of the tenant's quota and count this job."""
+        tenant = self.get_tenant(tenant_id)
+        if not tenant:
+            raise ValueError(f"Tenant not found: {tenant_id}")
+
+        tier = tenant.get("subscription_tier", "free").lower()
+        budget = self.shard_budget(TierQuota[tier.upper()].value, shard, shards)
+        update_expr = ("SET job_count = if_not_exists(job_count, :zero) + :inc, "
+                       "quota_limit = if_not_exists(quota_limit, :q), "
+                       "tier = if_not_exists(tier, :tier), "
+                       "tenant_id = :tid, "
+                       "updated_at = :ts")
+        expr_values = {
+            ":zero": 0,
+            ":inc": 1,
+            ":q": budget,
+            ":tier": tier,
+            ":tid": tenant_id,
+            ":ts": datetime.now(timezone.utc).isoformat()
+        }
+        for dimension, limit in self.dimension_limits(tier).items():
+            if limit is not None:
+                name = f"{dimension.value}_limit"
+                update_expr += f", {name} = if_not_exists({name}, :{dimension.value})"
+                expr_values[f":{dimension.value}"] = self.shard_budget(limit, shard, shards)
+        if tenant.get("stripe_subscription_item_id"):
+            update_expr += ", stripe_subscription_item_id = :si"
+            expr_values[":si"] = tenant["stripe_subscription_item_id"]
 
         try:
-            self.stripe.SubscriptionItem.create_usage_record(
-                subscription_item_id,
-                quantity=1,
-                timestamp=int(datetime.now(timezone.utc).timestamp()),
-                action="increment"
+            item = self._update_usage(
+                writes,
+                Key={"period_key": key},
+                UpdateExpression=update_expr,
+                # A concurrent request may have seeded the item first; honour its limit
+                ConditionExpression="((attribute_exists(quota_limit) AND "
+                                    "(attribute_not_exists(job_count) OR job_count < quota_limit)) OR "
+                                    "(attribute_not_exists(quota_limit) AND "
+                                    "(attribute_not_exists(job_count) OR job_count < :q))) AND "
+                                    + _DIMENSIONS_CONDITION,
+                ExpressionAttributeValues=expr_values,
+                ReturnValuesOnConditionCheckFailure="ALL_OLD"
             )
-        except Exception as e:
-            # Log but don't fail - usage is already recorded locally
-            print(f"Failed to report usage to Stripe: {e}")
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                if writes:
+                    raise
+                raise RuntimeError(f"Failed to record usage: {e}")
+            current = self._deserialize(e.response.get("Item"))
+            return False, {"tier": tier, "quota_limit": budget, **current}
+        if not item:
+            # Read once after a transaction; later ones on the item go on from it (_increment_shard)
+            item = self._lease_hints[key] = self._get_usage_item(key)
+        return True, item
+
+    def _update_usage(self, writes: Optional[List[Dict[str, Any]]], **update: Any) -> Dict[str, Any]:
+        """
+        Apply a usage item update on its own, or in one transaction with writes.
+
+        Returns:
+            The updated item; {} for a transaction, which cannot return it
+
+        Raises:
+            ClientError: ConditionalCheckFailedException with the current item
+                as "Item" when the usage update's condition fails, whether alone
+                or in the transaction; other errors as raised
+        """
+        if writes is None:
+            return self.usage_table.update_item(ReturnValues="ALL_NEW", **update)["Attributes"]
+        try:
+            # The resource's client serializes attribute values, as for _batch_get_chunk
+            self.dynamodb.meta.client.transact_write_items(TransactItems=[
+                *writes, {"Update": {"TableName": self.usage_table_name, **update}}
+            ])
+        except ClientError as e:
+            reasons = e.response.get("CancellationReasons") or []
+            usage_reason = reasons[len(writes)] if len(reasons) > len(writes) else {}
+            writes_ok = all(reason.get("Code") in (None, "None") for reason in reasons[:len(writes)])
+            if usage_reason.get("Code") == "ConditionalCheckFailed" and writes_ok:
+                raise ClientError({
+                    "Error": {"Code": "ConditionalCheckFailedException", "Message": usage_reason.get("Message", "")},
+                    "Item": usage_reason.get("Item")
+                }, "TransactWriteItems") from e
+            raise
+        return {}
+
+    def _get_usage_item(self, key: str) -> Dict[str, Any]:
+        return self.usage_table.get_item(Key={"period_key": key}, ConsistentRead=True).get("Item", {})
+
+    def _read_usage(self, tenant_id: str, period_key: str) -> Dict[str, Any]:
+        """A period's usage item, or the sum of its shards for sharded tenants."""
+        shards = self.shard_count(tenant_id)
+        if shards == 1:
+            return self.usage_table.get_item(Key={"period_key": period_key}).get("Item", {})
+        return self.combine_shards(self.batch_get_usage(self.shard_keys(period_key, shards)), shards)
+
+    def combine_shards(self, items: List[Dict[str, Any]], shards: int) -> Dict[str, Any]:
+        """
+        Merge a tenant's usage shard items for one period into a single usage item.
+
+        Args:
+            items: Shard items that exist (missing shards may be left out)
+            shards: Number of shards the period is split into
+
+        Returns:
+            Usage item with summed job_count and dimensions, outstanding
+            leases, and the tier's quota limits once any shard is seeded
+        """
+        if shards == 1 or not items:
+            return items[0] if items else {}
+        usage: Dict[str, Any] = {"job_count": sum(int(i.get("job_count", 0)) for i in items)}
+        usage.update({
+            name: value for i in items for name, value in i.items() if name.startswith(LEASE_ATTRIBUTE_PREFIX)
+        })
+        for dimension in MeteringDimension:
+            usage[dimension.value] = sum(Decimal(i.get(dimension.value, 0)) for i in items)
+        seeded = [i for i in items if "quota_limit" in i]
+        if seeded:
+            # Unseeded shards have no stored budget yet; the tier's quotas are the totals
+            usage["tier"] = seeded[0].get("tier", "free")
+            usage["quota_limit"] = TierQuota[usage["tier"].upper()].value
+            for dimension, limit in self.dimension_limits(usage["tier"]).items():
+                if limit is not None:
+                    usage[f"{dimension.value}_limit"] = limit
+        return usage
+
+    def _batch_get_chunk(
+        self,
+        keys: List[str],
+        consistent: bool,
+        projection: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        # The resource's client serializes and deserializes attribute values
+        client = self.dynamodb.meta.client
+        items = []
+        request = {self.usage_table_name: {
+            "Keys": [{"period_key": key} for key in keys],
+            "ConsistentRead": consistent,
+            **({"ProjectionExpression": projection} if projection else {})
+        }}
+        attempt = 0
+        while request:
+            response = client.batch_get_item(RequestItems=request)
+            items.extend(response.get("Responses", {}).get(self.usage_table_name, []))
+            request = response.get("UnprocessedKeys") or None
+            if request:
+                # Throttled keys come back unprocessed; back off before retrying them
+                time.sleep(min(1.0, 0.05 * 2 ** attempt))
+                attempt += 1
+        return items
+
+    def _raise_quota_exceeded(self, tenant_id: str, usage: Dict[str, Any]) -> None:
+        tier = usage.get("tier", "free").upper()
+        if int(usage.get("job_count", 0)) < int(usage["quota_limit"]):
+            for dimension in MeteringDimension:
+                limit = usage.get(f"{dimension.value}_limit")
+                used = usage.get(dimension.value, 0)
+                if limit is not None and used >= limit:
+                    raise QuotaExceededError(
+                        f"{dimension.value} quota exceeded for tenant {tenant_id}. "
+                        f"Tier: {tier}, Limit: {int(limit)}, Used: {int(used)}"
+                    )
+        raise QuotaExceededError(
+            f"Quota exceeded for tenant {tenant_id}. "
+            f"Tier: {tier}, "
+            f"Limit: {int(usage['quota_limit'])}, Used: {int(usage.get('job_count', 0))}"
+        )
+
+    def _deserialize(self, item: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Convert a low-level DynamoDB item (as returned on condition failure)."""
+        deserializer = TypeDeserializer()
+        return {k: deserializer.deserialize(v) for k, v in (item or {}).items()}
@@ -0,0 +1,293 @@
+"""
+Per-tenant request rate limiting for the Outpost API.
+
+Each tenant has a token bucket sized by subscription tier. The shared bucket
+lives in DynamoDB as a GCRA "theoretical arrival time", so taking tokens is
+a single conditional update with no read. Warm Lambda containers lease a
+small batch of tokens at a time and spend them in-process, so most requests
+never touch DynamoDB; a denied container remembers when the bucket refills
+and rejects locally until then.
+"""
+import math
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple, Callable
+
+import boto3
+from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeDeserializer
+
+from src.outpost.services.tenant_cache import TenantCache
+
+# (requests per second, burst) by subscription tier
+TIER_RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    "FREE": (5, 20),
+    "PRO": (50, 200),
+    "ENTERPRISE": (500, 2000)
+}
+
+RATE_LIMIT_MODES = ("distributed", "local", "off")
+
+
+def _parse_rate_limits(value: str) -> Dict[str, Tuple[float, int]]:
+    """Parse RATE_LIMITS overrides, e.g. "pro=100:400,free=2:5"."""
+    limits = {}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        tier, _, spec = part.partition("=")
+        rate, _, burst = spec.partition(":")
+        limits[tier.upper()] = (float(rate), int(burst or max(1, float(rate))))
+    return limits
+
+
+class RateLimitDecision:
+    """Outcome of a rate limit check."""
+
+    def __init__(self, allowed: bool, limit: int, remaining: int, retry_after: float = 0.0):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(max(0, self.remaining))
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+class _LocalBucket:
+    """A container's view of one tenant's bucket."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = 0.0
+        self.updated = 0.0
+        self.lease_expires = 0.0
+        self.blocked_until = 0.0
+        self.shared_remaining = 0
+        self.tat: Optional[int] = None
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter with per-tier rates.
+
+    Modes (RATE_LIMIT_MODE):
+    - distributed: tokens are leased from the DynamoDB bucket in batches
+      (RATE_LIMIT_LEASE_FRACTION of a second's rate, but at least
+      RATE_LIMIT_MIN_LEASE tokens or half the burst, whichever is smaller)
+      and spent in-process. A lease is valid for RATE_LIMIT_LEASE_SECONDS,
+      or for as long as the bucket takes to earn its tokens back if that is
+      longer, so a container re-leasing at a low tier's rate never drains
+      the bucket faster than it refills.
+    - local: in-process buckets only, per container
+    - off: every request is allowed
+
+    DynamoDB errors fail open: an outage of the limiter table must not take
+    the API down with it.
+    """
+
+    # Shared by every instance in the process; handlers create a limiter per request
+    _buckets: Dict[str, _LocalBucket] = {}
+    _buckets_lock = threading.Lock()
+    _tables: Dict[str, Any] = {}
+
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        limits: Optional[Dict[str, Tuple[float, int]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        wall_clock: Callable[[], float] = time.time
+    ):
+        self.mode = mode or os.environ.get("RATE_LIMIT_MODE", "distributed")
+        if self.mode not in RATE_LIMIT_MODES:
+            raise ValueError(f"Unknown RATE_LIMIT_MODE: {self.mode}")
+        self.limits = {
+            **TIER_RATE_LIMITS,
+            **(limits if limits is not None else _parse_rate_limits(os.environ.get("RATE_LIMITS", "")))
+        }
+        self.table_name = os.environ.get("RATE_LIMITS_TABLE", "outpost-rate-limits-prod")
+        self.tenants_table_name = os.environ.get("TENANTS_TABLE", "outpost-tenants-prod")
+        self.lease_seconds = float(os.environ.get("RATE_LIMIT_LEASE_SECONDS", "1"))
+        self.lease_fraction = float(os.environ.get("RATE_LIMIT_LEASE_FRACTION", "0.1"))
+        # Keeps low tiers (FREE: 5/s) from leasing one token, and making one DynamoDB call, per request
+        self.min_lease = int(os.environ.get("RATE_LIMIT_MIN_LEASE", "10"))
+        self._clock = clock
+        self._wall_clock = wall_clock
+
+    @classmethod
+    def reset(cls) -> None:
+        """Forget all in-process bucket state (tests, or a fresh container)."""
+        with cls._buckets_lock:
+            cls._buckets.clear()
+
+    @property
+    def table(self):
+        table = self._tables.get(self.table_name)
+        if table is None:
+            table = boto3.resource("dynamodb", region_name="us-east-1").Table(self.table_name)
+            self._tables[self.table_name] = table
+        return table
+
+    def limit_for(self, tier: Optional[str]) -> Tuple[float, int]:
+        return self.limits.get((tier or "free").upper(), self.limits["FREE"])
+
+    def tier_for(self, tenant_id: str) -> str:
+        """The tenant's subscription tier, from the process-wide tenant cache."""
+        def load(tid):
+            table = boto3.resource("dynamodb", region_name="us-east-1").Table(self.tenants_table_name)
+            return table.get_item(Key={"tenant_id": tid}).get("Item")
+
+        try:
+            tenant = TenantCache.for_table(self.tenants_table_name).get(tenant_id, load)
+        except Exception:
+            tenant = None
+        return (tenant or {}).get("subscription_tier", "free")
+
+    def check(self, tenant_id: str, tier: Optional[str] = None, cost: int = 1) -> RateLimitDecision:
+        """
+        Take `cost` tokens from the tenant's bucket.
+
+        Args:
+            tenant_id: Tenant identifier
+            tier: Subscription tier; looked up (cached) when not given
+            cost: Tokens this request consumes
+
+        Returns:
+            RateLimitDecision; when not allowed, retry_after is in seconds
+        """
+        if self.mode == "off":
+            return RateLimitDecision(True, 0, 0)
+
+        rate, burst = self.limit_for(tier or self.tier_for(tenant_id))
+        bucket = self._bucket(tenant_id)
+        now = self._clock()
+        with bucket.lock:
+            if now < bucket.blocked_until:
+                return RateLimitDecision(False, burst, 0, bucket.blocked_until - now)
+            if self.mode == "local":
+                return self._take_local(bucket, now, rate, burst, cost)
+
+            if bucket.tokens >= cost and now < bucket.lease_expires:
+                bucket.tokens -= cost
+                return RateLimitDecision(True, burst, bucket.shared_remaining + int(bucket.tokens))
+            return self._lease(tenant_id, bucket, now, rate, burst, cost)
+
+    def _bucket(self, tenant_id: str) -> _LocalBucket:
+        bucket = self._buckets.get(tenant_id)
+        if bucket is None:
+            with self._buckets_lock:
+                bucket = self._buckets.setdefault(tenant_id, _LocalBucket())
+        return bucket
+
+    def _take_local(self, bucket: _LocalBucket, now: float, rate: float, burst: int, cost: int) -> RateLimitDecision:
+        if bucket.updated == 0.0:
+            bucket.tokens = burst
+        else:
+            bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+        bucket.updated = now
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            return RateLimitDecision(True, burst, int(bucket.tokens))
+        retry_after = (cost - bucket.tokens) / rate
+        bucket.blocked_until = now + retry_after
+        return RateLimitDecision(False, burst, 0, retry_after)
+
+    def _lease(
+        self,
+        tenant_id: str,
+        bucket: _LocalBucket,
+        now: float,
+        rate: float,
+        burst: int,
+        cost: int
+    ) -> RateLimitDecision:
+        """Take a batch of tokens from the shared GCRA bucket; spend `cost` of them now."""
+        interval = 1000.0 / rate
+        tolerance = burst * interval
+        wanted = max(cost, min(burst, max(math.ceil(rate * self.lease_fraction), min(self.min_lease, burst // 2))))
+        now_ms = int(self._wall_clock() * 1000)
+        known_tat = bucket.tat
+
+        for _ in range(3):
+            idle = known_tat is None or known_tat <= now_ms
+            try:
+                new_tat = self._advance(tenant_id, now_ms, wanted, interval, tolerance, idle)
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    return self._fail_open(e, burst)
+                old = e.response.get("Item")
+                known_tat = int(TypeDeserializer().deserialize(old["tat"])) if old and "tat" in old else None
+                if known_tat is not None and known_tat > now_ms:
+                    available = int((now_ms + tolerance - known_tat) // interval)
+                    if available < cost:
+                        bucket.tat = known_tat
+                        retry_after = (known_tat + cost * interval - tolerance - now_ms) / 1000
+                        bucket.blocked_until = now + retry_after
+                        return RateLimitDecision(False, burst, 0, retry_after)
+                    wanted = min(wanted, available)
+                continue
+            except Exception as e:
+                return self._fail_open(e, burst)
+
+            bucket.tat = new_tat
+            bucket.tokens = wanted - cost
+            bucket.lease_expires = now + max(self.lease_seconds, wanted / rate)
+            bucket.shared_remaining = max(0, int((now_ms + tolerance - new_tat) // interval))
+            return RateLimitDecision(True, burst, bucket.shared_remaining + int(bucket.tokens))
+
+        # Lost the race three times; tell the client to come back shortly
+        return RateLimitDecision(False, burst, 0, interval / 1000)
+
+    def _advance(
+        self,
+        tenant_id: str,
+        now_ms: int,
+        tokens: int,
+        interval: float,
+        tolerance: float,
+        idle: bool
+    ) -> int:
+        """
+        Move the bucket's theoretical arrival time forward by `tokens` intervals.
+
+        GCRA: a request is allowed while tat - now <= tolerance after adding
+        it. DynamoDB has no max(), so an idle bucket (tat in the past) and a
+        busy one are updated with different conditions.
+
+        Raises:
+            ClientError: ConditionalCheckFailedException, with the current item
+        """
+        step = int(math.ceil(tokens * interval))
+        if idle:
+            new_tat = now_ms + step
+            self.table.update_item(
+                Key={"bucket_id": tenant_id},
+                UpdateExpression="SET tat = :tat, expires_at = :exp",
+                ConditionExpression="attribute_not_exists(tat) OR tat <= :now",
+                ExpressionAttributeValues={":tat": new_tat, ":now": now_ms, ":exp": new_tat // 1000 + 3600},
+                ReturnValuesOnConditionCheckFailure="ALL_OLD"
+            )
+            return new_tat
+        response = self.table.update_item(
+            Key={"bucket_id": tenant_id},
+            UpdateExpression="SET tat = tat + :step, expires_at = :exp",
+            ConditionExpression="tat > :now AND tat <= :max_tat",
+            ExpressionAttributeValues={
+                ":step": step,
+                ":now": now_ms,
+                ":max_tat": int(now_ms + tolerance) - step,
+                ":exp": now_ms // 1000 + 3600
+            },
+            ReturnValues="UPDATED_NEW",
+            ReturnValuesOnConditionCheckFailure="ALL_OLD"
+        )
+        return int(response["Attributes"]["tat"])
+
+    def _fail_open(self, error: Exception, burst: int) -> RateLimitDecision:
+        print(f"Rate limiter unavailable, allowing request: {error}")
+        return RateLimitDecision(True, burst, burst)
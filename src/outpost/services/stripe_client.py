@@ -13,6 +13,9 @@ from datetime import datetime
 class StripeClient:
     """Low-level Stripe API client with configuration management."""
 
+    # Stripe prices cannot change amount, so amounts are cached per price ID for the process
+    _price_amounts: Dict[str, int] = {}
+
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key or os.environ.get("STRIPE_SECRET_KEY")
         if not self.api_key:
@@ -112,7 +115,9 @@ class StripeClient:
             mode="subscription",
             success_url=success_url,
             cancel_url=cancel_url,
-            metadata=metadata or {}
+            metadata=metadata or {},
+            # Carried onto the subscription so webhooks can see the tier
+            subscription_data={"metadata": metadata or {}}
         )
 
     def create_portal_session(
@@ -216,3 +221,16 @@ class StripeClient:
         if tier_lower not in self.prices:
             raise ValueError(f"Unknown tier: {tier}. Valid tiers: {list(self.prices.keys())}")
         return self.prices[tier_lower]
+
+    def get_tier_amount(self, tier: str) -> int:
+        """Get the recurring amount (in cents) of a subscription tier's Stripe price."""
+        price_id = self.get_price_for_tier(tier)
+        amount = self._price_amounts.get(price_id)
+        if amount is None:
+            amount = self._price_amounts[price_id] = int(stripe.Price.retrieve(price_id).get("unit_amount") or 0)
+        return amount
+
+    @classmethod
+    def reset_price_amounts(cls) -> None:
+        """Forget cached price amounts (tests, or prices reconfigured)."""
+        cls._price_amounts.clear()
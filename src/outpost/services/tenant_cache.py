@@ -0,0 +1,168 @@
+"""
+Process-wide tenant record cache for Outpost services.
+
+Tenant tiers change a few times a month, but metering reads the tenant record
+on hot paths. Records are cached per tenants table with a TTL; concurrent
+misses for the same tenant share a single load (single-flight), and writers
+such as BillingService invalidate entries when a tenant's subscription changes.
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Callable, Tuple
+
+
+class _Flight:
+    """An in-progress load that other callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+
+
+class TenantCache:
+    """
+    TTL cache of tenant records with single-flight loading.
+
+    Features:
+    - One shared cache per tenants table (TenantCache.for_table)
+    - TTL from TENANT_CACHE_TTL_SECONDS (0 disables caching)
+    - Concurrent misses for a tenant coalesce into one load
+    - Explicit invalidation of one tenant or the whole cache
+    - Hit/miss/coalesced/invalidation counters for TTL tuning, logged
+      periodically by the API handlers and the worker (log_stats)
+
+    Missing tenants are not cached, so a newly created tenant is visible
+    immediately.
+    """
+
+    _registry: Dict[str, "TenantCache"] = {}
+    _registry_lock = threading.Lock()
+    _stats_logged_at: Optional[float] = None
+
+    def __init__(self, ttl_seconds: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(
+            os.environ.get("TENANT_CACHE_TTL_SECONDS", "300")
+        )
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._flights: Dict[str, _Flight] = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0, "load_errors": 0}
+
+    @classmethod
+    def for_table(cls, table_name: str) -> "TenantCache":
+        """The process-wide cache for a tenants table."""
+        with cls._registry_lock:
+            cache = cls._registry.get(table_name)
+            if cache is None:
+                cache = cls._registry[table_name] = cls()
+            return cache
+
+    @classmethod
+    def reset(cls) -> None:
+        """Drop every process-wide cache (tests, configuration changes)."""
+        with cls._registry_lock:
+            cls._registry.clear()
+            cls._stats_logged_at = None
+
+    @classmethod
+    def log_stats(cls, interval_seconds: Optional[float] = None, clock: Callable[[], float] = time.monotonic) -> bool:
+        """
+        Print every process-wide cache's stats as one JSON line per table,
+        at most once per TENANT_CACHE_STATS_INTERVAL_SECONDS.
+
+        Handlers call this on every invocation; the first call only starts
+        the interval.
+
+        Returns:
+            True if stats were printed
+        """
+        if interval_seconds is None:
+            interval_seconds = float(os.environ.get("TENANT_CACHE_STATS_INTERVAL_SECONDS", "300"))
+        now = clock()
+        with cls._registry_lock:
+            if cls._stats_logged_at is None:
+                cls._stats_logged_at = now
+                return False
+            if now - cls._stats_logged_at < interval_seconds:
+                return False
+            cls._stats_logged_at = now
+            caches = list(cls._registry.items())
+        for table_name, cache in caches:
+            print(json.dumps({"metric": "tenant_cache", "table": table_name, **cache.stats()}))
+        return bool(caches)
+
+    def get(self, tenant_id: str, load: Callable[[str], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached record for tenant_id, loading it on a miss.
+
+        Args:
+            tenant_id: Tenant identifier
+            load: Called with tenant_id to fetch the record (None if missing)
+
+        Raises:
+            Whatever load raises; errors are not cached
+        """
+        if self.ttl_seconds <= 0:
+            return load(tenant_id)
+
+        with self._lock:
+            entry = self._entries.get(tenant_id)
+            if entry and entry[0] > self._clock():
+                self._stats["hits"] += 1
+                return entry[1]
+
+            self._stats["misses"] += 1
+            flight = self._flights.get(tenant_id)
+            leader = flight is None
+            if leader:
+                flight = self._flights[tenant_id] = _Flight()
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = load(tenant_id)
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._stats["load_errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                # An invalidation during the load removed the flight; do not cache stale data
+                if self._flights.get(tenant_id) is flight:
+                    del self._flights[tenant_id]
+                    if flight.error is None and flight.value is not None:
+                        self._entries[tenant_id] = (self._clock() + self.ttl_seconds, flight.value)
+            flight.done.set()
+        return flight.value
+
+    def invalidate(self, tenant_id: Optional[str] = None) -> None:
+        """Drop one tenant's entry, or every entry when tenant_id is None."""
+        with self._lock:
+            self._stats["invalidations"] += 1
+            if tenant_id is None:
+                self._entries.clear()
+                self._flights.clear()
+            else:
+                self._entries.pop(tenant_id, None)
+                self._flights.pop(tenant_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+                "ttl_seconds": self.ttl_seconds
+            }
@@ -0,0 +1,118 @@
+"""
+Process-wide cache of tenants' usage summaries for read-heavy billing views.
+
+Billing pages (e.g. the invoice preview) read a tenant's period usage on
+every request. Summaries (as returned by MeteringService.get_usage) are
+cached per usage table with a TTL, together with a version of the usage
+items they were built from (MeteringService.usage_version: each item's
+updated_at, which every usage write sets). A hit is only served after a
+cheap read confirms the version is unchanged, so usage recorded by any
+process, not just this one, is seen on the next request.
+"""
+import copy
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Callable, Tuple
+
+
+class UsageCache:
+    """
+    TTL cache of usage summaries, validated against the usage items.
+
+    Features:
+    - One shared cache per usage table (UsageCache.for_table)
+    - TTL from USAGE_CACHE_TTL_SECONDS (0 disables caching)
+    - Entries reloaded when the usage items' version has changed
+    - Explicit invalidation, e.g. on tier changes and usage resets
+    - Hit/miss/stale/invalidation counters
+    """
+
+    _registry: Dict[str, "UsageCache"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, ttl_seconds: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(
+            os.environ.get("USAGE_CACHE_TTL_SECONDS", "60")
+        )
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], Tuple[float, Any, Dict[str, Any]]] = {}
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "invalidations": 0}
+
+    @classmethod
+    def for_table(cls, table_name: str) -> "UsageCache":
+        """The process-wide cache for a usage table."""
+        with cls._registry_lock:
+            cache = cls._registry.get(table_name)
+            if cache is None:
+                cache = cls._registry[table_name] = cls()
+            return cache
+
+    @classmethod
+    def reset(cls) -> None:
+        """Drop every process-wide cache (tests, configuration changes)."""
+        with cls._registry_lock:
+            cls._registry.clear()
+
+    def get(
+        self,
+        tenant_id: str,
+        period: str,
+        load: Callable[[], Dict[str, Any]],
+        version: Optional[Callable[[], Any]] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Return a copy of the cached summary, loading it on a miss.
+
+        Args:
+            tenant_id: Tenant identifier
+            period: Period (YYYY-MM)
+            load: Reads the summary
+            version: Reads the current version of the data behind it; a
+                cached summary is only returned while this is unchanged
+
+        Returns:
+            (summary, hit)
+
+        Raises:
+            Whatever load or version raise; errors are not cached
+        """
+        if self.ttl_seconds <= 0:
+            return load(), False
+
+        with self._lock:
+            entry = self._entries.get((tenant_id, period))
+            fresh = entry is not None and entry[0] > self._clock()
+        # Read before load: a write landing in between makes the entry look stale, never current
+        current = version() if version else None
+        with self._lock:
+            if fresh and entry[1] == current:
+                self._stats["hits"] += 1
+                return copy.deepcopy(entry[2]), True
+            self._stats["stale" if fresh else "misses"] += 1
+
+        usage = load()
+        with self._lock:
+            self._entries[(tenant_id, period)] = (self._clock() + self.ttl_seconds, current, copy.deepcopy(usage))
+        return usage, False
+
+    def invalidate(self, tenant_id: Optional[str] = None) -> None:
+        """Drop one tenant's entries, or every entry when tenant_id is None."""
+        with self._lock:
+            self._stats["invalidations"] += 1
+            if tenant_id is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == tenant_id]:
+                    del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+                "ttl_seconds": self.ttl_seconds
+            }
@@ -0,0 +1,316 @@
+"""
+Month-end usage report across every tenant.
+
+Tenants are read with a parallel segmented scan. For each scanned page, the
+period's usage items (every shard) are fetched by key with BatchGetItem,
+100 keys per request, and turned into report rows. Rows are streamed to CSV
+or JSONL as pages complete, so memory is bounded by a few pages regardless
+of the number of tenants. Rows come out in scan order, not sorted.
+
+Run locally against moto:
+    python -m src.outpost.services.usage_report --period 2026-05 \\
+        --output usage-2026-05.csv --moto --seed 5000
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Iterator, BinaryIO
+
+import boto3
+
+from src.outpost.services.audit_export import MultipartUpload
+from src.outpost.services.metering import MeteringService, MeteringDimension, TierQuota, BATCH_GET_SIZE
+
+REPORT_FORMATS = ("csv", "jsonl")
+
+REPORT_COLUMNS = [
+    "tenant_id", "name", "email", "status", "tier", "period",
+    "job_count", "quota", "usage_percent", "billable_jobs", "stripe_reported",
+    *[d.value for d in MeteringDimension]
+]
+
+_DONE = object()
+
+
+class UsageReport:
+    """
+    Builds the usage report for one billing period.
+
+    Features:
+    - Tenants scanned in parallel segments (USAGE_REPORT_SEGMENTS)
+    - Usage items fetched with BatchGetItem, one request per page of tenants
+    - Streaming CSV or JSONL output, to any binary file object or to S3
+    - Tenants without usage in the period get a zero row
+    """
+
+    def __init__(
+        self,
+        metering: Optional[MeteringService] = None,
+        segments: Optional[int] = None,
+        page_size: int = BATCH_GET_SIZE,
+        bucket: Optional[str] = None
+    ):
+        self.metering = metering or MeteringService()
+        self.tenants_table_name = self.metering.tenants_table_name
+        self.segments = segments or int(os.environ.get("USAGE_REPORT_SEGMENTS", "8"))
+        self.page_size = page_size
+        self.bucket = bucket or os.environ.get("USAGE_REPORT_BUCKET")
+
+    def rows(self, period: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield one row per tenant for the period (YYYY-MM, default current).
+
+        Each scan segment runs in its own thread and hands finished pages to
+        the caller through a bounded queue; a slow consumer pauses the scan.
+        """
+        period = period or datetime.now(timezone.utc).strftime("%Y-%m")
+        pages: queue.Queue = queue.Queue(maxsize=2 * self.segments)
+        stop = threading.Event()
+
+        def put(page) -> bool:
+            while not stop.is_set():
+                try:
+                    pages.put(page, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def scan(segment: int) -> None:
+            try:
+                for tenants in self._scan_segment(segment):
+                    if not put(self._page_rows(tenants, period)):
+                        return
+            except Exception as e:
+                put(e)
+            finally:
+                put(_DONE)
+
+        with ThreadPoolExecutor(max_workers=self.segments) as pool:
+            for segment in range(self.segments):
+                pool.submit(scan, segment)
+            try:
+                remaining = self.segments
+                while remaining:
+                    page = pages.get()
+                    if page is _DONE:
+                        remaining -= 1
+                    elif isinstance(page, Exception):
+                        raise page
+                    else:
+                        yield from page
+            finally:
+                # Unblock scanners if the caller stopped early or a segment failed
+                stop.set()
+
+    def write(self, fileobj: BinaryIO, period: Optional[str] = None, fmt: str = "csv") -> Dict[str, Any]:
+        """
+        Stream the report to a binary file object.
+
+        Returns:
+            Stats: rows, bytes and seconds
+
+        Raises:
+            ValueError: Unknown format
+        """
+        if fmt not in REPORT_FORMATS:
+            raise ValueError(f"Unknown report format: {fmt}")
+
+        started = time.monotonic()
+        rows = 0
+        written = 0
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=REPORT_COLUMNS) if fmt == "csv" else None
+        if writer:
+            writer.writeheader()
+
+        for row in self.rows(period):
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(row, separators=(",", ":")) + "\n")
+            rows += 1
+            if buffer.tell() >= 64 * 1024:
+                written += self._flush(buffer, fileobj)
+        written += self._flush(buffer, fileobj)
+
+        return {
+            "rows": rows,
+            "bytes": written,
+            "seconds": round(time.monotonic() - started, 3)
+        }
+
+    def export(self, period: Optional[str] = None, fmt: str = "csv", key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Stream the report to S3 (USAGE_REPORT_BUCKET) with multipart upload.
+
+        Returns:
+            Stats as from write(), plus the location
+
+        Raises:
+            ValueError: Unknown format or no report bucket configured
+        """
+        if fmt not in REPORT_FORMATS:
+            raise ValueError(f"Unknown report format: {fmt}")
+        if not self.bucket:
+            raise ValueError("USAGE_REPORT_BUCKET is not configured")
+
+        period = period or datetime.now(timezone.utc).strftime("%Y-%m")
+        key = key or f"usage-reports/{period}.{fmt}"
+        upload = MultipartUpload(
+            boto3.client("s3", region_name="us-east-1"),
+            self.bucket,
+            key,
+            8 * 1024 * 1024,
+            "text/csv" if fmt == "csv" else "application/x-ndjson"
+        )
+        try:
+            stats = self.write(upload, period, fmt)
+            upload.close()
+        except BaseException:
+            upload.abort()
+            raise
+        return {"location": f"s3://{self.bucket}/{key}", **stats}
+
+    def _scan_segment(self, segment: int) -> Iterator[List[Dict[str, Any]]]:
+        """Pages of tenant records from one scan segment."""
+        # Low-level clients are thread-safe; the resource's client deserializes items
+        client = self.metering.dynamodb.meta.client
+        kwargs = {
+            "TableName": self.tenants_table_name,
+            "Segment": segment,
+            "TotalSegments": self.segments,
+            "Limit": self.page_size
+        }
+        while True:
+            response = client.scan(**kwargs)
+            # Tenants tables keyed by (tenant_id, sk) keep the record under sk = METADATA
+            tenants = [item for item in response.get("Items", []) if item.get("sk", "METADATA") == "METADATA"]
+            if tenants:
+                yield tenants
+            if "LastEvaluatedKey" not in response:
+                return
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def _page_rows(self, tenants: List[Dict[str, Any]], period: str) -> List[Dict[str, Any]]:
+        metering = self.metering
+        keys = {
+            tenant["tenant_id"]: metering.shard_keys(f"{tenant['tenant_id']}#{period}",
+                                                     metering.shard_count(tenant["tenant_id"]))
+            for tenant in tenants
+        }
+        items = {
+            item["period_key"]: item
+            for item in metering.batch_get_usage([key for shard_keys in keys.values() for key in shard_keys], consistent=False)
+        }
+
+        rows = []
+        for tenant in tenants:
+            tenant_id = tenant["tenant_id"]
+            usage = metering.combine_shards([items[k] for k in keys[tenant_id] if k in items], len(keys[tenant_id]))
+            tier = (usage.get("tier") or tenant.get("subscription_tier") or "free").lower()
+            count = int(usage.get("job_count", 0))
+            quota = int(usage["quota_limit"]) if "quota_limit" in usage else TierQuota[tier.upper()].value
+            rows.append({
+                "tenant_id": tenant_id,
+                "name": tenant.get("name"),
+                "email": tenant.get("email"),
+                "status": tenant.get("status"),
+                "tier": tier,
+                "period": period,
+                "job_count": count,
+                "quota": quota,
+                "usage_percent": round(count / quota * 100, 1) if quota > 0 else 0,
+                "billable_jobs": metering.billable_job_count(usage) if usage else 0,
+                "stripe_reported": sum(int(items[k].get("stripe_reported", 0)) for k in keys[tenant_id] if k in items),
+                **{d.value: float(usage.get(d.value, 0)) for d in MeteringDimension}
+            })
+        return rows
+
+    @staticmethod
+    def _flush(buffer: io.StringIO, fileobj: BinaryIO) -> int:
+        data = buffer.getvalue().encode()
+        if data:
+            fileobj.write(data)
+        buffer.seek(0)
+        buffer.truncate()
+        return len(data)
+
+
+def _seed(metering: MeteringService, count: int, period: str) -> None:
+    tiers = ["free", "pro", "enterprise"]
+    tenants = metering.dynamodb.Table(metering.tenants_table_name)
+    with tenants.batch_writer() as tenant_batch, metering.usage_table.batch_writer() as usage_batch:
+        for i in range(count):
+            tenant_id = f"ten_{i:06d}"
+            tier = tiers[i % len(tiers)]
+            tenant_batch.put_item(Item={
+                "tenant_id": tenant_id,
+                "name": f"Tenant {i}",
+                "email": f"tenant{i}@example.com",
+                "status": "active",
+                "subscription_tier": tier
+            })
+            if random.random() < 0.8:
+                usage_batch.put_item(Item={
+                    "period_key": f"{tenant_id}#{period}",
+                    "tenant_id": tenant_id,
+                    "job_count": random.randint(0, TierQuota[tier.upper()].value // 10),
+                    "quota_limit": TierQuota[tier.upper()].value,
+                    "tier": tier
+                })
+
+
+def _create_local_tables(metering: MeteringService) -> None:
+    dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+    for name, key in ((metering.tenants_table_name, "tenant_id"), (metering.usage_table_name, "period_key")):
+        dynamodb.create_table(
+            TableName=name,
+            KeySchema=[{"AttributeName": key, "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": key, "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Write the usage report for every tenant")
+    parser.add_argument("--period", help="Billing period (YYYY-MM), default current")
+    parser.add_argument("--format", choices=REPORT_FORMATS, default="csv")
+    parser.add_argument("--output", help="File to write (default: upload to USAGE_REPORT_BUCKET)")
+    parser.add_argument("--segments", type=int, help="Parallel scan segments")
+    parser.add_argument("--moto", action="store_true", help="Run against in-memory AWS (moto)")
+    parser.add_argument("--seed", type=int, default=0, help="With --moto, tenants to generate first")
+    args = parser.parse_args(argv)
+
+    def run():
+        metering = MeteringService()
+        if args.moto:
+            _create_local_tables(metering)
+            if args.seed:
+                _seed(metering, args.seed, args.period or datetime.now(timezone.utc).strftime("%Y-%m"))
+        report = UsageReport(metering, segments=args.segments)
+        if args.output:
+            with open(args.output, "wb") as f:
+                return report.write(f, args.period, args.format)
+        return report.export(args.period, args.format)
+
+    if args.moto:
+        from moto import mock_aws
+        with mock_aws():
+            stats = run()
+    else:
+        stats = run()
+    print(json.dumps(stats, indent=2))
+    return stats
+
+
+if __name__ == "__main__":
+    main()
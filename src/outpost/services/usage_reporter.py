@@ -0,0 +1,225 @@
+"""
+Batched Stripe metered-usage reporting for Outpost.
+
+record_job_usage only increments DynamoDB counters. On a schedule,
+UsageReporter reports what the counters have gained since the last report,
+summed per Stripe subscription item, so Stripe sees one usage record per
+subscription item per run instead of one per job.
+
+Each usage item carries stripe_reported (units Stripe has acknowledged) and,
+while a report is in flight, stripe_pending (the job_count being reported).
+Units held by unexpired quota leases are not reported until they are used
+(see MeteringService.billable_job_count).
+A report is claimed, sent with an idempotency key derived from exactly those
+ranges, then committed. A run that dies after Stripe accepted the report
+leaves stripe_pending behind, and the next run replays the same ranges with
+the same key, so Stripe does not count them twice.
+"""
+import hashlib
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, Optional, List, Tuple
+
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+from src.outpost.services.metering import MeteringService
+
+
+class UsageReporter:
+    """
+    Reports usage deltas from the usage table to Stripe.
+
+    Features:
+    - One aggregated usage record per subscription item per run
+    - Idempotency keys so retries never double-bill
+    - Claim/commit on each usage item, safe with overlapping runs
+    - Reconciliation of local counters against reported and Stripe totals
+    """
+
+    def __init__(self, metering: Optional[MeteringService] = None, stripe_module=None):
+        self.metering = metering or MeteringService()
+        self.usage_table = self.metering.usage_table
+        self.stripe = stripe_module or self.metering.stripe
+
+    def default_periods(self) -> List[str]:
+        """The current period and the previous one, for increments that landed at month end."""
+        now = datetime.now(timezone.utc)
+        previous = now.replace(day=1) - timedelta(days=1)
+        return [now.strftime("%Y-%m"), previous.strftime("%Y-%m")]
+
+    def report(self, periods: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Report unreported usage for the given periods (default: current and previous).
+
+        Returns:
+            Counts of subscription items reported or failed, and units reported
+        """
+        if not self.stripe:
+            return {"skipped": "STRIPE_METERING_ENABLED is false"}
+
+        result = {"subscription_items": 0, "reported": 0, "units": 0, "failed": 0, "skipped": 0}
+        for subscription_item_id, items in self._items_by_subscription_item(periods).items():
+            result["subscription_items"] += 1
+            outcome, units = self.report_subscription_item(subscription_item_id, items)
+            result[outcome] += 1
+            result["units"] += units
+        return result
+
+    def report_subscription_item(self, subscription_item_id: str, items: List[Dict[str, Any]]) -> Tuple[str, int]:
+        """
+        Report the usage items of one subscription item as a single usage record.
+
+        Returns:
+            ("reported", units), ("failed", 0) or ("skipped", 0)
+        """
+        in_flight = [item for item in items if "stripe_pending" in item]
+        if in_flight:
+            # Replay exactly what an earlier run claimed so the idempotency key matches
+            ranges = [(item["period_key"], int(item.get("stripe_reported", 0)), int(item["stripe_pending"]))
+                      for item in in_flight]
+        else:
+            ranges = [r for r in (self._claim(item) for item in items) if r]
+        if not ranges:
+            return "skipped", 0
+
+        units = sum(to - start for _, start, to in ranges)
+        try:
+            self.stripe.SubscriptionItem.create_usage_record(
+                subscription_item_id,
+                quantity=units,
+                timestamp=int(datetime.now(timezone.utc).timestamp()),
+                action="increment",
+                idempotency_key=self.idempotency_key(subscription_item_id, ranges)
+            )
+        except Exception as e:
+            # Claims stay in place; the next run retries with the same key
+            print(f"Failed to report usage for {subscription_item_id}: {e}")
+            return "failed", 0
+
+        for period_key, _, to in ranges:
+            self._commit(period_key, to)
+        return "reported", units
+
+    @staticmethod
+    def idempotency_key(subscription_item_id: str, ranges: List[Tuple[str, int, int]]) -> str:
+        material = "|".join([subscription_item_id] + [f"{k}:{start}:{to}" for k, start, to in sorted(ranges)])
+        return f"outpost-usage-{hashlib.sha256(material.encode()).hexdigest()[:40]}"
+
+    def reconcile(self, periods: Optional[List[str]] = None, check_stripe: bool = False) -> List[Dict[str, Any]]:
+        """
+        Compare local counters with what has been reported, per subscription item.
+
+        Defaults to the current period only. With check_stripe, also fetch Stripe's usage summary for the
+        subscription's current billing period (which matches the local
+        period only when the billing cycle is anchored to the 1st).
+
+        Returns:
+            One row per subscription item; "in_sync" is False while any
+            usage is unreported or Stripe's total disagrees
+        """
+        rows = []
+        periods = periods or self.default_periods()[:1]
+        for subscription_item_id, items in self._items_by_subscription_item(periods, only_pending=False).items():
+            local = sum(self.metering.billable_job_count(item) for item in items)
+            reported = sum(int(item.get("stripe_reported", 0)) for item in items)
+            row = {
+                "subscription_item_id": subscription_item_id,
+                "tenant_ids": sorted({item["tenant_id"] for item in items if item.get("tenant_id")}),
+                "local": local,
+                "reported": reported,
+                "unreported": local - reported,
+                "in_flight": sum(1 for item in items if "stripe_pending" in item)
+            }
+            if check_stripe and self.stripe:
+                summaries = self.stripe.SubscriptionItem.list_usage_record_summaries(subscription_item_id, limit=1)
+                row["stripe"] = summaries.data[0].total_usage if summaries.data else 0
+            row["in_sync"] = row["unreported"] == 0 and row.get("stripe", reported) == reported
+            rows.append(row)
+        return rows
+
+    def _items_by_subscription_item(
+        self,
+        periods: Optional[List[str]],
+        only_pending: bool = True
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Fetch the periods' usage items of every subscribed tenant and group them by subscription item.
+
+        Period keys are deterministic ("tenant#YYYY-MM" and its shards), so
+        items are read by key with BatchGetItem rather than found by scanning
+        the whole usage table.
+        """
+        periods = periods or self.default_periods()
+        tenants = self.subscribed_tenants()
+        keys = [
+            key
+            for tenant_id in tenants
+            for period in periods
+            for key in self.metering.shard_keys(f"{tenant_id}#{period}", self.metering.shard_count(tenant_id))
+        ]
+
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for item in self.metering.batch_get_usage(keys):
+            unreported = self.metering.billable_job_count(item) > int(item.get("stripe_reported", 0))
+            if only_pending and not (unreported or "stripe_pending" in item):
+                continue
+            tenant_id = item.get("tenant_id") or item["period_key"].split("#")[0]
+            # The item keeps the subscription item it was seeded with, if any
+            subscription_item_id = item.get("stripe_subscription_item_id") or tenants[tenant_id]
+            grouped.setdefault(subscription_item_id, []).append(item)
+        return grouped
+
+    def subscribed_tenants(self) -> Dict[str, str]:
+        """
+        Tenants with a Stripe subscription item.
+
+        Returns:
+            Dict of tenant_id to stripe_subscription_item_id
+        """
+        tenants = {}
+        kwargs = {
+            "FilterExpression": Attr("stripe_subscription_item_id").exists(),
+            "ProjectionExpression": "tenant_id, sk, stripe_subscription_item_id"
+        }
+        while True:
+            response = self.metering.tenants_table.scan(**kwargs)
+            for item in response.get("Items", []):
+                # Tenants tables keyed by (tenant_id, sk) keep the record under sk = METADATA
+                if item.get("sk", "METADATA") == "METADATA":
+                    tenants[item["tenant_id"]] = item["stripe_subscription_item_id"]
+            if "LastEvaluatedKey" not in response:
+                return tenants
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def _claim(self, item: Dict[str, Any]) -> Optional[Tuple[str, int, int]]:
+        """Mark an item's unreported range as in flight; None if there is none or another run has it."""
+        start = int(item.get("stripe_reported", 0))
+        to = self.metering.billable_job_count(item)
+        if to <= start:
+            return None
+        try:
+            self.usage_table.update_item(
+                Key={"period_key": item["period_key"]},
+                UpdateExpression="SET stripe_pending = :to",
+                ConditionExpression="attribute_not_exists(stripe_pending) AND "
+                                    "(attribute_not_exists(stripe_reported) OR stripe_reported = :start)",
+                ExpressionAttributeValues={":to": to, ":start": start}
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return None
+            raise
+        return item["period_key"], start, to
+
+    def _commit(self, period_key: str, to: int) -> None:
+        try:
+            self.usage_table.update_item(
+                Key={"period_key": period_key},
+                UpdateExpression="SET stripe_reported = :to, stripe_reported_at = :ts REMOVE stripe_pending",
+                ConditionExpression="stripe_pending = :to",
+                ExpressionAttributeValues={":to": to, ":ts": datetime.now(timezone.utc).isoformat()}
+            )
+        except ClientError as e:
+            # Reset while the report was in flight; the reported units stay billed
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
@@ -0,0 +1,84 @@
+"""
+Micro-batching of short jobs for Outpost workers.
+
+Groups queued jobs that share a tenant and repository so they can run in a
+single workspace. Batch size and the time spent waiting to fill a batch are
+both bounded to protect job latency.
+"""
+import json
+import os
+import time
+from typing import Dict, Any, List, Tuple, Callable
+
+
+class JobBatcher:
+    """
+    Groups SQS job messages into batches for Worker.execute_batch.
+
+    Only jobs submitted with batchable=True are grouped; every other message
+    is returned as a batch of one so it runs exactly as before.
+    """
+
+    def __init__(self, max_size: int = None, max_wait_seconds: float = None):
+        self.max_size = max_size or int(os.environ.get("WORKER_BATCH_MAX_SIZE", "1"))
+        self.max_wait_seconds = max_wait_seconds if max_wait_seconds is not None else float(
+            os.environ.get("WORKER_BATCH_MAX_WAIT_SECONDS", "2")
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 1
+
+    def batch_key(self, body: Dict[str, Any]) -> Tuple[str, str]:
+        """Jobs with the same tenant and repository can share a workspace."""
+        return body["tenant_id"], body.get("repo") or ""
+
+    def collect(self, receive: Callable[[int, int], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Receive messages until a batch can be filled or the wait budget runs out.
+
+        Args:
+            receive: Callable(max_messages, wait_seconds) returning SQS messages
+
+        Returns:
+            All messages received during this collection window
+        """
+        messages = receive(min(10, self.max_size), 20)
+        if not self.enabled or not messages:
+            return messages
+
+        deadline = time.monotonic() + self.max_wait_seconds
+        while len(messages) < self.max_size and time.monotonic() < deadline:
+            if not any(json.loads(m["Body"]).get("batchable") for m in messages):
+                break
+            more = receive(min(10, self.max_size - len(messages)), 0)
+            if not more:
+                break
+            messages.extend(more)
+        return messages
+
+    def group(self, messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Split messages into batches, preserving arrival order within each batch.
+
+        Returns:
+            List of batches; each batch holds at most max_size messages
+        """
+        batches: List[List[Dict[str, Any]]] = []
+        open_batches: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+
+        for message in messages:
+            body = json.loads(message["Body"])
+            if not self.enabled or not body.get("batchable"):
+                batches.append([message])
+                continue
+
+            key = self.batch_key(body)
+            batch = open_batches.get(key)
+            if batch is None or len(batch) >= self.max_size:
+                batch = []
+                open_batches[key] = batch
+                batches.append(batch)
+            batch.append(message)
+
+        return batches
@@ -0,0 +1,106 @@
+"""
+Workspace checkpoints for interrupted Outpost jobs.
+
+When a worker on Fargate Spot receives SIGTERM it has about two minutes
+before the task is stopped. The in-flight job's workspace and agent state
+are snapshotted here so a requeued job can resume instead of starting over.
+
+Snapshots go to S3 when CHECKPOINT_BUCKET is set, otherwise to a local
+directory (CHECKPOINT_DIR) that stands in for S3 in development and tests.
+"""
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+from typing import Dict, Any, Tuple
+
+import boto3
+
+
+class CheckpointStore:
+    """
+    Saves and restores job workspace snapshots.
+
+    A checkpoint is a gzipped tarball of the workspace plus a JSON state
+    document (steps, elapsed time, attempt). The returned pointer is an
+    s3:// URI or a local file path and is carried on the requeued message.
+    """
+
+    def __init__(self, bucket: str = None, local_dir: str = None):
+        self.bucket = bucket or os.environ.get("CHECKPOINT_BUCKET")
+        self.local_dir = local_dir or os.environ.get("CHECKPOINT_DIR", "/tmp/outpost/checkpoints")
+        self.s3 = boto3.client("s3", region_name="us-east-1") if self.bucket else None
+
+    def save(self, tenant_id: str, job_id: str, attempt: int, workspace_dir: str, state: Dict[str, Any]) -> str:
+        """
+        Snapshot a workspace and its state.
+
+        Returns:
+            Checkpoint pointer (s3://bucket/key or local path)
+        """
+        key = f"checkpoints/{tenant_id}/{job_id}/{attempt}.tar.gz"
+
+        with tempfile.TemporaryFile() as archive:
+            with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+                tar.add(workspace_dir, arcname="workspace")
+                payload = json.dumps(state).encode()
+                info = tarfile.TarInfo("state.json")
+                info.size = len(payload)
+                tar.addfile(info, io.BytesIO(payload))
+            archive.seek(0)
+
+            if self.s3:
+                self.s3.upload_fileobj(archive, self.bucket, key)
+                return f"s3://{self.bucket}/{key}"
+
+            path = os.path.join(self.local_dir, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                shutil.copyfileobj(archive, f)
+            return path
+
+    def restore(self, pointer: str, workspace_dir: str) -> Dict[str, Any]:
+        """
+        Restore a checkpoint into workspace_dir (replacing its contents).
+
+        Returns:
+            The state document saved with the checkpoint
+        """
+        with tempfile.TemporaryFile() as archive:
+            if pointer.startswith("s3://"):
+                bucket, key = self._parse_s3(pointer)
+                s3 = self.s3 or boto3.client("s3", region_name="us-east-1")
+                s3.download_fileobj(bucket, key, archive)
+            else:
+                with open(pointer, "rb") as f:
+                    shutil.copyfileobj(f, archive)
+            archive.seek(0)
+
+            shutil.rmtree(workspace_dir, ignore_errors=True)
+            extract_dir = tempfile.mkdtemp(dir=os.path.dirname(workspace_dir))
+            try:
+                with tarfile.open(fileobj=archive, mode="r:gz") as tar:
+                    tar.extractall(extract_dir, filter="data")
+                os.rename(os.path.join(extract_dir, "workspace"), workspace_dir)
+                with open(os.path.join(extract_dir, "state.json")) as f:
+                    return json.load(f)
+            finally:
+                shutil.rmtree(extract_dir, ignore_errors=True)
+
+    def delete(self, pointer: str) -> None:
+        """Remove a checkpoint once the job no longer needs it (best effort)."""
+        try:
+            if pointer.startswith("s3://"):
+                bucket, key = self._parse_s3(pointer)
+                s3 = self.s3 or boto3.client("s3", region_name="us-east-1")
+                s3.delete_object(Bucket=bucket, Key=key)
+            elif os.path.exists(pointer):
+                os.remove(pointer)
+        except Exception as e:
+            print(f"Failed to delete checkpoint {pointer}: {e}")
+
+    def _parse_s3(self, pointer: str) -> Tuple[str, str]:
+        bucket, _, key = pointer[len("s3://"):].partition("/")
+        return bucket, key
@@ -0,0 +1,228 @@
+"""
+Per-tenant running-job limits for Outpost workers.
+
+Monthly quotas cap how many jobs a tenant runs, not how many run at once.
+Before running a job, a worker takes a slot from the tenant's semaphore item
+in the concurrency table. The slot is a lease: the heartbeat thread renews
+it while the job runs and the worker releases it when the job finishes. A
+slot whose lease has expired (its worker died) is reclaimed by the next
+worker that finds the tenant at its limit, so no reaper is needed.
+"""
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Callable, Set, Tuple
+
+import boto3
+from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeDeserializer
+
+from src.outpost.services.tenant_cache import TenantCache
+
+# Jobs running at once by subscription tier
+TIER_CONCURRENCY_LIMITS: Dict[str, int] = {
+    "FREE": 2,
+    "PRO": 10,
+    "ENTERPRISE": 100
+}
+
+# Semaphore item attributes for held slots: slot_<holder> = lease expiry (epoch seconds)
+SLOT_ATTRIBUTE_PREFIX = "slot_"
+
+
+def _parse_concurrency_limits(value: str) -> Dict[str, int]:
+    """Parse CONCURRENCY_LIMITS overrides, e.g. "pro=20,free=1"."""
+    limits = {}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        tier, _, limit = part.partition("=")
+        limits[tier.upper()] = int(limit)
+    return limits
+
+
+class ConcurrencyLimiter:
+    """
+    DynamoDB semaphore per tenant, sized by subscription tier.
+
+    Item: tenant_id, running (slots held), one slot_<holder> attribute per
+    held slot, expires_at (TTL, so idle tenants' items are cleaned up).
+    Acquiring is one conditional update (running < limit) that adds the
+    slot and increments running together; releasing and reclaiming remove
+    a slot and decrement running in one update, so the two never drift.
+
+    DynamoDB errors fail open: jobs keep running if the table is unavailable.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, int]] = None,
+        lease_seconds: Optional[int] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        self.dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+        self.table = self.dynamodb.Table(os.environ.get("CONCURRENCY_TABLE", "outpost-concurrency-prod"))
+        self.tenants_table_name = os.environ.get("TENANTS_TABLE", "outpost-tenants-prod")
+        self.limits = {
+            **TIER_CONCURRENCY_LIMITS,
+            **(limits if limits is not None else _parse_concurrency_limits(os.environ.get("CONCURRENCY_LIMITS", "")))
+        }
+        # Several heartbeat intervals, so one missed beat does not lose the slot
+        self.lease_seconds = lease_seconds or int(os.environ.get("CONCURRENCY_LEASE_SECONDS", "120"))
+        self._clock = clock
+        self._held: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+
+    def limit_for(self, tier: Optional[str]) -> int:
+        return self.limits.get((tier or "free").upper(), self.limits["FREE"])
+
+    def tier_for(self, tenant_id: str) -> str:
+        """The tenant's subscription tier, from the process-wide tenant cache."""
+        def load(tid):
+            table = self.dynamodb.Table(self.tenants_table_name)
+            return table.get_item(Key={"tenant_id": tid}).get("Item")
+
+        try:
+            tenant = TenantCache.for_table(self.tenants_table_name).get(tenant_id, load)
+        except Exception:
+            tenant = None
+        return (tenant or {}).get("subscription_tier", "free")
+
+    def acquire(self, tenant_id: str, holder: str, tier: Optional[str] = None) -> bool:
+        """
+        Take one of the tenant's slots for holder (e.g. "<worker_id>#<job_id>").
+
+        At the limit, slots with expired leases are reclaimed and the
+        acquire retried. Acquiring a slot the holder already has renews it.
+
+        Returns:
+            True if the slot is held, False if the tenant is at its limit
+        """
+        limit = self.limit_for(tier or self.tier_for(tenant_id))
+        slot = f"{SLOT_ATTRIBUTE_PREFIX}{holder}"
+        for _ in range(3):
+            now = int(self._clock())
+            try:
+                self.table.update_item(
+                    Key={"tenant_id": tenant_id},
+                    UpdateExpression="SET #slot = :lease, expires_at = :ttl ADD running :one",
+                    ConditionExpression="attribute_not_exists(#slot) AND "
+                                        "(attribute_not_exists(running) OR running < :limit)",
+                    ExpressionAttributeNames={"#slot": slot},
+                    ExpressionAttributeValues={
+                        ":lease": now + self.lease_seconds,
+                        ":ttl": now + self.lease_seconds + 24 * 60 * 60,
+                        ":one": 1,
+                        ":limit": limit
+                    },
+                    ReturnValuesOnConditionCheckFailure="ALL_OLD"
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    return self._fail_open(tenant_id, holder, e)
+                deserializer = TypeDeserializer()
+                current = {k: deserializer.deserialize(v) for k, v in (e.response.get("Item") or {}).items()}
+                if slot in current:
+                    # A redelivered message for a job this worker already holds a slot for
+                    self._track(tenant_id, holder)
+                    return self._renew_slot(tenant_id, holder)
+                if not self._reclaim(tenant_id, current, now):
+                    return False
+                continue
+            except Exception as e:
+                return self._fail_open(tenant_id, holder, e)
+
+            self._track(tenant_id, holder)
+            return True
+        return False
+
+    def release(self, tenant_id: str, holder: str) -> None:
+        """Give a slot back (best effort; an unreleased slot expires and is reclaimed)."""
+        with self._lock:
+            self._held.discard((tenant_id, holder))
+        try:
+            self.table.update_item(
+                Key={"tenant_id": tenant_id},
+                UpdateExpression="REMOVE #slot ADD running :minus_one",
+                ConditionExpression="attribute_exists(#slot)",
+                ExpressionAttributeNames={"#slot": f"{SLOT_ATTRIBUTE_PREFIX}{holder}"},
+                ExpressionAttributeValues={":minus_one": -1}
+            )
+        except ClientError as e:
+            # Already reclaimed after its lease expired
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                print(f"Failed to release concurrency slot {holder} for {tenant_id}: {e}")
+        except Exception as e:
+            print(f"Failed to release concurrency slot {holder} for {tenant_id}: {e}")
+
+    def renew(self) -> None:
+        """Extend the lease of every slot this worker holds; called with each heartbeat."""
+        with self._lock:
+            held = list(self._held)
+        for tenant_id, holder in held:
+            self._renew_slot(tenant_id, holder)
+
+    def held(self) -> int:
+        with self._lock:
+            return len(self._held)
+
+    def _renew_slot(self, tenant_id: str, holder: str) -> bool:
+        now = int(self._clock())
+        try:
+            self.table.update_item(
+                Key={"tenant_id": tenant_id},
+                UpdateExpression="SET #slot = :lease, expires_at = :ttl",
+                ConditionExpression="attribute_exists(#slot)",
+                ExpressionAttributeNames={"#slot": f"{SLOT_ATTRIBUTE_PREFIX}{holder}"},
+                ExpressionAttributeValues={
+                    ":lease": now + self.lease_seconds,
+                    ":ttl": now + self.lease_seconds + 24 * 60 * 60
+                }
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                # Reclaimed after a long stall; the job keeps running but no longer counts
+                print(f"Concurrency slot {holder} for {tenant_id} was reclaimed")
+                with self._lock:
+                    self._held.discard((tenant_id, holder))
+                return False
+            print(f"Failed to renew concurrency slot {holder} for {tenant_id}: {e}")
+        except Exception as e:
+            print(f"Failed to renew concurrency slot {holder} for {tenant_id}: {e}")
+        return True
+
+    def _reclaim(self, tenant_id: str, item: Dict[str, Any], now: int) -> bool:
+        """
+        Remove slots whose lease expired before now.
+
+        Each removal is conditional on the expiry that was read, so a slot
+        renewed in the meantime, or reclaimed by another worker, is left alone.
+
+        Returns:
+            True if any slot was reclaimed
+        """
+        reclaimed = False
+        for name, lease in item.items():
+            if not name.startswith(SLOT_ATTRIBUTE_PREFIX) or int(lease) > now:
+                continue
+            try:
+                self.table.update_item(
+                    Key={"tenant_id": tenant_id},
+                    UpdateExpression="REMOVE #slot ADD running :minus_one",
+                    ConditionExpression="#slot = :lease",
+                    ExpressionAttributeNames={"#slot": name},
+                    ExpressionAttributeValues={":lease": lease, ":minus_one": -1}
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    print(f"Failed to reclaim concurrency slot {name} for {tenant_id}: {e}")
+                continue
+            print(f"Reclaimed expired concurrency slot {name[len(SLOT_ATTRIBUTE_PREFIX):]} for {tenant_id}")
+            reclaimed = True
+        return reclaimed
+
+    def _track(self, tenant_id: str, holder: str) -> None:
+        with self._lock:
+            self._held.add((tenant_id, holder))
+
+    def _fail_open(self, tenant_id: str, holder: str, error: Exception) -> bool:
+        print(f"Concurrency limiter unavailable, running {holder} for {tenant_id}: {error}")
+        return True
@@ -0,0 +1,442 @@
+"""
+Host-level dependency cache for Outpost workers.
+
+Keeps installed dependency directories (node_modules, .venv, ...) keyed by
+lockfile content hash and materializes them into job workspaces as
+copy-on-write clones where the filesystem supports them (btrfs, XFS), plain
+copies otherwise. Workspaces never share inodes with the cache, so in-place
+edits (patch-package, postinstall scripts, sed -i) cannot change an entry.
+Package-manager download caches are shared between jobs through environment
+variables. Entries are evicted least-recently-used once the cache exceeds
+its disk budget.
+
+Entries are scoped per tenant so one tenant can never receive dependency
+trees produced by another tenant's job, and per runtime (WORKER_IMAGE plus
+the interpreter's version, ABI and platform) so trees with native modules
+are never restored onto a runtime they were not built for. Python virtual
+environments are not cached: they hold absolute paths to the workspace
+they were created in. pip, uv and poetry still share their download caches.
+
+A job's lockfile usually appears only once its command has cloned the
+repository, so the worker also puts `outpost-restore-deps` on the command's
+PATH (see write_restore_hook): calling it from the workspace after the clone
+restores cached dependency directories, e.g.
+
+    git clone $REPO . && outpost-restore-deps && npm install
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import platform
+import shlex
+import shutil
+import sys
+import sysconfig
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List
+
+
+# Lockfile -> dependency directory it produces (relative to the lockfile). Only
+# trees that can be moved between workspaces; virtualenvs embed their own path.
+DEPENDENCY_MANIFESTS = {
+    "package-lock.json": "node_modules",
+    "yarn.lock": "node_modules",
+    "pnpm-lock.yaml": "node_modules",
+    "Gemfile.lock": "vendor/bundle",
+}
+
+# Package-manager cache environment variable -> cache subdirectory
+PACKAGE_MANAGER_CACHES = {
+    "npm_config_cache": "npm",
+    "YARN_CACHE_FOLDER": "yarn",
+    "PIP_CACHE_DIR": "pip",
+    "UV_CACHE_DIR": "uv",
+    "POETRY_CACHE_DIR": "poetry",
+    "BUNDLE_USER_CACHE": "bundler",
+}
+
+
+# ioctl(FICLONE): share extents copy-on-write (Linux btrfs, XFS with reflink)
+FICLONE = 0x40049409
+
+# Written by outpost-restore-deps for the worker to read back after the command
+RESTORE_RESULT_FILE = os.path.join(".outpost", "deps-restore.json")
+
+
+def _clone_or_copy(src: str, dst: str) -> str:
+    """Copy a file as a copy-on-write clone, falling back to a plain copy."""
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+def runtime_id() -> str:
+    """
+    Identify the runtime dependency trees are built on.
+
+    WORKER_IMAGE should be an immutable image reference (digest or build
+    id); the interpreter's version, ABI and platform are always included.
+    """
+    return "|".join([
+        os.environ.get("WORKER_IMAGE", ""),
+        sys.implementation.cache_tag or "",
+        sysconfig.get_config_var("SOABI") or "",
+        platform.machine(),
+        "-".join(platform.libc_ver())
+    ])
+
+
+def _install_seconds(path: str) -> float:
+    """
+    How long an install took to write a directory: first to last file change.
+
+    Change times (unlike mtimes, which package managers often pin) record
+    when each file was written, so later work in the job is not counted.
+    """
+    first = last = None
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            try:
+                changed = os.lstat(os.path.join(root, name)).st_ctime
+            except OSError:
+                continue
+            first = changed if first is None else min(first, changed)
+            last = changed if last is None else max(last, changed)
+    return last - first if first is not None else 0.0
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class DependencyCache:
+    """
+    LRU cache of installed dependency directories shared by all jobs on a host.
+
+    Features:
+    - Cache keys derived from tenant, runtime, lockfile name and lockfile content hash
+    - Copy-on-write materialization (copy fallback) into workspaces
+    - Tenant-scoped package-manager caches (npm, pip, yarn, ...)
+    - LRU eviction within a disk budget (DEP_CACHE_MAX_BYTES)
+    - Per-agent hit/miss and time-saved statistics
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.enabled = os.environ.get("DEP_CACHE_ENABLED", "true").lower() == "true"
+        self.root = root or os.environ.get("DEP_CACHE_DIR", "/tmp/outpost/cache")
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.environ.get("DEP_CACHE_MAX_BYTES", str(20 * 1024 ** 3))
+        )
+        self.entries_dir = os.path.join(self.root, "entries")
+        self.index_path = os.path.join(self.root, "index.json")
+        self.runtime = runtime_id()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def compute_key(self, tenant_id: str, lockfile_path: str) -> str:
+        """
+        Compute the cache key for a lockfile.
+
+        Format: sha256(tenant_id, runtime, lockfile name, lockfile contents)
+        """
+        digest = hashlib.sha256()
+        digest.update(tenant_id.encode())
+        digest.update(b"\0")
+        digest.update(self.runtime.encode())
+        digest.update(b"\0")
+        digest.update(os.path.basename(lockfile_path).encode())
+        digest.update(b"\0")
+        with open(lockfile_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def find_manifests(self, workspace_dir: str) -> List[Dict[str, str]]:
+        """Find lockfiles at the top level of a workspace."""
+        manifests = []
+        for lockfile, dep_dir in DEPENDENCY_MANIFESTS.items():
+            path = os.path.join(workspace_dir, lockfile)
+            if os.path.isfile(path):
+                manifests.append({
+                    "lockfile": path,
+                    "dep_dir": os.path.join(workspace_dir, dep_dir)
+                })
+        return manifests
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Return the cached directory for a key, or None on miss."""
+        path = os.path.join(self.entries_dir, key)
+        return path if os.path.isdir(path) else None
+
+    def entry(self, key: str) -> Dict[str, Any]:
+        """Index metadata (size, last_used, build_seconds) for a cached key."""
+        with self._index() as index:
+            return dict(index.get(key, {}))
+
+    def materialize(self, key: str, dest: str, merge: bool = False) -> bool:
+        """
+        Materialize a cached entry into dest (copy-on-write clone, copy fallback).
+
+        Args:
+            key: Cache key
+            dest: Destination directory
+            merge: Materialize into an existing directory instead of requiring a new one
+
+        Returns:
+            True if the entry existed and was materialized
+        """
+        src = self.lookup(key)
+        if not src or (os.path.exists(dest) and not merge):
+            return False
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copytree(src, dest, symlinks=True, copy_function=_clone_or_copy, dirs_exist_ok=merge)
+        with self._index() as index:
+            if key in index:
+                index[key]["last_used"] = time.time()
+        return True
+
+    def store(self, key: str, src: str, build_seconds: float = 0.0) -> bool:
+        """
+        Store a directory in the cache under key.
+
+        Args:
+            key: Cache key (see compute_key)
+            src: Directory to cache
+            build_seconds: Time it took to produce src (used for time-saved stats)
+
+        Returns:
+            True if a new entry was stored
+        """
+        if not os.path.isdir(src) or self.lookup(key):
+            return False
+
+        os.makedirs(self.entries_dir, exist_ok=True)
+        tmp = os.path.join(self.entries_dir, f".tmp-{key}-{os.getpid()}-{threading.get_ident()}")
+        shutil.copytree(
+            src,
+            tmp,
+            symlinks=True,
+            copy_function=_clone_or_copy,
+            ignore=shutil.ignore_patterns(".outpost")
+        )
+        try:
+            os.rename(tmp, os.path.join(self.entries_dir, key))
+        except OSError:
+            # Another worker stored the same key first
+            shutil.rmtree(tmp, ignore_errors=True)
+            return False
+
+        with self._index() as index:
+            index[key] = {
+                "size": _dir_size(os.path.join(self.entries_dir, key)),
+                "last_used": time.time(),
+                "build_seconds": build_seconds
+            }
+            self._evict(index)
+        return True
+
+    def restore(self, tenant_id: str, agent: str, workspace_dir: str) -> Dict[str, Any]:
+        """
+        Materialize cached dependency directories for every lockfile in a workspace.
+
+        Returns:
+            Dict with hits, misses and estimated seconds saved
+        """
+        result = {"hits": 0, "misses": 0, "seconds_saved": 0.0}
+        if not self.enabled:
+            return result
+
+        for manifest in self.find_manifests(workspace_dir):
+            if os.path.exists(manifest["dep_dir"]):
+                continue
+            started = time.monotonic()
+            try:
+                key = self.compute_key(tenant_id, manifest["lockfile"])
+                hit = self.materialize(key, manifest["dep_dir"])
+            except OSError as e:
+                # A broken cache must never fail the job
+                print(f"Dependency cache restore failed: {e}")
+                shutil.rmtree(manifest["dep_dir"], ignore_errors=True)
+                hit = False
+            if hit:
+                elapsed = time.monotonic() - started
+                build_seconds = self.entry(key).get("build_seconds", 0.0)
+                result["hits"] += 1
+                result["seconds_saved"] += max(0.0, build_seconds - elapsed)
+            else:
+                result["misses"] += 1
+
+        self._record(agent, result)
+        return result
+
+    def save(self, tenant_id: str, workspace_dir: str, build_seconds: Optional[float] = None) -> int:
+        """
+        Store dependency directories produced in a workspace.
+
+        Args:
+            tenant_id: Tenant identifier
+            workspace_dir: Workspace holding the lockfiles
+            build_seconds: Install time for every directory (default: measured
+                per directory from its files' change times)
+
+        Returns:
+            Number of new cache entries stored
+        """
+        if not self.enabled:
+            return 0
+
+        stored = 0
+        for manifest in self.find_manifests(workspace_dir):
+            if not os.path.isdir(manifest["dep_dir"]):
+                continue
+            try:
+                key = self.compute_key(tenant_id, manifest["lockfile"])
+                if self.lookup(key):
+                    continue
+                seconds = build_seconds if build_seconds is not None else _install_seconds(manifest["dep_dir"])
+                if self.store(key, manifest["dep_dir"], seconds):
+                    stored += 1
+            except OSError as e:
+                print(f"Dependency cache save failed: {e}")
+        return stored
+
+    def write_restore_hook(self, tenant_id: str, agent: str, workspace_dir: str) -> Dict[str, str]:
+        """
+        Put an `outpost-restore-deps` command on the job's PATH.
+
+        The command restores this tenant's cached dependency directories
+        into the workspace it is run from, once the job has fetched its
+        lockfiles. Its hits are read back with collect_restore_result.
+
+        Returns:
+            Environment variables for the job (PATH)
+        """
+        if not self.enabled:
+            return {}
+        bin_dir = os.path.join(workspace_dir, ".outpost", "bin")
+        os.makedirs(bin_dir, exist_ok=True)
+        project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+        hook = os.path.join(bin_dir, "outpost-restore-deps")
+        with open(hook, "w") as f:
+            f.write("#!/bin/sh\n")
+            f.write(
+                f"PYTHONPATH={shlex.quote(project_root)} exec {shlex.quote(sys.executable)} -m "
+                f"src.outpost.worker.dep_cache --root {shlex.quote(self.root)} "
+                f"--tenant {shlex.quote(tenant_id)} --agent {shlex.quote(agent)} "
+                f"--result {shlex.quote(os.path.join(workspace_dir, RESTORE_RESULT_FILE))} "
+                f"\"${{1:-$PWD}}\"\n"
+            )
+        os.chmod(hook, 0o755)
+        return {"PATH": f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"}
+
+    def collect_restore_result(self, agent: str, workspace_dir: str) -> Dict[str, Any]:
+        """Hits and misses of outpost-restore-deps runs during a job (counted in stats)."""
+        path = os.path.join(workspace_dir, RESTORE_RESULT_FILE)
+        result = {"hits": 0, "misses": 0, "seconds_saved": 0.0}
+        try:
+            with open(path) as f:
+                for line in f:
+                    for name, value in json.loads(line).items():
+                        result[name] += value
+            os.remove(path)
+        except (OSError, ValueError, KeyError):
+            return result
+        self._record(agent, result)
+        return result
+
+    def package_manager_env(self, tenant_id: str) -> Dict[str, str]:
+        """Environment variables pointing package managers at tenant-scoped caches."""
+        if not self.enabled:
+            return {}
+
+        env = {}
+        for var, subdir in PACKAGE_MANAGER_CACHES.items():
+            path = os.path.join(self.root, "pm", tenant_id, subdir)
+            os.makedirs(path, exist_ok=True)
+            env[var] = path
+        return env
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-agent hit rate and time saved."""
+        with self._lock:
+            report = {}
+            for agent, s in self._stats.items():
+                lookups = s["hits"] + s["misses"]
+                report[agent] = {
+                    "hits": s["hits"],
+                    "misses": s["misses"],
+                    "hit_rate": round(s["hits"] / lookups, 3) if lookups else 0.0,
+                    "seconds_saved": round(s["seconds_saved"], 2)
+                }
+            return report
+
+    def _record(self, agent: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            s = self._stats.setdefault(agent, {"hits": 0, "misses": 0, "seconds_saved": 0.0})
+            s["hits"] += result["hits"]
+            s["misses"] += result["misses"]
+            s["seconds_saved"] += result["seconds_saved"]
+
+    @contextmanager
+    def _index(self):
+        """Load the on-disk index under a process and host-wide lock."""
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock, open(self.index_path + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(self.index_path) as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                index = {}
+            yield index
+            tmp = f"{self.index_path}.{os.getpid()}"
+            with open(tmp, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp, self.index_path)
+
+    def _evict(self, index: Dict[str, Any]) -> None:
+        """Remove least-recently-used entries until within the disk budget."""
+        total = sum(entry.get("size", 0) for entry in index.values())
+        for key in sorted(index, key=lambda k: index[k].get("last_used", 0)):
+            if total <= self.max_bytes:
+                break
+            total -= index[key].get("size", 0)
+            shutil.rmtree(os.path.join(self.entries_dir, key), ignore_errors=True)
+            del index[key]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Restore cached dependency directories into a workspace")
+    parser.add_argument("workspace", help="Directory holding the lockfiles")
+    parser.add_argument("--root", required=True)
+    parser.add_argument("--tenant", required=True)
+    parser.add_argument("--agent", required=True)
+    parser.add_argument("--result", help="Append the hit/miss counts to this file")
+    args = parser.parse_args()
+
+    cache = DependencyCache(root=args.root)
+    result = cache.restore(args.tenant, args.agent, os.path.abspath(args.workspace))
+    print(f"outpost-restore-deps: {result['hits']} restored, {result['misses']} not cached")
+    if args.result:
+        os.makedirs(os.path.dirname(args.result), exist_ok=True)
+        with open(args.result, "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,20 @@
+import json
 import os
+import signal
 import subprocess
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
 import boto3
-from src.outpost.models import JobStatus
-from src.outpost.services import AuditService
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from src.outpost.models import JobStatus, StepStatus
+from src.outpost.services import AuditService, MeteringService
 from src.outpost.secrets import SecretsManager
+from src.outpost.worker.dep_cache import DependencyCache
+from src.outpost.worker.pipeline import StepRunner, StepFailedError, StepInterruptedError, terminate_process_group
+from src.outpost.worker.checkpoint import CheckpointStore
+from src.outpost.worker.heartbeat import HeartbeatWriter, default_worker_id
 
 class Worker:
     def __init__(self):
@@ -13,68 +23,500 @@ class Worker:
         self.table = self.dynamodb.Table(self.jobs_table_name)
         self.audit = AuditService()
         self.secrets = SecretsManager()
+        self.dep_cache = DependencyCache()
+        self.pipeline = StepRunner(dep_cache=self.dep_cache)
+        self.checkpoints = CheckpointStore()
+        self.metering = MeteringService()
+        # Container size, for vCPU-second and memory GB-second metering
+        self.vcpu = float(os.environ.get("WORKER_VCPU", "1"))
+        self.memory_mb = float(os.environ.get("WORKER_MEMORY_MB", "2048"))
+        self.worker_id = default_worker_id()
+        # Set by the poller; running jobs are listed on the heartbeat so the reaper can find them
+        self.heartbeat: Optional[HeartbeatWriter] = None
+        self.interrupted = False
+        self._process = None
+        self.checkpoint_stats = {
+            "checkpoints": 0,
+            "resumes": 0,
+            "compute_saved_seconds": 0.0,
+            "resume_seconds": 0.0
+        }
+
+    def interrupt(self):
+        """
+        Stop the in-flight job so it can be checkpointed (e.g. on Spot SIGTERM).
+
+        The running job is snapshotted and execute() returns a resume payload
+        for the caller to requeue.
+        """
+        self.interrupted = True
+        self.pipeline.interrupt()
+        if self._process and self._process.poll() is None:
+            terminate_process_group(self._process)
+
+    def warm_credentials(self, hours: Optional[float] = None, max_tenants: Optional[int] = None) -> int:
+        """
+        Prefetch agent credentials for tenants with recent jobs, before polling.
 
-    def update_job_status(self, tenant_id: str, job_id: str, status: JobStatus, error: str = None):
+        Tenants come from the jobs table's status-index: those with queued or
+        running jobs first, then those with jobs finished in the last
+        CREDENTIAL_WARM_HOURS. Failures are logged; jobs then fetch their
+        tenant's credentials on first use.
+
+        Returns:
+            Number of tenants warmed
+        """
+        hours = hours if hours is not None else float(os.environ.get("CREDENTIAL_WARM_HOURS", "24"))
+        max_tenants = max_tenants if max_tenants is not None else int(
+            os.environ.get("CREDENTIAL_WARM_MAX_TENANTS", "200")
+        )
+        if max_tenants <= 0:
+            return 0
+        started = time.monotonic()
+        try:
+            tenant_ids = self.recent_tenants(hours, max_tenants)
+            self.secrets.prefetch_agent_credentials(tenant_ids)
+        except Exception as e:
+            print(f"Failed to warm agent credentials: {e}")
+            return 0
+        print(f"Warmed agent credentials for {len(tenant_ids)} tenants in {time.monotonic() - started:.2f}s")
+        return len(tenant_ids)
+
+    def recent_tenants(self, hours: float, max_tenants: int) -> List[str]:
+        """Distinct tenants with jobs created in the last `hours`, most urgent status first."""
+        since = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+        tenant_ids: List[str] = []
+        for status in (JobStatus.PENDING, JobStatus.RUNNING, JobStatus.SUCCESS, JobStatus.FAILED):
+            kwargs = {
+                "IndexName": "status-index",
+                "KeyConditionExpression": Key("status").eq(status.value) & Key("created_at").gte(since),
+                "ProjectionExpression": "tenant_id",
+                "ScanIndexForward": False
+            }
+            while True:
+                response = self.table.query(**kwargs)
+                for item in response.get("Items", []):
+                    if item["tenant_id"] not in tenant_ids:
+                        tenant_ids.append(item["tenant_id"])
+                        if len(tenant_ids) >= max_tenants:
+                            return tenant_ids
+                if "LastEvaluatedKey" not in response:
+                    break
+                kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        return tenant_ids
+
+    def claim_job(self, tenant_id: str, job_id: str) -> bool:
+        """
+        Mark a pending job running on this worker.
+
+        The claim is conditional, so a redelivered or duplicate message never
+        runs a job twice and never revives a job that was failed, cancelled
+        or finished in the meantime.
+
+        Returns:
+            False if the job is not pending (and not already this worker's):
+            the message is stale and can be dropped
+        """
+        try:
+            self.table.update_item(
+                Key={"tenant_id": tenant_id, "job_id": job_id},
+                UpdateExpression="SET #s = :running, worker_id = :w",
+                ConditionExpression="#s = :pending OR (#s = :running AND worker_id = :w)",
+                ExpressionAttributeNames={"#s": "status"},
+                ExpressionAttributeValues={
+                    ":running": JobStatus.RUNNING.value,
+                    ":pending": JobStatus.PENDING.value,
+                    ":w": self.worker_id
+                }
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            return False
+        return True
+
+    def update_job_status(
+        self,
+        tenant_id: str,
+        job_id: str,
+        status: JobStatus,
+        error: str = None,
+        output_location: str = None
+    ) -> bool:
+        """
+        Update a job this worker has claimed.
+
+        Returns:
+            False if the job is no longer owned by this worker (e.g. the orphan
+            reaper failed or requeued it), in which case nothing is written
+        """
         update_expr = "SET #s = :s, completed_at = :c"
         expr_attr_names = {"#s": "status"}
         expr_attr_values = {
             ":s": status.value,
-            ":c": datetime.utcnow().isoformat() if status in [JobStatus.SUCCESS, JobStatus.FAILED] else None
+            ":c": datetime.utcnow().isoformat() if status in [JobStatus.SUCCESS, JobStatus.FAILED] else None,
+            ":w": self.worker_id
         }
         
         if error:
             update_expr += ", error_message = :e"
             expr_attr_values[":e"] = error
 
+        if output_location:
+            update_expr += ", output_location = :o"
+            expr_attr_values[":o"] = output_location
+
+        try:
+            self.table.update_item(
+                Key={"tenant_id": tenant_id, "job_id": job_id},
+                UpdateExpression=update_expr,
+                ConditionExpression="worker_id = :w",
+                ExpressionAttributeNames=expr_attr_names,
+                ExpressionAttributeValues=expr_attr_values
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            print(f"Job {job_id} is no longer owned by worker {self.worker_id}; not marking it {status.value}")
+            return False
+        return True
+
+    def update_job_steps(self, tenant_id: str, job_id: str, steps: List[dict]):
+        """Persist per-step status and timing on the job item."""
         self.table.update_item(
             Key={"tenant_id": tenant_id, "job_id": job_id},
-            UpdateExpression=update_expr,
-            ExpressionAttributeNames=expr_attr_names,
-            ExpressionAttributeValues=expr_attr_values
+            UpdateExpression="SET steps = :steps",
+            ExpressionAttributeValues={":steps": steps}
         )
 
-    def execute(self, job_data: dict):
+    def execute(self, job_data: dict) -> Optional[dict]:
+        """
+        Execute a job.
+
+        Returns:
+            None when the job finished, or the message body to requeue when it
+            was interrupted and checkpointed
+        """
         tenant_id = job_data["tenant_id"]
         job_id = job_data["job_id"]
-        agent = job_data["agent"]
-        command = job_data["command"]
-
-        # Update status to RUNNING
-        self.update_job_status(tenant_id, job_id, JobStatus.RUNNING)
-        self.audit.log_action(tenant_id, "START_JOB", job_id)
 
         # Workspace isolation
         workspace_dir = f"/tmp/outpost/workspaces/{tenant_id}/{job_id}"
         os.makedirs(workspace_dir, exist_ok=True)
 
+        return self._run_job(job_data, workspace_dir)
+
+    def execute_batch(
+        self,
+        jobs: List[dict],
+        before_job: Optional[Callable[[int], bool]] = None
+    ) -> List[Optional[dict]]:
+        """
+        Execute several short jobs for one tenant and repository in a shared workspace.
+
+        Workspace setup is paid once per batch; every job still gets its own
+        status updates, output log and audit entries.
+
+        Args:
+            jobs: Job bodies, run in order
+            before_job: Called with a job's index before it starts; returning
+                False stops the batch there (e.g. its message could not be
+                kept invisible)
+
+        Returns:
+            One execute() result per job that was started; jobs after an
+            interruption are not started and have no entry
+        """
+        tenant_id = jobs[0]["tenant_id"]
+        if any(job["tenant_id"] != tenant_id for job in jobs):
+            raise ValueError("Batched jobs must belong to a single tenant")
+
+        batch_id = f"batch-{jobs[0]['job_id']}"
+        workspace_dir = f"/tmp/outpost/workspaces/{tenant_id}/{batch_id}"
+        os.makedirs(workspace_dir, exist_ok=True)
+
+        results = []
+        for index, job_data in enumerate(jobs):
+            if self.interrupted or (before_job and not before_job(index)):
+                break
+            results.append(self._run_job(job_data, workspace_dir, batch_id=batch_id))
+        return results
+
+    def _run_job(self, job_data: dict, workspace_dir: str, batch_id: Optional[str] = None) -> Optional[dict]:
+        tenant_id = job_data["tenant_id"]
+        job_id = job_data["job_id"]
+        batch_metadata = {"batch_id": batch_id} if batch_id else None
+
+        # Listed on the heartbeat before it is marked running, so the reaper can always find it
+        if self.heartbeat:
+            self.heartbeat.track(tenant_id, job_id)
+        started = None
         try:
-            # Dispatch to agent CLI
-            # This is a simplified version of dispatch.sh
-            # In production, we'd use the actual agent CLI (claude, aider, etc.)
-            
-            # Example: Run as a subprocess
-            # We might need to inject API keys here from Secrets Manager
-            
-            process = subprocess.Popen(
-                command,
-                shell=True,
-                cwd=workspace_dir,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            stdout, stderr = process.communicate(timeout=600) # 10 min timeout
+            if not self.claim_job(tenant_id, job_id):
+                print(f"Skipping job {job_id}: not pending (already claimed, finished or cancelled)")
+                return None
+
+            credentials = self._load_credentials(job_data, batch_metadata)
+            if credentials is None:
+                return None
 
-            if process.returncode == 0:
-                self.update_job_status(tenant_id, job_id, JobStatus.SUCCESS)
-                self.audit.log_action(tenant_id, "JOB_SUCCESS", job_id)
+            started = time.monotonic()
+            return self._execute_job(job_data, workspace_dir, batch_metadata, credentials)
+        finally:
+            if self.heartbeat:
+                self.heartbeat.untrack(tenant_id, job_id)
+            if started is not None:
+                self._record_resource_usage(tenant_id, job_id, workspace_dir, time.monotonic() - started)
+
+    def _load_credentials(self, job_data: dict, batch_metadata: Optional[dict]) -> Optional[Dict[str, str]]:
+        """The job's agent credentials, or None after failing the job (nothing ran, nothing is metered)."""
+        tenant_id = job_data["tenant_id"]
+        job_id = job_data["job_id"]
+        try:
+            return self.secrets.agent_env(tenant_id, job_data["agent"])
+        except Exception as e:
+            error = f"Failed to load credentials: {e}"
+            self.update_job_status(tenant_id, job_id, JobStatus.FAILED, error=error)
+            self.audit.log_action(tenant_id, "JOB_ERROR", job_id, metadata={**(batch_metadata or {}), "error": error})
+            if job_data.get("resume"):
+                self.checkpoints.delete(job_data["resume"]["checkpoint"])
+            return None
+
+    def _record_resource_usage(self, tenant_id: str, job_id: str, workspace_dir: str, duration_seconds: float):
+        """Meter the job's container time and any tokens the agent reported (failed jobs included)."""
+        completion = {"duration_seconds": duration_seconds, "vcpu": self.vcpu, "memory_mb": self.memory_mb}
+        usage_file = self.usage_file(workspace_dir, job_id)
+        try:
+            if os.path.exists(usage_file):
+                with open(usage_file) as f:
+                    reported = json.load(f)
+                completion["tokens_input"] = reported.get("tokens_input")
+                completion["tokens_output"] = reported.get("tokens_output")
+            self.metering.record_resource_usage(tenant_id, job_id, **self.metering.usage_from_completion(completion))
+        except Exception as e:
+            # Metering must never fail a job that already ran
+            print(f"Failed to record resource usage for {job_id}: {e}")
+
+    @staticmethod
+    def usage_file(workspace_dir: str, job_id: str) -> str:
+        """Where an agent may write {"tokens_input": n, "tokens_output": n} (exported as OUTPOST_USAGE_FILE)."""
+        return os.path.join(workspace_dir, ".outpost", "usage", f"{job_id}.json")
+
+    def _execute_job(
+        self,
+        job_data: dict,
+        workspace_dir: str,
+        batch_metadata: Optional[dict],
+        credentials: Dict[str, str]
+    ) -> Optional[dict]:
+        tenant_id = job_data["tenant_id"]
+        job_id = job_data["job_id"]
+        agent = job_data["agent"]
+
+        self.audit.log_action(tenant_id, "START_JOB", job_id, metadata=batch_metadata)
+
+        checkpoint_steps = None
+        if job_data.get("resume"):
+            checkpoint_steps = self._resume(job_data, workspace_dir)
+
+        # Reuse cached dependencies and package-manager caches for this tenant
+        env = {
+            **os.environ,
+            **self.dep_cache.package_manager_env(tenant_id),
+            # outpost-restore-deps, for commands that fetch their lockfiles themselves
+            **self.dep_cache.write_restore_hook(tenant_id, agent, workspace_dir),
+            # The tenant's own credentials take precedence over any in the image
+            **credentials,
+            "OUTPOST_USAGE_FILE": self.usage_file(workspace_dir, job_id)
+        }
+        os.makedirs(os.path.dirname(env["OUTPOST_USAGE_FILE"]), exist_ok=True)
+        cache_result = self.dep_cache.restore(tenant_id, agent, workspace_dir)
+
+        started = time.monotonic()
+        try:
+            if job_data.get("steps"):
+                output_location, error, extra = self._run_steps(job_data, workspace_dir, env, checkpoint_steps)
+            else:
+                output_location, error, extra = self._run_command(job_data, workspace_dir, env)
+            restored = self.dep_cache.collect_restore_result(agent, workspace_dir)
+            cache_result = {name: cache_result[name] + restored[name] for name in cache_result}
+
+            if error is None:
+                self.dep_cache.save(tenant_id, workspace_dir)
+                self.update_job_status(tenant_id, job_id, JobStatus.SUCCESS, output_location=output_location)
+                self.audit.log_action(tenant_id, "JOB_SUCCESS", job_id, metadata={
+                    **(batch_metadata or {}),
+                    **extra,
+                    "dep_cache_hits": cache_result["hits"],
+                    "dep_cache_misses": cache_result["misses"]
+                })
             else:
-                self.update_job_status(tenant_id, job_id, JobStatus.FAILED, error=stderr)
-                self.audit.log_action(tenant_id, "JOB_FAILED", job_id, metadata={"error": stderr})
+                self.update_job_status(tenant_id, job_id, JobStatus.FAILED, error=error, output_location=output_location)
+                self.audit.log_action(tenant_id, "JOB_FAILED", job_id, metadata={**(batch_metadata or {}), **extra, "error": error})
 
+        except StepInterruptedError as e:
+            if not any(step.get("status") in (StepStatus.SUCCESS.value, StepStatus.CACHED.value) for step in e.steps):
+                # Nothing completed (or a plain command): a snapshot would save no work
+                return self._requeue(job_data)
+            return self._checkpoint(job_data, workspace_dir, e.steps, time.monotonic() - started)
         except subprocess.TimeoutExpired:
             self.update_job_status(tenant_id, job_id, JobStatus.FAILED, error="Timeout expired")
-            self.audit.log_action(tenant_id, "JOB_TIMEOUT", job_id)
+            self.audit.log_action(tenant_id, "JOB_TIMEOUT", job_id, metadata=batch_metadata)
         except Exception as e:
             self.update_job_status(tenant_id, job_id, JobStatus.FAILED, error=str(e))
-            self.audit.log_action(tenant_id, "JOB_ERROR", job_id, metadata={"error": str(e)})
+            self.audit.log_action(tenant_id, "JOB_ERROR", job_id, metadata={**(batch_metadata or {}), "error": str(e)})
+
+        if job_data.get("resume"):
+            self.checkpoints.delete(job_data["resume"]["checkpoint"])
+        return None
+
+    def _checkpoint(self, job_data: dict, workspace_dir: str, steps: List[dict], elapsed: float) -> dict:
+        """Snapshot an interrupted job and build the message body that resumes it."""
+        tenant_id = job_data["tenant_id"]
+        job_id = job_data["job_id"]
+        previous = job_data.get("resume") or {}
+        attempt = int(previous.get("attempt", 0)) + 1
+        total_elapsed = int(previous.get("elapsed_seconds", 0) + elapsed)
+
+        started = time.monotonic()
+        pointer = self.checkpoints.save(tenant_id, job_id, attempt, workspace_dir, {
+            "steps": steps,
+            "elapsed_seconds": total_elapsed
+        })
+        checkpoint_ms = int((time.monotonic() - started) * 1000)
+        self.checkpoint_stats["checkpoints"] += 1
+
+        # Back to pending: the job is requeued, not failed
+        self.update_job_status(tenant_id, job_id, JobStatus.PENDING)
+        self.audit.log_action(tenant_id, "JOB_CHECKPOINTED", job_id, metadata={
+            "attempt": attempt,
+            "checkpoint_ms": checkpoint_ms,
+            "elapsed_seconds": total_elapsed
+        })
+
+        return {
+            **job_data,
+            "batchable": False,
+            "resume": {"checkpoint": pointer, "attempt": attempt, "elapsed_seconds": total_elapsed}
+        }
+
+    def _requeue(self, job_data: dict) -> dict:
+        """Return an interrupted job to pending, to start over without a checkpoint."""
+        tenant_id = job_data["tenant_id"]
+        job_id = job_data["job_id"]
+
+        self.update_job_status(tenant_id, job_id, JobStatus.PENDING)
+        self.audit.log_action(tenant_id, "JOB_REQUEUED", job_id, metadata={"reason": "interrupted"})
+        if job_data.get("resume"):
+            self.checkpoints.delete(job_data["resume"]["checkpoint"])
+        return {name: value for name, value in job_data.items() if name != "resume"}
+
+    def _resume(self, job_data: dict, workspace_dir: str) -> Optional[List[dict]]:
+        """
+        Restore a checkpointed workspace.
+
+        Returns:
+            The step state saved with the checkpoint, or None when the job
+            starts over. Completed steps are taken from the checkpoint only,
+            never from the message.
+        """
+        resume = job_data["resume"]
+
+        started = time.monotonic()
+        try:
+            state = self.checkpoints.restore(resume["checkpoint"], workspace_dir)
+        except Exception as e:
+            # Snapshot lost or unreadable: start over rather than fail the job
+            print(f"Failed to restore checkpoint {resume['checkpoint']}: {e}")
+            os.makedirs(workspace_dir, exist_ok=True)
+            return None
+        resume_seconds = time.monotonic() - started
+
+        steps = state.get("steps")
+        completed_ms = sum(
+            int(step.get("duration_ms") or 0)
+            for step in steps or []
+            if step.get("status") in ("success", "cached")
+        )
+
+        self.checkpoint_stats["resumes"] += 1
+        self.checkpoint_stats["resume_seconds"] += resume_seconds
+        self.checkpoint_stats["compute_saved_seconds"] += completed_ms / 1000
+        self.audit.log_action(job_data["tenant_id"], "RESUME_JOB", job_data["job_id"], metadata={
+            "attempt": resume.get("attempt"),
+            "resume_ms": int(resume_seconds * 1000),
+            "compute_saved_ms": completed_ms
+        })
+        print(f"Checkpoint stats: {self.checkpoint_stats}")
+
+        return steps
+
+    def _run_command(self, job_data: dict, workspace_dir: str, env: dict):
+        """Run a single-command job. Returns (output_location, error, audit metadata)."""
+        # Dispatch to agent CLI
+        # This is a simplified version of dispatch.sh
+        # In production, we'd use the actual agent CLI (claude, aider, etc.)
+        
+        # Example: Run as a subprocess
+        # We might need to inject API keys here from Secrets Manager
+        
+        process = subprocess.Popen(
+            job_data["command"],
+            shell=True,
+            cwd=workspace_dir,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            start_new_session=True
+        )
+        self._process = process
+        try:
+            stdout, stderr = process.communicate(timeout=600) # 10 min timeout
+        except subprocess.TimeoutExpired:
+            terminate_process_group(process, signal.SIGKILL)
+            process.communicate()
+            raise
+        finally:
+            self._process = None
+
+        if self.interrupted and process.returncode != 0:
+            raise StepInterruptedError([])
+
+        output_location = self._write_output(workspace_dir, job_data["job_id"], stdout, stderr)
+
+        return output_location, (None if process.returncode == 0 else stderr), {}
+
+    def _run_steps(self, job_data: dict, workspace_dir: str, env: dict, checkpoint_steps: Optional[List[dict]] = None):
+        """Run a multi-step job. Returns (output_location, error, audit metadata)."""
+        tenant_id = job_data["tenant_id"]
+        job_id = job_data["job_id"]
+        output_location = os.path.join(workspace_dir, ".outpost", "steps")
+
+        try:
+            steps = self.pipeline.run(
+                tenant_id,
+                job_data["agent"],
+                checkpoint_steps or job_data["steps"],
+                workspace_dir,
+                env,
+                on_update=lambda steps: self.update_job_steps(tenant_id, job_id, steps),
+                resumed=checkpoint_steps is not None
+            )
+        except StepFailedError as e:
+            return output_location, e.stderr, {"failed_step": e.step["name"]}
+
+        cached = [step["name"] for step in steps if step.get("cache_hit")]
+        return output_location, None, {"cached_steps": cached}
+
+    def _write_output(self, workspace_dir: str, job_id: str, stdout: str, stderr: str) -> str:
+        """Write a job's output to its own log file inside the workspace."""
+        output_dir = os.path.join(workspace_dir, ".outpost", "output")
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"{job_id}.log")
+        with open(path, "w") as f:
+            f.write(stdout or "")
+            if stderr:
+                f.write("\n--- stderr ---\n")
+                f.write(stderr)
+        return path
@@ -0,0 +1,299 @@
+"""
+Worker heartbeats and orphaned-job reaping for Outpost.
+
+Every worker keeps a heartbeat item in the workers table listing the jobs it
+is running. A worker that stops heartbeating for WORKER_DEAD_AFTER_SECONDS is
+considered dead and its jobs are failed or requeued by the reaper, which runs
+as a scheduled function or inside any worker (REAPER_IN_WORKER=true).
+
+Detection latency is roughly WORKER_DEAD_AFTER_SECONDS plus the reaper
+interval. Heartbeat items carry a TTL only so abandoned rows are eventually
+garbage-collected; liveness is always decided from last_seen.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Any, List, Optional
+
+import boto3
+from botocore.exceptions import ClientError
+
+from src.outpost.models import JobStatus
+from src.outpost.services import AuditService
+
+
+def _json_default(value):
+    # DynamoDB returns numbers as Decimal
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
+
+
+def default_worker_id() -> str:
+    """WORKER_ID if set, otherwise host, pid and a random suffix."""
+    return os.environ.get("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class HeartbeatWriter:
+    """
+    Periodically writes this worker's heartbeat item from a background thread.
+
+    Item: worker_id, jobs [{tenant_id, job_id}], last_seen (epoch seconds),
+    expires_at (TTL). Jobs are tracked before they are marked running so a
+    running job is always listed on a heartbeat. With a concurrency limiter,
+    every beat also renews the tenant slots this worker holds.
+    """
+
+    def __init__(
+        self,
+        worker_id: str,
+        interval_seconds: float = None,
+        reaper: Optional["OrphanReaper"] = None,
+        reap_interval_seconds: float = None,
+        concurrency: Optional["ConcurrencyLimiter"] = None
+    ):
+        self.dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+        self.table = self.dynamodb.Table(os.environ.get("WORKERS_TABLE", "outpost-workers-prod"))
+        self.worker_id = worker_id
+        self.interval_seconds = interval_seconds or float(os.environ.get("HEARTBEAT_INTERVAL_SECONDS", "10"))
+        self.ttl_seconds = int(os.environ.get("HEARTBEAT_TTL_SECONDS", str(24 * 60 * 60)))
+        self.reaper = reaper
+        self.reap_interval_seconds = reap_interval_seconds or float(os.environ.get("REAPER_INTERVAL_SECONDS", "30"))
+        self.concurrency = concurrency
+        self._jobs: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def track(self, tenant_id: str, job_id: str) -> None:
+        """Add a job to the heartbeat and publish it immediately."""
+        with self._lock:
+            self._jobs[f"{tenant_id}#{job_id}"] = {"tenant_id": tenant_id, "job_id": job_id}
+        self.beat()
+
+    def untrack(self, tenant_id: str, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(f"{tenant_id}#{job_id}", None)
+        self.beat()
+
+    def beat(self) -> None:
+        """Write the heartbeat item (best effort; a missed beat is retried next interval)."""
+        now = int(time.time())
+        with self._lock:
+            jobs = list(self._jobs.values())
+        try:
+            self.table.put_item(Item={
+                "worker_id": self.worker_id,
+                "jobs": jobs,
+                "last_seen": now,
+                "expires_at": now + self.ttl_seconds
+            })
+        except Exception as e:
+            print(f"Heartbeat write failed: {e}")
+
+    def start(self) -> None:
+        self._stop.clear()
+        self.beat()
+        self._thread = threading.Thread(target=self._run, name="heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self, deregister: bool = True) -> None:
+        """Stop heartbeating; deregister removes the item so the worker is not reaped."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval_seconds)
+        if deregister:
+            try:
+                self.table.delete_item(Key={"worker_id": self.worker_id})
+            except Exception as e:
+                print(f"Heartbeat deregistration failed: {e}")
+
+    def _run(self) -> None:
+        next_reap = time.monotonic()
+        while not self._stop.wait(self.interval_seconds):
+            self.beat()
+            if self.concurrency:
+                self.concurrency.renew()
+            if self.reaper and time.monotonic() >= next_reap:
+                next_reap = time.monotonic() + self.reap_interval_seconds
+                try:
+                    self.reaper.reap()
+                except Exception as e:
+                    print(f"Reaper run failed: {e}")
+
+
+class OrphanReaper:
+    """
+    Fails or requeues jobs owned by workers whose heartbeat has gone stale.
+
+    Every job transition is a conditional write on status = running and
+    worker_id = <dead worker>, so concurrent reapers (and a job re-claimed by
+    a live worker in the meantime) never act on the same job twice.
+
+    Actions (REAPER_ACTION):
+    - fail: mark the job failed
+    - requeue: reset the job to pending and send it back to the jobs queue;
+      after REAPER_MAX_REQUEUES the job is failed instead
+
+    The dead worker's own message is redelivered once its visibility timeout
+    expires. Workers only start jobs they can claim while pending
+    (Worker.claim_job), so whichever of the two messages arrives first runs
+    the job and the other is dropped; a reaped-and-failed job is never
+    restarted by the redelivery.
+    """
+
+    def __init__(self, dead_after_seconds: float = None, action: str = None, max_requeues: int = None):
+        self.dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+        self.sqs = boto3.client("sqs", region_name="us-east-1")
+        self.workers_table = self.dynamodb.Table(os.environ.get("WORKERS_TABLE", "outpost-workers-prod"))
+        self.jobs_table = self.dynamodb.Table(os.environ.get("JOBS_TABLE", "outpost-jobs-prod"))
+        self.queue_url = os.environ.get("JOBS_QUEUE_URL")
+        self.audit = AuditService()
+        self.dead_after_seconds = dead_after_seconds or float(os.environ.get("WORKER_DEAD_AFTER_SECONDS", "45"))
+        self.action = (action or os.environ.get("REAPER_ACTION", "fail")).lower()
+        self.max_requeues = max_requeues if max_requeues is not None else int(
+            os.environ.get("REAPER_MAX_REQUEUES", "2")
+        )
+        if self.action not in ("fail", "requeue"):
+            raise ValueError(f"Unknown reaper action: {self.action}")
+
+    def dead_workers(self) -> List[Dict[str, Any]]:
+        """Heartbeat items not refreshed within dead_after_seconds."""
+        cutoff = int(time.time() - self.dead_after_seconds)
+        items = []
+        kwargs = {
+            "FilterExpression": "last_seen < :cutoff",
+            "ExpressionAttributeValues": {":cutoff": cutoff}
+        }
+        while True:
+            response = self.workers_table.scan(**kwargs)
+            items.extend(response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return items
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def reap(self) -> Dict[str, int]:
+        """
+        Reap every dead worker's jobs.
+
+        Returns:
+            Counts of dead workers, failed jobs, requeued jobs and jobs skipped
+            because another reaper or worker got there first
+        """
+        result = {"dead_workers": 0, "failed": 0, "requeued": 0, "skipped": 0}
+        for worker in self.dead_workers():
+            result["dead_workers"] += 1
+            for job in worker.get("jobs") or []:
+                outcome = self.reap_job(worker["worker_id"], job["tenant_id"], job["job_id"])
+                result[outcome] += 1
+            self._deregister(worker)
+        if result["dead_workers"]:
+            print(f"Reaper result: {result}")
+        return result
+
+    def reap_job(self, worker_id: str, tenant_id: str, job_id: str) -> str:
+        """
+        Fail or requeue one orphaned job.
+
+        Returns:
+            "failed", "requeued" or "skipped"
+        """
+        error = f"Worker {worker_id} stopped heartbeating"
+
+        if self.action == "requeue":
+            job = self._transition(worker_id, tenant_id, job_id, JobStatus.PENDING, error)
+            if job:
+                self._send(job)
+                self.audit.log_action(tenant_id, "JOB_REQUEUED", job_id, metadata={"worker_id": worker_id})
+                return "requeued"
+            # Out of requeues, or already handled: failing it is conditional too
+
+        if self._transition(worker_id, tenant_id, job_id, JobStatus.FAILED, error):
+            self.audit.log_action(tenant_id, "JOB_REAPED", job_id, metadata={"worker_id": worker_id, "error": error})
+            return "failed"
+        return "skipped"
+
+    def _transition(
+        self,
+        worker_id: str,
+        tenant_id: str,
+        job_id: str,
+        status: JobStatus,
+        error: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Move a job off a dead worker if it is still running there.
+
+        Returns:
+            The updated job item, or None if the condition did not hold
+        """
+        update_expr = (
+            "SET #s = :s, error_message = :e, "
+            "reaped_count = if_not_exists(reaped_count, :zero) + :one REMOVE worker_id"
+        )
+        condition = "#s = :running AND worker_id = :wid"
+        values = {
+            ":s": status.value,
+            ":e": error,
+            ":zero": 0,
+            ":one": 1,
+            ":running": JobStatus.RUNNING.value,
+            ":wid": worker_id
+        }
+        if status == JobStatus.PENDING:
+            condition += " AND (attribute_not_exists(reaped_count) OR reaped_count < :max)"
+            values[":max"] = self.max_requeues
+        else:
+            update_expr = update_expr.replace("error_message = :e", "error_message = :e, completed_at = :c")
+            values[":c"] = datetime.utcnow().isoformat()
+
+        try:
+            response = self.jobs_table.update_item(
+                Key={"tenant_id": tenant_id, "job_id": job_id},
+                UpdateExpression=update_expr,
+                ConditionExpression=condition,
+                ExpressionAttributeNames={"#s": "status"},
+                ExpressionAttributeValues=values,
+                ReturnValues="ALL_NEW"
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            return None
+        return response["Attributes"]
+
+    def _send(self, job: Dict[str, Any]) -> None:
+        """Send a requeued job back to the queue as a fresh submission."""
+        body = {k: v for k, v in job.items() if k not in ("error_message", "resume")}
+        if body.get("steps"):
+            # The dead worker's workspace is gone, so every step runs again
+            body["steps"] = [
+                {k: step[k] for k in ("name", "command", "cacheable", "inputs") if k in step}
+                for step in body["steps"]
+            ]
+        self.sqs.send_message(
+            QueueUrl=self.queue_url,
+            MessageBody=json.dumps(body, default=_json_default),
+            MessageAttributes={
+                "TenantID": {"DataType": "String", "StringValue": job["tenant_id"]},
+                "JobID": {"DataType": "String", "StringValue": job["job_id"]},
+                "Priority": {"DataType": "String", "StringValue": job.get("priority") or "normal"}
+            }
+        )
+
+    def _deregister(self, worker: Dict[str, Any]) -> None:
+        """Delete a dead worker's heartbeat unless it has come back since it was read."""
+        try:
+            self.workers_table.delete_item(
+                Key={"worker_id": worker["worker_id"]},
+                ConditionExpression="last_seen = :seen",
+                ExpressionAttributeValues={":seen": worker["last_seen"]}
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
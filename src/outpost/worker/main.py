@@ -1,57 +1,240 @@
 import os
 import json
+import random
 import time
 import signal
 import boto3
+from src.outpost.services import TenantCache
 from src.outpost.worker.executor import Worker
+from src.outpost.worker.batching import JobBatcher
+from src.outpost.worker.concurrency import ConcurrencyLimiter
+from src.outpost.worker.heartbeat import HeartbeatWriter, OrphanReaper
 
 class JobPoller:
     def __init__(self):
         self.sqs = boto3.client("sqs", region_name="us-east-1")
         self.queue_url = os.environ.get("JOBS_QUEUE_URL")
         self.worker = Worker()
+        self.batcher = JobBatcher()
+        reaper = OrphanReaper() if os.environ.get("REAPER_IN_WORKER", "false").lower() == "true" else None
+        self.concurrency = ConcurrencyLimiter()
+        self.defer_seconds = int(os.environ.get("CONCURRENCY_DEFER_SECONDS", "15"))
+        # How long a received message is kept hidden each time a job starts; more than
+        # one job's timeout (600s), so it cannot be redelivered while a job runs
+        self.job_visibility_seconds = int(os.environ.get("WORKER_JOB_VISIBILITY_SECONDS", "900"))
+        self.heartbeat = HeartbeatWriter(self.worker.worker_id, reaper=reaper, concurrency=self.concurrency)
+        self.worker.heartbeat = self.heartbeat
         self.running = True
         
         # Graceful shutdown
         signal.signal(signal.SIGTERM, self.stop)
         signal.signal(signal.SIGINT, self.stop)
 
-    def stop(self, *args):
+    def stop(self, signum=None, *args):
         print("Stopping worker...")
         self.running = False
+        if signum == signal.SIGTERM:
+            # Spot interruption: checkpoint the in-flight job instead of losing it
+            self.worker.interrupt()
 
     def start(self):
-        print(f"Starting worker, polling {self.queue_url}...")
+        print(f"Starting worker {self.worker.worker_id}, polling {self.queue_url}...")
+        self.worker.warm_credentials()
+        self.heartbeat.start()
+        try:
+            self.poll()
+        finally:
+            self.heartbeat.stop()
+            self.worker.audit.flush()
+            print(f"Dependency cache stats: {self.worker.dep_cache.stats()}")
+
+    def poll(self):
         while self.running:
+            TenantCache.log_stats()
             try:
-                response = self.sqs.receive_message(
-                    QueueUrl=self.queue_url,
-                    MaxNumberOfMessages=1,
-                    WaitTimeSeconds=20, # Long polling
-                    MessageAttributeNames=["All"]
-                )
-                
-                messages = response.get("Messages", [])
-                for message in messages:
-                    self.process_message(message)
+                messages = self.batcher.collect(self.receive_messages)
+                batches = self.batcher.group(messages)
+                for index, batch in enumerate(batches):
+                    waiting = [message for later in batches[index + 1:] for message in later]
+                    if not self.running:
+                        # Stopping: hand the rest back to the queue instead of leaving them hidden
+                        self.release(batch + waiting)
+                        break
+                    if len(batches) > 1:
+                        # Messages received together wait for each other; keep every one hidden
+                        self.extend_visibility(batch + waiting)
+                    if len(batch) == 1:
+                        self.process_message(batch[0])
+                    else:
+                        self.process_batch(batch, waiting)
                     
             except Exception as e:
                 print(f"Error polling SQS: {e}")
                 time.sleep(5)
 
+    def receive_messages(self, max_messages: int = 1, wait_seconds: int = 20):
+        response = self.sqs.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=max_messages,
+            WaitTimeSeconds=wait_seconds, # Long polling
+            MessageAttributeNames=["All"]
+        )
+        return response.get("Messages", [])
+
     def process_message(self, message):
         body = json.loads(message["Body"])
         receipt_handle = message["ReceiptHandle"]
-        
-        print(f"Processing job {body.get('job_id')} for tenant {body.get('tenant_id')}")
+        tenant_id = body.get("tenant_id")
+        holder = f"{self.worker.worker_id}#{body.get('job_id')}"
+
+        if not self.concurrency.acquire(tenant_id, holder):
+            self.defer([message])
+            return
+
+        print(f"Processing job {body.get('job_id')} for tenant {tenant_id}")
         
         try:
-            self.worker.execute(body)
+            resume = self.worker.execute(body)
+            if resume:
+                self.requeue(message, resume)
             # Delete message after successful execution
             self.sqs.delete_message(QueueUrl=self.queue_url, ReceiptHandle=receipt_handle)
         except Exception as e:
             print(f"Error executing job: {e}")
             # Message will eventually return to queue via visibility timeout
+        finally:
+            self.concurrency.release(tenant_id, holder)
+
+    def process_batch(self, messages, waiting=()):
+        bodies = [json.loads(message["Body"]) for message in messages]
+        job_ids = [body.get("job_id") for body in bodies]
+        tenant_id = bodies[0].get("tenant_id")
+        # A batch runs its jobs one after another, so it occupies one slot
+        holder = f"{self.worker.worker_id}#batch-{job_ids[0]}"
+
+        if not self.concurrency.acquire(tenant_id, holder):
+            self.defer(messages)
+            return
+
+        print(f"Processing batch of {len(bodies)} jobs {job_ids} for tenant {bodies[0].get('tenant_id')}")
+
+        try:
+            # Jobs run one after another, so the batch as a whole can outlast the
+            # queue's visibility timeout: push it, and the messages received with
+            # it, back as each job starts
+            results = self.worker.execute_batch(
+                bodies, before_job=lambda index: self.extend_visibility([*messages[index:], *waiting])
+            )
+            # Each job keeps its own message; jobs not started before an
+            # interruption are left to return via visibility timeout
+            finished = messages[:len(results)]
+            for message, resume in zip(finished, results):
+                if resume:
+                    self.requeue(message, resume)
+            for start in range(0, len(finished), 10):
+                self.sqs.delete_message_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[
+                        {"Id": str(i), "ReceiptHandle": message["ReceiptHandle"]}
+                        for i, message in enumerate(finished[start:start + 10])
+                    ]
+                )
+        except Exception as e:
+            print(f"Error executing batch: {e}")
+            # Messages will eventually return to queue via visibility timeout
+        finally:
+            self.concurrency.release(tenant_id, holder)
+
+    def extend_visibility(self, messages) -> bool:
+        """
+        Keep messages hidden for another WORKER_JOB_VISIBILITY_SECONDS.
+
+        Returns:
+            False if the first message could not be extended: it may already
+            be visible again, and another worker may be running it
+        """
+        failed = set()
+        try:
+            for start in range(0, len(messages), 10):
+                response = self.sqs.change_message_visibility_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[
+                        {
+                            "Id": str(start + i),
+                            "ReceiptHandle": message["ReceiptHandle"],
+                            "VisibilityTimeout": self.job_visibility_seconds
+                        }
+                        for i, message in enumerate(messages[start:start + 10])
+                    ]
+                )
+                failed.update(entry["Id"] for entry in response.get("Failed", []))
+        except Exception as e:
+            print(f"Failed to extend message visibility: {e}")
+            return False
+        if failed:
+            print(f"Failed to extend visibility of {len(failed)} message(s)")
+        return "0" not in failed
+
+    def release(self, messages):
+        """Make received messages visible again right away, for another worker to take."""
+        for start in range(0, len(messages), 10):
+            try:
+                self.sqs.change_message_visibility_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[
+                        {"Id": str(i), "ReceiptHandle": message["ReceiptHandle"], "VisibilityTimeout": 0}
+                        for i, message in enumerate(messages[start:start + 10])
+                    ]
+                )
+            except Exception as e:
+                # They return via visibility timeout instead
+                print(f"Failed to release messages: {e}")
+
+    def defer(self, messages):
+        """
+        Put back jobs of a tenant at its concurrency limit, delayed by a few seconds.
+
+        The messages are re-sent with a delay and the originals deleted,
+        rather than hidden with a visibility timeout: every receive counts
+        towards the queue's maxReceiveCount, and waiting on a busy tenant
+        must not send jobs to the dead-letter queue.
+        """
+        for message in messages:
+            attributes = {
+                name: {"DataType": attr["DataType"], "StringValue": attr["StringValue"]}
+                for name, attr in (message.get("MessageAttributes") or {}).items()
+                if "StringValue" in attr
+            }
+            deferred = int((message.get("MessageAttributes") or {}).get("Deferred", {}).get("StringValue", "0"))
+            attributes["Deferred"] = {"DataType": "String", "StringValue": str(deferred + 1)}
+            self.sqs.send_message(
+                QueueUrl=self.queue_url,
+                MessageBody=message["Body"],
+                MessageAttributes=attributes,
+                # Jitter spreads a tenant's backlog instead of returning it all at once
+                DelaySeconds=min(900, self.defer_seconds + random.randint(0, self.defer_seconds))
+            )
+            self.sqs.delete_message(QueueUrl=self.queue_url, ReceiptHandle=message["ReceiptHandle"])
+        print(f"Deferred {len(messages)} job(s): tenant at its concurrency limit")
+
+    def requeue(self, message, body):
+        """Send an interrupted job back to the queue, with its resume pointer if it was checkpointed."""
+        attributes = {
+            name: {"DataType": attr["DataType"], "StringValue": attr["StringValue"]}
+            for name, attr in (message.get("MessageAttributes") or {}).items()
+            if "StringValue" in attr and name != "ResumeAttempt"
+        }
+        if body.get("resume"):
+            attributes["ResumeAttempt"] = {"DataType": "String", "StringValue": str(body["resume"]["attempt"])}
+        self.sqs.send_message(
+            QueueUrl=self.queue_url,
+            MessageBody=json.dumps(body),
+            MessageAttributes=attributes
+        )
+        if body.get("resume"):
+            print(f"Requeued job {body.get('job_id')} from checkpoint {body['resume']['checkpoint']}")
+        else:
+            print(f"Requeued job {body.get('job_id')} to start over")
 
 if __name__ == "__main__":
     poller = JobPoller()
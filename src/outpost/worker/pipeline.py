@@ -0,0 +1,269 @@
+"""
+Multi-step job pipelines for Outpost workers.
+
+Runs a job's ordered steps (clone, install, agent, test, package, ...) in one
+workspace, recording timing and status per step. Deterministic steps are
+cached by input hash: on a hit the workspace snapshot taken after the step is
+restored and the step is skipped.
+"""
+import hashlib
+import os
+import shutil
+import signal
+import subprocess
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable
+
+from src.outpost.models import StepStatus
+from src.outpost.worker.dep_cache import DependencyCache
+
+# Set by the runner; only trusted when they come from the worker's own checkpoint
+STEP_STATE_FIELDS = ("status", "started_at", "completed_at", "duration_ms", "cache_hit", "cache_key")
+
+
+class StepFailedError(Exception):
+    """Raised when a pipeline step exits non-zero."""
+
+    def __init__(self, step: Dict[str, Any], stderr: str):
+        super().__init__(f"Step '{step['name']}' failed: {stderr}")
+        self.step = step
+        self.stderr = stderr
+
+
+def terminate_process_group(process: subprocess.Popen, sig: int = signal.SIGTERM) -> None:
+    """Signal a shell command and every child it spawned."""
+    try:
+        os.killpg(process.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class StepInterruptedError(Exception):
+    """Raised when the runner is interrupted (e.g. Spot SIGTERM) mid-pipeline."""
+
+    def __init__(self, steps: List[Dict[str, Any]]):
+        super().__init__("Pipeline interrupted")
+        self.steps = steps
+
+
+class StepRunner:
+    """
+    Executes pipeline steps with per-step timing and input-hash caching.
+
+    Cache keys chain through previous steps:
+        key_n = sha256(key_{n-1}, command_n, contents of inputs_n)
+    so a cached snapshot always describes the full workspace after step n.
+    Once a non-cacheable step has run, the workspace is no longer a pure
+    function of the inputs and later steps always execute.
+
+    Snapshots are kept in a separate cache per tenant (under
+    step_cache_root/<tenant_id>, each within DEP_CACHE_MAX_BYTES).
+
+    When resuming from a checkpoint, steps already marked success/cached
+    are not run again. Otherwise any step state passed in is discarded.
+    """
+
+    def __init__(
+        self,
+        step_cache_root: Optional[str] = None,
+        dep_cache: Optional[DependencyCache] = None,
+        step_timeout: int = 600
+    ):
+        self.step_cache_root = step_cache_root or os.path.join(
+            os.environ.get("DEP_CACHE_DIR", "/tmp/outpost/cache"), "steps"
+        )
+        self._step_caches: Dict[str, DependencyCache] = {}
+        self.dep_cache = dep_cache
+        self.step_timeout = step_timeout
+        self.interrupted = False
+        self._process = None
+
+    def interrupt(self) -> None:
+        """Stop the running step; run() raises StepInterruptedError."""
+        self.interrupted = True
+        if self._process and self._process.poll() is None:
+            terminate_process_group(self._process)
+
+    def step_cache(self, tenant_id: str) -> DependencyCache:
+        """The tenant's own step snapshot cache."""
+        cache = self._step_caches.get(tenant_id)
+        if cache is None:
+            cache = self._step_caches[tenant_id] = DependencyCache(root=os.path.join(self.step_cache_root, tenant_id))
+        return cache
+
+    def step_key(self, previous_key: str, step: Dict[str, Any], workspace_dir: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(previous_key.encode())
+        digest.update(b"\0")
+        digest.update(step["command"].encode())
+        for relpath in sorted(step.get("inputs") or []):
+            digest.update(b"\0")
+            digest.update(relpath.encode())
+            path = os.path.join(workspace_dir, relpath)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(chunk)
+        return digest.hexdigest()
+
+    def run(
+        self,
+        tenant_id: str,
+        agent: str,
+        steps: List[Dict[str, Any]],
+        workspace_dir: str,
+        env: Dict[str, str],
+        on_update: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        resumed: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Run steps in order.
+
+        Args:
+            tenant_id: Tenant identifier (scopes the cache)
+            agent: Agent name (for dependency cache stats)
+            steps: Step dicts (JobStep.model_dump(mode="json"))
+            workspace_dir: Workspace shared by all steps
+            env: Environment for step subprocesses
+            on_update: Called with the full step list after every status change
+            resumed: Steps come from the worker's checkpoint of this job, and
+                the workspace was restored with them; completed steps are skipped
+
+        Returns:
+            Steps with status and timing filled in
+
+        Raises:
+            StepFailedError: If a step exits non-zero (remaining steps are marked skipped)
+            StepInterruptedError: If interrupt() was called (the current step is left pending)
+            subprocess.TimeoutExpired: If a step exceeds the step timeout
+        """
+        steps = [
+            {"status": StepStatus.PENDING.value, **{
+                name: value for name, value in step.items() if resumed or name not in STEP_STATE_FIELDS
+            }}
+            for step in steps
+        ]
+        step_cache = self.step_cache(tenant_id)
+        notify = on_update or (lambda _: None)
+        previous_key = hashlib.sha256(tenant_id.encode()).hexdigest()
+        deterministic = True
+
+        for index, step in enumerate(steps):
+            if step["status"] in (StepStatus.SUCCESS.value, StepStatus.CACHED.value):
+                # Completed before a checkpoint; keep the cache chain if it is intact
+                if step.get("cache_key") and deterministic:
+                    previous_key = step["cache_key"]
+                else:
+                    deterministic = False
+                continue
+
+            if self.interrupted:
+                raise StepInterruptedError(steps)
+
+            started = time.monotonic()
+            step["started_at"] = datetime.utcnow().isoformat()
+            key = None
+
+            if step.get("cacheable") and deterministic and step_cache.enabled:
+                key = self.step_key(previous_key, step, workspace_dir)
+                if self._restore_snapshot(step_cache, key, workspace_dir):
+                    self._finish(step, StepStatus.CACHED, started, cache_hit=True)
+                    step["cache_key"] = key
+                    previous_key = key
+                    notify(steps)
+                    continue
+            else:
+                deterministic = False
+
+            step["status"] = StepStatus.RUNNING.value
+            notify(steps)
+
+            if self.dep_cache:
+                self.dep_cache.restore(tenant_id, agent, workspace_dir)
+
+            try:
+                stderr = self._execute(index, step, workspace_dir, env)
+            except subprocess.TimeoutExpired:
+                self._finish(step, StepStatus.FAILED, started)
+                self._skip_remaining(steps, index)
+                notify(steps)
+                raise
+
+            if self.interrupted and stderr is not None:
+                step["status"] = StepStatus.PENDING.value
+                step["started_at"] = None
+                notify(steps)
+                raise StepInterruptedError(steps)
+
+            if stderr is not None:
+                self._finish(step, StepStatus.FAILED, started)
+                self._skip_remaining(steps, index)
+                notify(steps)
+                raise StepFailedError(step, stderr)
+
+            self._finish(step, StepStatus.SUCCESS, started)
+            if key:
+                step_cache.store(key, workspace_dir, build_seconds=step["duration_ms"] / 1000)
+                step["cache_key"] = key
+                previous_key = key
+            notify(steps)
+
+        return steps
+
+    def _execute(self, index: int, step: Dict[str, Any], workspace_dir: str, env: Dict[str, str]) -> Optional[str]:
+        """Run a step command. Returns None on success, stderr on failure."""
+        process = subprocess.Popen(
+            step["command"],
+            shell=True,
+            cwd=workspace_dir,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            start_new_session=True
+        )
+        self._process = process
+        try:
+            stdout, stderr = process.communicate(timeout=self.step_timeout)
+        except subprocess.TimeoutExpired:
+            terminate_process_group(process, signal.SIGKILL)
+            process.communicate()
+            raise
+        finally:
+            self._process = None
+
+        # Per-step output log, kept out of cached snapshots
+        log_dir = os.path.join(workspace_dir, ".outpost", "steps")
+        os.makedirs(log_dir, exist_ok=True)
+        with open(os.path.join(log_dir, f"{index:02d}-{step['name']}.log"), "w") as f:
+            f.write(stdout or "")
+            if stderr:
+                f.write("\n--- stderr ---\n")
+                f.write(stderr)
+
+        return None if process.returncode == 0 else (stderr or f"exit code {process.returncode}")
+
+    def _restore_snapshot(self, step_cache: DependencyCache, key: str, workspace_dir: str) -> bool:
+        """Replace the workspace (except .outpost) with a cached snapshot."""
+        if not step_cache.lookup(key):
+            return False
+        for name in os.listdir(workspace_dir):
+            if name == ".outpost":
+                continue
+            path = os.path.join(workspace_dir, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        return step_cache.materialize(key, workspace_dir, merge=True)
+
+    def _finish(self, step: Dict[str, Any], status: StepStatus, started: float, cache_hit: bool = False) -> None:
+        step["status"] = status.value
+        step["completed_at"] = datetime.utcnow().isoformat()
+        step["duration_ms"] = int((time.monotonic() - started) * 1000)
+        step["cache_hit"] = cache_hit
+
+    def _skip_remaining(self, steps: List[Dict[str, Any]], failed_index: int) -> None:
+        for step in steps[failed_index + 1:]:
+            step["status"] = StepStatus.SKIPPED.value
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Anomaly detector evaluation on synthetic submission traces.
+
+Replays per-tenant traces through AnomalyDetector (flag mode, in-process
+state, a fake clock and an in-memory audit sink; no AWS):
+1. steady: Poisson submissions at a per-tenant rate,
+2. diurnal: a daily cycle between 0.2x and 1.8x the tenant's rate,
+3. bursty: steady, with legitimate bursts (3x for 10 minutes) four times a day,
+4. runaway: steady traffic, then a submission loop at 10x, 30x or 100x the
+   tenant's rate for an hour.
+
+Reports the detection rate and time to detect for loops, false-positive
+episodes per tenant-day (episodes that start outside a loop), and the
+memory the detector holds per tenant. Loops that stay under
+ANOMALY_MIN_JOBS per interval are not flagged by design; they count as
+missed here.
+
+Usage:
+    python tests/performance/anomaly_evaluation.py [--tenants 40] [--days 1] [--seed 7]
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.outpost.services.anomaly import AnomalyDetector  # noqa: E402
+
+START = 1_777_593_600.0  # 2026-05-01T00:00:00Z
+DAY = 86400.0
+LOOP_MULTIPLIERS = (10, 30, 100)
+
+
+class FakeClock:
+    def __init__(self, now=START):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class AuditSink:
+    """Collects log_action calls instead of writing to DynamoDB."""
+
+    def __init__(self):
+        self.entries = []
+
+    def log_action(self, tenant_id, action, resource, metadata=None):
+        self.entries.append((tenant_id, action, metadata))
+
+
+def arrivals(rng, rate_at, duration):
+    """Poisson arrival times (seconds from start) for a rate in jobs/minute, by thinning."""
+    peak = max(rate_at(t) for t in range(0, int(duration), 60)) / 60.0
+    t = 0.0
+    while True:
+        t += rng.expovariate(peak)
+        if t >= duration:
+            return
+        if rng.random() * peak <= rate_at(t) / 60.0:
+            yield t
+
+
+def replay(detector, clock, tenant_id, times):
+    """Submit arrivals grouped per second; returns the offsets at which episodes started."""
+    flagged = False
+    starts = []
+    second, units = None, 0
+    for t in list(times) + [None]:
+        bucket = None if t is None else int(t)
+        if bucket != second and units:
+            clock.now = START + second
+            decision = detector.record_submission(tenant_id, units)
+            if decision.anomalous and not flagged:
+                starts.append(float(second))
+            flagged = decision.anomalous
+            units = 0
+        second = bucket
+        units += 1
+    return starts
+
+
+def tenant_rate(rng):
+    # Median about 8 jobs/minute, from under one to a few hundred
+    return math.exp(rng.gauss(math.log(8), 1.2))
+
+
+def scenario_steady(rng, tenants, days):
+    for i in range(tenants):
+        base = tenant_rate(rng)
+        yield f"steady_{i}", (lambda t, base=base: base), days * DAY, None
+
+
+def scenario_diurnal(rng, tenants, days):
+    for i in range(tenants):
+        base = tenant_rate(rng)
+        phase = rng.uniform(0, DAY)
+
+        def rate_at(t, base=base, phase=phase):
+            return base * (1 + 0.8 * math.sin(2 * math.pi * (t + phase) / DAY))
+
+        yield f"diurnal_{i}", rate_at, days * DAY, None
+
+
+def scenario_bursty(rng, tenants, days):
+    for i in range(tenants):
+        base = tenant_rate(rng)
+        bursts = [rng.uniform(0, days * DAY) for _ in range(max(1, int(4 * days)))]
+
+        def rate_at(t, base=base, bursts=bursts):
+            return base * 3 if any(b <= t < b + 600 for b in bursts) else base
+
+        yield f"bursty_{i}", rate_at, days * DAY, None
+
+
+def scenario_runaway(rng, tenants, days):
+    for i in range(tenants):
+        base = tenant_rate(rng)
+        multiplier = LOOP_MULTIPLIERS[i % len(LOOP_MULTIPLIERS)]
+        loop_start = float(int(rng.uniform(0.25, 0.75) * days * DAY))
+        window = (loop_start, loop_start + 3600)
+
+        def rate_at(t, base=base, multiplier=multiplier, window=window):
+            return base * multiplier if window[0] <= t < window[1] else base
+
+        yield f"runaway_{multiplier}x_{i}", rate_at, days * DAY, (window, multiplier)
+
+
+def bytes_per_tenant(count):
+    """Memory held by the detector per tenant, from tracemalloc."""
+    AnomalyDetector.reset()
+    detector = AnomalyDetector(mode="flag", audit=AuditSink(), clock=FakeClock(), state="local")
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for i in range(count):
+        detector.record_submission(f"ten_{i}")
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    AnomalyDetector.reset()
+    return total / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, default=40, help="Tenants per scenario")
+    parser.add_argument("--days", type=float, default=1.0, help="Trace length per tenant")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = []
+    detections = {m: [] for m in LOOP_MULTIPLIERS}
+    started = time.perf_counter()
+    submissions = 0
+    for name, scenario in (("steady", scenario_steady), ("diurnal", scenario_diurnal), ("bursty", scenario_bursty),
+                           ("runaway", scenario_runaway)):
+        AnomalyDetector.reset()
+        clock = FakeClock()
+        sink = AuditSink()
+        detector = AnomalyDetector(mode="flag", audit=sink, clock=clock, state="local")
+        false_positives = 0
+        for tenant_id, rate_at, duration, loop in scenario(rng, args.tenants, args.days):
+            times = list(arrivals(rng, rate_at, duration))
+            submissions += len(times)
+            # Alerts are printed as well as audited
+            with contextlib.redirect_stdout(io.StringIO()):
+                starts = replay(detector, clock, tenant_id, times)
+            if loop is None:
+                false_positives += len(starts)
+                continue
+            (loop_start, loop_end), multiplier = loop
+            inside = [s for s in starts if loop_start <= s < loop_end]
+            false_positives += len(starts) - len(inside)
+            detections[multiplier].append(inside[0] - loop_start if inside else None)
+        results.append({
+            "scenario": name,
+            "tenants": args.tenants,
+            "false_positive_episodes": false_positives,
+            "false_positives_per_tenant_day": false_positives / (args.tenants * args.days),
+            "audit_entries": len(sink.entries)
+        })
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.tenants} tenants x {args.days:g} day(s) per scenario, {submissions} submissions "
+          f"replayed in {elapsed:.1f}s")
+    print(f"{'scenario':>10} {'FP episodes':>12} {'FP/tenant-day':>14} {'audit entries':>14}")
+    for r in results:
+        print(f"{r['scenario']:>10} {r['false_positive_episodes']:>12} "
+              f"{r['false_positives_per_tenant_day']:>14.3f} {r['audit_entries']:>14}")
+
+    loops = []
+    print(f"\n{'loop':>6} {'loops':>6} {'detected':>9} {'median s':>9} {'max s':>7}")
+    for multiplier, delays in detections.items():
+        found = sorted(d for d in delays if d is not None)
+        row = {
+            "multiplier": multiplier,
+            "loops": len(delays),
+            "detection_rate": len(found) / len(delays) if delays else 0.0,
+            "median_seconds_to_detect": found[len(found) // 2] if found else None,
+            "max_seconds_to_detect": found[-1] if found else None
+        }
+        loops.append(row)
+        median = "-" if row["median_seconds_to_detect"] is None else f"{row['median_seconds_to_detect']:.0f}"
+        worst = "-" if row["max_seconds_to_detect"] is None else f"{row['max_seconds_to_detect']:.0f}"
+        print(f"{multiplier:>5}x {row['loops']:>6} {row['detection_rate']:>9.0%} {median:>9} {worst:>7}")
+
+    memory = bytes_per_tenant(10_000)
+    print(f"\ndetector state: {memory:.0f} bytes per tenant")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "scenarios": results, "loops": loops,
+                       "bytes_per_tenant": memory}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
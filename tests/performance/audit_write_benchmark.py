@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Audit write benchmark: sort-key collisions and sharded write throughput.
+
+1. Collisions: several writers logging for one tenant in the same
+   microsecond (worker threads, API handlers on other hosts) under the
+   legacy sort key (datetime.isoformat()) versus "<timestamp>#<ULID>" keys.
+   Every duplicate legacy key is an audit entry silently overwritten.
+2. Throughput: writes for one hot tenant spread over 1..N partition-key
+   shards. A DynamoDB partition key sustains ~1000 WCU/s, so the sustainable
+   rate is bounded by the busiest shard: 1000 / max_share.
+
+Runs locally against moto; the partition limit is modelled, not measured.
+
+Usage:
+    python tests/performance/audit_write_benchmark.py [--writes 2000] [--json results/audit.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.outpost.services.audit import AuditService  # noqa: E402
+
+PARTITION_WCU = 1000
+TABLE = "outpost-audit-bench"
+
+
+def create_table():
+    dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+    return dynamodb.create_table(
+        TableName=TABLE,
+        KeySchema=[
+            {"AttributeName": "tenant_id", "KeyType": "HASH"},
+            {"AttributeName": "timestamp", "KeyType": "RANGE"}
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "tenant_id", "AttributeType": "S"},
+            {"AttributeName": "timestamp", "AttributeType": "S"}
+        ],
+        BillingMode="PAY_PER_REQUEST"
+    )
+
+
+def bench_collisions(instants, writers=4):
+    legacy, keyed = set(), set()
+    for _ in range(instants):
+        now = datetime.utcnow()
+        for _ in range(writers):
+            legacy.add(now.isoformat())
+            keyed.add(AuditService._next_sort_key(now))
+    writes = instants * writers
+    return {
+        "writes": writes,
+        "writers_per_instant": writers,
+        "legacy_unique_keys": len(legacy),
+        "legacy_lost_entries": writes - len(legacy),
+        "sortable_unique_keys": len(keyed),
+        "sortable_lost_entries": writes - len(keyed)
+    }
+
+
+def bench_shards(table, writes, shard_counts):
+    results = []
+    for shards in shard_counts:
+        tenant_id = f"ten_hot_{shards}"
+        service = AuditService(shards={tenant_id: shards})
+        service.table = table
+
+        started = time.perf_counter()
+        for i in range(writes):
+            service.log_action(tenant_id, "BENCH", f"res{i}")
+        local_seconds = time.perf_counter() - started
+
+        per_partition = Counter()
+        for partition_key in service.partition_keys(tenant_id):
+            per_partition[partition_key] = table.query(
+                KeyConditionExpression=boto3.dynamodb.conditions.Key("tenant_id").eq(partition_key),
+                Select="COUNT"
+            )["Count"]
+        stored = sum(per_partition.values())
+        max_share = max(per_partition.values()) / stored
+
+        started = time.perf_counter()
+        service.get_tenant_audit(tenant_id, limit=100)
+        read_ms = (time.perf_counter() - started) * 1000
+
+        results.append({
+            "shards": shards,
+            "stored": stored,
+            "max_shard_share": round(max_share, 3),
+            "sustainable_writes_per_sec": int(PARTITION_WCU / max_share),
+            "local_writes_per_sec": int(writes / local_seconds),
+            "read_latest_100_ms": round(read_ms, 1)
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--shards", default="1,2,4,8")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        table = create_table()
+        report = {
+            "collisions": bench_collisions(args.writes),
+            "sharding": bench_shards(table, args.writes, [int(s) for s in args.shards.split(",")])
+        }
+
+    c = report["collisions"]
+    print(f"Collisions over {c['writes']} writes, {c['writers_per_instant']} writers per microsecond:")
+    print(f"  legacy isoformat keys: {c['legacy_lost_entries']} entries overwritten")
+    print(f"  timestamp#ULID keys:   {c['sortable_lost_entries']} entries overwritten")
+    print()
+    print(f"{'shards':>6} {'max share':>10} {'sustainable w/s':>16} {'gain':>6} {'read 100 (ms)':>14}")
+    base = report["sharding"][0]["sustainable_writes_per_sec"]
+    for r in report["sharding"]:
+        print(
+            f"{r['shards']:>6} {r['max_shard_share']:>10} {r['sustainable_writes_per_sec']:>16} "
+            f"{r['sustainable_writes_per_sec'] / base:>5.1f}x {r['read_latest_100_ms']:>14}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Cost engine benchmark: bulk pricing of cost events.
+
+Compares, over the same synthetic events,
+1. reference: CostEngine.calculate, one event dict at a time,
+2. vectorized: CostEngine.price over the columns loaded by
+   CostEvents.from_events (loading is timed separately),
+3. what-if: the same columns re-priced under other model tiers.
+
+The reference path is timed on a sample (--reference-events) and
+extrapolated; its results are checked against the vectorized ones.
+
+Usage:
+    python tests/performance/cost_benchmark.py [--events 2000000] [--reference-events 100000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.outpost.services import cost_engine  # noqa: E402
+from src.outpost.services.cost_engine import CostEngine, CostEvents, MODEL_TIER_MAP, LLM_TOKEN_RATES  # noqa: E402
+
+
+def generate_events(count, seed):
+    rng = random.Random(seed)
+    agents = list(LLM_TOKEN_RATES)
+    models = list(MODEL_TIER_MAP) + ["unknown-model"]
+    users = [f"user_{i}" for i in range(1000)]
+    for _ in range(count):
+        persistent = rng.random() < 0.3
+        yield {
+            "event_type": "dispatch_complete",
+            "user_id": rng.choice(users),
+            "dispatch_id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "agent": rng.choice(agents),
+            "model": rng.choice(models),
+            "started_at": "2026-05-01T00:00:00Z",
+            "ended_at": "2026-05-01T00:10:00Z",
+            "duration_seconds": rng.uniform(0, 3600),
+            "vcpu": rng.choice([0.25, 0.5, 1.0, 2.0, 4.0]),
+            "memory_mb": rng.choice([512, 1024, 2048, 4096, 8192]),
+            "network_egress_bytes": 0,
+            "tokens_input": rng.randrange(0, 500_000),
+            "tokens_output": rng.randrange(0, 100_000),
+            "status": "success",
+            "workspace_mode": "persistent" if persistent else "ephemeral",
+            "efs_size_bytes": rng.randrange(0, 50 * 1024 ** 3) if persistent else None
+        }
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=2_000_000)
+    parser.add_argument("--reference-events", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    if cost_engine.np is None:
+        print("numpy is not installed; CostEngine.price falls back to the reference implementation")
+
+    engine = CostEngine()
+    events = list(generate_events(args.events, args.seed))
+    sample = events[:args.reference_events]
+
+    loaded, load_s = timed(lambda: CostEvents.from_events(events))
+    priced, price_s = timed(lambda: engine.price(loaded))
+    what_if = CostEngine(model_tiers={model: "balanced" for model in MODEL_TIER_MAP})
+    _, what_if_s = timed(lambda: what_if.price(loaded))
+    _, totals_s = timed(lambda: engine.totals(loaded, by="user_id"))
+    reference, reference_s = timed(lambda: [engine.calculate(event)["total"] for event in sample])
+
+    mismatches = sum(1 for i, total in enumerate(reference) if float(priced["total"][i]) != total)
+    results = [
+        {"method": "reference", "events": len(sample), "seconds": reference_s},
+        {"method": "load columns", "events": len(loaded), "seconds": load_s},
+        {"method": "vectorized", "events": len(loaded), "seconds": price_s},
+        {"method": "what-if", "events": len(loaded), "seconds": what_if_s},
+        {"method": "totals by user", "events": len(loaded), "seconds": totals_s}
+    ]
+    for r in results:
+        r["events_per_second"] = r["events"] / r["seconds"] if r["seconds"] else float("inf")
+
+    print(f"{args.events} events ({len(loaded.pairs)} agent/model pairs, {len(loaded.users)} users):")
+    print(f"{'method':>15} {'events':>10} {'seconds':>9} {'events/s':>14}")
+    for r in results:
+        print(f"{r['method']:>15} {r['events']:>10} {r['seconds']:>9.3f} {r['events_per_second']:>14,.0f}")
+    print(f"reference mismatches: {mismatches} of {len(sample)}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results, "mismatches": mismatches}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Credential injection benchmark: time spent building each job's credentials.
+
+Replays the same job stream (tenants drawn with a skew, most jobs from a
+few busy tenants) against Secrets Manager under moto, with a simulated
+round trip per API call (--rtt-ms, since moto answers in-process):
+1. ad hoc: GetSecretValue for the job's agent key and the GitHub token,
+   on every job,
+2. per secret, cached: the same calls with a per-secret cache (as
+   SecretsManager.get_api_key_secret); missing secrets are not cached,
+3. batched: SecretsManager.agent_env, one BatchGetSecretValue per tenant,
+   cached per tenant,
+4. batched, warmed: as 3, after prefetch_agent_credentials for the
+   tenants a worker warms at startup (timed separately).
+
+All runs stay within the cache TTL; in production each tenant is read again
+every five minutes.
+
+Usage:
+    python tests/performance/credential_benchmark.py [--tenants 200] [--jobs 2000] [--rtt-ms 20]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from moto import mock_aws  # noqa: E402
+from botocore.exceptions import ClientError  # noqa: E402
+
+from src.outpost.secrets import SecretsManager, AGENT_CREDENTIAL_ENV  # noqa: E402
+
+AGENTS = ["claude", "codex", "gemini", "aider", "grok"]
+
+
+class RoundTrips:
+    """Counts Secrets Manager calls and adds a fixed delay to each."""
+
+    def __init__(self, rtt_seconds):
+        self.rtt_seconds = rtt_seconds
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.rtt_seconds)
+
+
+def seed(manager, rng, tenants):
+    for i in range(tenants):
+        tenant_id = f"ten_{i}"
+        for agent in rng.sample(AGENTS, rng.randint(1, 3)):
+            manager.create_agent_credential(tenant_id, agent, f"{agent}-{tenant_id}")
+        if rng.random() < 0.5:
+            manager.create_agent_credential(tenant_id, "github", f"ghp-{tenant_id}")
+
+
+def job_stream(rng, tenants, jobs):
+    weights = [1 / (i + 1) for i in range(tenants)]
+    for tenant in rng.choices(range(tenants), weights=weights, k=jobs):
+        yield f"ten_{tenant}", rng.choice(AGENTS)
+
+
+def per_secret_env(manager, cache, tenant_id, agent):
+    env = {}
+    for name in (agent, "github"):
+        secret_name = manager._get_agent_prefix(tenant_id) + name
+        if cache is not None and secret_name in cache:
+            env[AGENT_CREDENTIAL_ENV[name]] = cache[secret_name]
+            continue
+        try:
+            value = manager.client.get_secret_value(SecretId=secret_name)["SecretString"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ResourceNotFoundException":
+                raise
+            continue
+        if cache is not None:
+            cache[secret_name] = value
+        env[AGENT_CREDENTIAL_ENV[name]] = value
+    return env
+
+
+def run(name, manager, trips, jobs, build_env, warm=None):
+    manager._cache = {}
+    trips.calls = 0
+    warm_seconds = 0.0
+    if warm:
+        started = time.perf_counter()
+        warm()
+        warm_seconds = time.perf_counter() - started
+    warm_calls = trips.calls
+    trips.calls = 0
+
+    latencies = []
+    for tenant_id, agent in jobs:
+        started = time.perf_counter()
+        build_env(tenant_id, agent)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        "method": name,
+        "jobs": len(jobs),
+        "calls": trips.calls,
+        "calls_per_job": trips.calls / len(jobs),
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "warm_calls": warm_calls,
+        "warm_seconds": warm_seconds
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, default=200)
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--warm-tenants", type=int, default=50, help="Busiest tenants warmed at startup")
+    parser.add_argument("--rtt-ms", type=float, default=20.0, help="Simulated Secrets Manager round trip")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with mock_aws():
+        manager = SecretsManager()
+        seed(manager, rng, args.tenants)
+        trips = RoundTrips(args.rtt_ms / 1000)
+        manager.client.meta.events.register("before-call.secrets-manager", trips)
+        jobs = list(job_stream(rng, args.tenants, args.jobs))
+        per_secret_cache = {}
+
+        results = [
+            run("ad hoc", manager, trips, jobs,
+                lambda tenant_id, agent: per_secret_env(manager, None, tenant_id, agent)),
+            run("per secret", manager, trips, jobs,
+                lambda tenant_id, agent: per_secret_env(manager, per_secret_cache, tenant_id, agent)),
+            run("batched", manager, trips, jobs, manager.agent_env),
+            run("warmed", manager, trips, jobs, manager.agent_env,
+                warm=lambda: manager.prefetch_agent_credentials(f"ten_{i}" for i in range(args.warm_tenants)))
+        ]
+
+    baseline = results[0]["mean_ms"]
+    print(f"{args.jobs} jobs over {args.tenants} tenants, {args.rtt_ms:g} ms per Secrets Manager call:")
+    print(f"{'method':>11} {'calls/job':>10} {'mean ms':>8} {'p50 ms':>7} {'p99 ms':>7} {'saved ms/job':>13}")
+    for r in results:
+        r["saved_ms_per_job"] = baseline - r["mean_ms"]
+        print(f"{r['method']:>11} {r['calls_per_job']:>10.3f} {r['mean_ms']:>8.2f} {r['p50_ms']:>7.2f} "
+              f"{r['p99_ms']:>7.2f} {r['saved_ms_per_job']:>13.2f}")
+    warmed = results[-1]
+    print(f"warm-up: {args.warm_tenants} tenants in {warmed['warm_calls']} calls, {warmed['warm_seconds']:.2f}s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Job submission benchmark: storing a job and counting it against the quota.
+
+Compares, per submission,
+1. sequential: PutItem for the job, then MeteringService.record_job_usage
+   (two round trips, and a window where the job exists uncounted),
+2. transaction: MeteringService.transact_job_usage, one TransactWriteItems
+   call holding the job Put and the usage update.
+
+Runs locally against moto. --latency-ms adds a per-request delay to model
+the round trip to DynamoDB (--txn-latency-ms for TransactWriteItems, which
+is slower in practice). Moto's own processing time is not representative
+(its transactions copy the tables involved), so "model ms" reports the
+mean modeled network time per submission alongside the measured times.
+
+Usage:
+    python tests/performance/submission_benchmark.py [--jobs 500] [--latency-ms 6] [--txn-latency-ms 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.outpost.services.metering import MeteringService  # noqa: E402
+
+JOBS_TABLE = "outpost-jobs-bench"
+USAGE_TABLE = "outpost-usage-bench"
+TENANTS_TABLE = "outpost-tenants-bench"
+
+
+def create_tables():
+    dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+    dynamodb.create_table(
+        TableName=JOBS_TABLE,
+        KeySchema=[
+            {"AttributeName": "tenant_id", "KeyType": "HASH"},
+            {"AttributeName": "job_id", "KeyType": "RANGE"}
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "tenant_id", "AttributeType": "S"},
+            {"AttributeName": "job_id", "AttributeType": "S"}
+        ],
+        BillingMode="PAY_PER_REQUEST"
+    )
+    dynamodb.create_table(
+        TableName=USAGE_TABLE,
+        KeySchema=[{"AttributeName": "period_key", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "period_key", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST"
+    )
+    tenants = dynamodb.create_table(
+        TableName=TENANTS_TABLE,
+        KeySchema=[{"AttributeName": "tenant_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "tenant_id", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST"
+    )
+    for method in ("sequential", "transaction"):
+        tenants.put_item(Item={"tenant_id": f"ten_{method}", "subscription_tier": "enterprise"})
+
+
+def add_latency(service, latency_ms, txn_latency_ms):
+    calls = {"count": 0, "modeled_ms": 0.0}
+
+    def on_call(event_name, **kwargs):
+        calls["count"] += 1
+        delay = txn_latency_ms if event_name.endswith("TransactWriteItems") else latency_ms
+        calls["modeled_ms"] += delay
+        if delay:
+            time.sleep(delay / 1000)
+
+    service.dynamodb.meta.client.meta.events.register("before-call.dynamodb", on_call)
+    return calls
+
+
+def job_put(tenant_id, job_id):
+    return {
+        "TableName": JOBS_TABLE,
+        "Item": {"tenant_id": tenant_id, "job_id": job_id, "status": "PENDING"},
+        "ConditionExpression": "attribute_not_exists(job_id)"
+    }
+
+
+def bench(method, service, calls, jobs, interval_ms):
+    tenant_id = f"ten_{method}"
+    # Warm up: seeds the usage item
+    service.transact_job_usage(tenant_id, "warmup", [{"Put": job_put(tenant_id, "warmup")}])
+    calls["count"] = 0
+    calls["modeled_ms"] = 0.0
+
+    latencies = []
+    for i in range(jobs):
+        job_id = f"job_{i:06d}"
+        started = time.perf_counter()
+        if method == "sequential":
+            service.dynamodb.meta.client.put_item(**job_put(tenant_id, job_id))
+            service.record_job_usage(tenant_id, job_id)
+        else:
+            service.transact_job_usage(tenant_id, job_id, [{"Put": job_put(tenant_id, job_id)}])
+        latencies.append((time.perf_counter() - started) * 1000)
+        if interval_ms:
+            time.sleep(interval_ms / 1000)
+
+    latencies.sort()
+    return {
+        "method": method,
+        "requests": calls["count"],
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "mean_ms": statistics.fmean(latencies),
+        "modeled_ms": calls["modeled_ms"] / jobs,
+        "counted": service.get_usage(tenant_id)["count"] - 1
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=6.0)
+    parser.add_argument("--txn-latency-ms", type=float, default=10.0)
+    parser.add_argument("--interval-ms", type=float, default=0.0, help="Pause between submissions")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ["USAGE_TABLE"] = USAGE_TABLE
+    os.environ["TENANTS_TABLE"] = TENANTS_TABLE
+    os.environ["STRIPE_METERING_ENABLED"] = "false"
+    results = []
+    with mock_aws():
+        create_tables()
+        for method in ("sequential", "transaction"):
+            MeteringService.reset_leases()
+            service = MeteringService(shards={})
+            calls = add_latency(service, args.latency_ms, args.txn_latency_ms)
+            results.append(bench(method, service, calls, args.jobs, args.interval_ms))
+
+    print(f"{args.jobs} submissions, {args.latency_ms} ms per request ({args.txn_latency_ms} ms per transaction):")
+    print(f"{'method':>18} {'requests':>9} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'model ms':>9} {'counted':>8}")
+    for r in results:
+        print(f"{r['method']:>18} {r['requests']:>9} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['mean_ms']:>8.1f} {r['modeled_ms']:>9.1f} {r['counted']:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Usage history benchmark: 24 months x many tenants.
+
+Compares fetching monthly usage history
+1. one GetItem per tenant-month (the obvious fix for the broken Query), and
+2. MeteringService.get_usage_histories: deterministic period keys fetched
+   with BatchGetItem, 100 keys per request, requests in parallel.
+
+Runs locally against moto. Moto answers in microseconds, so --latency-ms
+adds a per-request delay to model the network round trip to DynamoDB.
+
+Usage:
+    python tests/performance/usage_history_benchmark.py [--tenants 200] [--months 24] [--latency-ms 8]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.outpost.services.metering import MeteringService  # noqa: E402
+
+TABLE = "outpost-usage-bench"
+
+
+def create_table():
+    dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+    return dynamodb.create_table(
+        TableName=TABLE,
+        KeySchema=[{"AttributeName": "period_key", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "period_key", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST"
+    )
+
+
+def seed(table, tenant_ids, periods, fill):
+    with table.batch_writer() as batch:
+        for tenant_id in tenant_ids:
+            for period in periods:
+                if random.random() < fill:
+                    batch.put_item(Item={
+                        "period_key": f"{tenant_id}#{period}",
+                        "tenant_id": tenant_id,
+                        "job_count": random.randint(1, 100),
+                        "quota_limit": 100,
+                        "tier": "pro"
+                    })
+
+
+def add_latency(service, latency_ms):
+    calls = {"count": 0}
+
+    def on_call(**kwargs):
+        calls["count"] += 1
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+
+    service.dynamodb.meta.client.meta.events.register("before-call.dynamodb", on_call)
+    return calls
+
+
+def bench_get_item(service, calls, tenant_ids, periods):
+    calls["count"] = 0
+    started = time.perf_counter()
+    found = 0
+    for tenant_id in tenant_ids:
+        for period in periods:
+            found += "Item" in service.usage_table.get_item(Key={"period_key": f"{tenant_id}#{period}"})
+    return {"method": "get_item", "seconds": time.perf_counter() - started, "requests": calls["count"], "items": found}
+
+
+def bench_batch(service, calls, tenant_ids, months):
+    calls["count"] = 0
+    started = time.perf_counter()
+    histories = service.get_usage_histories(tenant_ids, months)
+    found = sum(1 for history in histories.values() for month in history if month["tier"])
+    return {"method": "batch_get", "seconds": time.perf_counter() - started, "requests": calls["count"], "items": found}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, default=200)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--fill", type=float, default=0.6, help="Fraction of months with usage")
+    parser.add_argument("--latency-ms", type=float, default=8.0)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ["USAGE_TABLE"] = TABLE
+    with mock_aws():
+        table = create_table()
+        service = MeteringService(shards={})
+        tenant_ids = [f"ten_{i:05d}" for i in range(args.tenants)]
+        periods = service.recent_periods(args.months)
+        seed(table, tenant_ids, periods, args.fill)
+
+        calls = add_latency(service, args.latency_ms)
+        results = [
+            bench_get_item(service, calls, tenant_ids, periods),
+            bench_batch(service, calls, tenant_ids, args.months)
+        ]
+
+    print(f"{args.tenants} tenants x {args.months} months, {args.latency_ms} ms per request:")
+    print(f"{'method':>10} {'requests':>9} {'items':>7} {'seconds':>8} {'speedup':>8}")
+    base = results[0]["seconds"]
+    for r in results:
+        print(f"{r['method']:>10} {r['requests']:>9} {r['items']:>7} {r['seconds']:>8.2f} {base / r['seconds']:>7.1f}x")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
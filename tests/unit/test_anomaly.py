@@ -0,0 +1,193 @@
+import os
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import boto3
+from moto import mock_aws
+
+from src.outpost.services.anomaly import AnomalyDetector, UsageAnomalyError
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_040.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@mock_aws
+class TestAnomalyDetector(unittest.TestCase):
+    def setUp(self):
+        for name in ("ANOMALY_MODE", "ANOMALY_STATE", "ANOMALY_INTERVAL_SECONDS", "ANOMALY_MIN_JOBS",
+                     "ANOMALY_THRESHOLD"):
+            os.environ.pop(name, None)
+        os.environ["RATE_LIMITS_TABLE"] = "outpost-rate-limits-test"
+        self.addCleanup(os.environ.pop, "RATE_LIMITS_TABLE")
+        AnomalyDetector.reset()
+        self.table = boto3.resource("dynamodb", region_name="us-east-1").create_table(
+            TableName="outpost-rate-limits-test",
+            KeySchema=[{"AttributeName": "bucket_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "bucket_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        self.clock = FakeClock()
+        self.audit = MagicMock()
+
+    def _detector(self, mode="flag", metering=None, state=None):
+        return AnomalyDetector(mode=mode, audit=self.audit, metering=metering, clock=self.clock, state=state)
+
+    def _steady(self, detector, per_interval, intervals, tenant_id="ten_1"):
+        for _ in range(intervals):
+            for _ in range(per_interval):
+                detector.record_submission(tenant_id)
+            self.clock.now += 60
+
+    def _actions(self):
+        return [call.args[1] for call in self.audit.log_action.call_args_list]
+
+    def test_steady_rate_not_flagged(self):
+        detector = self._detector(state="local")
+        self._steady(detector, 40, 50)
+
+        self.assertEqual(self._actions(), [])
+        self.assertAlmostEqual(detector.baseline("ten_1")["mean"], 40)
+
+    def test_loop_flagged_within_interval_and_audited_once(self):
+        detector = self._detector(state="local")
+        self._steady(detector, 40, 60)
+
+        decisions = [detector.record_submission("ten_1") for _ in range(500)]
+
+        self.assertFalse(decisions[0].anomalous)
+        self.assertTrue(decisions[-1].anomalous)
+        self.assertFalse(decisions[-1].throttled)
+        self.assertEqual(self._actions(), ["USAGE_ANOMALY"])
+        metadata = self.audit.log_action.call_args.kwargs["metadata"]
+        self.assertGreater(metadata["count"], metadata["limit"])
+
+    def test_flagged_intervals_do_not_raise_the_baseline(self):
+        detector = self._detector(state="local")
+        self._steady(detector, 40, 60)
+        before = detector.baseline("ten_1")["mean"]
+
+        self._steady(detector, 1000, 10)
+
+        self.assertAlmostEqual(detector.baseline("ten_1")["mean"], before)
+        self.assertTrue(detector.baseline("ten_1")["flagged"])
+
+    def test_episode_clears_when_rate_returns(self):
+        detector = self._detector()
+        self._steady(detector, 5, 5)
+        self._steady(detector, 200, 3)
+        self._steady(detector, 5, 2)
+
+        self.assertEqual(self._actions(), ["USAGE_ANOMALY", "USAGE_ANOMALY_CLEARED"])
+        self.assertEqual(self.audit.log_action.call_args.kwargs["metadata"]["peak_per_interval"], 200)
+        self.assertFalse(detector.baseline("ten_1")["flagged"])
+
+    def test_throttle_mode_raises_until_cleared(self):
+        detector = self._detector("throttle")
+        self._steady(detector, 5, 3)
+        for _ in range(30):
+            detector.record_submission("ten_1")
+        with self.assertRaises(UsageAnomalyError) as ctx:
+            detector.record_submission("ten_1")
+        self.assertGreater(ctx.exception.retry_after, 0)
+        # Other tenants are unaffected
+        detector.record_submission("ten_2")
+
+        self.clock.now += 120
+        self.assertFalse(detector.record_submission("ten_1").throttled)
+
+    def test_unseeded_tenant_not_judged_during_warmup(self):
+        detector = self._detector(state="local")
+        self._steady(detector, 1000, 3)
+        self.assertEqual(self._actions(), [])
+
+    def test_baseline_seeded_from_month_to_date_usage(self):
+        metering = MagicMock()
+        # A busy tenant: about 100 jobs a minute so far this month
+        metering.get_usage.return_value = {"count": 100 * 60 * 24 * 10}
+        self.clock.now = datetime(2026, 5, 11, 0, 0, 30, tzinfo=timezone.utc).timestamp()
+        detector = self._detector(metering=metering)
+
+        for _ in range(150):
+            detector.record_submission("ten_1")
+
+        self.assertEqual(self._actions(), [])
+        metering.get_usage.assert_called_once_with("ten_1")
+        self.assertGreater(detector.baseline("ten_1")["mean"], 10)
+
+        # A new container facing an ongoing loop judges it straight away
+        metering.get_usage.return_value = {"count": 0}
+        for _ in range(31):
+            detector.record_submission("ten_2")
+        self.assertEqual(self._actions(), ["USAGE_ANOMALY"])
+
+    def test_idle_intervals_decay_baseline(self):
+        detector = self._detector(state="local")
+        self._steady(detector, 40, 60)
+        self.clock.now += 60 * 1000
+        detector.record_submission("ten_1")
+
+        self.assertLess(detector.baseline("ten_1")["mean"], 0.01)
+
+    def test_rate_shared_across_instances(self):
+        """Test a loop spread over several containers is judged on its whole rate."""
+        detectors = [self._detector() for _ in range(4)]
+        for _ in range(30):
+            for detector in detectors:
+                for _ in range(10):
+                    detector.record_submission("ten_1")
+            self.clock.now += 60
+
+        # 40 per interval in total, not 10 per container
+        self.assertAlmostEqual(detectors[0].baseline("ten_1")["mean"], 40, delta=1)
+        self.assertEqual(self._actions(), [])
+
+        # Each container sees a quarter of a 400-per-interval loop; none of them alone would flag it
+        decisions = [detectors[i % 4].record_submission("ten_1") for i in range(400)]
+        self.assertTrue(decisions[-1].anomalous)
+        self.assertEqual(self._actions(), ["USAGE_ANOMALY"])
+
+    def test_new_containers_do_not_inflate_the_prior(self):
+        """Test the month-to-date prior is read once per tenant, not once per container."""
+        metering = MagicMock()
+        metering.get_usage.return_value = {"count": 100 * 60 * 24 * 10}
+        self.clock.now = datetime(2026, 5, 11, 0, 0, 30, tzinfo=timezone.utc).timestamp()
+
+        for _ in range(5):
+            self._detector(metering=metering).record_submission("ten_1")
+
+        metering.get_usage.assert_called_once_with("ten_1")
+        self.assertEqual(self._detector().baseline("ten_1")["count"], 5)
+
+    def test_local_state_per_process(self):
+        detector = self._detector(state="local")
+        self._steady(detector, 40, 5)
+
+        self.assertAlmostEqual(detector.baseline("ten_1")["mean"], 40)
+        self.assertIsNone(self._detector().baseline("ten_1"))
+        self.assertNotIn("Item", self.table.get_item(Key={"bucket_id": "anomaly#ten_1"}))
+
+    def test_fails_open_without_table(self):
+        self.table.delete()
+        decision = self._detector("throttle").record_submission("ten_1")
+        self.assertFalse(decision.anomalous)
+
+    def test_off_and_invalid_modes(self):
+        detector = self._detector("off")
+        for _ in range(1000):
+            detector.record_submission("ten_1")
+        self.assertIsNone(detector.baseline("ten_1"))
+
+        with self.assertRaises(ValueError):
+            AnomalyDetector(mode="block", audit=self.audit)
+        with self.assertRaises(ValueError):
+            AnomalyDetector(audit=self.audit, state="redis")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,9 @@
 import unittest
 import os
+from datetime import datetime, timedelta
 from moto import mock_aws
 import boto3
-from src.outpost.services.audit import AuditService
+from src.outpost.services.audit import AuditService, AuditMode, SORT_KEY_FORMAT, flush_audit_aggregates
 
 @mock_aws
 class TestAuditService(unittest.TestCase):
@@ -20,11 +21,22 @@ class TestAuditService(unittest.TestCase):
             ],
             AttributeDefinitions=[
                 {"AttributeName": "tenant_id", "AttributeType": "S"},
-                {"AttributeName": "timestamp", "AttributeType": "S"}
+                {"AttributeName": "timestamp", "AttributeType": "S"},
+                {"AttributeName": "action_bucket", "AttributeType": "S"}
             ],
+            GlobalSecondaryIndexes=[{
+                "IndexName": "action-index",
+                "KeySchema": [
+                    {"AttributeName": "action_bucket", "KeyType": "HASH"},
+                    {"AttributeName": "timestamp", "KeyType": "RANGE"}
+                ],
+                "Projection": {"ProjectionType": "ALL"}
+            }],
             BillingMode="PAY_PER_REQUEST"
         )
         self.service = AuditService(region_name=self.region)
+        AuditService._aggregates.clear()
+        AuditService._aggregates_since = None
 
     def test_log_action(self):
         self.service.log_action(
@@ -51,5 +63,206 @@ class TestAuditService(unittest.TestCase):
         # ScanIndexForward=False means newest first. ACTION2 should be first.
         self.assertEqual(entries[0].action, "ACTION2")
 
+    def test_same_instant_writes_do_not_collide(self):
+        for i in range(50):
+            self.service.log_action("ten_123", "BURST", f"res{i}")
+
+        items = self.table.query(
+            KeyConditionExpression=boto3.dynamodb.conditions.Key("tenant_id").eq("ten_123")
+        )["Items"]
+        self.assertEqual(len(items), 50)
+        # Sort keys follow write order
+        self.assertEqual([item["resource"] for item in items], [f"res{i}" for i in range(50)])
+
+    def test_sharded_tenant_reads_merge_shards(self):
+        service = AuditService(region_name=self.region, shards={"ten_hot": 4})
+        for i in range(40):
+            service.log_action("ten_hot", "ACTION", f"res{i:02d}")
+
+        partitions = {
+            item["tenant_id"] for item in self.table.scan()["Items"]
+        }
+        self.assertGreater(len(partitions), 1)
+        self.assertTrue(partitions <= set(service.partition_keys("ten_hot")))
+
+        entries = service.get_tenant_audit("ten_hot", limit=10)
+        self.assertEqual([e.resource for e in entries], [f"res{i:02d}" for i in range(39, 29, -1)])
+        self.assertTrue(all(e.tenant_id == "ten_hot" for e in entries))
+
+    def _seed(self, service, tenant_id, count):
+        for i in range(count):
+            service.log_action(tenant_id, "JOB" if i % 3 else "LOGIN", f"res{i:02d}")
+
+    def test_query_range_paginates_with_cursor(self):
+        service = AuditService(region_name=self.region, shards={"ten_hot": 3})
+        self._seed(service, "ten_hot", 25)
+
+        seen = []
+        entries, cursor = service.query_range("ten_hot", limit=10, newest_first=False)
+        seen.extend(e.resource for e in entries)
+        while cursor:
+            entries, cursor = service.query_range("ten_hot", limit=10, cursor=cursor, newest_first=False)
+            seen.extend(e.resource for e in entries)
+
+        self.assertEqual(seen, [f"res{i:02d}" for i in range(25)])
+
+    def test_query_range_filters_actions_and_window(self):
+        self._seed(self.service, "ten_123", 12)
+        future = datetime.utcnow() + timedelta(days=1)
+
+        entries, cursor = self.service.query_range("ten_123", actions=["LOGIN"], limit=100)
+        self.assertEqual([e.resource for e in entries], ["res09", "res06", "res03", "res00"])
+        self.assertIsNone(cursor)
+
+        entries, _ = self.service.query_range("ten_123", start=future, end=future + timedelta(days=1))
+        self.assertEqual(entries, [])
+
+    def test_iter_pages_is_lazy(self):
+        self._seed(self.service, "ten_123", 7)
+        pages = self.service.iter_pages("ten_123", page_size=3)
+
+        first = next(pages)
+        self.assertEqual([e.resource for e in first], ["res06", "res05", "res04"])
+        self.assertEqual([len(page) for page in pages], [3, 1])
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            self.service.query_range("ten_123", cursor="not-a-cursor")
+
+    def _items(self, tenant_id="ten_123"):
+        return self.table.query(
+            KeyConditionExpression=boto3.dynamodb.conditions.Key("tenant_id").eq(tenant_id)
+        )["Items"]
+
+    def test_sampled_actions(self):
+        service = AuditService(region_name=self.region, policies={
+            "GET_JOB": (AuditMode.SAMPLE, 0.0),
+            "LIST_JOBS": (AuditMode.SAMPLE, 1.0)
+        })
+        for _ in range(20):
+            service.log_action("ten_123", "GET_JOB", "job_1")
+        service.log_action("ten_123", "LIST_JOBS", "jobs")
+
+        items = self._items()
+        self.assertEqual([item["action"] for item in items], ["LIST_JOBS"])
+        self.assertEqual(items[0]["metadata"]["sample_rate"], 1)
+
+    def test_aggregated_actions_flush_as_counters(self):
+        service = AuditService(region_name=self.region, policies={"GET_JOB": (AuditMode.AGGREGATE, 1.0)})
+        for _ in range(5):
+            service.log_action("ten_123", "GET_JOB", "job_1")
+        self.assertEqual(self._items(), [])
+
+        self.assertEqual(service.flush(), 1)
+        for _ in range(3):
+            service.log_action("ten_123", "GET_JOB", "job_1")
+        service.flush()
+
+        items = self._items()
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]["count"], 8)
+
+        entries = service.get_tenant_audit("ten_123")
+        self.assertEqual(entries[0].action, "GET_JOB")
+        self.assertEqual(entries[0].metadata["count"], 8)
+        self.assertTrue(entries[0].metadata["aggregated"])
+
+    def test_handler_flushes_aggregates_once_due(self):
+        @flush_audit_aggregates
+        def handler(event, context):
+            AuditService(region_name=self.region, policies={"GET_JOB": (AuditMode.AGGREGATE, 1.0)}).log_action(
+                "ten_123", "GET_JOB", "job_1"
+            )
+            raise RuntimeError("handler failed")
+
+        # Counts are held across invocations of a warm container
+        with self.assertRaises(RuntimeError):
+            handler({}, None)
+        self.assertEqual(self._items(), [])
+        self.assertTrue(AuditService.has_pending_aggregates())
+
+        os.environ["AUDIT_AGGREGATE_FLUSH_COUNT"] = "2"
+        self.addCleanup(os.environ.pop, "AUDIT_AGGREGATE_FLUSH_COUNT")
+        with self.assertRaises(RuntimeError):
+            handler({}, None)
+
+        items = self._items()
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]["count"], 2)
+        self.assertFalse(AuditService.has_pending_aggregates())
+
+    def test_aggregates_due_by_age(self):
+        service = AuditService(region_name=self.region, policies={"GET_JOB": (AuditMode.AGGREGATE, 1.0)})
+        self.assertFalse(AuditService.aggregates_due(max_age_seconds=0))
+        service.log_action("ten_123", "GET_JOB", "job_1")
+
+        self.assertFalse(AuditService.aggregates_due(max_age_seconds=60, max_count=100))
+        self.assertTrue(AuditService.aggregates_due(max_age_seconds=0, max_count=100))
+
+    def test_billing_portal_access_is_never_aggregated(self):
+        service = AuditService(region_name=self.region, policies={"ACCESS_BILLING_PORTAL": (AuditMode.AGGREGATE, 1.0)})
+        service.log_action("ten_123", "ACCESS_BILLING_PORTAL", "bps_1")
+
+        self.assertEqual([item["action"] for item in self._items()], ["ACCESS_BILLING_PORTAL"])
+
+    def test_security_critical_actions_always_logged(self):
+        service = AuditService(region_name=self.region, policies={
+            "REVOKE_KEY": (AuditMode.SAMPLE, 0.0),
+            "GENERATE_KEY": (AuditMode.AGGREGATE, 1.0)
+        })
+        service.log_action("ten_123", "REVOKE_KEY", "key_1")
+        service.log_action("ten_123", "GENERATE_KEY", "key_2")
+
+        self.assertEqual(sorted(item["action"] for item in self._items()), ["GENERATE_KEY", "REVOKE_KEY"])
+
+    def test_policies_from_environment(self):
+        os.environ["AUDIT_POLICIES"] = "GET_JOB=sample:0.25,LIST_JOBS=aggregate"
+        try:
+            service = AuditService(region_name=self.region)
+        finally:
+            del os.environ["AUDIT_POLICIES"]
+
+        self.assertEqual(service.policy("GET_JOB"), (AuditMode.SAMPLE, 0.25))
+        self.assertEqual(service.policy("LIST_JOBS"), (AuditMode.AGGREGATE, 1.0))
+        self.assertEqual(service.policy("ACCESS_BILLING_PORTAL"), (AuditMode.ALWAYS, 1.0))
+        self.assertEqual(service.policy("SUBMIT_JOB"), (AuditMode.ALWAYS, 1.0))
+
+    def test_query_action_across_tenants(self):
+        for i in range(9):
+            self.service.log_action(f"ten_{i % 3}", "REVOKE_KEY", f"key_{i}")
+            self.service.log_action(f"ten_{i % 3}", "SUBMIT_JOB", f"job_{i}")
+
+        # Only indexed actions carry the sparse index attribute
+        indexed = [item for item in self.table.scan()["Items"] if "action_bucket" in item]
+        self.assertEqual({item["action"] for item in indexed}, {"REVOKE_KEY"})
+
+        seen = []
+        entries, cursor = self.service.query_action("REVOKE_KEY", limit=4)
+        seen.extend(entries)
+        while cursor:
+            entries, cursor = self.service.query_action("REVOKE_KEY", limit=4, cursor=cursor)
+            seen.extend(entries)
+        self.assertEqual([e.resource for e in seen], [f"key_{i}" for i in range(8, -1, -1)])
+        self.assertEqual({e.tenant_id for e in seen}, {"ten_0", "ten_1", "ten_2"})
+
+    def test_query_action_spans_hour_buckets(self):
+        now = datetime.utcnow()
+        for hours_ago in (0, 2, 5):
+            when = now - timedelta(hours=hours_ago)
+            self.table.put_item(Item={
+                "tenant_id": "ten_123",
+                "timestamp": f"{when.strftime(SORT_KEY_FORMAT)}#{hours_ago:026d}",
+                "action": "GENERATE_KEY",
+                "resource": f"key_{hours_ago}",
+                "metadata": {},
+                "action_bucket": self.service._action_bucket("GENERATE_KEY", when, 0)
+            })
+
+        entries, _ = self.service.query_action("GENERATE_KEY", start=now - timedelta(hours=3), end=now, newest_first=False)
+        self.assertEqual([e.resource for e in entries], ["key_2", "key_0"])
+
+        with self.assertRaises(ValueError):
+            self.service.query_action("SUBMIT_JOB")
+
 if __name__ == "__main__":
     unittest.main()
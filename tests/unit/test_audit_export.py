@@ -0,0 +1,84 @@
+import gzip
+import json
+import os
+import unittest
+from datetime import datetime, timedelta
+from moto import mock_aws
+import boto3
+from src.outpost.services.audit import AuditService
+from src.outpost.services.audit_export import AuditExporter, MIN_PART_SIZE
+
+@mock_aws
+class TestAuditExport(unittest.TestCase):
+    def setUp(self):
+        self.region = "us-east-1"
+        os.environ["AUDIT_TABLE"] = "outpost-audit-prod"
+        self.dynamodb = boto3.resource("dynamodb", region_name=self.region)
+        self.dynamodb.create_table(
+            TableName="outpost-audit-prod",
+            KeySchema=[
+                {"AttributeName": "tenant_id", "KeyType": "HASH"},
+                {"AttributeName": "timestamp", "KeyType": "RANGE"}
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "tenant_id", "AttributeType": "S"},
+                {"AttributeName": "timestamp", "AttributeType": "S"}
+            ],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        self.s3 = boto3.client("s3", region_name=self.region)
+        self.s3.create_bucket(Bucket="outpost-audit-exports")
+        self.audit = AuditService(region_name=self.region, shards={"ten_123": 2})
+        self.exporter = AuditExporter(audit=self.audit, bucket="outpost-audit-exports", page_size=7)
+
+    def _read_ndjson(self, location):
+        key = location.split("/", 3)[3]
+        body = self.s3.get_object(Bucket="outpost-audit-exports", Key=key)["Body"].read()
+        return [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+
+    def test_export_ndjson(self):
+        for i in range(30):
+            self.audit.log_action("ten_123", "SUBMIT_JOB" if i % 2 else "GET_JOB", f"job_{i:02d}", metadata={"seq": i})
+        self.audit.log_action("ten_other", "SUBMIT_JOB", "job_x")
+
+        start = datetime.utcnow() - timedelta(hours=1)
+        end = datetime.utcnow() + timedelta(hours=1)
+        stats = self.exporter.export("ten_123", start, end)
+
+        self.assertEqual(stats["entries"], 30)
+        self.assertEqual(stats["parts"], 1)
+        self.assertGreater(stats["bytes_uncompressed"], stats["bytes_written"])
+        rows = self._read_ndjson(stats["location"])
+        self.assertEqual([row["resource"] for row in rows], [f"job_{i:02d}" for i in range(30)])
+        self.assertEqual(rows[3]["metadata"], {"seq": 3})
+
+        stats = self.exporter.export("ten_123", start, end, actions=["SUBMIT_JOB"], key="filtered.ndjson.gz")
+        self.assertEqual(stats["entries"], 15)
+
+    def test_export_empty_range(self):
+        start = datetime(2020, 1, 1)
+        stats = self.exporter.export("ten_123", start, start + timedelta(days=1))
+        self.assertEqual(stats["entries"], 0)
+        self.assertEqual(self._read_ndjson(stats["location"]), [])
+
+    def test_multipart_parts_respect_minimum_size(self):
+        # Incompressible metadata so the gzip stream spans several parts
+        payload = os.urandom(150 * 1024).hex()
+        # Hex compresses about 2:1
+        entries = 2 * MIN_PART_SIZE // len(payload) + 4
+        for i in range(entries):
+            self.audit.log_action("ten_123", "BULK", f"res{i}", metadata={"blob": payload})
+        exporter = AuditExporter(audit=self.audit, bucket="outpost-audit-exports", part_size=1)
+
+        stats = exporter.export("ten_123", datetime(2020, 1, 1), datetime.utcnow() + timedelta(hours=1))
+
+        self.assertEqual(stats["entries"], entries)
+        self.assertEqual(stats["parts"], 2)
+        self.assertEqual(len(self._read_ndjson(stats["location"])), entries)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            self.exporter.export("ten_123", datetime(2020, 1, 1), datetime.utcnow(), fmt="xml")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import json
+from src.outpost.worker.batching import JobBatcher
+
+
+def _message(job_id, tenant_id="ten_1", repo="acme/app", batchable=True):
+    body = {"job_id": job_id, "tenant_id": tenant_id, "repo": repo, "batchable": batchable}
+    return {"Body": json.dumps(body), "ReceiptHandle": f"rh-{job_id}"}
+
+
+def _ids(batches):
+    return [[json.loads(m["Body"])["job_id"] for m in batch] for batch in batches]
+
+
+class TestJobBatcher(unittest.TestCase):
+    def test_groups_by_tenant_and_repo(self):
+        batcher = JobBatcher(max_size=5, max_wait_seconds=0)
+        messages = [
+            _message("j1"),
+            _message("j2", repo="acme/other"),
+            _message("j3"),
+            _message("j4", tenant_id="ten_2"),
+        ]
+        self.assertEqual(_ids(batcher.group(messages)), [["j1", "j3"], ["j2"], ["j4"]])
+
+    def test_non_batchable_jobs_run_alone(self):
+        batcher = JobBatcher(max_size=5, max_wait_seconds=0)
+        messages = [_message("j1", batchable=False), _message("j2", batchable=False)]
+        self.assertEqual(_ids(batcher.group(messages)), [["j1"], ["j2"]])
+
+    def test_batch_size_is_bounded(self):
+        batcher = JobBatcher(max_size=2, max_wait_seconds=0)
+        messages = [_message(f"j{i}") for i in range(5)]
+        self.assertEqual(_ids(batcher.group(messages)), [["j0", "j1"], ["j2", "j3"], ["j4"]])
+
+    def test_disabled_by_default(self):
+        batcher = JobBatcher(max_size=1)
+        self.assertFalse(batcher.enabled)
+        self.assertEqual(len(batcher.group([_message("j1"), _message("j2")])), 2)
+
+    def test_collect_stops_when_batch_is_full(self):
+        batcher = JobBatcher(max_size=3, max_wait_seconds=5)
+        queue = [[_message("j1")], [_message("j2")], [_message("j3")], [_message("j4")]]
+        calls = []
+
+        def receive(max_messages, wait_seconds):
+            calls.append(wait_seconds)
+            return queue.pop(0) if queue else []
+
+        messages = batcher.collect(receive)
+        self.assertEqual(len(messages), 3)
+        # Only the first receive long-polls; top-ups never block
+        self.assertEqual(calls, [20, 0, 0])
+
+    def test_collect_skips_wait_for_unbatchable_jobs(self):
+        batcher = JobBatcher(max_size=3, max_wait_seconds=5)
+        queue = [[_message("j1", batchable=False)], [_message("j2")]]
+        messages = batcher.collect(lambda n, w: queue.pop(0))
+        self.assertEqual(len(messages), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -12,6 +12,7 @@ import boto3
 from src.outpost.services.billing import BillingService, SubscriptionTier, SubscriptionStatus
 from src.outpost.services.stripe_client import StripeClient
 from src.outpost.models import Tenant, TenantStatus
+from src.outpost.services.tenant_cache import TenantCache
 
 
 class TestStripeClient(unittest.TestCase):
@@ -95,6 +96,16 @@ class TestStripeClient(unittest.TestCase):
         self.assertEqual(client.get_price_for_tier("enterprise"), "price_enterprise_test")
         self.assertEqual(client.get_price_for_tier("PRO"), "price_pro_test")  # Case insensitive
 
+    @patch("stripe.Price.retrieve")
+    def test_get_tier_amount(self, mock_retrieve):
+        StripeClient.reset_price_amounts()
+        mock_retrieve.return_value = {"id": "price_pro_test", "unit_amount": 2900}
+        client = StripeClient()
+
+        self.assertEqual(client.get_tier_amount("pro"), 2900)
+        self.assertEqual(client.get_tier_amount("PRO"), 2900)
+        mock_retrieve.assert_called_once_with("price_pro_test")
+
     def test_get_price_for_invalid_tier(self):
         client = StripeClient()
 
@@ -114,6 +125,7 @@ class TestBillingService(unittest.TestCase):
         self.audit_table_name = "outpost-audit-prod"
 
         os.environ["TENANTS_TABLE"] = self.tenants_table_name
+        TenantCache.reset()
         os.environ["AUDIT_TABLE"] = self.audit_table_name
         os.environ["STRIPE_SECRET_KEY"] = "sk_test_fake"
         os.environ["APP_URL"] = "https://outpost.test.com"
@@ -235,6 +247,9 @@ class TestBillingService(unittest.TestCase):
         result = service.create_portal_session(tenant_id="ten_123")
 
         self.assertIn("billing.stripe.com", result["url"])
+        # One audit entry per visit
+        actions = [item["action"] for item in self.audit_table.scan()["Items"]]
+        self.assertEqual(actions, ["ACCESS_BILLING_PORTAL"])
 
     def test_handle_subscription_update_active(self):
         # Add stripe_customer_id to tenant
@@ -258,6 +273,48 @@ class TestBillingService(unittest.TestCase):
         self.assertEqual(item["subscription_status"], "active")
         self.assertEqual(item["subscription_id"], "sub_abc123")
 
+    def test_handle_subscription_update_syncs_tier_quota(self):
+        self.tenants_table.update_item(
+            Key={"tenant_id": "ten_123"},
+            UpdateExpression="SET stripe_customer_id = :cid, subscription_tier = :t",
+            ExpressionAttributeValues={":cid": "cus_existing123", ":t": "free"}
+        )
+        metering = MagicMock()
+
+        service = BillingService(metering_service=metering)
+        service.handle_subscription_update(
+            stripe_customer_id="cus_existing123",
+            subscription_id="sub_abc123",
+            status="active",
+            tier="pro"
+        )
+
+        item = self.tenants_table.get_item(Key={"tenant_id": "ten_123"})["Item"]
+        self.assertEqual(item["subscription_tier"], "pro")
+        metering.sync_quota.assert_called_once_with("ten_123", "pro")
+
+    def test_handle_subscription_update_rejects_unknown_tier(self):
+        self.tenants_table.update_item(
+            Key={"tenant_id": "ten_123"},
+            UpdateExpression="SET stripe_customer_id = :cid, subscription_tier = :t",
+            ExpressionAttributeValues={":cid": "cus_existing123", ":t": "free"}
+        )
+        metering = MagicMock()
+
+        service = BillingService(metering_service=metering)
+        with self.assertRaises(ValueError):
+            service.handle_subscription_update(
+                stripe_customer_id="cus_existing123",
+                subscription_id="sub_abc123",
+                status="active",
+                tier="platinum"
+            )
+
+        item = self.tenants_table.get_item(Key={"tenant_id": "ten_123"})["Item"]
+        self.assertEqual(item["subscription_tier"], "free")
+        self.assertNotIn("subscription_id", item)
+        metering.sync_quota.assert_not_called()
+
     def test_handle_subscription_update_canceled(self):
         # Add stripe_customer_id to tenant
         self.tenants_table.update_item(
@@ -9,6 +9,9 @@ from moto import mock_aws
 import boto3
 
 from src.outpost.functions.api.billing import BillingAPI, handler
+from src.outpost.services.tenant_cache import TenantCache
+from src.outpost.services.stripe_client import StripeClient
+from src.outpost.services.usage_cache import UsageCache
 
 
 @mock_aws
@@ -22,6 +25,9 @@ class TestBillingAPI(unittest.TestCase):
         self.usage_table_name = "outpost-usage-prod"
 
         os.environ["TENANTS_TABLE"] = self.tenants_table_name
+        TenantCache.reset()
+        UsageCache.reset()
+        StripeClient.reset_price_amounts()
         os.environ["AUDIT_TABLE"] = self.audit_table_name
         os.environ["USAGE_TABLE"] = self.usage_table_name
         os.environ["STRIPE_SECRET_KEY"] = "sk_test_fake"
@@ -99,6 +105,39 @@ class TestBillingAPI(unittest.TestCase):
         self.assertIn("quota", result)
         self.assertIn("remaining", result)
 
+    def test_get_usage_history(self):
+        """Test usage history is zero-filled per month."""
+        api = BillingAPI()
+        result = api.get_usage_history("ten_123", months=3)
+
+        self.assertEqual(len(result["history"]), 3)
+        self.assertEqual([h["count"] for h in result["history"]], [0, 0, 0])
+
+        with self.assertRaises(ValueError):
+            api.get_usage_history("ten_123", months=0)
+
+    @patch("stripe.Price.retrieve")
+    def test_get_preview(self, mock_price):
+        """Test the invoice preview reflects usage recorded after it was cached."""
+        mock_price.return_value = {"unit_amount": 900}
+        api = BillingAPI()
+        api.metering.record_job_usage("ten_123", "job_1")
+
+        first = api.get_preview("ten_123")
+        self.assertEqual(first["tier"], "pro")
+        self.assertEqual(first["lines"][0]["amount"], 900)
+        self.assertEqual(first["usage"]["jobs"], 1)
+        self.assertFalse(first["cached"])
+
+        api.metering.record_job_usage("ten_123", "job_2")
+        api.metering.record_resource_usage("ten_123", "job_2", vcpu_seconds=10000)
+        second = api.get_preview("ten_123")
+        self.assertFalse(second["cached"])
+        self.assertEqual(second["usage"]["jobs"], 2)
+        self.assertEqual(second["usage"]["vcpu_seconds"], 10000)
+        self.assertEqual(second["amount_to_date"], 900 + 12)
+        self.assertTrue(api.get_preview("ten_123")["cached"])
+
     def test_get_subscription_status(self):
         """Test getting subscription status."""
         api = BillingAPI()
@@ -190,6 +229,23 @@ class TestLambdaHandler(unittest.TestCase):
         body = json.loads(response["body"])
         self.assertEqual(body["count"], 5)
 
+    @patch.object(BillingAPI, "get_preview")
+    def test_get_preview(self, mock_preview):
+        """Test GET /billing/preview."""
+        mock_preview.return_value = {"tenant_id": "ten_123", "projected_total": 900}
+
+        event = {
+            "httpMethod": "GET",
+            "path": "/billing/preview",
+            "headers": {"X-Tenant-ID": "ten_123"},
+            "requestContext": {}
+        }
+
+        response = handler(event, None)
+
+        self.assertEqual(response["statusCode"], 200)
+        self.assertEqual(json.loads(response["body"])["projected_total"], 900)
+
     @patch.object(BillingAPI, "get_subscription_status")
     def test_get_status(self, mock_status):
         """Test GET /billing/status."""
@@ -0,0 +1,50 @@
+import unittest
+import os
+import shutil
+import tempfile
+from moto import mock_aws
+import boto3
+from src.outpost.worker.checkpoint import CheckpointStore
+
+
+class TestCheckpointStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.workspace = os.path.join(self.tmp, "ws")
+        os.makedirs(os.path.join(self.workspace, "src"))
+        with open(os.path.join(self.workspace, "src", "main.py"), "w") as f:
+            f.write("print('partial work')")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _assert_roundtrip(self, store):
+        pointer = store.save("ten_1", "job_1", 1, self.workspace, {"elapsed_seconds": 42})
+        shutil.rmtree(self.workspace)
+
+        state = store.restore(pointer, self.workspace)
+
+        self.assertEqual(state["elapsed_seconds"], 42)
+        with open(os.path.join(self.workspace, "src", "main.py")) as f:
+            self.assertIn("partial work", f.read())
+        return pointer
+
+    def test_local_roundtrip(self):
+        store = CheckpointStore(local_dir=os.path.join(self.tmp, "checkpoints"))
+        pointer = self._assert_roundtrip(store)
+        self.assertTrue(pointer.endswith("ten_1/job_1/1.tar.gz"))
+
+        store.delete(pointer)
+        self.assertFalse(os.path.exists(pointer))
+
+    @mock_aws
+    def test_s3_roundtrip(self):
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="outpost-checkpoints")
+        store = CheckpointStore(bucket="outpost-checkpoints")
+
+        pointer = self._assert_roundtrip(store)
+        self.assertEqual(pointer, "s3://outpost-checkpoints/checkpoints/ten_1/job_1/1.tar.gz")
+
+if __name__ == "__main__":
+    unittest.main()
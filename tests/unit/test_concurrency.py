@@ -0,0 +1,111 @@
+import os
+import unittest
+from moto import mock_aws
+import boto3
+from src.outpost.services.tenant_cache import TenantCache
+from src.outpost.worker.concurrency import ConcurrencyLimiter, _parse_concurrency_limits
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@mock_aws
+class TestConcurrencyLimiter(unittest.TestCase):
+    def setUp(self):
+        os.environ["CONCURRENCY_TABLE"] = "outpost-concurrency-prod"
+        os.environ["TENANTS_TABLE"] = "outpost-tenants-prod"
+        TenantCache.reset()
+
+        dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+        self.table = dynamodb.create_table(
+            TableName="outpost-concurrency-prod",
+            KeySchema=[{"AttributeName": "tenant_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "tenant_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        tenants = dynamodb.create_table(
+            TableName="outpost-tenants-prod",
+            KeySchema=[{"AttributeName": "tenant_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "tenant_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        tenants.put_item(Item={"tenant_id": "ten_free", "subscription_tier": "free"})
+        tenants.put_item(Item={"tenant_id": "ten_pro", "subscription_tier": "pro"})
+
+        self.clock = FakeClock()
+        self.limiter = ConcurrencyLimiter(lease_seconds=60, clock=self.clock)
+
+    def _item(self, tenant_id):
+        return self.table.get_item(Key={"tenant_id": tenant_id})["Item"]
+
+    def test_limit_by_tier(self):
+        self.assertTrue(self.limiter.acquire("ten_free", "w1#job_1"))
+        self.assertTrue(self.limiter.acquire("ten_free", "w2#job_2"))
+        self.assertFalse(self.limiter.acquire("ten_free", "w1#job_3"))
+        # Other tenants are unaffected
+        for i in range(3):
+            self.assertTrue(self.limiter.acquire("ten_pro", f"w1#job_{i}"))
+        self.assertEqual(self._item("ten_free")["running"], 2)
+
+    def test_release_frees_slot(self):
+        self.limiter.acquire("ten_free", "w1#job_1")
+        self.limiter.acquire("ten_free", "w1#job_2")
+        self.limiter.release("ten_free", "w1#job_1")
+
+        self.assertTrue(self.limiter.acquire("ten_free", "w1#job_3"))
+        self.assertEqual(self._item("ten_free")["running"], 2)
+        self.assertEqual(self.limiter.held(), 2)
+
+        # Releasing twice does not free a second slot
+        self.limiter.release("ten_free", "w1#job_1")
+        self.assertEqual(self._item("ten_free")["running"], 2)
+
+    def test_expired_slots_are_reclaimed(self):
+        dead = ConcurrencyLimiter(lease_seconds=60, clock=self.clock)
+        dead.acquire("ten_free", "dead#job_1")
+        dead.acquire("ten_free", "dead#job_2")
+        self.assertFalse(self.limiter.acquire("ten_free", "w1#job_3"))
+
+        self.clock.now += 61
+        self.assertTrue(self.limiter.acquire("ten_free", "w1#job_3"))
+        item = self._item("ten_free")
+        self.assertEqual(item["running"], 1)
+        self.assertNotIn("slot_dead#job_1", item)
+
+        # The dead worker's late release does not free someone else's slot
+        dead.release("ten_free", "dead#job_2")
+        self.assertEqual(self._item("ten_free")["running"], 1)
+
+    def test_heartbeat_renewal_keeps_slot(self):
+        self.limiter.acquire("ten_free", "w1#job_1")
+        self.limiter.acquire("ten_free", "w1#job_2")
+        self.clock.now += 50
+        self.limiter.renew()
+        self.clock.now += 50
+
+        other = ConcurrencyLimiter(lease_seconds=60, clock=self.clock)
+        self.assertFalse(other.acquire("ten_free", "w2#job_3"))
+
+    def test_redelivered_job_keeps_its_slot(self):
+        self.assertTrue(self.limiter.acquire("ten_free", "w1#job_1"))
+        self.assertTrue(self.limiter.acquire("ten_free", "w1#job_1"))
+        self.assertEqual(self._item("ten_free")["running"], 1)
+
+    def test_fails_open_without_table(self):
+        self.table.delete()
+        self.assertTrue(self.limiter.acquire("ten_free", "w1#job_1"))
+
+    def test_parse_concurrency_limits(self):
+        self.assertEqual(_parse_concurrency_limits("pro=20, free=1"), {"PRO": 20, "FREE": 1})
+        limiter = ConcurrencyLimiter(limits={"FREE": 1})
+        self.assertEqual(limiter.limit_for("free"), 1)
+        self.assertEqual(limiter.limit_for("enterprise"), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+Unit tests for the bulk cost engine.
+"""
+import random
+import unittest
+import uuid
+from unittest.mock import patch
+
+from src.outpost.services import cost_engine
+from src.outpost.services.cost_engine import CostEngine, CostEvents, COST_COMPONENTS, MODEL_TIER_MAP, LLM_TOKEN_RATES
+
+
+def make_event(**overrides):
+    event = {
+        "event_type": "dispatch_complete",
+        "user_id": "user_1",
+        "dispatch_id": str(uuid.uuid4()),
+        "agent": "claude",
+        "model": "claude-opus-4-5-20251101",
+        "started_at": "2026-05-01T00:00:00Z",
+        "ended_at": "2026-05-01T00:01:00Z",
+        "duration_seconds": 60,
+        "vcpu": 1.0,
+        "memory_mb": 2048,
+        "network_egress_bytes": 0,
+        "tokens_input": 1000,
+        "tokens_output": 500,
+        "status": "success",
+        "workspace_mode": "ephemeral",
+        "efs_size_bytes": None
+    }
+    event.update(overrides)
+    return event
+
+
+def random_events(count, seed=7):
+    rng = random.Random(seed)
+    models = {agent: [m for m in MODEL_TIER_MAP if m.startswith(agent[:3])] + ["unknown-model"]
+              for agent in LLM_TOKEN_RATES}
+    events = []
+    for i in range(count):
+        agent = rng.choice(list(LLM_TOKEN_RATES))
+        persistent = rng.random() < 0.3
+        events.append(make_event(
+            user_id=f"user_{rng.randrange(20)}",
+            agent=agent,
+            model=rng.choice(models[agent]),
+            duration_seconds=rng.uniform(0, 3600),
+            vcpu=rng.choice([0.25, 0.5, 1.0, 2.0, 4.0]),
+            memory_mb=rng.choice([512, 1024, 2048, 4096, 8192]),
+            tokens_input=rng.randrange(0, 500_000),
+            tokens_output=rng.randrange(0, 100_000),
+            workspace_mode="persistent" if persistent else "ephemeral",
+            efs_size_bytes=rng.randrange(0, 50 * 1024 ** 3) if persistent else None
+        ))
+    return events
+
+
+class TestCostEngine(unittest.TestCase):
+    """Tests for reference and vectorized pricing."""
+
+    def setUp(self):
+        self.engine = CostEngine()
+
+    def test_calculate_matches_ledger_formulas(self):
+        cost = self.engine.calculate(make_event())
+
+        self.assertAlmostEqual(cost["compute"], 0.00072, places=9)
+        self.assertAlmostEqual(cost["memory"], 0.00012, places=9)
+        self.assertAlmostEqual(cost["llm"], 0.0525, places=9)
+        self.assertEqual(cost["storage"], 0)
+        self.assertAlmostEqual(cost["total"], 0.05334, places=9)
+        self.assertEqual(cost["currency"], "USD")
+
+    def test_model_tier_and_storage(self):
+        cost = self.engine.calculate(make_event(model="claude-3-5-haiku-20241022"))
+        self.assertAlmostEqual(cost["llm"], 0.00525, places=9)
+
+        persistent = self.engine.calculate(make_event(workspace_mode="persistent", efs_size_bytes=10 * 1024 ** 3))
+        self.assertAlmostEqual(persistent["storage"], 10 * 0.30 / (30 * 24 * 3600) * 60, places=6)
+        # Ephemeral workspaces are never charged for storage
+        ephemeral = self.engine.calculate(make_event(efs_size_bytes=10 * 1024 ** 3))
+        self.assertEqual(ephemeral["storage"], 0)
+
+    def test_invalid_events(self):
+        with self.assertRaises(ValueError):
+            self.engine.calculate(make_event(vcpu=0))
+        with self.assertRaises(ValueError):
+            CostEvents.from_events([make_event(), make_event(tokens_output=-1)])
+        with self.assertRaises(ValueError):
+            self.engine.price(CostEvents.from_events([make_event(agent="cursor")]))
+
+    def test_vectorized_matches_reference(self):
+        events = random_events(2000)
+        priced = self.engine.price(CostEvents.from_events(events))
+
+        for i, event in enumerate(events):
+            expected = self.engine.calculate(event)
+            for name in COST_COMPONENTS:
+                self.assertEqual(float(priced[name][i]), expected[name])
+
+    def test_fallback_without_numpy_matches_reference(self):
+        events = random_events(200)
+        with patch.object(cost_engine, "np", None):
+            loaded = CostEvents.from_events(events)
+            priced = self.engine.price(loaded)
+            totals = self.engine.totals(loaded, by="user_id")
+
+        self.assertIsInstance(priced["total"], list)
+        self.assertEqual(priced["total"], [self.engine.calculate(e)["total"] for e in events])
+        self.assertEqual(totals, self.engine.totals(CostEvents.from_events(events), by="user_id"))
+
+    def test_totals(self):
+        events = random_events(500)
+        loaded = CostEvents.from_events(events)
+
+        by_user = self.engine.totals(loaded, by="user_id")
+        for user_id in ("user_0", "user_7"):
+            expected = sum(self.engine.calculate(e)["total"] for e in events if e["user_id"] == user_id)
+            self.assertAlmostEqual(by_user[user_id]["total"], expected, places=6)
+
+        by_agent = self.engine.totals(loaded, by="agent")
+        self.assertEqual(set(by_agent), set(LLM_TOKEN_RATES))
+        overall = self.engine.totals(loaded)
+        self.assertAlmostEqual(sum(g["total"] for g in by_agent.values()), overall["total"], places=5)
+
+        with self.assertRaises(ValueError):
+            self.engine.totals(loaded, by="dispatch_id")
+
+    def test_what_if_rates(self):
+        loaded = CostEvents.from_events([make_event(), make_event(agent="grok", model="grok-3")])
+        current = self.engine.totals(loaded)
+        cheaper = CostEngine(model_tiers={"claude-opus-4-5-20251101": "balanced"}).totals(loaded)
+
+        self.assertLess(cheaper["llm"], current["llm"])
+        self.assertEqual(cheaper["compute"], current["compute"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+import os
+import shutil
+import subprocess
+import tempfile
+from src.outpost.worker.dep_cache import DependencyCache
+
+
+class TestDependencyCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = DependencyCache(root=os.path.join(self.tmp, "cache"), max_bytes=10 * 1024 * 1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _workspace(self, name, lock_content="lock-v1", with_deps=True):
+        ws = os.path.join(self.tmp, name)
+        os.makedirs(ws)
+        with open(os.path.join(ws, "package-lock.json"), "w") as f:
+            f.write(lock_content)
+        if with_deps:
+            os.makedirs(os.path.join(ws, "node_modules", "left-pad"))
+            with open(os.path.join(ws, "node_modules", "left-pad", "index.js"), "w") as f:
+                f.write("module.exports = 1;")
+        return ws
+
+    def test_save_and_restore_copies(self):
+        src = self._workspace("ws1")
+        self.assertEqual(self.cache.save("ten_1", src, build_seconds=30.0), 1)
+
+        dest = self._workspace("ws2", with_deps=False)
+        result = self.cache.restore("ten_1", "claude", dest)
+
+        self.assertEqual(result["hits"], 1)
+        self.assertGreater(result["seconds_saved"], 0)
+        restored = os.path.join(dest, "node_modules", "left-pad", "index.js")
+        self.assertTrue(os.path.exists(restored))
+        self.assertEqual(os.stat(restored).st_nlink, 1)
+
+    def test_in_place_edits_do_not_reach_the_cache(self):
+        src = self._workspace("ws1")
+        self.cache.save("ten_1", src)
+        # e.g. patch-package editing a dependency after install
+        with open(os.path.join(src, "node_modules", "left-pad", "index.js"), "w") as f:
+            f.write("patched")
+
+        dest = self._workspace("ws2", with_deps=False)
+        self.cache.restore("ten_1", "claude", dest)
+        restored = os.path.join(dest, "node_modules", "left-pad", "index.js")
+        with open(restored, "a") as f:
+            f.write(" // edited")
+
+        key = self.cache.compute_key("ten_1", os.path.join(src, "package-lock.json"))
+        with open(os.path.join(self.cache.lookup(key), "left-pad", "index.js")) as f:
+            self.assertEqual(f.read(), "module.exports = 1;")
+
+    def test_restore_hook_after_lockfile_appears(self):
+        self.cache.save("ten_1", self._workspace("ws1"))
+        ws = os.path.join(self.tmp, "ws2")
+        os.makedirs(ws)
+        env = {**os.environ, **self.cache.write_restore_hook("ten_1", "claude", ws)}
+
+        # The job fetches its lockfile, then asks for cached dependencies
+        subprocess.run(
+            f"cp {self.tmp}/ws1/package-lock.json . && outpost-restore-deps",
+            shell=True, cwd=ws, env=env, check=True, capture_output=True
+        )
+
+        self.assertTrue(os.path.exists(os.path.join(ws, "node_modules", "left-pad", "index.js")))
+        self.assertEqual(self.cache.collect_restore_result("claude", ws)["hits"], 1)
+        self.assertEqual(self.cache.stats()["claude"]["hits"], 1)
+        self.assertEqual(self.cache.collect_restore_result("claude", ws)["hits"], 0)
+
+    def test_miss_on_different_lockfile_or_tenant(self):
+        self.cache.save("ten_1", self._workspace("ws1"))
+
+        other_lock = self._workspace("ws2", lock_content="lock-v2", with_deps=False)
+        self.assertEqual(self.cache.restore("ten_1", "claude", other_lock)["misses"], 1)
+
+        other_tenant = self._workspace("ws3", with_deps=False)
+        self.assertEqual(self.cache.restore("ten_2", "claude", other_tenant)["misses"], 1)
+        self.assertFalse(os.path.exists(os.path.join(other_tenant, "node_modules")))
+
+    def test_miss_on_different_runtime(self):
+        self.cache.save("ten_1", self._workspace("ws1"))
+
+        os.environ["WORKER_IMAGE"] = "outpost-claude@sha256:other"
+        self.addCleanup(os.environ.pop, "WORKER_IMAGE")
+        other_image = DependencyCache(root=self.cache.root)
+        self.assertEqual(other_image.restore("ten_1", "claude", self._workspace("ws2", with_deps=False))["misses"], 1)
+
+    def test_virtualenvs_not_cached(self):
+        ws = os.path.join(self.tmp, "ws_py")
+        os.makedirs(os.path.join(ws, ".venv", "bin"))
+        with open(os.path.join(ws, "requirements.txt"), "w") as f:
+            f.write("requests==2.31.0")
+
+        self.assertEqual(self.cache.save("ten_1", ws), 0)
+
+    def test_build_seconds_measured_from_install(self):
+        ws = self._workspace("ws1")
+        # However long the rest of the job took, only the install is counted
+        self.cache.save("ten_1", ws)
+        key = self.cache.compute_key("ten_1", os.path.join(ws, "package-lock.json"))
+        self.assertLess(self.cache.entry(key)["build_seconds"], 5)
+
+    def test_lru_eviction_within_budget(self):
+        cache = DependencyCache(root=os.path.join(self.tmp, "small"), max_bytes=25)
+        for i in range(3):
+            ws = self._workspace(f"ws{i}", lock_content=f"lock-{i}")
+            cache.save("ten_1", ws)
+
+        entries = [e for e in os.listdir(cache.entries_dir) if not e.startswith(".")]
+        self.assertEqual(len(entries), 1)
+        newest = cache.compute_key("ten_1", os.path.join(self.tmp, "ws2", "package-lock.json"))
+        self.assertIsNotNone(cache.lookup(newest))
+
+    def test_stats_per_agent(self):
+        self.cache.save("ten_1", self._workspace("ws1"))
+        self.cache.restore("ten_1", "claude", self._workspace("ws2", with_deps=False))
+        self.cache.restore("ten_1", "aider", self._workspace("ws3", lock_content="x", with_deps=False))
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["claude"]["hit_rate"], 1.0)
+        self.assertEqual(stats["aider"]["hit_rate"], 0.0)
+
+    def test_package_manager_env_is_tenant_scoped(self):
+        env = self.cache.package_manager_env("ten_1")
+        self.assertIn("ten_1", env["PIP_CACHE_DIR"])
+        self.assertTrue(os.path.isdir(env["npm_config_cache"]))
+
+if __name__ == "__main__":
+    unittest.main()
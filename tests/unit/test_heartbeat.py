@@ -0,0 +1,144 @@
+import json
+import os
+import time
+import unittest
+from moto import mock_aws
+import boto3
+from src.outpost.worker.heartbeat import HeartbeatWriter, OrphanReaper
+
+@mock_aws
+class TestHeartbeat(unittest.TestCase):
+    def setUp(self):
+        self.region = "us-east-1"
+        os.environ["JOBS_TABLE"] = "outpost-jobs-prod"
+        os.environ["AUDIT_TABLE"] = "outpost-audit-prod"
+        os.environ["WORKERS_TABLE"] = "outpost-workers-prod"
+
+        self.dynamodb = boto3.resource("dynamodb", region_name=self.region)
+        self.jobs = self.dynamodb.create_table(
+            TableName="outpost-jobs-prod",
+            KeySchema=[
+                {"AttributeName": "tenant_id", "KeyType": "HASH"},
+                {"AttributeName": "job_id", "KeyType": "RANGE"}
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "tenant_id", "AttributeType": "S"},
+                {"AttributeName": "job_id", "AttributeType": "S"}
+            ],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        self.dynamodb.create_table(
+            TableName="outpost-audit-prod",
+            KeySchema=[
+                {"AttributeName": "tenant_id", "KeyType": "HASH"},
+                {"AttributeName": "timestamp", "KeyType": "RANGE"}
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "tenant_id", "AttributeType": "S"},
+                {"AttributeName": "timestamp", "AttributeType": "S"}
+            ],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        self.workers = self.dynamodb.create_table(
+            TableName="outpost-workers-prod",
+            KeySchema=[{"AttributeName": "worker_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "worker_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        self.sqs = boto3.client("sqs", region_name=self.region)
+        os.environ["JOBS_QUEUE_URL"] = self.sqs.create_queue(QueueName="outpost-jobs")["QueueUrl"]
+
+    def tearDown(self):
+        os.environ.pop("JOBS_QUEUE_URL", None)
+
+    def _running_job(self, job_id, worker_id):
+        self.jobs.put_item(Item={
+            "tenant_id": "ten_1",
+            "job_id": job_id,
+            "agent": "claude",
+            "command": "echo hi",
+            "status": "running",
+            "worker_id": worker_id
+        })
+
+    def _dead_worker(self, worker_id, job_ids):
+        self.workers.put_item(Item={
+            "worker_id": worker_id,
+            "jobs": [{"tenant_id": "ten_1", "job_id": job_id} for job_id in job_ids],
+            "last_seen": int(time.time()) - 300,
+            "expires_at": int(time.time()) + 3600
+        })
+
+    def _status(self, job_id):
+        return self.jobs.get_item(Key={"tenant_id": "ten_1", "job_id": job_id})["Item"]["status"]
+
+    def test_track_publishes_jobs(self):
+        writer = HeartbeatWriter("w-1")
+        writer.track("ten_1", "job_1")
+
+        item = self.workers.get_item(Key={"worker_id": "w-1"})["Item"]
+        self.assertEqual(item["jobs"], [{"tenant_id": "ten_1", "job_id": "job_1"}])
+        self.assertGreater(item["expires_at"], item["last_seen"])
+
+        writer.untrack("ten_1", "job_1")
+        item = self.workers.get_item(Key={"worker_id": "w-1"})["Item"]
+        self.assertEqual(item["jobs"], [])
+
+        writer.stop()
+        self.assertNotIn("Item", self.workers.get_item(Key={"worker_id": "w-1"}))
+
+    def test_reaper_fails_jobs_of_dead_workers(self):
+        self._running_job("job_1", "w-dead")
+        self._dead_worker("w-dead", ["job_1"])
+        self._running_job("job_2", "w-live")
+        HeartbeatWriter("w-live").track("ten_1", "job_2")
+
+        result = OrphanReaper(dead_after_seconds=60).reap()
+
+        self.assertEqual(result["dead_workers"], 1)
+        self.assertEqual(result["failed"], 1)
+        self.assertEqual(self._status("job_1"), "failed")
+        self.assertEqual(self._status("job_2"), "running")
+        self.assertNotIn("Item", self.workers.get_item(Key={"worker_id": "w-dead"}))
+
+    def test_reaper_skips_job_reclaimed_by_another_worker(self):
+        self._running_job("job_1", "w-new")
+        self._dead_worker("w-dead", ["job_1"])
+
+        result = OrphanReaper(dead_after_seconds=60).reap()
+
+        self.assertEqual(result["skipped"], 1)
+        self.assertEqual(self._status("job_1"), "running")
+
+    def test_second_reaper_does_not_act_twice(self):
+        self._running_job("job_1", "w-dead")
+        first = OrphanReaper(dead_after_seconds=60, action="requeue")
+        second = OrphanReaper(dead_after_seconds=60, action="requeue")
+
+        self.assertEqual(first.reap_job("w-dead", "ten_1", "job_1"), "requeued")
+        self.assertEqual(second.reap_job("w-dead", "ten_1", "job_1"), "skipped")
+
+        messages = self.sqs.receive_message(QueueUrl=os.environ["JOBS_QUEUE_URL"], MaxNumberOfMessages=10)
+        self.assertEqual(len(messages["Messages"]), 1)
+        body = json.loads(messages["Messages"][0]["Body"])
+        self.assertEqual(body["job_id"], "job_1")
+        self.assertEqual(body["status"], "pending")
+        self.assertNotIn("worker_id", body)
+
+    def test_requeue_falls_back_to_fail_after_max_requeues(self):
+        reaper = OrphanReaper(dead_after_seconds=60, action="requeue", max_requeues=1)
+        self._running_job("job_1", "w-1")
+        self.assertEqual(reaper.reap_job("w-1", "ten_1", "job_1"), "requeued")
+
+        # Picked up again and orphaned again
+        self.jobs.update_item(
+            Key={"tenant_id": "ten_1", "job_id": "job_1"},
+            UpdateExpression="SET #s = :s, worker_id = :w",
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues={":s": "running", ":w": "w-2"}
+        )
+        self.assertEqual(reaper.reap_job("w-2", "ten_1", "job_1"), "failed")
+        self.assertEqual(self._status("job_1"), "failed")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+"""
+Unit tests for InvoicePreview and UsageCache.
+"""
+import os
+import unittest
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+from moto import mock_aws
+import boto3
+
+from src.outpost.services.invoice_preview import InvoicePreview, USAGE_PRICES, _parse_usage_prices
+from src.outpost.services.metering import MeteringService
+from src.outpost.services.tenant_cache import TenantCache
+from src.outpost.services.usage_cache import UsageCache
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@mock_aws
+class TestInvoicePreview(unittest.TestCase):
+    """Tests for projected invoices served from cached usage."""
+
+    def setUp(self):
+        os.environ["TENANTS_TABLE"] = "outpost-tenants-prod"
+        os.environ["USAGE_TABLE"] = "outpost-usage-prod"
+        os.environ["STRIPE_METERING_ENABLED"] = "false"
+        TenantCache.reset()
+        UsageCache.reset()
+        MeteringService.reset_leases()
+
+        dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+        tenants = dynamodb.create_table(
+            TableName="outpost-tenants-prod",
+            KeySchema=[{"AttributeName": "tenant_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "tenant_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        self.usage_table = dynamodb.create_table(
+            TableName="outpost-usage-prod",
+            KeySchema=[{"AttributeName": "period_key", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "period_key", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        tenants.put_item(Item={"tenant_id": "ten_pro", "subscription_tier": "pro"})
+
+        self.metering = MeteringService()
+        # Halfway through the current month
+        start, end = self._month()
+        self.clock = FakeClock((start.timestamp() + end.timestamp()) / 2)
+        self.stripe = MagicMock()
+        self.stripe.get_tier_amount.side_effect = {"free": 0, "pro": 900, "enterprise": 9900}.__getitem__
+        self.preview = InvoicePreview(
+            self.metering,
+            stripe_client=self.stripe,
+            usage_prices={"jobs": Decimal("10"), "vcpu_seconds": Decimal("0.0012")},
+            clock=self.clock
+        )
+
+    def _month(self):
+        now = datetime.now(timezone.utc)
+        start = datetime(now.year, now.month, 1, tzinfo=timezone.utc)
+        end = datetime(now.year + (now.month == 12), now.month % 12 + 1, 1, tzinfo=timezone.utc)
+        return start, end
+
+    def test_lines_and_projection(self):
+        for i in range(10):
+            self.metering.record_job_usage("ten_pro", f"job_{i}")
+        self.metering.record_resource_usage("ten_pro", "job_0", vcpu_seconds=5000)
+
+        result = self.preview.preview("ten_pro")
+        lines = {line["description"]: line for line in result["lines"]}
+
+        self.assertEqual(result["elapsed"], 0.5)
+        self.assertEqual(lines["Pro plan"]["amount"], 900)
+        self.assertEqual(lines["jobs"]["amount"], 100)
+        # Ten jobs by mid-month project to twenty
+        self.assertEqual(lines["jobs"]["projected_amount"], 200)
+        self.assertEqual(lines["vcpu_seconds"]["amount"], 6)
+        self.assertEqual(lines["vcpu_seconds"]["projected_amount"], 12)
+        self.assertNotIn("tokens", lines)
+        self.assertEqual(result["amount_to_date"], 1006)
+        self.assertEqual(result["projected_total"], 1112)
+
+    def test_projection_capped_at_quota(self):
+        for i in range(80):
+            self.metering.record_job_usage("ten_pro", f"job_{i}")
+
+        lines = {line["description"]: line for line in self.preview.preview("ten_pro")["lines"]}
+        self.assertEqual(lines["jobs"]["projected_quantity"], 100)
+
+    def test_cached_usage_reloaded_once_recorded(self):
+        self.metering.record_job_usage("ten_pro", "job_1")
+        self.preview.preview("ten_pro")
+
+        with patch.object(self.metering, "get_usage", wraps=self.metering.get_usage) as get_usage:
+            self.assertTrue(self.preview.preview("ten_pro")["cached"])
+            get_usage.assert_not_called()
+
+            # Recorded by another process (e.g. the jobs API): nothing tells this cache
+            other = MeteringService()
+            other.usage_cache = UsageCache(ttl_seconds=0)
+            other.record_job_usage("ten_pro", "job_2")
+            other.record_resource_usage("ten_pro", "job_2", vcpu_seconds=100)
+            result = self.preview.preview("ten_pro")
+
+        get_usage.assert_called_once()
+        self.assertFalse(result["cached"])
+        self.assertEqual(result["usage"]["jobs"], 2)
+        self.assertEqual(result["usage"]["vcpu_seconds"], 100)
+        self.assertEqual(self.metering.usage_cache.stats()["stale"], 1)
+        self.assertTrue(self.preview.preview("ten_pro")["cached"])
+
+    def test_usage_version_covers_shards(self):
+        metering = MeteringService(shards={"ten_pro": 3})
+        for i in range(6):
+            metering.record_job_usage("ten_pro", f"job_{i}")
+        version = metering.usage_version("ten_pro")
+
+        self.assertTrue(all(updated_at for _, updated_at in version))
+        self.assertEqual(metering.usage_version("ten_pro"), version)
+        metering.record_resource_usage("ten_pro", "job_0", vcpu_seconds=1)
+        self.assertNotEqual(metering.usage_version("ten_pro"), version)
+
+    def test_tier_change_and_reset_invalidate(self):
+        self.metering.record_job_usage("ten_pro", "job_1")
+        self.preview.preview("ten_pro")
+
+        self.metering.sync_quota("ten_pro", "enterprise")
+        result = self.preview.preview("ten_pro")
+        self.assertFalse(result["cached"])
+        self.assertEqual(result["lines"][0]["amount"], 9900)
+
+        self.metering.reset_usage("ten_pro")
+        self.assertEqual(self.preview.preview("ten_pro")["usage"]["jobs"], 0)
+
+    def test_usage_cache_ttl_and_version(self):
+        cache = UsageCache(ttl_seconds=10, clock=self.clock)
+        loads = []
+        versions = {"current": "v1"}
+
+        def load():
+            loads.append(1)
+            return {"count": len(loads), "quota": 100, "dimensions": {}}
+
+        def version():
+            return versions["current"]
+
+        self.assertEqual(cache.get("ten_pro", "2026-05", load, version),
+                         ({"count": 1, "quota": 100, "dimensions": {}}, False))
+        self.assertEqual(cache.get("ten_pro", "2026-05", load, version), ({"count": 1, "quota": 100, "dimensions": {}}, True))
+
+        versions["current"] = "v2"
+        self.assertEqual(cache.get("ten_pro", "2026-05", load, version)[0]["count"], 2)
+        self.assertTrue(cache.get("ten_pro", "2026-05", load, version)[1])
+
+        self.clock.now += 11
+        self.assertEqual(cache.get("ten_pro", "2026-05", load, version)[0]["count"], 3)
+        self.assertEqual(cache.stats()["stale"], 1)
+
+    def test_leased_units_not_billed(self):
+        self.usage_table.put_item(Item={
+            "period_key": self.metering.get_current_period_key("ten_pro"), "tenant_id": "ten_pro",
+            "job_count": 30, "quota_limit": 100, "tier": "pro",
+            "lease_a": {"units": 20, "expires_at": int(self.clock.now) + 3600, "used": 5}
+        })
+
+        result = self.preview.preview("ten_pro")
+        self.assertEqual(result["usage"]["jobs"], 15)
+
+    def test_prices_from_billing_configuration(self):
+        preview = InvoicePreview(self.metering, stripe_client=self.stripe, tier_prices={"pro": 2900})
+        self.assertEqual(preview.tier_price("pro"), 2900)
+        self.assertEqual(preview.tier_price("enterprise"), 9900)
+        self.stripe.get_tier_amount.assert_called_once_with("enterprise")
+        self.assertEqual(USAGE_PRICES["vcpu_seconds"], Decimal("0.0012"))
+
+    def test_parse_prices(self):
+        self.assertEqual(_parse_usage_prices("Jobs=5,vcpu_seconds=0.002"),
+                         {"jobs": Decimal("5"), "vcpu_seconds": Decimal("0.002")})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,10 @@ import os
 from moto import mock_aws
 import boto3
 from src.outpost.functions.api.jobs import handler
+from src.outpost.services.metering import MeteringService
+from src.outpost.services.rate_limiter import RateLimiter
+from src.outpost.services.anomaly import AnomalyDetector
+from src.outpost.services.tenant_cache import TenantCache
 
 @mock_aws
 class TestJobAPI(unittest.TestCase):
@@ -15,6 +19,12 @@ class TestJobAPI(unittest.TestCase):
         
         os.environ["JOBS_TABLE"] = self.table_name
         os.environ["AUDIT_TABLE"] = self.audit_table
+        os.environ["TENANTS_TABLE"] = "outpost-tenants-prod"
+        os.environ["USAGE_TABLE"] = "outpost-usage-prod"
+        os.environ["STRIPE_METERING_ENABLED"] = "false"
+        TenantCache.reset()
+        MeteringService.reset_leases()
+        AnomalyDetector.reset()
         
         self.dynamodb = boto3.resource("dynamodb", region_name=self.region)
         self.dynamodb.create_table(
@@ -42,6 +52,27 @@ class TestJobAPI(unittest.TestCase):
             BillingMode="PAY_PER_REQUEST"
         )
         
+        self.tenants_table = self.dynamodb.create_table(
+            TableName="outpost-tenants-prod",
+            KeySchema=[{"AttributeName": "tenant_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "tenant_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        self.usage_table = self.dynamodb.create_table(
+            TableName="outpost-usage-prod",
+            KeySchema=[{"AttributeName": "period_key", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "period_key", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        # Rate limit buckets and shared submission statistics
+        self.dynamodb.create_table(
+            TableName="outpost-rate-limits-prod",
+            KeySchema=[{"AttributeName": "bucket_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "bucket_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        self.tenants_table.put_item(Item={"tenant_id": "ten_123", "subscription_tier": "free"})
+
         self.sqs = boto3.client("sqs", region_name=self.region)
         q = self.sqs.create_queue(QueueName=self.queue_name)
         os.environ["JOBS_QUEUE_URL"] = q["QueueUrl"]
@@ -63,6 +94,75 @@ class TestJobAPI(unittest.TestCase):
         sqs_response = self.sqs.receive_message(QueueUrl=os.environ["JOBS_QUEUE_URL"])
         self.assertEqual(len(sqs_response["Messages"]), 1)
 
+    def test_submission_counts_usage(self):
+        event = {
+            "httpMethod": "POST",
+            "requestContext": {"authorizer": {"tenant_id": self.tenant_id}},
+            "body": json.dumps({"agent": "claude", "command": "ls"})
+        }
+        for _ in range(3):
+            self.assertEqual(handler(event, None)["statusCode"], 201)
+
+        self.assertEqual(MeteringService().get_usage(self.tenant_id)["count"], 3)
+
+    def test_submission_over_quota_gets_402_and_stores_nothing(self):
+        MeteringService().record_job_usage(self.tenant_id, "job_seed")
+        key = MeteringService().get_current_period_key(self.tenant_id)
+        self.usage_table.update_item(Key={"period_key": key}, UpdateExpression="SET job_count = quota_limit")
+
+        event = {
+            "httpMethod": "POST",
+            "requestContext": {"authorizer": {"tenant_id": self.tenant_id}},
+            "body": json.dumps({"agent": "claude", "command": "ls"})
+        }
+        response = handler(event, None)
+
+        self.assertEqual(response["statusCode"], 402)
+        self.assertEqual(json.loads(response["body"])["error"], "Quota exceeded")
+        jobs = self.dynamodb.Table(self.table_name).scan()["Items"]
+        self.assertEqual(jobs, [])
+
+    def test_rate_limited_requests_get_429(self):
+        os.environ["RATE_LIMIT_MODE"] = "local"
+        os.environ["RATE_LIMITS"] = "free=1:2"
+        self.addCleanup(os.environ.pop, "RATE_LIMIT_MODE")
+        self.addCleanup(os.environ.pop, "RATE_LIMITS")
+        self.addCleanup(RateLimiter.reset)
+        RateLimiter.reset()
+
+        event = {
+            "httpMethod": "GET",
+            "requestContext": {"authorizer": {"tenant_id": self.tenant_id, "tier": "free"}}
+        }
+        responses = [handler(event, None) for _ in range(3)]
+
+        self.assertEqual([r["statusCode"] for r in responses], [200, 200, 429])
+        self.assertEqual(responses[0]["headers"]["X-RateLimit-Limit"], "2")
+        self.assertEqual(responses[1]["headers"]["X-RateLimit-Remaining"], "0")
+        self.assertEqual(responses[2]["headers"]["Retry-After"], "1")
+        self.assertEqual(json.loads(responses[2]["body"])["error"], "Rate limit exceeded")
+
+    def test_runaway_submissions_throttled_in_throttle_mode(self):
+        os.environ["ANOMALY_MODE"] = "throttle"
+        os.environ["ANOMALY_MIN_JOBS"] = "2"
+        os.environ["ANOMALY_THRESHOLD"] = "1"
+        self.addCleanup(os.environ.pop, "ANOMALY_MODE")
+        self.addCleanup(os.environ.pop, "ANOMALY_MIN_JOBS")
+        self.addCleanup(os.environ.pop, "ANOMALY_THRESHOLD")
+
+        event = {
+            "httpMethod": "POST",
+            "requestContext": {"authorizer": {"tenant_id": self.tenant_id}},
+            "body": json.dumps({"agent": "claude", "command": "ls"})
+        }
+        responses = [handler(event, None) for _ in range(3)]
+
+        self.assertEqual([r["statusCode"] for r in responses], [201, 201, 429])
+        self.assertEqual(json.loads(responses[2]["body"])["error"], "Unusual submission rate")
+        self.assertIn("Retry-After", responses[2]["headers"])
+        audit = self.dynamodb.Table(self.audit_table).scan()["Items"]
+        self.assertEqual([a["action"] for a in audit].count("USAGE_ANOMALY"), 1)
+
     def test_get_and_list_jobs(self):
         # Submit a job first
         self.test_submit_job()
@@ -104,6 +204,49 @@ class TestJobAPI(unittest.TestCase):
         res = handler(event, None)
         job = json.loads(res["body"])
         self.assertEqual(job["status"], "cancelled")
+    def test_submit_job_with_steps_and_get_steps(self):
+        event = {
+            "httpMethod": "POST",
+            "requestContext": {"authorizer": {"tenant_id": self.tenant_id}},
+            "body": json.dumps({
+                "agent": "claude",
+                "steps": [
+                    # Step state is the worker's to set
+                    {"name": "clone", "command": "git clone repo .", "cacheable": True,
+                     "status": "success", "cache_key": "forged", "duration_ms": 1},
+                    {"name": "agent", "command": "claude -p 'fix tests'"}
+                ]
+            })
+        }
+        res = handler(event, None)
+        self.assertEqual(res["statusCode"], 201)
+        job = json.loads(res["body"])
+        self.assertEqual(job["command"], "git clone repo . && claude -p 'fix tests'")
+        self.assertEqual(job["steps"][0]["status"], "pending")
+        self.assertIsNone(job["steps"][0]["cache_key"])
+        self.assertIsNone(job["steps"][0]["duration_ms"])
+
+        # Simulate the worker recording step timings
+        self.dynamodb.Table(self.table_name).update_item(
+            Key={"tenant_id": self.tenant_id, "job_id": job["job_id"]},
+            UpdateExpression="SET steps = :s",
+            ExpressionAttributeValues={":s": [
+                {"name": "clone", "status": "cached", "duration_ms": 12},
+                {"name": "agent", "status": "success", "duration_ms": 3400}
+            ]}
+        )
+
+        event = {
+            "httpMethod": "GET",
+            "path": f"/jobs/{job['job_id']}/steps",
+            "requestContext": {"authorizer": {"tenant_id": self.tenant_id}},
+            "pathParameters": {"id": job["job_id"]}
+        }
+        res = handler(event, None)
+        self.assertEqual(res["statusCode"], 200)
+        body = json.loads(res["body"])
+        self.assertEqual(body["total_duration_ms"], 3412)
+        self.assertEqual(body["steps"][0]["status"], "cached")
 
 if __name__ == "__main__":
     unittest.main()
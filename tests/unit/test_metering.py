@@ -3,11 +3,14 @@ Unit tests for MeteringService.
 """
 import unittest
 import os
+import time
 from moto import mock_aws
 import boto3
+from botocore.exceptions import ClientError
 from datetime import datetime, timezone
 
-from src.outpost.services.metering import MeteringService, TierQuota, QuotaExceededError
+from src.outpost.services.metering import MeteringService, MeteringDimension, TierQuota, QuotaExceededError
+from src.outpost.services.tenant_cache import TenantCache
 
 
 @mock_aws
@@ -20,6 +23,8 @@ class TestMeteringService(unittest.TestCase):
         self.usage_table_name = "outpost-usage-prod"
 
         os.environ["TENANTS_TABLE"] = self.tenants_table_name
+        TenantCache.reset()
+        MeteringService.reset_leases()
         os.environ["USAGE_TABLE"] = self.usage_table_name
         os.environ["STRIPE_METERING_ENABLED"] = "false"
 
@@ -175,6 +180,371 @@ class TestMeteringService(unittest.TestCase):
 
         self.assertIn("Tenant not found", str(ctx.exception))
 
+    def test_quota_limit_denormalized_without_overshoot(self):
+        """Test the usage item carries the quota and never exceeds it."""
+        for i in range(10):
+            self.service.record_job_usage("ten_free", f"job_{i}")
+        for i in range(3):
+            with self.assertRaises(QuotaExceededError):
+                self.service.record_job_usage("ten_free", f"job_over_{i}")
+
+        item = self.usage_table.get_item(Key={"period_key": self.service.get_current_period_key("ten_free")})["Item"]
+        self.assertEqual(item["job_count"], 10)
+        self.assertEqual(item["quota_limit"], 10)
+        self.assertEqual(item["tier"], "free")
+
+    def test_recording_does_not_read_tenant_after_seeding(self):
+        """Test steady-state recording is a single usage-table update."""
+        self.service.record_job_usage("ten_free", "job_001")
+        self.tenants_table.delete_item(Key={"tenant_id": "ten_free"})
+
+        result = self.service.record_job_usage("ten_free", "job_002")
+        self.assertEqual(result["count"], 2)
+
+    def test_sync_quota_on_tier_change(self):
+        """Test that a tier upgrade raises the denormalized limit."""
+        for i in range(10):
+            self.service.record_job_usage("ten_free", f"job_{i}")
+
+        self.service.sync_quota("ten_free", "pro")
+        result = self.service.record_job_usage("ten_free", "job_after_upgrade")
+
+        self.assertEqual(result["count"], 11)
+        self.assertEqual(result["quota"], 100)
+        self.assertEqual(self.service.get_usage("ten_free")["tier"], "pro")
+
+    def test_legacy_usage_item_is_backfilled(self):
+        """Test an item without quota_limit gets one on the next job."""
+        self.usage_table.put_item(Item={
+            "period_key": self.service.get_current_period_key("ten_free"),
+            "tenant_id": "ten_free",
+            "job_count": 10
+        })
+
+        with self.assertRaises(QuotaExceededError):
+            self.service.record_job_usage("ten_free", "job_001")
+
+        self.usage_table.put_item(Item={
+            "period_key": self.service.get_current_period_key("ten_pro"),
+            "tenant_id": "ten_pro",
+            "job_count": 5
+        })
+        result = self.service.record_job_usage("ten_pro", "job_001")
+        self.assertEqual(result["count"], 6)
+        self.assertEqual(result["quota"], 100)
+
+    def test_get_usage_history_zero_fills_months(self):
+        """Test history returns one record per month, newest first."""
+        periods = self.service.recent_periods(4)
+        self.usage_table.put_item(Item={
+            "period_key": f"ten_free#{periods[2]}",
+            "job_count": 7,
+            "quota_limit": 10,
+            "tier": "free"
+        })
+        self.service.record_job_usage("ten_free", "job_001")
+
+        history = self.service.get_usage_history("ten_free", 4)
+
+        self.assertEqual([h["period"] for h in history], periods)
+        self.assertEqual([h["count"] for h in history], [1, 0, 7, 0])
+        self.assertEqual(history[2]["quota"], 10)
+        self.assertIsNone(history[1]["quota"])
+
+    def test_recent_periods_cross_year(self):
+        """Test period list walks back across year boundaries."""
+        periods = self.service.recent_periods(24)
+        self.assertEqual(len(set(periods)), 24)
+        self.assertEqual(periods, sorted(periods, reverse=True))
+
+    def test_get_usage_histories_batches_many_tenants(self):
+        """Test bulk history spans several BatchGetItem requests."""
+        service = MeteringService(shards={"ten_pro": 2})
+        for i in range(3):
+            service.record_job_usage("ten_pro", f"job_{i}")
+        tenant_ids = ["ten_pro", "ten_free"] + [f"ten_{i}" for i in range(8)]
+
+        histories = service.get_usage_histories(tenant_ids, 24)
+
+        self.assertEqual(set(histories), set(tenant_ids))
+        self.assertEqual(histories["ten_pro"][0]["count"], 3)
+        self.assertEqual(histories["ten_pro"][0]["quota"], 100)
+        self.assertTrue(all(len(h) == 24 for h in histories.values()))
+
+    def test_sharded_counter_enforces_total_quota(self):
+        """Test shard budgets add up to the quota and are all usable."""
+        service = MeteringService(shards={"ten_free": 4})
+        results = [service.record_job_usage("ten_free", f"job_{i}") for i in range(10)]
+        with self.assertRaises(QuotaExceededError) as ctx:
+            service.record_job_usage("ten_free", "job_over")
+
+        self.assertEqual(results[-1]["count"], 10)
+        self.assertEqual(results[-1]["warning"], "QUOTA_REACHED")
+        self.assertIn("Limit: 10, Used: 10", str(ctx.exception))
+
+        period_key = service.get_current_period_key("ten_free")
+        items = [
+            self.usage_table.get_item(Key={"period_key": key})["Item"]
+            for key in service.shard_keys(period_key, 4)
+        ]
+        self.assertEqual([int(i["quota_limit"]) for i in items], [3, 3, 2, 2])
+        self.assertEqual([int(i["job_count"]) for i in items], [3, 3, 2, 2])
+
+    def test_sharded_usage_reads_sum_shards(self):
+        """Test get_usage and reset cover every shard."""
+        service = MeteringService(shards={"ten_pro": 3})
+        for i in range(7):
+            service.record_job_usage("ten_pro", f"job_{i}")
+
+        usage = service.get_usage("ten_pro")
+        self.assertEqual(usage["count"], 7)
+        self.assertEqual(usage["quota"], 100)
+
+        service.reset_usage("ten_pro")
+        self.assertEqual(service.get_usage("ten_pro")["count"], 0)
+
+    def test_sharded_sync_quota_splits_budget(self):
+        """Test a tier change re-splits the quota across shards."""
+        service = MeteringService(shards={"ten_free": 2})
+        service.record_job_usage("ten_free", "job_001")
+        service.sync_quota("ten_free", "pro")
+
+        period_key = service.get_current_period_key("ten_free")
+        limits = [
+            int(self.usage_table.get_item(Key={"period_key": key})["Item"]["quota_limit"])
+            for key in service.shard_keys(period_key, 2)
+        ]
+        self.assertEqual(limits, [50, 50])
+        self.assertEqual(service.get_usage("ten_free")["quota"], 100)
+
+    def test_record_resource_usage(self):
+        """Test resource dimensions accumulate and show up in get_usage."""
+        self.service.record_job_usage("ten_free", "job_001")
+        self.service.record_resource_usage("ten_free", "job_001", tokens=1500, vcpu_seconds=60, memory_gb_seconds=120)
+        self.service.record_resource_usage("ten_free", "job_002", tokens=500, vcpu_seconds=30.5)
+
+        usage = self.service.get_usage("ten_free")
+
+        tokens = usage["dimensions"]["tokens"]
+        self.assertEqual(tokens["used"], 2000)
+        self.assertEqual(tokens["quota"], 2_000_000)
+        self.assertEqual(usage["dimensions"]["vcpu_seconds"]["used"], 90.5)
+        self.assertEqual(usage["dimensions"]["memory_gb_seconds"]["used"], 120)
+        self.assertEqual(usage["count"], 1)
+
+    def test_exhausted_dimension_blocks_new_jobs(self):
+        """Test a few heavy jobs exhaust a dimension before the job count."""
+        self.service.record_job_usage("ten_free", "job_001")
+        self.service.record_resource_usage("ten_free", "job_001", vcpu_seconds=4 * 3600)
+
+        self.assertFalse(self.service.check_quota("ten_free"))
+        with self.assertRaises(QuotaExceededError) as ctx:
+            self.service.record_job_usage("ten_free", "job_002")
+        self.assertIn("vcpu_seconds quota exceeded", str(ctx.exception))
+        self.assertEqual(self.service.get_usage("ten_free")["count"], 1)
+
+    def test_dimension_quotas_per_tier(self):
+        """Test configured per-dimension limits and unlimited enterprise dimensions."""
+        service = MeteringService(dimension_quotas={
+            "FREE": {MeteringDimension.TOKENS: 1000, MeteringDimension.VCPU_SECONDS: None,
+                     MeteringDimension.MEMORY_GB_SECONDS: None}
+        })
+        service.record_job_usage("ten_free", "job_001")
+        service.record_resource_usage("ten_free", "job_001", tokens=999, vcpu_seconds=10 ** 7)
+        service.record_job_usage("ten_free", "job_002")
+        service.record_resource_usage("ten_free", "job_002", tokens=1)
+
+        with self.assertRaises(QuotaExceededError):
+            service.record_job_usage("ten_free", "job_003")
+
+        service.sync_quota("ten_free", "enterprise")
+        self.assertEqual(service.record_job_usage("ten_free", "job_003")["count"], 3)
+        self.assertIsNone(service.get_usage("ten_free")["dimensions"]["tokens"]["quota"])
+
+    def test_usage_from_completion(self):
+        """Test cost-event completion fields convert to dimension amounts."""
+        usage = MeteringService.usage_from_completion({
+            "duration_seconds": 120,
+            "vcpu": 0.5,
+            "memory_mb": 2048,
+            "tokens_input": 10000,
+            "tokens_output": 2500
+        })
+        self.assertEqual(usage, {"tokens": 12500, "vcpu_seconds": 60, "memory_gb_seconds": 240})
+
+    def _count_usage_writes(self, service):
+        calls = {"count": 0}
+
+        def on_call(**kwargs):
+            calls["count"] += 1
+
+        service.dynamodb.meta.client.meta.events.register("before-call.dynamodb.UpdateItem", on_call)
+        return calls
+
+    def test_consume_quota_leases_blocks(self):
+        """Test a busy tenant's jobs are counted from leases, not one write each."""
+        self.usage_table.put_item(Item={
+            "period_key": self.service.get_current_period_key("ten_pro"),
+            "tenant_id": "ten_pro", "job_count": 0, "quota_limit": 1000, "tier": "pro"
+        })
+        calls = self._count_usage_writes(self.service)
+
+        for i in range(100):
+            result = self.service.consume_quota("ten_pro", f"job_{i}")
+        self.assertEqual(result["count"], 100)
+        self.assertLess(calls["count"], 20)
+
+        leased = self.service.get_usage("ten_pro")
+        self.assertEqual(self.service.release_leases(), leased["count"] - 100)
+        self.assertGreater(leased["leased"], 0)
+        usage = self.service.get_usage("ten_pro")
+        self.assertEqual(usage["count"], 100)
+        self.assertEqual(usage["leased"], 0)
+
+    def test_consume_quota_exact_near_limit(self):
+        """Test leases shrink near the limit so the quota is never overshot."""
+        for i in range(10):
+            self.service.consume_quota("ten_free", f"job_{i}")
+        with self.assertRaises(QuotaExceededError):
+            self.service.consume_quota("ten_free", "job_over")
+
+        item = self.usage_table.get_item(Key={"period_key": self.service.get_current_period_key("ten_free")})["Item"]
+        self.assertEqual(item["job_count"], 10)
+
+    def test_consume_quota_shares_budget_with_other_processes(self):
+        """Test a lease is refused when other writers have used the budget it relied on."""
+        self.usage_table.put_item(Item={
+            "period_key": self.service.get_current_period_key("ten_pro"),
+            "tenant_id": "ten_pro", "job_count": 0, "quota_limit": 100, "tier": "pro"
+        })
+        for i in range(5):
+            self.service.consume_quota("ten_pro", f"job_{i}")
+        self.service.release_leases()
+        for i in range(95):
+            self.service.record_job_usage("ten_pro", f"other_{i}")
+
+        with self.assertRaises(QuotaExceededError):
+            self.service.consume_quota("ten_pro", "job_over")
+        self.assertEqual(self.service.get_usage("ten_pro")["count"], 100)
+
+    def _job_put(self, table, job_id):
+        return [{"Put": {
+            "TableName": table.name,
+            "Item": {"tenant_id": "ten_pro", "job_id": job_id},
+            "ConditionExpression": "attribute_not_exists(job_id)"
+        }}]
+
+    def test_transact_job_usage_writes_job_and_usage_together(self):
+        """Test each job and its usage are committed in one transaction, without leases."""
+        jobs = self.dynamodb.create_table(
+            TableName="outpost-jobs-test",
+            KeySchema=[{"AttributeName": "tenant_id", "KeyType": "HASH"},
+                       {"AttributeName": "job_id", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "tenant_id", "AttributeType": "S"},
+                                  {"AttributeName": "job_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        calls = {"transactions": 0, "other": 0}
+        self.service.dynamodb.meta.client.meta.events.register(
+            "before-call.dynamodb.*",
+            lambda model, **kwargs: calls.__setitem__(
+                "transactions" if model.name == "TransactWriteItems" else "other",
+                calls["transactions" if model.name == "TransactWriteItems" else "other"] + 1
+            )
+        )
+        self.service.transact_job_usage("ten_pro", "job_0", self._job_put(jobs, "job_0"))
+        calls.update(transactions=0, other=0)
+        for i in range(1, 30):
+            self.service.transact_job_usage("ten_pro", f"job_{i}", self._job_put(jobs, f"job_{i}"))
+
+        self.assertEqual(calls, {"transactions": 29, "other": 0})
+        self.assertEqual(len(jobs.scan()["Items"]), 30)
+        usage = self.service.get_usage("ten_pro")
+        self.assertEqual(usage["count"], 30)
+        self.assertEqual(usage["leased"], 0)
+
+        # A failed write is not counted
+        with self.assertRaises(ClientError):
+            self.service.transact_job_usage("ten_pro", "job_0", self._job_put(jobs, "job_0"))
+        self.assertEqual(self.service.get_usage("ten_pro")["count"], 30)
+
+    def test_billable_job_count_excludes_active_leases(self):
+        """Test units in unexpired leases are not billable; expired leases count as used."""
+        item = {
+            "job_count": 30,
+            "lease_a": {"units": 10, "expires_at": 2000},
+            "lease_b": {"units": 5, "expires_at": 500}
+        }
+        self.assertEqual(MeteringService.billable_job_count(item, now=1000), 20)
+        self.assertEqual(MeteringService.billable_job_count(item, now=3000), 30)
+
+    def test_billable_job_count_uses_recorded_lease_usage(self):
+        """Test only the used units of a lease are billable, whether or not it has expired."""
+        item = {"job_count": 30, "lease_a": {"units": 10, "expires_at": 2000, "used": 4}}
+        self.assertEqual(MeteringService.billable_job_count(item, now=1000), 24)
+        self.assertEqual(MeteringService.billable_job_count(item, now=3000), 24)
+
+    def test_settle_leases_records_used_units(self):
+        """Test settling leaves each lease's used units on the usage item."""
+        key = self.service.get_current_period_key("ten_pro")
+        self.usage_table.put_item(Item={
+            "period_key": key, "tenant_id": "ten_pro", "job_count": 0, "quota_limit": 1000, "tier": "pro"
+        })
+        for i in range(20):
+            self.service.consume_quota("ten_pro", f"job_{i}")
+        self.service.settle_leases()
+
+        # The process goes away without releasing its lease
+        MeteringService.reset_leases()
+        item = self.usage_table.get_item(Key={"period_key": key})["Item"]
+        self.assertGreater(item["job_count"], 20)
+        self.assertEqual(MeteringService.billable_job_count(item, now=time.time() + 3600), 20)
+
+    def test_expired_lease_unused_units_returned(self):
+        """Test a lease left behind by a stopped process is settled by the next leaser."""
+        key = self.service.get_current_period_key("ten_pro")
+        self.usage_table.put_item(Item={
+            "period_key": key, "tenant_id": "ten_pro", "job_count": 25, "quota_limit": 1000, "tier": "pro",
+            "lease_old": {"units": 20, "expires_at": int(time.time()) - 2 * self.service.lease_seconds, "used": 5}
+        })
+        for i in range(30):
+            self.service.consume_quota("ten_pro", f"job_{i}")
+        self.service.release_leases()
+
+        item = self.usage_table.get_item(Key={"period_key": key})["Item"]
+        self.assertNotIn("lease_old", item)
+        # 5 jobs outside the lease, 5 from it, 30 new
+        self.assertEqual(item["job_count"], 40)
+
+    def test_no_lease_near_dimension_limit(self):
+        """Test jobs are counted one by one, with dimension checks, near a dimension limit."""
+        key = self.service.get_current_period_key("ten_free")
+        self.usage_table.put_item(Item={
+            "period_key": key, "tenant_id": "ten_free", "job_count": 0, "quota_limit": 1000, "tier": "free",
+            "tokens": 1_900_000, "tokens_limit": 2_000_000
+        })
+        for i in range(10):
+            self.service.consume_quota("ten_free", f"job_{i}")
+
+        item = self.usage_table.get_item(Key={"period_key": key})["Item"]
+        self.assertEqual(item["job_count"], 10)
+        self.assertFalse([name for name in item if name.startswith("lease_")])
+
+    def test_reset_usage_drops_leases(self):
+        """Test a reset removes outstanding leases so they cannot return units."""
+        self.usage_table.put_item(Item={
+            "period_key": self.service.get_current_period_key("ten_pro"),
+            "tenant_id": "ten_pro", "job_count": 0, "quota_limit": 1000, "tier": "pro"
+        })
+        for i in range(20):
+            self.service.consume_quota("ten_pro", f"job_{i}")
+        self.service.reset_usage("ten_pro")
+
+        self.assertEqual(self.service.release_leases(), 0)
+        usage = self.service.get_usage("ten_pro")
+        self.assertEqual(usage["count"], 0)
+        self.assertEqual(usage["leased"], 0)
+
     def test_period_key_format(self):
         """Test that period key uses correct format."""
         now = datetime.now(timezone.utc)
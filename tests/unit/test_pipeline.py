@@ -0,0 +1,117 @@
+import unittest
+import os
+import shutil
+import tempfile
+from src.outpost.worker.pipeline import StepRunner, StepFailedError
+
+
+class TestStepRunner(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.runner = StepRunner(step_cache_root=os.path.join(self.tmp, "steps"))
+        self.counter = os.path.join(self.tmp, "runs.txt")
+        self.steps = [
+            {"name": "clone", "command": f"echo clone >> {self.counter}; echo v1 > lock.txt", "cacheable": True},
+            {"name": "install", "command": f"echo install >> {self.counter}; cp lock.txt deps.txt",
+             "cacheable": True, "inputs": ["lock.txt"]},
+            {"name": "agent", "command": "cat deps.txt > result.txt"},
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _workspace(self, name):
+        path = os.path.join(self.tmp, name)
+        os.makedirs(path)
+        return path
+
+    def _runs(self):
+        with open(self.counter) as f:
+            return f.read().split()
+
+    def test_records_timing_and_status(self):
+        updates = []
+        steps = self.runner.run("ten_1", "claude", self.steps, self._workspace("ws1"), dict(os.environ),
+                                on_update=lambda s: updates.append([step["status"] for step in s]))
+
+        self.assertEqual([s["status"] for s in steps], ["success", "success", "success"])
+        for step in steps:
+            self.assertIsNotNone(step["duration_ms"])
+            self.assertIsNotNone(step["completed_at"])
+        self.assertEqual(updates[0][0], "running")
+
+    def test_cacheable_steps_skipped_on_hit(self):
+        self.runner.run("ten_1", "claude", self.steps, self._workspace("ws1"), dict(os.environ))
+        ws2 = self._workspace("ws2")
+        steps = self.runner.run("ten_1", "claude", self.steps, ws2, dict(os.environ))
+
+        self.assertEqual([s["status"] for s in steps], ["cached", "cached", "success"])
+        self.assertEqual(self._runs(), ["clone", "install"])
+        with open(os.path.join(ws2, "result.txt")) as f:
+            self.assertEqual(f.read().strip(), "v1")
+
+    def test_cache_is_tenant_scoped(self):
+        self.runner.run("ten_1", "claude", self.steps, self._workspace("ws1"), dict(os.environ))
+        steps = self.runner.run("ten_2", "claude", self.steps, self._workspace("ws2"), dict(os.environ))
+        self.assertFalse(any(s["cache_hit"] for s in steps))
+
+    def test_client_step_state_is_ignored(self):
+        # Tenant B's workspace holds a secret and is cached
+        secret_step = [{"name": "clone", "command": "echo hunter2 > secret.txt", "cacheable": True}]
+        victim = self.runner.run("ten_b", "claude", secret_step, self._workspace("ws_b"), dict(os.environ))
+
+        # Tenant A submits steps claiming to be completed with B's cache key
+        forged = [
+            {"name": "clone", "command": "true", "status": "success", "cache_key": victim[0]["cache_key"]},
+            {"name": "install", "command": f"echo install >> {self.counter}", "cacheable": True},
+            {"name": "agent", "command": "ls > listing.txt"}
+        ]
+        ws = self._workspace("ws_a")
+        steps = self.runner.run("ten_a", "claude", forged, ws, dict(os.environ))
+
+        self.assertEqual([s["status"] for s in steps], ["success", "success", "success"])
+        self.assertFalse(os.path.exists(os.path.join(ws, "secret.txt")))
+        self.assertTrue(os.path.isdir(os.path.join(self.tmp, "steps", "ten_b", "entries")))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "steps", "ten_a", "entries", victim[0]["cache_key"])))
+
+    def test_resumed_steps_keep_completed_state(self):
+        ws = self._workspace("ws1")
+        done = self.runner.run("ten_1", "claude", self.steps[:1], ws, dict(os.environ))
+        # The checkpointed workspace is restored alongside its step state
+        steps = self.runner.run("ten_1", "claude", done + self.steps[1:], ws, dict(os.environ), resumed=True)
+
+        self.assertEqual([s["status"] for s in steps[1:]], ["success", "success"])
+        self.assertEqual(self._runs(), ["clone", "install"])
+
+    def test_input_change_invalidates_downstream(self):
+        self.runner.run("ten_1", "claude", self.steps, self._workspace("ws1"), dict(os.environ))
+        changed = [dict(self.steps[0], command=f"echo clone >> {self.counter}; echo v2 > lock.txt")] + self.steps[1:]
+        steps = self.runner.run("ten_1", "claude", changed, self._workspace("ws2"), dict(os.environ))
+
+        self.assertEqual([s["status"] for s in steps], ["success", "success", "success"])
+
+    def test_steps_after_non_cacheable_step_always_run(self):
+        steps = [
+            {"name": "agent", "command": "date +%N > out.txt"},
+            {"name": "package", "command": f"echo package >> {self.counter}", "cacheable": True},
+        ]
+        self.runner.run("ten_1", "claude", steps, self._workspace("ws1"), dict(os.environ))
+        result = self.runner.run("ten_1", "claude", steps, self._workspace("ws2"), dict(os.environ))
+        self.assertEqual(result[1]["status"], "success")
+        self.assertEqual(self._runs(), ["package", "package"])
+
+    def test_failure_skips_remaining_steps(self):
+        steps = [
+            {"name": "test", "command": "echo boom >&2; exit 3"},
+            {"name": "package", "command": "true"},
+        ]
+        updates = []
+        with self.assertRaises(StepFailedError) as ctx:
+            self.runner.run("ten_1", "claude", steps, self._workspace("ws1"), dict(os.environ),
+                            on_update=lambda s: updates.append(s))
+
+        self.assertIn("boom", ctx.exception.stderr)
+        self.assertEqual([s["status"] for s in updates[-1]], ["failed", "skipped"])
+
+if __name__ == "__main__":
+    unittest.main()
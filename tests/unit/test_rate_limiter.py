@@ -0,0 +1,160 @@
+"""
+Unit tests for RateLimiter.
+"""
+import os
+import time
+import unittest
+from moto import mock_aws
+import boto3
+
+from src.outpost.services.rate_limiter import RateLimiter, _parse_rate_limits
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestLocalRateLimiter(unittest.TestCase):
+    """In-process token buckets."""
+
+    def setUp(self):
+        RateLimiter.reset()
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(mode="local", limits={"FREE": (2, 4)}, clock=self.clock)
+
+    def test_burst_then_429(self):
+        decisions = [self.limiter.check("ten_1", tier="free") for _ in range(5)]
+
+        self.assertEqual([d.allowed for d in decisions], [True] * 4 + [False])
+        self.assertEqual(decisions[3].remaining, 0)
+        headers = decisions[4].headers()
+        self.assertEqual(headers["Retry-After"], "1")
+        self.assertEqual(headers["X-RateLimit-Limit"], "4")
+
+    def test_refills_at_tier_rate(self):
+        for _ in range(4):
+            self.limiter.check("ten_1", tier="free")
+        self.clock.now += 1.0
+
+        self.assertTrue(self.limiter.check("ten_1", tier="free").allowed)
+        self.assertTrue(self.limiter.check("ten_1", tier="free").allowed)
+        self.assertFalse(self.limiter.check("ten_1", tier="free").allowed)
+
+    def test_tenants_are_isolated(self):
+        for _ in range(5):
+            self.limiter.check("ten_1", tier="free")
+        self.assertTrue(self.limiter.check("ten_2", tier="free").allowed)
+
+    def test_off_mode_allows_everything(self):
+        limiter = RateLimiter(mode="off")
+        self.assertTrue(all(limiter.check("ten_1", tier="free").allowed for _ in range(100)))
+
+    def test_parse_rate_limits(self):
+        self.assertEqual(_parse_rate_limits("pro=100:400, free=2"), {"PRO": (100.0, 400), "FREE": (2.0, 2)})
+
+
+@mock_aws
+class TestDistributedRateLimiter(unittest.TestCase):
+    """Leases from the shared DynamoDB bucket."""
+
+    def setUp(self):
+        RateLimiter.reset()
+        RateLimiter._tables.clear()
+        os.environ["RATE_LIMITS_TABLE"] = "outpost-rate-limits-prod"
+        self.table = boto3.resource("dynamodb", region_name="us-east-1").create_table(
+            TableName="outpost-rate-limits-prod",
+            KeySchema=[{"AttributeName": "bucket_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "bucket_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        self.clock = FakeClock()
+        self.wall = FakeClock(1_800_000_000.0)
+
+    def _limiter(self):
+        return RateLimiter(mode="distributed", limits={"PRO": (10, 20)}, clock=self.clock, wall_clock=self.wall)
+
+    def test_burst_is_shared_across_containers(self):
+        allowed = 0
+        for _ in range(4):
+            # Each "container" starts with no local state
+            RateLimiter.reset()
+            limiter = self._limiter()
+            allowed += sum(limiter.check("ten_1", tier="pro").allowed for _ in range(10))
+
+        self.assertEqual(allowed, 20)
+
+    def test_denied_container_does_not_call_dynamodb_until_refill(self):
+        limiter = self._limiter()
+        for _ in range(20):
+            self.assertTrue(limiter.check("ten_1", tier="pro").allowed)
+        denied = limiter.check("ten_1", tier="pro")
+        self.assertFalse(denied.allowed)
+        self.assertAlmostEqual(denied.retry_after, 0.1, places=3)
+
+        tat = self.table.get_item(Key={"bucket_id": "ten_1"})["Item"]["tat"]
+        self.table.delete_item(Key={"bucket_id": "ten_1"})
+        self.assertFalse(limiter.check("ten_1", tier="pro").allowed)
+
+        # Refilled: leases again
+        self.table.put_item(Item={"bucket_id": "ten_1", "tat": tat})
+        self.clock.now += 0.5
+        self.wall.now += 0.5
+        self.assertTrue(limiter.check("ten_1", tier="pro").allowed)
+
+    def test_leases_batches_of_tokens(self):
+        calls = {"count": 0}
+
+        def count(**kwargs):
+            calls["count"] += 1
+
+        limiter = self._limiter()
+        limiter.table.meta.client.meta.events.register("before-call.dynamodb.UpdateItem", count)
+        for _ in range(10):
+            limiter.check("ten_1", tier="pro")
+
+        # 10 req/s with a 0.1s lease fraction would lease one token at a time; the minimum lease batches them
+        self.assertEqual(calls["count"], 1)
+        RateLimiter.reset()
+        calls["count"] = 0
+        limiter = RateLimiter(mode="distributed", limits={"PRO": (100, 200)}, clock=self.clock, wall_clock=self.wall)
+        for _ in range(50):
+            limiter.check("ten_2", tier="pro")
+        self.assertEqual(calls["count"], 5)
+
+    def test_low_tier_lease_lasts_until_its_tokens_refill(self):
+        calls = {"count": 0}
+
+        def count(**kwargs):
+            calls["count"] += 1
+
+        limiter = RateLimiter(mode="distributed", limits={"FREE": (5, 20)}, clock=self.clock, wall_clock=self.wall)
+        limiter.table.meta.client.meta.events.register("before-call.dynamodb.UpdateItem", count)
+        # One request a second, well under the rate, for a minute
+        for _ in range(60):
+            self.assertTrue(limiter.check("ten_1", tier="free").allowed)
+            self.clock.now += 1
+            self.wall.now += 1
+
+        # 10-token leases, each valid for the 2s the bucket needs to earn them back
+        self.assertEqual(calls["count"], 30)
+
+    def test_fails_open_without_table(self):
+        self.table.delete()
+        self.assertTrue(self._limiter().check("ten_1", tier="pro").allowed)
+
+    def test_fast_path_is_sub_millisecond(self):
+        limiter = RateLimiter(mode="distributed", limits={"PRO": (100000, 200000)})
+        limiter.check("ten_1", tier="pro")
+        started = time.perf_counter()
+        for _ in range(500):
+            limiter.check("ten_1", tier="pro")
+        per_check_ms = (time.perf_counter() - started) * 1000 / 500
+        self.assertLess(per_check_ms, 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
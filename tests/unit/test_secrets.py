@@ -1,5 +1,6 @@
 import unittest
 import time
+from unittest.mock import patch
 from moto import mock_aws
 import boto3
 from src.outpost.secrets import SecretsManager
@@ -50,5 +51,49 @@ class TestSecretsManager(unittest.TestCase):
         with self.assertRaises(Exception):
             self.manager.get_api_key_secret(self.tenant_id, self.key_name)
 
+    def test_agent_credentials_in_one_call(self):
+        self.manager.create_agent_credential(self.tenant_id, "claude", "sk-ant")
+        self.manager.create_agent_credential(self.tenant_id, "github", "ghp_token")
+        # Another tenant whose ID shares the prefix
+        self.manager.create_agent_credential("ten_1234", "claude", "sk-ant-other")
+
+        with patch.object(self.manager.client, "batch_get_secret_value",
+                          wraps=self.manager.client.batch_get_secret_value) as batch_get:
+            credentials = self.manager.get_agent_credentials(self.tenant_id)
+            env = self.manager.agent_env(self.tenant_id, "claude")
+
+        batch_get.assert_called_once()
+        self.assertEqual(credentials, {"claude": "sk-ant", "github": "ghp_token"})
+        self.assertEqual(env, {"ANTHROPIC_API_KEY": "sk-ant", "GITHUB_TOKEN": "ghp_token"})
+        self.assertEqual(self.manager.agent_env(self.tenant_id, "codex"), {"GITHUB_TOKEN": "ghp_token"})
+
+    def test_agent_credentials_cached_until_changed(self):
+        self.assertEqual(self.manager.get_agent_credentials(self.tenant_id), {})
+
+        with patch.object(self.manager.client, "batch_get_secret_value") as batch_get:
+            self.assertEqual(self.manager.get_agent_credentials(self.tenant_id), {})
+        batch_get.assert_not_called()
+
+        # Storing a credential through the manager drops the cached entry
+        self.manager.create_agent_credential(self.tenant_id, "gemini", "AIza-key")
+        self.assertEqual(self.manager.agent_env(self.tenant_id, "gemini"), {"GOOGLE_API_KEY": "AIza-key"})
+
+    def test_prefetch_many_tenants(self):
+        tenant_ids = [f"ten_{i}" for i in range(25)]
+        for tenant_id in tenant_ids:
+            self.manager.create_agent_credential(tenant_id, "claude", f"sk-{tenant_id}")
+            self.manager.create_agent_credential(tenant_id, "grok", f"xai-{tenant_id}")
+            self.manager.create_agent_credential(tenant_id, "github", f"ghp-{tenant_id}")
+
+        with patch.object(self.manager.client, "batch_get_secret_value",
+                          wraps=self.manager.client.batch_get_secret_value) as batch_get:
+            credentials = self.manager.prefetch_agent_credentials(tenant_ids + ["ten_none"])
+            self.manager.get_agent_credentials("ten_24")
+
+        # 26 tenants, ten name prefixes per call: 30 + 30 + 15 secrets, 20 per page
+        self.assertEqual(batch_get.call_count, 5)
+        self.assertEqual(credentials["ten_24"], {"claude": "sk-ten_24", "grok": "xai-ten_24", "github": "ghp-ten_24"})
+        self.assertEqual(credentials["ten_none"], {})
+
 if __name__ == "__main__":
     unittest.main()
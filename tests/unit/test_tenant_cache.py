@@ -0,0 +1,193 @@
+"""
+Unit tests for TenantCache.
+"""
+import os
+import threading
+import time
+import unittest
+from moto import mock_aws
+import boto3
+from contextlib import redirect_stdout
+from io import StringIO
+import json
+
+from src.outpost.services.metering import MeteringService
+from src.outpost.services.tenant_cache import TenantCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTenantCache(unittest.TestCase):
+    """Tests for the TTL / single-flight cache itself."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TenantCache(ttl_seconds=60, clock=self.clock)
+        self.loads = []
+
+    def _load(self, tenant_id):
+        self.loads.append(tenant_id)
+        return {"tenant_id": tenant_id, "subscription_tier": "pro"}
+
+    def test_hit_within_ttl(self):
+        self.cache.get("ten_1", self._load)
+        self.clock.now = 59
+        self.cache.get("ten_1", self._load)
+
+        self.assertEqual(self.loads, ["ten_1"])
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_reload_after_ttl(self):
+        self.cache.get("ten_1", self._load)
+        self.clock.now = 61
+        self.cache.get("ten_1", self._load)
+
+        self.assertEqual(self.loads, ["ten_1", "ten_1"])
+
+    def test_missing_tenant_not_cached(self):
+        self.cache.get("ten_1", lambda tenant_id: None)
+        self.cache.get("ten_1", self._load)
+
+        self.assertEqual(self.loads, ["ten_1"])
+
+    def test_invalidate(self):
+        self.cache.get("ten_1", self._load)
+        self.cache.get("ten_2", self._load)
+        self.cache.invalidate("ten_1")
+        self.cache.get("ten_1", self._load)
+        self.cache.get("ten_2", self._load)
+
+        self.assertEqual(self.loads, ["ten_1", "ten_2", "ten_1"])
+
+        self.cache.invalidate()
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_load_errors_are_not_cached(self):
+        def failing(tenant_id):
+            raise RuntimeError("throttled")
+
+        with self.assertRaises(RuntimeError):
+            self.cache.get("ten_1", failing)
+        self.cache.get("ten_1", self._load)
+
+        self.assertEqual(self.loads, ["ten_1"])
+        self.assertEqual(self.cache.stats()["load_errors"], 1)
+
+    def test_concurrent_misses_share_one_load(self):
+        cache = TenantCache(ttl_seconds=60)
+        release = threading.Event()
+
+        def slow_load(tenant_id):
+            release.wait(5)
+            return self._load(tenant_id)
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get("ten_1", slow_load)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        while cache.stats()["misses"] < 8:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.loads, ["ten_1"])
+        self.assertEqual(len(results), 8)
+        self.assertEqual(cache.stats()["coalesced"], 7)
+
+    def test_invalidate_during_load_discards_result(self):
+        def load_then_invalidate(tenant_id):
+            self.cache.invalidate(tenant_id)
+            return self._load(tenant_id)
+
+        self.cache.get("ten_1", load_then_invalidate)
+        self.cache.get("ten_1", self._load)
+
+        self.assertEqual(len(self.loads), 2)
+
+    def test_zero_ttl_disables_caching(self):
+        cache = TenantCache(ttl_seconds=0)
+        cache.get("ten_1", self._load)
+        cache.get("ten_1", self._load)
+
+        self.assertEqual(len(self.loads), 2)
+
+    def test_for_table_is_shared(self):
+        TenantCache.reset()
+        self.assertIs(TenantCache.for_table("t"), TenantCache.for_table("t"))
+        self.assertIsNot(TenantCache.for_table("t"), TenantCache.for_table("u"))
+
+    def test_log_stats_once_per_interval(self):
+        TenantCache.reset()
+        TenantCache.for_table("t").get("ten_1", self._load)
+        out = StringIO()
+        with redirect_stdout(out):
+            self.assertFalse(TenantCache.log_stats(60, clock=self.clock))
+            self.clock.now = 30
+            self.assertFalse(TenantCache.log_stats(60, clock=self.clock))
+            self.clock.now = 61
+            self.assertTrue(TenantCache.log_stats(60, clock=self.clock))
+            self.assertFalse(TenantCache.log_stats(60, clock=self.clock))
+
+        line = json.loads(out.getvalue())
+        self.assertEqual(line["metric"], "tenant_cache")
+        self.assertEqual(line["table"], "t")
+        self.assertEqual(line["misses"], 1)
+
+
+@mock_aws
+class TestMeteringTenantCache(unittest.TestCase):
+    """MeteringService reads tenants through the shared cache."""
+
+    def setUp(self):
+        os.environ["TENANTS_TABLE"] = "outpost-tenants-prod"
+        os.environ["USAGE_TABLE"] = "outpost-usage-prod"
+        os.environ["STRIPE_METERING_ENABLED"] = "false"
+        TenantCache.reset()
+
+        dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+        self.tenants_table = dynamodb.create_table(
+            TableName="outpost-tenants-prod",
+            KeySchema=[{"AttributeName": "tenant_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "tenant_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        dynamodb.create_table(
+            TableName="outpost-usage-prod",
+            KeySchema=[{"AttributeName": "period_key", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "period_key", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        self.tenants_table.put_item(Item={"tenant_id": "ten_1", "subscription_tier": "free"})
+
+    def test_tier_lookups_hit_cache_until_invalidated(self):
+        first = MeteringService()
+        second = MeteringService()
+
+        self.assertEqual(first.get_usage("ten_1")["quota"], 10)
+        self.tenants_table.update_item(
+            Key={"tenant_id": "ten_1"},
+            UpdateExpression="SET subscription_tier = :t",
+            ExpressionAttributeValues={":t": "pro"}
+        )
+        # Shared across instances in the process, so still the cached tier
+        self.assertEqual(second.get_usage("ten_1")["quota"], 10)
+
+        TenantCache.for_table("outpost-tenants-prod").invalidate("ten_1")
+        self.assertEqual(second.get_usage("ten_1")["quota"], 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""
+Unit tests for UsageReport.
+"""
+import csv
+import io
+import json
+import os
+import unittest
+from moto import mock_aws
+import boto3
+
+from src.outpost.services.metering import MeteringService
+from src.outpost.services.tenant_cache import TenantCache
+from src.outpost.services.usage_report import UsageReport, REPORT_COLUMNS
+
+
+@mock_aws
+class TestUsageReport(unittest.TestCase):
+    """Tests for the all-tenant usage report."""
+
+    def setUp(self):
+        os.environ["TENANTS_TABLE"] = "outpost-tenants-prod"
+        os.environ["USAGE_TABLE"] = "outpost-usage-prod"
+        os.environ["STRIPE_METERING_ENABLED"] = "false"
+        TenantCache.reset()
+        MeteringService.reset_leases()
+
+        dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+        self.tenants_table = dynamodb.create_table(
+            TableName="outpost-tenants-prod",
+            KeySchema=[{"AttributeName": "tenant_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "tenant_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        dynamodb.create_table(
+            TableName="outpost-usage-prod",
+            KeySchema=[{"AttributeName": "period_key", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "period_key", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        with self.tenants_table.batch_writer() as batch:
+            for i in range(250):
+                batch.put_item(Item={
+                    "tenant_id": f"ten_{i:03d}",
+                    "name": f"Tenant {i}",
+                    "status": "active",
+                    "subscription_tier": "pro" if i % 2 else "free"
+                })
+
+        self.metering = MeteringService(shards={"ten_001": 2})
+        self.period = self.metering.get_current_period_key("x").split("#")[1]
+        self.metering.record_job_usage("ten_000", "job_1")
+        for i in range(3):
+            self.metering.record_job_usage("ten_001", f"job_{i}")
+        self.report = UsageReport(self.metering, segments=3, page_size=40)
+
+    def test_one_row_per_tenant(self):
+        rows = {row["tenant_id"]: row for row in self.report.rows(self.period)}
+
+        self.assertEqual(len(rows), 250)
+        self.assertEqual(rows["ten_000"]["job_count"], 1)
+        self.assertEqual(rows["ten_000"]["quota"], 10)
+        self.assertEqual(rows["ten_000"]["usage_percent"], 10.0)
+        # Sharded tenants are summed across shards
+        self.assertEqual(rows["ten_001"]["job_count"], 3)
+        self.assertEqual(rows["ten_001"]["billable_jobs"], 3)
+        self.assertEqual(rows["ten_001"]["tier"], "pro")
+        # No usage this period
+        self.assertEqual(rows["ten_002"]["job_count"], 0)
+        self.assertEqual(rows["ten_002"]["quota"], 10)
+
+    def test_write_csv(self):
+        out = io.BytesIO()
+        stats = self.report.write(out, self.period, "csv")
+
+        rows = list(csv.DictReader(io.StringIO(out.getvalue().decode())))
+        self.assertEqual(stats["rows"], 250)
+        self.assertEqual(stats["bytes"], len(out.getvalue()))
+        self.assertEqual(list(rows[0].keys()), REPORT_COLUMNS)
+        self.assertEqual({r["tenant_id"] for r in rows}, {f"ten_{i:03d}" for i in range(250)})
+
+    def test_write_jsonl(self):
+        out = io.BytesIO()
+        self.report.write(out, self.period, "jsonl")
+
+        rows = [json.loads(line) for line in out.getvalue().decode().splitlines()]
+        self.assertEqual(len(rows), 250)
+        self.assertEqual(next(r for r in rows if r["tenant_id"] == "ten_001")["job_count"], 3)
+
+        with self.assertRaises(ValueError):
+            self.report.write(io.BytesIO(), self.period, "xlsx")
+
+    def test_skips_non_metadata_records(self):
+        self.tenants_table.put_item(Item={"tenant_id": "ten_900", "sk": "API_KEY#1"})
+        rows = list(self.report.rows(self.period))
+        self.assertNotIn("ten_900", {r["tenant_id"] for r in rows})
+
+    def test_stopping_early_does_not_hang(self):
+        rows = self.report.rows(self.period)
+        self.assertEqual(len([next(rows) for _ in range(5)]), 5)
+        rows.close()
+
+    def test_export_to_s3(self):
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="outpost-reports")
+        report = UsageReport(self.metering, segments=2, bucket="outpost-reports")
+
+        result = report.export(self.period, "jsonl")
+
+        self.assertEqual(result["location"], f"s3://outpost-reports/usage-reports/{self.period}.jsonl")
+        body = s3.get_object(Bucket="outpost-reports", Key=f"usage-reports/{self.period}.jsonl")["Body"].read()
+        self.assertEqual(len(body.decode().splitlines()), 250)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+Unit tests for UsageReporter.
+"""
+import os
+import unittest
+from unittest.mock import MagicMock
+from moto import mock_aws
+import boto3
+
+from src.outpost.services.metering import MeteringService
+from src.outpost.services.tenant_cache import TenantCache
+from src.outpost.services.usage_reporter import UsageReporter
+
+
+@mock_aws
+class TestUsageReporter(unittest.TestCase):
+    """Tests for batched Stripe usage reporting."""
+
+    def setUp(self):
+        os.environ["TENANTS_TABLE"] = "outpost-tenants-prod"
+        os.environ["USAGE_TABLE"] = "outpost-usage-prod"
+        os.environ["STRIPE_METERING_ENABLED"] = "false"
+        TenantCache.reset()
+        MeteringService.reset_leases()
+
+        dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+        self.tenants_table = dynamodb.create_table(
+            TableName="outpost-tenants-prod",
+            KeySchema=[{"AttributeName": "tenant_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "tenant_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        self.usage_table = dynamodb.create_table(
+            TableName="outpost-usage-prod",
+            KeySchema=[{"AttributeName": "period_key", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "period_key", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        self.tenants_table.put_item(Item={
+            "tenant_id": "ten_pro",
+            "subscription_tier": "pro",
+            "stripe_subscription_item_id": "si_pro"
+        })
+        self.tenants_table.put_item(Item={"tenant_id": "ten_free", "subscription_tier": "free"})
+
+        self.stripe = MagicMock()
+        self.metering = MeteringService(shards={"ten_pro": 2})
+        self.reporter = UsageReporter(metering=self.metering, stripe_module=self.stripe)
+
+    def _record(self, tenant_id, count):
+        for i in range(count):
+            self.metering.record_job_usage(tenant_id, f"job_{i}")
+
+    def test_recording_does_not_call_stripe(self):
+        self._record("ten_pro", 3)
+        self.stripe.SubscriptionItem.create_usage_record.assert_not_called()
+
+    def test_reports_aggregated_delta_once(self):
+        self._record("ten_pro", 5)
+        self._record("ten_free", 2)
+
+        result = self.reporter.report()
+
+        self.assertEqual(result["reported"], 1)
+        self.assertEqual(result["units"], 5)
+        create = self.stripe.SubscriptionItem.create_usage_record
+        create.assert_called_once()
+        self.assertEqual(create.call_args.args[0], "si_pro")
+        self.assertEqual(create.call_args.kwargs["quantity"], 5)
+        self.assertEqual(create.call_args.kwargs["action"], "increment")
+
+        # Nothing new to report
+        self.assertEqual(self.reporter.report()["units"], 0)
+        self._record("ten_pro", 2)
+        self.assertEqual(self.reporter.report()["units"], 2)
+        self.assertEqual(create.call_args.kwargs["quantity"], 2)
+
+    def test_failed_report_is_retried_with_same_idempotency_key(self):
+        self._record("ten_pro", 4)
+        create = self.stripe.SubscriptionItem.create_usage_record
+        create.side_effect = RuntimeError("rate limited")
+
+        self.assertEqual(self.reporter.report()["failed"], 1)
+        first_key = create.call_args.kwargs["idempotency_key"]
+
+        # More usage arrives before the retry; the retry replays only the claimed range
+        self._record("ten_pro", 1)
+        create.side_effect = None
+        result = self.reporter.report()
+
+        self.assertEqual(result["units"], 4)
+        self.assertEqual(create.call_args.kwargs["idempotency_key"], first_key)
+        self.assertEqual(self.reporter.report()["units"], 1)
+
+    def test_leased_units_reported_once_used(self):
+        for i in range(30):
+            self.metering.consume_quota("ten_pro", f"job_{i}")
+
+        # Only units the lease records as used are reported
+        first = self.reporter.report()["units"]
+        self.assertLessEqual(first, 30)
+        self.assertLess(first, self.metering.get_usage("ten_pro")["count"])
+
+        self.metering.release_leases()
+        self.assertEqual(first + self.reporter.report()["units"], 30)
+
+    def test_reconcile(self):
+        self._record("ten_pro", 3)
+        self.stripe.SubscriptionItem.list_usage_record_summaries.return_value = MagicMock(
+            data=[MagicMock(total_usage=3)]
+        )
+
+        before = self.reporter.reconcile()
+        self.assertEqual(before[0]["unreported"], 3)
+        self.assertFalse(before[0]["in_sync"])
+
+        self.reporter.report()
+        after = self.reporter.reconcile(check_stripe=True)
+        self.assertEqual(after[0]["subscription_item_id"], "si_pro")
+        self.assertEqual(after[0]["local"], 3)
+        self.assertEqual(after[0]["stripe"], 3)
+        self.assertTrue(after[0]["in_sync"])
+
+    def test_reads_usage_by_key_without_scanning(self):
+        self._record("ten_pro", 3)
+        self._record("ten_free", 2)
+        self.reporter.usage_table = MagicMock(wraps=self.usage_table)
+        self.metering.usage_table = self.reporter.usage_table
+
+        self.assertEqual(self.reporter.subscribed_tenants(), {"ten_pro": "si_pro"})
+        self.assertEqual(self.reporter.report()["units"], 3)
+        self.reporter.usage_table.scan.assert_not_called()
+
+    def test_disabled_without_stripe(self):
+        reporter = UsageReporter(metering=self.metering)
+        self.assertIn("skipped", reporter.report())
+
+
+if __name__ == "__main__":
+    unittest.main()
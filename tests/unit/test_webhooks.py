@@ -9,6 +9,7 @@ from moto import mock_aws
 import boto3
 
 from src.outpost.functions.api.webhooks import WebhookHandler, handler
+from src.outpost.services.tenant_cache import TenantCache
 
 
 @mock_aws
@@ -21,6 +22,7 @@ class TestWebhookHandler(unittest.TestCase):
         self.audit_table_name = "outpost-audit-prod"
 
         os.environ["TENANTS_TABLE"] = self.tenants_table_name
+        TenantCache.reset()
         os.environ["AUDIT_TABLE"] = self.audit_table_name
         os.environ["STRIPE_SECRET_KEY"] = "sk_test_fake"
         os.environ["STRIPE_WEBHOOK_SECRET"] = "whsec_test_fake"
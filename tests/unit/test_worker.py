@@ -1,9 +1,14 @@
 import unittest
+import json
 import os
 import shutil
+import threading
+from datetime import datetime
+from unittest.mock import MagicMock, patch
 from moto import mock_aws
 import boto3
 from src.outpost.worker.executor import Worker
+from src.outpost.worker.main import JobPoller
 from src.outpost.models import JobStatus
 
 @mock_aws
@@ -67,6 +72,66 @@ class TestWorker(unittest.TestCase):
         # Verify status
         res = self.table.get_item(Key={"tenant_id": tenant_id, "job_id": job_id})
         self.assertEqual(res["Item"]["status"], "success")
+        self.assertEqual(res["Item"]["worker_id"], self.executor.worker_id)
+
+    def test_execute_records_resource_usage(self):
+        os.environ["WORKER_VCPU"] = "2"
+        os.environ["WORKER_MEMORY_MB"] = "4096"
+        self.addCleanup(os.environ.pop, "WORKER_VCPU")
+        self.addCleanup(os.environ.pop, "WORKER_MEMORY_MB")
+        usage_table = self.dynamodb.create_table(
+            TableName="outpost-usage-prod",
+            KeySchema=[{"AttributeName": "period_key", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "period_key", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        worker = Worker()
+        self.table.put_item(Item={"tenant_id": "ten_1", "job_id": "job_usage", "status": "pending"})
+
+        worker.execute({
+            "tenant_id": "ten_1",
+            "job_id": "job_usage",
+            "agent": "claude",
+            "command": "sleep 0.2; echo '{\"tokens_input\": 1200, \"tokens_output\": 300}' > $OUTPOST_USAGE_FILE"
+        })
+
+        item = usage_table.get_item(Key={"period_key": worker.metering.get_current_period_key("ten_1")})["Item"]
+        self.assertEqual(item["tokens"], 1500)
+        self.assertGreaterEqual(item["vcpu_seconds"], 0.4)
+        self.assertAlmostEqual(float(item["memory_gb_seconds"]), float(item["vcpu_seconds"]) * 2, places=2)
+
+    def test_job_tracked_before_claim(self):
+        calls = []
+        self.executor.heartbeat = MagicMock()
+        self.executor.heartbeat.track.side_effect = lambda *args: calls.append("track")
+        self.executor.heartbeat.untrack.side_effect = lambda *args: calls.append("untrack")
+
+        with patch.object(self.executor, "claim_job", side_effect=lambda *args: calls.append("claim") or False):
+            self.executor.execute({"tenant_id": "ten_1", "job_id": "job_taken", "agent": "claude", "command": "true"})
+
+        # A skipped job is dropped from the heartbeat again
+        self.assertEqual(calls, ["track", "claim", "untrack"])
+
+    def test_credentials_error_fails_only_that_job(self):
+        for job_id in ("job_a", "job_b"):
+            self.table.put_item(Item={"tenant_id": "ten_1", "job_id": job_id, "status": "pending"})
+        self.executor.secrets = MagicMock()
+        self.executor.secrets.agent_env.side_effect = [RuntimeError("throttled"), {}]
+        self.executor.metering = MagicMock()
+
+        self.executor.execute_batch([
+            {"tenant_id": "ten_1", "job_id": job_id, "agent": "claude", "command": "echo ok"}
+            for job_id in ("job_a", "job_b")
+        ])
+
+        failed = self.table.get_item(Key={"tenant_id": "ten_1", "job_id": "job_a"})["Item"]
+        self.assertEqual(failed["status"], "failed")
+        self.assertIn("throttled", failed["error_message"])
+        self.assertEqual(self.table.get_item(Key={"tenant_id": "ten_1", "job_id": "job_b"})["Item"]["status"], "success")
+        # Only the job that ran is metered
+        self.assertEqual(
+            [c.args[1] for c in self.executor.metering.record_resource_usage.call_args_list], ["job_b"]
+        )
 
     def test_execute_failure(self):
         job_id = "job_456"
@@ -89,6 +154,302 @@ class TestWorker(unittest.TestCase):
         # Verify status
         res = self.table.get_item(Key={"tenant_id": tenant_id, "job_id": job_id})
         self.assertEqual(res["Item"]["status"], "failed")
+    def test_stale_redelivery_is_not_run(self):
+        # Reaped and failed while the original message was still in flight
+        self.table.put_item(Item={"tenant_id": "ten_1", "job_id": "job_reaped", "status": "failed"})
+
+        self.assertIsNone(self.executor.execute({
+            "tenant_id": "ten_1",
+            "job_id": "job_reaped",
+            "agent": "claude",
+            "command": "touch ran.txt"
+        }))
+
+        item = self.table.get_item(Key={"tenant_id": "ten_1", "job_id": "job_reaped"})["Item"]
+        self.assertEqual(item["status"], "failed")
+        self.assertNotIn("worker_id", item)
+        self.assertFalse(os.path.exists("/tmp/outpost/workspaces/ten_1/job_reaped/ran.txt"))
+
+    def test_status_not_written_after_job_is_reaped(self):
+        self.table.put_item(Item={"tenant_id": "ten_1", "job_id": "job_1", "status": "pending"})
+        self.assertTrue(self.executor.claim_job("ten_1", "job_1"))
+        self.assertFalse(Worker().claim_job("ten_1", "job_1"))
+
+        # The reaper requeued it and another worker picked it up
+        self.table.update_item(
+            Key={"tenant_id": "ten_1", "job_id": "job_1"},
+            UpdateExpression="SET worker_id = :w",
+            ExpressionAttributeValues={":w": "w-other"}
+        )
+        self.assertFalse(self.executor.update_job_status("ten_1", "job_1", JobStatus.SUCCESS))
+        item = self.table.get_item(Key={"tenant_id": "ten_1", "job_id": "job_1"})["Item"]
+        self.assertEqual(item["status"], "running")
+
+    def test_execute_batch_shares_workspace(self):
+        tenant_id = "ten_1"
+        jobs = []
+        for job_id, command in [("job_a", "echo first > shared.txt"), ("job_b", "cat shared.txt")]:
+            self.table.put_item(Item={"tenant_id": tenant_id, "job_id": job_id, "status": "pending"})
+            jobs.append({
+                "tenant_id": tenant_id,
+                "job_id": job_id,
+                "agent": "grok",
+                "command": command,
+                "repo": "acme/app",
+                "batchable": True
+            })
+
+        self.executor.execute_batch(jobs)
+
+        outputs = []
+        for job in jobs:
+            item = self.table.get_item(Key={"tenant_id": tenant_id, "job_id": job["job_id"]})["Item"]
+            self.assertEqual(item["status"], "success")
+            outputs.append(item["output_location"])
+
+        # Each job has its own output, produced in the shared workspace
+        self.assertNotEqual(outputs[0], outputs[1])
+        with open(outputs[1]) as f:
+            self.assertIn("first", f.read())
+
+    def test_execute_injects_tenant_agent_credentials(self):
+        self.executor.secrets.create_agent_credential("ten_1", "claude", "sk-ant-tenant")
+        self.executor.secrets.create_agent_credential("ten_1", "codex", "sk-openai-tenant")
+        self.table.put_item(Item={"tenant_id": "ten_1", "job_id": "job_env", "status": "pending"})
+
+        self.executor.execute({
+            "tenant_id": "ten_1",
+            "job_id": "job_env",
+            "agent": "claude",
+            "command": "echo \"key=$ANTHROPIC_API_KEY\"; env"
+        })
+
+        item = self.table.get_item(Key={"tenant_id": "ten_1", "job_id": "job_env"})["Item"]
+        self.assertEqual(item["status"], "success")
+        with open(item["output_location"]) as f:
+            output = f.read()
+        self.assertIn("key=sk-ant-tenant", output)
+        # Only the job's own agent credential is injected
+        self.assertNotIn("sk-openai-tenant", output)
+
+    def test_warm_credentials_for_recent_tenants(self):
+        os.environ["JOBS_TABLE"] = "outpost-jobs-indexed"
+        self.addCleanup(os.environ.__setitem__, "JOBS_TABLE", self.table_name)
+        table = self.dynamodb.create_table(
+            TableName="outpost-jobs-indexed",
+            KeySchema=[
+                {"AttributeName": "tenant_id", "KeyType": "HASH"},
+                {"AttributeName": "job_id", "KeyType": "RANGE"}
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "tenant_id", "AttributeType": "S"},
+                {"AttributeName": "job_id", "AttributeType": "S"},
+                {"AttributeName": "status", "AttributeType": "S"},
+                {"AttributeName": "created_at", "AttributeType": "S"}
+            ],
+            GlobalSecondaryIndexes=[{
+                "IndexName": "status-index",
+                "KeySchema": [
+                    {"AttributeName": "status", "KeyType": "HASH"},
+                    {"AttributeName": "created_at", "KeyType": "RANGE"}
+                ],
+                "Projection": {"ProjectionType": "ALL"}
+            }],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        recent = datetime.utcnow().isoformat()
+        for tenant_id, status, created_at in [
+            ("ten_queued", "pending", recent),
+            ("ten_done", "success", recent),
+            ("ten_idle", "success", "2020-01-01T00:00:00")
+        ]:
+            table.put_item(Item={"tenant_id": tenant_id, "job_id": "job_1", "status": status, "created_at": created_at})
+        worker = Worker()
+        worker.secrets.create_agent_credential("ten_queued", "claude", "sk-ant-queued")
+
+        self.assertEqual(worker.recent_tenants(24, 10), ["ten_queued", "ten_done"])
+        with patch.object(worker.secrets.client, "batch_get_secret_value",
+                          wraps=worker.secrets.client.batch_get_secret_value) as batch_get:
+            self.assertEqual(worker.warm_credentials(), 2)
+            self.assertEqual(worker.secrets.agent_env("ten_queued", "claude"), {"ANTHROPIC_API_KEY": "sk-ant-queued"})
+            self.assertEqual(worker.secrets.agent_env("ten_done", "claude"), {})
+        batch_get.assert_called_once()
+
+    def test_execute_batch_stops_when_before_job_refuses(self):
+        jobs = []
+        for job_id in ("job_a", "job_b"):
+            self.table.put_item(Item={"tenant_id": "ten_1", "job_id": job_id, "status": "pending"})
+            jobs.append({"tenant_id": "ten_1", "job_id": job_id, "agent": "claude", "command": "true"})
+
+        results = self.executor.execute_batch(jobs, before_job=lambda index: index == 0)
+
+        self.assertEqual(results, [None])
+        item = self.table.get_item(Key={"tenant_id": "ten_1", "job_id": "job_b"})["Item"]
+        self.assertEqual(item["status"], "pending")
+
+    def test_poller_extends_visibility_as_batched_jobs_start(self):
+        poller = JobPoller()
+        poller.sqs = MagicMock()
+        poller.sqs.change_message_visibility_batch.return_value = {"Successful": [], "Failed": []}
+        poller.concurrency = MagicMock()
+        poller.concurrency.acquire.return_value = True
+        messages = [
+            {"Body": json.dumps({"tenant_id": "ten_1", "job_id": f"job_{i}"}), "ReceiptHandle": f"rh-{i}"}
+            for i in range(3)
+        ]
+
+        def execute_batch(bodies, before_job):
+            return [None for index in range(len(bodies)) if before_job(index)]
+
+        with patch.object(poller.worker, "execute_batch", side_effect=execute_batch):
+            poller.process_batch(messages)
+
+        extended = [
+            [entry["ReceiptHandle"] for entry in call.kwargs["Entries"]]
+            for call in poller.sqs.change_message_visibility_batch.call_args_list
+        ]
+        self.assertEqual(extended, [["rh-0", "rh-1", "rh-2"], ["rh-1", "rh-2"], ["rh-2"]])
+        self.assertEqual(
+            poller.sqs.change_message_visibility_batch.call_args.kwargs["Entries"][0]["VisibilityTimeout"], 900
+        )
+        poller.sqs.delete_message_batch.assert_called_once()
+
+        # A message that is visible again is not run twice
+        poller.sqs.reset_mock()
+        poller.sqs.change_message_visibility_batch.return_value = {"Successful": [], "Failed": [{"Id": "0"}]}
+        with patch.object(poller.worker, "execute_batch", side_effect=execute_batch):
+            poller.process_batch(messages)
+        poller.sqs.delete_message_batch.assert_not_called()
+
+    def test_poller_keeps_every_held_message_hidden(self):
+        poller = JobPoller()
+        poller.sqs = MagicMock()
+        poller.sqs.change_message_visibility_batch.return_value = {"Successful": [], "Failed": []}
+        messages = [
+            {"Body": json.dumps({"tenant_id": f"ten_{i}", "job_id": f"job_{i}"}), "ReceiptHandle": f"rh-{i}"}
+            for i in range(3)
+        ]
+        processed = []
+
+        def process_message(message):
+            processed.append(message["ReceiptHandle"])
+            if len(processed) == 2:
+                poller.running = False
+
+        with patch.object(poller.batcher, "collect", return_value=messages), \
+                patch.object(poller, "process_message", side_effect=process_message):
+            poller.poll()
+
+        calls = [
+            [(entry["ReceiptHandle"], entry["VisibilityTimeout"]) for entry in call.kwargs["Entries"]]
+            for call in poller.sqs.change_message_visibility_batch.call_args_list
+        ]
+        self.assertEqual(processed, ["rh-0", "rh-1"])
+        # Each message stays hidden until it runs; the rest are released on shutdown
+        self.assertEqual(calls, [
+            [("rh-0", 900), ("rh-1", 900), ("rh-2", 900)],
+            [("rh-1", 900), ("rh-2", 900)],
+            [("rh-2", 0)]
+        ])
+
+    def test_execute_batch_rejects_mixed_tenants(self):
+        jobs = [
+            {"tenant_id": "ten_1", "job_id": "j1", "agent": "grok", "command": "true"},
+            {"tenant_id": "ten_2", "job_id": "j2", "agent": "grok", "command": "true"}
+        ]
+        with self.assertRaises(ValueError):
+            self.executor.execute_batch(jobs)
+    def test_execute_steps_records_timings(self):
+        job_id = "job_steps"
+        tenant_id = "ten_1"
+        self.table.put_item(Item={"tenant_id": tenant_id, "job_id": job_id, "status": "pending"})
+
+        self.executor.execute({
+            "tenant_id": tenant_id,
+            "job_id": job_id,
+            "agent": "claude",
+            "command": "echo clone && echo test",
+            "steps": [
+                {"name": "clone", "command": "echo clone", "cacheable": True},
+                {"name": "test", "command": "echo test"}
+            ]
+        })
+
+        item = self.table.get_item(Key={"tenant_id": tenant_id, "job_id": job_id})["Item"]
+        self.assertEqual(item["status"], "success")
+        self.assertEqual([s["status"] for s in item["steps"]], ["success", "success"])
+        self.assertIn("duration_ms", item["steps"][0])
+
+    def test_execute_steps_failure(self):
+        job_id = "job_steps_fail"
+        tenant_id = "ten_1"
+        self.table.put_item(Item={"tenant_id": tenant_id, "job_id": job_id, "status": "pending"})
+
+        self.executor.execute({
+            "tenant_id": tenant_id,
+            "job_id": job_id,
+            "agent": "claude",
+            "command": "exit 1",
+            "steps": [{"name": "test", "command": "exit 1"}, {"name": "package", "command": "true"}]
+        })
+
+        item = self.table.get_item(Key={"tenant_id": tenant_id, "job_id": job_id})["Item"]
+        self.assertEqual(item["status"], "failed")
+        self.assertEqual([s["status"] for s in item["steps"]], ["failed", "skipped"])
+    def test_interrupt_requeues_command_job_without_checkpoint(self):
+        self.table.put_item(Item={"tenant_id": "ten_1", "job_id": "job_cmd", "status": "pending"})
+        self.executor.checkpoints = MagicMock()
+
+        threading.Timer(0.5, self.executor.interrupt).start()
+        body = self.executor.execute({"tenant_id": "ten_1", "job_id": "job_cmd", "agent": "claude", "command": "sleep 30"})
+
+        self.assertEqual(body["job_id"], "job_cmd")
+        self.assertNotIn("resume", body)
+        self.executor.checkpoints.save.assert_not_called()
+        item = self.table.get_item(Key={"tenant_id": "ten_1", "job_id": "job_cmd"})["Item"]
+        self.assertEqual(item["status"], "pending")
+
+    def test_interrupt_checkpoints_and_resume_skips_completed_steps(self):
+        job_id = "job_spot"
+        tenant_id = "ten_1"
+        self.table.put_item(Item={"tenant_id": tenant_id, "job_id": job_id, "status": "pending"})
+        counter = "/tmp/outpost/setup-runs.txt"
+        os.makedirs("/tmp/outpost", exist_ok=True)
+
+        job_data = {
+            "tenant_id": tenant_id,
+            "job_id": job_id,
+            "agent": "claude",
+            "command": "setup && agent",
+            "steps": [
+                {"name": "setup", "command": f"echo run >> {counter}; echo state > progress.txt"},
+                {"name": "agent", "command": "[ -n \"$OUTPOST_TEST_RESUMED\" ] || sleep 30; cat progress.txt"}
+            ]
+        }
+
+        threading.Timer(1.0, self.executor.interrupt).start()
+        resume = self.executor.execute(job_data)
+
+        self.assertIsNotNone(resume)
+        self.assertEqual(resume["resume"]["attempt"], 1)
+        item = self.table.get_item(Key={"tenant_id": tenant_id, "job_id": job_id})["Item"]
+        self.assertEqual(item["status"], "pending")
+
+        # A fresh worker picks up the requeued message
+        shutil.rmtree(f"/tmp/outpost/workspaces/{tenant_id}/{job_id}")
+        worker = Worker()
+        os.environ["OUTPOST_TEST_RESUMED"] = "1"
+        try:
+            self.assertIsNone(worker.execute(resume))
+        finally:
+            del os.environ["OUTPOST_TEST_RESUMED"]
+
+        item = self.table.get_item(Key={"tenant_id": tenant_id, "job_id": job_id})["Item"]
+        self.assertEqual(item["status"], "success")
+        with open(counter) as f:
+            self.assertEqual(f.read().split(), ["run"])
+        self.assertEqual(worker.checkpoint_stats["resumes"], 1)
+        self.assertGreaterEqual(worker.checkpoint_stats["compute_saved_seconds"], 0)
 
 if __name__ == "__main__":
     unittest.main()